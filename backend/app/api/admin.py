@@ -1,12 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from uuid import UUID
-from app.db.database import get_db
+from app.db.database import engine, get_db
+from app.core.cache import sacco_cache, user_cache
 from app.models.sacco import Sacco
 from app.models.vehicle import Vehicle
 from app.models.user import User
-from app.models.trip import Trip
+from app.core.responses import FastJSONResponse
+from app.services.demand import SOURCES, check_region, demand_heatmap
+from app.services.sacco_analytics import breakdown_query, check_options, stream_breakdown, totals_query
 from pydantic import BaseModel
 from typing import Optional
 from datetime import datetime, timedelta
@@ -33,7 +37,7 @@ class SaccoResponse(BaseModel):
     id: str
     name: str
     registration_number: str
-    phone: str
+    phone: Optional[str]
     email: Optional[str]
     address: Optional[str]
     created_at: datetime
@@ -42,6 +46,19 @@ class SaccoResponse(BaseModel):
         from_attributes = True
 
 
+def _sacco_response(sacco: Sacco) -> dict:
+    # The saccos table has contact_phone / contact_email and no address column
+    return {
+        "id": str(sacco.id),
+        "name": sacco.name,
+        "registration_number": sacco.registration_number,
+        "phone": sacco.contact_phone,
+        "email": sacco.contact_email,
+        "address": None,
+        "created_at": sacco.created_at
+    }
+
+
 @router.post("/saccos", response_model=SaccoResponse, status_code=status.HTTP_201_CREATED)
 def create_sacco(
     sacco_data: SaccoCreate,
@@ -63,24 +80,15 @@ def create_sacco(
     sacco = Sacco(
         name=sacco_data.name,
         registration_number=sacco_data.registration_number,
-        phone=sacco_data.phone,
-        email=sacco_data.email,
-        address=sacco_data.address
+        contact_phone=sacco_data.phone,
+        contact_email=sacco_data.email
     )
     
     db.add(sacco)
     db.commit()
     db.refresh(sacco)
     
-    return {
-        "id": str(sacco.id),
-        "name": sacco.name,
-        "registration_number": sacco.registration_number,
-        "phone": sacco.phone,
-        "email": sacco.email,
-        "address": sacco.address,
-        "created_at": sacco.created_at
-    }
+    return _sacco_response(sacco)
 
 
 @router.get("/saccos")
@@ -99,21 +107,14 @@ def list_saccos(
         "skip": skip,
         "limit": limit,
         "saccos": [
-            {
-                "id": str(s.id),
-                "name": s.name,
-                "registration_number": s.registration_number,
-                "phone": s.phone,
-                "email": s.email,
-                "address": s.address,
-                "created_at": s.created_at
-            }
+            _sacco_response(s)
             for s in saccos
         ]
     }
 
 
 @router.get("/saccos/{sacco_id}", response_model=SaccoResponse)
+@sacco_cache.read_through("sacco_id", SaccoResponse)
 def get_sacco(
     sacco_id: str,
     db: Session = Depends(get_db)
@@ -136,15 +137,7 @@ def get_sacco(
             detail="Sacco not found"
         )
     
-    return {
-        "id": str(sacco.id),
-        "name": sacco.name,
-        "registration_number": sacco.registration_number,
-        "phone": sacco.phone,
-        "email": sacco.email,
-        "address": sacco.address,
-        "created_at": sacco.created_at
-    }
+    return _sacco_response(sacco)
 
 
 @router.patch("/saccos/{sacco_id}", response_model=SaccoResponse)
@@ -174,24 +167,15 @@ def update_sacco(
     if sacco_update.name:
         sacco.name = sacco_update.name
     if sacco_update.phone:
-        sacco.phone = sacco_update.phone
+        sacco.contact_phone = sacco_update.phone
     if sacco_update.email:
-        sacco.email = sacco_update.email
-    if sacco_update.address:
-        sacco.address = sacco_update.address
+        sacco.contact_email = sacco_update.email
     
     db.commit()
+    sacco_cache.invalidate(sacco_uuid)
     db.refresh(sacco)
     
-    return {
-        "id": str(sacco.id),
-        "name": sacco.name,
-        "registration_number": sacco.registration_number,
-        "phone": sacco.phone,
-        "email": sacco.email,
-        "address": sacco.address,
-        "created_at": sacco.created_at
-    }
+    return _sacco_response(sacco)
 
 
 @router.get("/saccos/{sacco_id}/vehicles")
@@ -272,10 +256,15 @@ def get_sacco_drivers(
 @router.get("/saccos/{sacco_id}/analytics")
 def get_sacco_analytics(
     sacco_id: str,
-    days: int = 30,
+    days: int = Query(30, ge=1, description="Window ending now"),
+    bucket: Optional[str] = Query(None, description="hour, day or week (service-local time)"),
+    group_by: Optional[str] = Query(None, description="route, vehicle or driver"),
     db: Session = Depends(get_db)
 ):
-    """Get Sacco analytics for a period"""
+    """
+    Get Sacco analytics for a period: totals, or with bucket and/or group_by
+    a breakdown streamed as it is aggregated
+    """
     
     try:
         sacco_uuid = UUID(sacco_id)
@@ -285,41 +274,62 @@ def get_sacco_analytics(
             detail="Invalid sacco ID format"
         )
     
-    # Get vehicles for this sacco
-    vehicles = db.query(Vehicle.id).filter(
-        Vehicle.sacco_id == sacco_uuid
-    ).all()
+    try:
+        check_options(bucket, group_by)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     
-    vehicle_ids = [v.id for v in vehicles]
+    end_date = datetime.utcnow()
+    start_date = end_date - timedelta(days=days)
     
-    if not vehicle_ids:
+    if bucket is None and group_by is None:
+        totals = db.execute(totals_query(sacco_uuid, start_date, end_date)).one()
+        total_earnings = float(totals.earnings)
         return {
             "sacco_id": sacco_id,
             "period_days": days,
-            "total_trips": 0,
-            "total_earnings": 0.0,
-            "average_trip_value": 0.0
+            "total_trips": totals.trips,
+            "total_earnings": total_earnings,
+            "average_trip_value": total_earnings / totals.trips if totals.trips else 0.0,
+            "total_vehicles": totals.vehicles
         }
     
-    # Get trips for these vehicles in the period
-    start_date = datetime.utcnow() - timedelta(days=days)
+    query = breakdown_query(engine.dialect.name, sacco_uuid, start_date, end_date, bucket, group_by)
+    header = {"sacco_id": sacco_id, "period_days": days, "bucket": bucket, "group_by": group_by}
     
-    trips = db.query(Trip).filter(
-        Trip.vehicle_id.in_(vehicle_ids),
-        Trip.trip_status == "completed",
-        Trip.end_time >= start_date
-    ).all()
+    def body():
+        # A connection of its own: the request's session is closed once the handler returns
+        with engine.connect() as conn:
+            yield from stream_breakdown(conn, query, header)
     
-    total_earnings = sum(float(trip.fare_amount or 0) for trip in trips)
+    return StreamingResponse(body(), media_type="application/json")
+
+
+@router.get("/demand/heatmap")
+def get_demand_heatmap(
+    region: str = Query(..., description="Geohash prefix of the area"),
+    source: str = Query("trips", description="trips (trip starts) or alerts"),
+    precision: Optional[int] = Query(None, description="Geohash length of the cells, default region length + 2"),
+    db: Session = Depends(get_db)
+):
+    """
+    Trip starts or emergency alerts per geohash cell and local hour of the
+    week (0 = Monday 00:00), for deploying vehicles where demand is
+    """
+    region = region.lower()
+    if source not in SOURCES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"source must be one of: {', '.join(SOURCES)}"
+        )
+    if precision is None:
+        precision = min(len(region) + 2, demand_heatmap.precision)
+    try:
+        check_region(region, precision, demand_heatmap.precision)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     
-    return {
-        "sacco_id": sacco_id,
-        "period_days": days,
-        "total_trips": len(trips),
-        "total_earnings": total_earnings,
-        "average_trip_value": total_earnings / len(trips) if trips else 0.0,
-        "total_vehicles": len(vehicle_ids)
-    }
+    return FastJSONResponse(demand_heatmap.heatmap(db.connection(), source, region, precision))
 
 
 @router.post("/users/{user_id}/set-role")
@@ -355,6 +365,7 @@ def set_user_role(
     
     user.user_type = role
     db.commit()
+    user_cache.invalidate(user_uuid)
     db.refresh(user)
     
     return {
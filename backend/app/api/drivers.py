@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
+from sqlalchemy import and_, case, func, select, true
 from typing import List
 from uuid import UUID
 from datetime import datetime, timedelta
@@ -8,10 +8,57 @@ from app.db.database import get_db
 from app.models.trip import Trip, TripStatus
 from app.models.vehicle import Vehicle
 from app.models.user import User
+from app.models.driver_safety_score import DriverSafetyScore
+from app.models.rating import Rating
 from app.schemas.trip import TripResponse
 
 router = APIRouter(prefix="/api/drivers", tags=["Driver Dashboard"])
 
+def _dashboard_query(driver_uuid: UUID, today_start: datetime, today_end: datetime):
+    """
+    Everything the dashboard shows, as one statement returning one row (none if
+    the driver does not exist): conditional aggregates over the driver's
+    completed trips and ratings, joined to the ongoing trip and its vehicle
+    """
+    today = and_(Trip.end_time >= today_start, Trip.end_time < today_end)
+    completed = select(
+        func.count().label("total_trips"),
+        func.coalesce(func.sum(Trip.fare_amount), 0).label("total_earnings"),
+        func.count(case((today, Trip.id))).label("today_trips"),
+        func.coalesce(func.sum(case((today, Trip.fare_amount))), 0).label("today_earnings"),
+    ).where(
+        Trip.user_id == driver_uuid,
+        Trip.trip_status == TripStatus.completed,
+    ).cte("completed_trips")
+
+    ratings = select(
+        func.avg(Rating.score).label("average_rating"),
+        func.count().label("total_ratings"),
+    ).where(Rating.driver_id == driver_uuid).cte("driver_ratings")
+
+    # The driver is a bound parameter, so the ongoing trip is an uncorrelated
+    # derived table rather than a lateral join
+    active = select(
+        Trip.id, Trip.vehicle_id, Trip.route_id, Trip.start_time, Trip.fare_amount,
+    ).where(
+        Trip.user_id == driver_uuid,
+        Trip.trip_status == TripStatus.ongoing,
+    ).order_by(Trip.start_time.desc()).limit(1).subquery("active")
+
+    return select(
+        User.id, User.name, User.phone,
+        completed.c.total_trips, completed.c.total_earnings,
+        completed.c.today_trips, completed.c.today_earnings,
+        ratings.c.average_rating, ratings.c.total_ratings,
+        active.c.id.label("trip_id"), active.c.vehicle_id, active.c.route_id,
+        active.c.start_time, active.c.fare_amount,
+        Vehicle.registration_number, Vehicle.vehicle_type, Vehicle.capacity,
+    ).select_from(User).join(completed, true()).join(ratings, true()).outerjoin(
+        active, true()
+    ).outerjoin(
+        Vehicle, Vehicle.id == active.c.vehicle_id
+    ).where(User.id == driver_uuid)
+
 @router.get("/{driver_id}/dashboard")
 def get_driver_dashboard(
     driver_id: str,
@@ -28,82 +75,52 @@ def get_driver_dashboard(
             detail="Invalid driver ID format"
         )
     
-    # Get driver user info
-    driver = db.query(User).filter(User.id == driver_uuid).first()
-    if not driver:
+    today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    today_end = today_start + timedelta(days=1)
+    
+    row = db.execute(_dashboard_query(driver_uuid, today_start, today_end)).mappings().first()
+    if not row:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Driver not found"
         )
     
-    # Get active trip
-    active_trip = db.query(Trip).filter(
-        Trip.user_id == driver_uuid,
-        Trip.trip_status == "ongoing"
-    ).first()
-    
-    # Calculate today's earnings
-    today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-    today_end = today_start + timedelta(days=1)
-    
-    today_trips = db.query(Trip).filter(
-        Trip.user_id == driver_uuid,
-        Trip.trip_status == "completed",
-        Trip.end_time >= today_start,
-        Trip.end_time < today_end
-    ).all()
-    
-    today_earnings = sum(float(trip.fare_amount or 0) for trip in today_trips)
-    today_trips_count = len(today_trips)
-    
-    # Calculate total earnings (all time)
-    all_completed_trips = db.query(Trip).filter(
-        Trip.user_id == driver_uuid,
-        Trip.trip_status == "completed"
-    ).all()
-    
-    total_earnings = sum(float(trip.fare_amount or 0) for trip in all_completed_trips)
-    total_trips = len(all_completed_trips)
-    
-    # Calculate average rating (placeholder - would require rating model)
-    average_rating = 4.5  # Placeholder
-    
-    # Get vehicle info
-    vehicle = None
-    if active_trip and active_trip.vehicle_id:
-        vehicle = db.query(Vehicle).filter(Vehicle.id == active_trip.vehicle_id).first()
+    total_earnings = float(row["total_earnings"])
+    total_trips = row["total_trips"]
+    average_rating = round(float(row["average_rating"]), 2) if row["total_ratings"] else None
     
     return {
         "driver": {
-            "id": str(driver.id),
-            "name": driver.name,
-            "phone": driver.phone,
+            "id": str(row["id"]),
+            "name": row["name"],
+            "phone": row["phone"],
             "rating": average_rating,
         },
         "active_trip": {
-            "id": str(active_trip.id) if active_trip else None,
-            "vehicle_id": str(active_trip.vehicle_id) if active_trip else None,
-            "route_id": str(active_trip.route_id) if active_trip else None,
-            "start_time": active_trip.start_time.isoformat() if active_trip else None,
-            "fare_amount": float(active_trip.fare_amount or 0) if active_trip else None,
-        } if active_trip else None,
+            "id": str(row["trip_id"]),
+            "vehicle_id": str(row["vehicle_id"]),
+            "route_id": str(row["route_id"]),
+            "start_time": row["start_time"].isoformat(),
+            "fare_amount": float(row["fare_amount"] or 0),
+        } if row["trip_id"] else None,
         "vehicle": {
-            "id": str(vehicle.id),
-            "registration": vehicle.registration_number,
-            "type": vehicle.vehicle_type,
-            "capacity": vehicle.capacity,
-        } if vehicle else None,
+            "id": str(row["vehicle_id"]),
+            "registration": row["registration_number"],
+            "type": row["vehicle_type"],
+            "capacity": row["capacity"],
+        } if row["registration_number"] else None,
         "earnings": {
-            "today": today_earnings,
-            "today_trips": today_trips_count,
+            "today": float(row["today_earnings"]),
+            "today_trips": row["today_trips"],
             "total": total_earnings,
             "total_trips": total_trips,
             "average_per_trip": total_earnings / total_trips if total_trips > 0 else 0,
         },
         "stats": {
             "total_trips": total_trips,
-            "completed_today": today_trips_count,
+            "completed_today": row["today_trips"],
             "average_rating": average_rating,
+            "total_ratings": row["total_ratings"],
         }
     }
 
@@ -223,3 +240,63 @@ def get_driver_rating(
             "1_star": 0,
         }
     }
+
+@router.get("/{driver_id}/safety")
+def get_driver_safety(
+    driver_id: str,
+    days: int = 30,
+    db: Session = Depends(get_db)
+):
+    """
+    Get driver safety score and driving totals for the past N days,
+    including driving not yet saved by the safety monitor
+    """
+    from app.services.driving_safety import COUNTERS, driving_safety, safety_score
+
+    try:
+        driver_uuid = UUID(driver_id)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid driver ID format"
+        )
+    
+    driver = db.query(User).filter(User.id == driver_uuid).first()
+    if not driver:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Driver not found"
+        )
+    
+    start_day = (datetime.utcnow() + driving_safety.utc_offset).date() - timedelta(days=days - 1)
+    rows = db.query(DriverSafetyScore).filter(
+        DriverSafetyScore.driver_id == driver_uuid,
+        DriverSafetyScore.day >= start_day
+    ).order_by(DriverSafetyScore.day.desc()).all()
+    
+    totals = driving_safety.pending_totals(driver_uuid, start_day)
+    for row in rows:
+        for name in COUNTERS:
+            totals[name] += getattr(row, name)
+    
+    return {
+        "driver_id": str(driver.id),
+        "driver_name": driver.name,
+        "period_days": days,
+        "safety_score": safety_score(totals),
+        "distance_km": round(totals["distance_m"] / 1000, 1),
+        "driving_hours": round(totals["driving_seconds"] / 3600, 1),
+        "overspeed_minutes": round(totals["overspeed_seconds"] / 60, 1),
+        "overspeed_events": totals["overspeed_events"],
+        "harsh_brakes": totals["harsh_brakes"],
+        "daily_breakdown": [
+            {
+                "date": str(row.day),
+                "safety_score": safety_score({name: getattr(row, name) for name in COUNTERS}),
+                "distance_km": round(row.distance_m / 1000, 1),
+                "overspeed_events": row.overspeed_events,
+                "harsh_brakes": row.harsh_brakes,
+            }
+            for row in rows
+        ],
+    }
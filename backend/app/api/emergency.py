@@ -1,16 +1,72 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy import select, tuple_
+from typing import List, Optional
 from datetime import datetime
+import logging
 from app.db.database import get_db
+from app.core.pagination import encode_cursor, decode_cursor
+from app.core.responses import FastJSONResponse, SchemaRows
 from app.models.emergency_alert import EmergencyAlert
+from app.models.trip import Trip
+from app.models.vehicle import Vehicle
 from app.schemas.emergency_alert import EmergencyAlertCreate, EmergencyAlertResponse, EmergencyAlertUpdate
 from app.services.notification_service import NotificationService
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/api/emergency", tags=["Emergency"])
 
+_alert_rows = SchemaRows(EmergencyAlertResponse, EmergencyAlert.__table__)
+
+
+def _alert_sacco_id(db: Session, alert: EmergencyAlert) -> Optional[str]:
+    """Resolve the sacco an alert belongs to via its vehicle (or its trip's vehicle)"""
+    vehicle_id = alert.vehicle_id
+    if not vehicle_id and alert.trip_id:
+        vehicle_id = db.query(Trip.vehicle_id).filter(Trip.id == alert.trip_id).scalar()
+    if not vehicle_id:
+        return None
+
+    sacco_id = db.query(Vehicle.sacco_id).filter(Vehicle.id == vehicle_id).scalar()
+    return str(sacco_id) if sacco_id else None
+
+
+def _alert_payload(alert: EmergencyAlert) -> dict:
+    """JSON-ready alert data for the real-time alert channel"""
+    return {
+        "id": str(alert.id),
+        "user_id": str(alert.user_id),
+        "trip_id": str(alert.trip_id) if alert.trip_id else None,
+        "vehicle_id": str(alert.vehicle_id) if alert.vehicle_id else None,
+        "alert_type": alert.alert_type.value if alert.alert_type else None,
+        "latitude": float(alert.latitude),
+        "longitude": float(alert.longitude),
+        "description": alert.description,
+        "status": alert.status.value if alert.status else None,
+        "acknowledged_by": str(alert.acknowledged_by) if alert.acknowledged_by else None,
+        "acknowledged_at": alert.acknowledged_at.isoformat() if alert.acknowledged_at else None,
+        "resolved_at": alert.resolved_at.isoformat() if alert.resolved_at else None,
+        "created_at": alert.created_at.isoformat() if alert.created_at else None,
+    }
+
+
+async def _publish_alert(db: Session, event: str, alert: EmergencyAlert):
+    from app.websockets.manager import connection_manager
+
+    try:
+        await connection_manager.broadcast_emergency_alert(
+            event=event,
+            alert_data=_alert_payload(alert),
+            sacco_id=_alert_sacco_id(db, alert),
+        )
+    except Exception as e:
+        logger.error(f"Failed to publish emergency alert {alert.id}: {e}")
+        # Don't fail the request if the real-time channel fails
+
+
 @router.post("", response_model=EmergencyAlertResponse, status_code=status.HTTP_201_CREATED)
-def create_emergency_alert(
+async def create_emergency_alert(
     alert_data: EmergencyAlertCreate,
     user_id: str,  # In production, this would come from JWT token
     db: Session = Depends(get_db)
@@ -50,22 +106,52 @@ def create_emergency_alert(
     except Exception as e:
         print(f"Failed to send emergency notifications: {str(e)}")
         # Don't fail the alert creation if notifications fail
+
+    await _publish_alert(db, "emergency_alert_created", new_alert)
     
     return new_alert
 
 @router.get("", response_model=List[EmergencyAlertResponse])
 def get_emergency_alerts(
     status: str = None,
+    cursor: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
+    limit: int = Query(50, ge=1, le=200),
     db: Session = Depends(get_db)
 ):
-    """Get all emergency alerts with optional status filter"""
-    query = db.query(EmergencyAlert)
+    """
+    Get emergency alerts, newest first, with optional status filter.
+    Keyset paginated: pass the X-Next-Cursor response header back as `cursor`
+    to fetch the next page. The header is absent on the last page.
+    """
+    query = select(*_alert_rows.columns)
     
     if status:
-        query = query.filter(EmergencyAlert.status == status)
+        query = query.where(EmergencyAlert.status == status)
+
+    if cursor:
+        position = decode_cursor(cursor)
+        if position is None:
+            raise HTTPException(
+                status_code=400,
+                detail="Invalid cursor"
+            )
+        query = query.where(
+            tuple_(EmergencyAlert.created_at, EmergencyAlert.id) < position
+        )
     
-    alerts = query.order_by(EmergencyAlert.created_at.desc()).all()
-    return alerts
+    # Rows go straight to JSON, without building and validating EmergencyAlertResponse models
+    alerts = _alert_rows.dicts(db.execute(query.order_by(
+        EmergencyAlert.created_at.desc(),
+        EmergencyAlert.id.desc()
+    ).limit(limit + 1)))
+
+    headers = None
+    if len(alerts) > limit:
+        alerts = alerts[:limit]
+        last = alerts[-1]
+        headers = {"X-Next-Cursor": encode_cursor(last["created_at"], last["id"])}
+
+    return FastJSONResponse(alerts, headers=headers)
 
 @router.get("/{alert_id}", response_model=EmergencyAlertResponse)
 def get_emergency_alert(alert_id: str, db: Session = Depends(get_db)):
@@ -79,7 +165,7 @@ def get_emergency_alert(alert_id: str, db: Session = Depends(get_db)):
     return alert
 
 @router.patch("/{alert_id}", response_model=EmergencyAlertResponse)
-def update_emergency_alert(
+async def update_emergency_alert(
     alert_id: str,
     update_data: EmergencyAlertUpdate,
     admin_user_id: str,  # In production, from JWT token
@@ -104,4 +190,7 @@ def update_emergency_alert(
     
     db.commit()
     db.refresh(alert)
+
+    await _publish_alert(db, "emergency_alert_updated", alert)
+
     return alert
\ No newline at end of file
@@ -0,0 +1,95 @@
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from typing import Optional
+from uuid import UUID
+from datetime import datetime, timedelta
+from app.core.timestamps import to_naive_utc
+from app.db.database import engine, get_db
+from app.models.route import Route
+from app.models.vehicle import Vehicle
+from app.services.gps_export import EXPORT_FORMATS, ExportUnavailable, check_format, export_query, iter_chunks, stream_export
+
+router = APIRouter(prefix="/api/exports", tags=["Exports"])
+
+# Longest range one export may cover
+MAX_EXPORT_DAYS = 93
+
+
+@router.get("/gps")
+def export_gps_history(
+    vehicle_id: Optional[str] = Query(None, description="Export one vehicle"),
+    route_id: Optional[str] = Query(None, description="Export the vehicles assigned to a route"),
+    start: datetime = Query(..., description="From (UTC)"),
+    end: Optional[datetime] = Query(None, description="Until (UTC, exclusive), defaults to now"),
+    format: str = Query("npz", description="npz or arrow"),
+    compress: bool = Query(False, description="Deflate npz members"),
+    db: Session = Depends(get_db)
+):
+    """
+    Stream GPS history as columnar binary.
+    npz members: vehicle (int32 index into vehicle_ids), latitude/longitude (float64),
+    timestamp_ms (int64 epoch ms), speed_kmh/heading (float32, NaN when unknown).
+    arrow: an IPC stream with the same columns, vehicle_id dictionary-encoded.
+    """
+    if (vehicle_id is None) == (route_id is None):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Pass exactly one of vehicle_id or route_id"
+        )
+
+    start = to_naive_utc(start)
+    end = to_naive_utc(end) or datetime.utcnow()
+    if start >= end:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="start must be before end"
+        )
+    if end - start > timedelta(days=MAX_EXPORT_DAYS):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Exports are limited to {MAX_EXPORT_DAYS} days"
+        )
+
+    try:
+        check_format(format)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except ExportUnavailable as e:
+        raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail=str(e))
+
+    try:
+        vehicle_uuid = UUID(vehicle_id) if vehicle_id else None
+        route_uuid = UUID(route_id) if route_id else None
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid vehicle or route ID format"
+        )
+
+    if vehicle_uuid and not db.query(Vehicle.id).filter(Vehicle.id == vehicle_uuid).first():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Vehicle not found"
+        )
+    if route_uuid and not db.query(Route.id).filter(Route.id == route_uuid).first():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Route not found"
+        )
+
+    query = export_query(start, end, vehicle_id=vehicle_uuid, route_id=route_uuid)
+
+    def body():
+        # A connection of its own: the request's session is closed once the handler returns
+        with engine.connect() as conn:
+            yield from stream_export(format, iter_chunks(conn, query), compress=compress)
+
+    media_type, extension = EXPORT_FORMATS[format]
+    subject = f"vehicle-{vehicle_uuid}" if vehicle_uuid else f"route-{route_uuid}"
+    filename = f"gps-{subject}-{start:%Y%m%d%H%M}-{end:%Y%m%d%H%M}.{extension}"
+    return StreamingResponse(
+        body(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
@@ -1,14 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Header, Response, status
 from sqlalchemy.orm import Session
 from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from typing import Optional
 from uuid import UUID
-from datetime import datetime, timedelta
 from app.db.database import get_db
+from app.core.cache import trip_payment_cache
 from app.models.payment import Payment, PaymentStatus, PaymentMethod
 from app.models.trip import Trip
 from app.models.user import User
 from app.schemas.payment import PaymentCreate, PaymentResponse, PaymentMpesaCallback
-import os
+from app.services.payment_queue import payment_queue, StkPushJob
+from app.services.mpesa_callbacks import callback_processor, MpesaCallback
+from app.services.mpesa_service import new_account_reference
 from decimal import Decimal
 
 router = APIRouter(prefix="/api/payments", tags=["Payments"])
@@ -17,9 +21,16 @@ router = APIRouter(prefix="/api/payments", tags=["Payments"])
 @router.post("/create", response_model=PaymentResponse, status_code=status.HTTP_201_CREATED)
 def create_payment(
     payment_data: PaymentCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=100),
     db: Session = Depends(get_db)
 ):
-    """Create a payment for a trip"""
+    """
+    Create a payment for a trip.
+    Returns immediately with a pending payment; the M-Pesa STK push is sent
+    by the payment queue workers. Repeated requests for the same attempt
+    (double-taps, client retries) return the existing payment with 200.
+    """
     
     # Check if trip exists
     trip = db.query(Trip).filter(Trip.id == payment_data.trip_id).first()
@@ -29,16 +40,38 @@ def create_payment(
             detail="Trip not found"
         )
     
-    # Check if payment already exists for this trip
-    existing_payment = db.query(Payment).filter(
+    # Check existing payments for this trip
+    existing_payments = db.query(Payment).filter(
         Payment.trip_id == payment_data.trip_id
-    ).first()
-    
-    if existing_payment and existing_payment.payment_status == PaymentStatus.completed:
+    ).all()
+
+    if any(p.payment_status == PaymentStatus.completed for p in existing_payments):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Payment already completed for this trip"
         )
+
+    # A pending/processing attempt is still in flight: hand it back instead of charging twice
+    in_flight = next(
+        (p for p in existing_payments if p.payment_status in (PaymentStatus.pending, PaymentStatus.processing)),
+        None
+    )
+    if in_flight:
+        # Its STK job may have been dropped (full queue, restart); enqueue skips one still queued
+        if (in_flight.payment_method == PaymentMethod.mpesa and in_flight.payment_status == PaymentStatus.pending
+                and payment_data.phone_number):
+            payment_queue.enqueue(StkPushJob(
+                payment_id=str(in_flight.id),
+                phone_number=payment_data.phone_number,
+                amount=float(in_flight.amount),
+                reference=in_flight.reference_number
+            ))
+        response.status_code = status.HTTP_200_OK
+        return in_flight
+
+    # Without a client key, each new attempt gets the next per-trip key
+    if not idempotency_key:
+        idempotency_key = f"trip-{trip.id.hex}-{len(existing_payments)}"
     
     # Create payment
     payment = Payment(
@@ -48,24 +81,38 @@ def create_payment(
         amount=payment_data.amount,
         payment_method=payment_data.payment_method,
         payment_status=PaymentStatus.pending,
-        reference_number=f"PAY-{trip.id.hex[:8].upper()}-{datetime.utcnow().timestamp()}"
+        reference_number=new_account_reference(),
+        idempotency_key=idempotency_key
     )
     
     db.add(payment)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        # A concurrent request with the same key won the race
+        db.rollback()
+        existing = db.query(Payment).filter(
+            Payment.idempotency_key == idempotency_key
+        ).first()
+        if not existing:
+            raise
+        if existing.trip_id != trip.id:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Idempotency-Key already used for another trip"
+            )
+        response.status_code = status.HTTP_200_OK
+        return existing
     db.refresh(payment)
     
-    # If Mpesa, initiate STK push
+    # If Mpesa, queue the STK push
     if payment_data.payment_method == PaymentMethod.mpesa and payment_data.phone_number:
-        try:
-            initiate_mpesa_stk(
-                phone_number=payment_data.phone_number,
-                amount=float(payment_data.amount),
-                reference=payment.reference_number,
-                payment_id=str(payment.id)
-            )
-        except Exception as e:
-            print(f"Mpesa STK initiation failed: {e}")
+        payment_queue.enqueue(StkPushJob(
+            payment_id=str(payment.id),
+            phone_number=payment_data.phone_number,
+            amount=float(payment_data.amount),
+            reference=payment.reference_number
+        ))
     
     return payment
 
@@ -95,6 +142,10 @@ def get_payment(
 
 
 @router.get("/trip/{trip_id}", response_model=PaymentResponse)
+# Pending payments change under M-Pesa callbacks, so only settled ones are cached
+@trip_payment_cache.read_through(
+    "trip_id", PaymentResponse, cacheable=lambda payment: payment["payment_status"] in ("completed", "refunded")
+)
 def get_trip_payment(
     trip_id: str,
     db: Session = Depends(get_db)
@@ -108,7 +159,11 @@ def get_trip_payment(
             detail="Invalid trip ID format"
         )
     
-    payment = db.query(Payment).filter(Payment.trip_id == trip_uuid).first()
+    # A trip can have several attempts: the completed one, else the latest
+    payment = db.query(Payment).filter(Payment.trip_id == trip_uuid).order_by(
+        (Payment.payment_status == PaymentStatus.completed).desc(),
+        Payment.created_at.desc()
+    ).first()
     if not payment:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -119,36 +174,26 @@ def get_trip_payment(
 
 
 @router.post("/callback/mpesa")
-def mpesa_callback(callback_data: PaymentMpesaCallback, db: Session = Depends(get_db)):
-    """Handle Mpesa payment callback"""
-    
-    # Find payment by reference
-    payment = db.query(Payment).filter(
-        Payment.reference_number == callback_data.reference
-    ).first()
-    
-    if not payment:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Payment reference not found"
-        )
-    
-    # Update payment status
-    if callback_data.status.lower() == "success":
-        payment.payment_status = PaymentStatus.completed
-        payment.mpesa_transaction_id = callback_data.transaction_id
-        
-        # Update trip payment status
-        trip = db.query(Trip).filter(Trip.id == payment.trip_id).first()
-        if trip:
-            trip.payment_status = "completed"
-    else:
-        payment.payment_status = PaymentStatus.failed
-    
-    db.commit()
-    db.refresh(payment)
-    
-    return {"status": "processed", "payment_id": str(payment.id)}
+def mpesa_callback(callback_data: PaymentMpesaCallback, background_tasks: BackgroundTasks):
+    """
+    Handle Mpesa payment callback.
+    Acknowledged immediately; the status transition is applied after the response
+    (or with the next batch when callback batching is enabled). Duplicate callbacks
+    are dropped without touching the database.
+    """
+    callback = MpesaCallback(
+        reference=callback_data.reference,
+        transaction_id=callback_data.transaction_id,
+        succeeded=callback_data.status.lower() == "success"
+    )
+
+    if not callback_processor.submit(callback):
+        return {"status": "duplicate", "reference": callback.reference}
+
+    if not callback_processor.batch_mode:
+        background_tasks.add_task(callback_processor.process, [callback])
+
+    return {"status": "accepted", "reference": callback.reference}
 
 
 @router.get("/user/{user_id}/history")
@@ -183,33 +228,6 @@ def get_user_payments(
     }
 
 
-def initiate_mpesa_stk(phone_number: str, amount: float, reference: str, payment_id: str):
-    """
-    Initiate Mpesa STK push
-    Requires: MPESA_API_KEY, MPESA_BUSINESS_CODE, MPESA_CALLBACK_URL
-    """
-    
-    # Get Mpesa credentials from environment
-    api_key = os.getenv("MPESA_API_KEY")
-    business_code = os.getenv("MPESA_BUSINESS_CODE", "174379")
-    callback_url = os.getenv("MPESA_CALLBACK_URL", "https://safarisalama-api.onrender.com/api/payments/callback/mpesa")
-    
-    if not api_key:
-        raise ValueError("MPESA_API_KEY not configured")
-    
-    # This is a placeholder - actual implementation would use Mpesa API
-    # For now, we'll just log it
-    print(f"Mpesa STK Push initiated: {phone_number}, Amount: {amount}, Reference: {reference}")
-    
-    # TODO: Implement actual Mpesa integration using requests library
-    # This would typically involve:
-    # 1. Getting JWT token from Mpesa API
-    # 2. Calling the STK push endpoint
-    # 3. Handling the response
-    
-    return {"status": "initiated", "phone": phone_number}
-
-
 @router.patch("/{payment_id}/status")
 def update_payment_status(
     payment_id: str,
@@ -242,6 +260,7 @@ def update_payment_status(
     
     payment.payment_status = status
     db.commit()
+    trip_payment_cache.invalidate(payment.trip_id)
     db.refresh(payment)
     
     return payment
@@ -1,27 +1,46 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session, joinedload
-from typing import List
+from typing import List, Optional
+from datetime import date
+from uuid import UUID
+from sqlalchemy import select
 from app.db.database import get_db
+from app.core.cache import forecast_cache
+from app.core.responses import FastJSONResponse, SchemaRows
 from app.models.route import Route
 from app.models.stop import Stop
 from app.models.route_stop import RouteStop
 from app.schemas.route import RouteCreate, RouteResponse
+from app.services.demand_forecast import demand_forecast
 
 router = APIRouter(prefix="/api/routes", tags=["routes"])
 
+_route_rows = SchemaRows(RouteResponse, Route.__table__)
+
 
 @router.get("", response_model=List[RouteResponse])
 def get_routes(
     active_only: bool = True,
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. id,name,route_number"),
+    compact: bool = Query(False, description="Return {fields, rows} with each row as an array of values"),
     db: Session = Depends(get_db)
 ):
-    query = db.query(Route)
+    try:
+        rows = _route_rows.only(fields)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+    query = select(*rows.columns)
 
     if active_only:
-        query = query.filter(Route.is_active == True)
+        query = query.where(Route.is_active == True)
 
-    routes = query.order_by(Route.route_number).all()
-    return routes
+    # Rows go straight to JSON, without building and validating RouteResponse models
+    routes = db.execute(query.order_by(Route.route_number))
+    return FastJSONResponse(rows.content(routes, compact))
 
 
 @router.get("/{route_id}", response_model=RouteResponse)
@@ -39,6 +58,33 @@ def get_route(route_id: str, db: Session = Depends(get_db)):
     return route
 
 
+@router.get("/{route_id}/demand-forecast")
+def get_route_demand_forecast(
+    route_id: str,
+    day: Optional[date] = Query(None, description="Local day, default today"),
+    db: Session = Depends(get_db)
+):
+    """Trips expected to start on the route in each 15-minute slot of a day"""
+    try:
+        route_uuid = UUID(route_id)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid route ID format"
+        )
+
+    day = day or demand_forecast.local_date()
+    forecast = forecast_cache.get_or_load(
+        f"{route_uuid}:{day}", lambda: demand_forecast.forecast(db, route_uuid, day)
+    )
+    if forecast is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No demand forecast for this route and day"
+        )
+    return FastJSONResponse(forecast)
+
+
 @router.post("", response_model=RouteResponse, status_code=status.HTTP_201_CREATED)
 def create_route(route: RouteCreate, db: Session = Depends(get_db)):
     payload = route.model_dump(exclude={"stops"})
@@ -0,0 +1,75 @@
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from sqlalchemy.orm import Session
+from uuid import UUID
+from datetime import datetime
+from app.db.database import get_db
+from app.models.stop import Stop
+from app.schemas.route import StopArrivalsResponse, StopLocationUpdate, StopResponse
+from app.services.geofence import geofence, load_route_stops
+from app.services.headway import headway
+
+router = APIRouter(prefix="/api/stops", tags=["stops"])
+
+
+def _parse_stop_id(stop_id: str) -> UUID:
+    try:
+        return UUID(stop_id)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid stop ID format"
+        )
+
+
+@router.patch("/{stop_id}/location", response_model=StopResponse)
+def update_stop_location(stop_id: str, location: StopLocationUpdate, db: Session = Depends(get_db)):
+    """Set a stop's position and geofence radius"""
+    stop = db.query(Stop).filter(Stop.id == _parse_stop_id(stop_id)).first()
+    if not stop:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Stop not found"
+        )
+
+    stop.latitude = location.latitude
+    stop.longitude = location.longitude
+    stop.radius_m = location.radius_m
+    db.commit()
+    db.refresh(stop)
+
+    routes = load_route_stops(db, geofence.default_radius_m)
+    geofence.set_routes(routes)
+    headway.set_routes(routes)
+    return stop
+
+
+@router.get("/{stop_id}/arrivals", response_model=StopArrivalsResponse)
+def get_stop_arrivals(
+    stop_id: str,
+    limit: int = Query(5, ge=1, le=50),
+    db: Session = Depends(get_db)
+):
+    """
+    Next vehicles expected at a stop, soonest first, predicted from each
+    vehicle's last stop and the learned travel times between stops.
+    """
+    stop_uuid = _parse_stop_id(stop_id)
+    now = datetime.utcnow()
+    arrivals = geofence.arrivals_at(stop_uuid, now=now, limit=limit)
+
+    if arrivals is None:
+        # Only unknown stops cost a query; the prediction itself is answered from memory
+        stop = db.query(Stop.id, Stop.latitude).filter(Stop.id == stop_uuid).first()
+        if not stop:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Stop not found"
+            )
+        if stop.latitude is None:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Stop has no coordinates yet; set them with PATCH /api/stops/{stop_id}/location"
+            )
+        arrivals = []
+
+    return {"stop_id": stop_uuid, "generated_at": now, "arrivals": arrivals}
@@ -1,15 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime
+from uuid import UUID
+from sqlalchemy import select
 from app.db.database import get_db
+from app.core.cache import trip_cache
+from app.core.responses import FastJSONResponse, SchemaRows
 from app.models.trip import Trip
 from app.schemas.trip import TripStart, TripEnd, TripResponse
 from app.models.vehicle import Vehicle
+from app.services.fleet_changes import fleet_changes
+from app.services.occupancy import occupancy
 
 
 router = APIRouter(prefix="/api/trips", tags=["Trips"])
 
+_trip_rows = SchemaRows(TripResponse, Trip.__table__)
+
 @router.post("/start", response_model=TripResponse, status_code=status.HTTP_201_CREATED)
 def start_trip(
         trip_data: TripStart,
@@ -42,24 +50,40 @@ def start_trip(
                 detail="route_id is required when vehicle_id is not specified"
             )
 
-        # Find an available online vehicle on this route or unassigned
+        # Find an available online vehicle on this route or unassigned, with a free seat
         from sqlalchemy import or_
-        available_vehicle = db.query(Vehicle).filter(
+        candidates = db.query(Vehicle).filter(
             or_(
                 Vehicle.route_id == trip_data.route_id,
                 Vehicle.route_id == None
             ),
             Vehicle.is_online == True,
             Vehicle.is_active == True
-        ).first()
+        ).all()
 
+        # reserve() takes the seat as it checks, so the vehicle can't fill up in between
+        available_vehicle = next(
+            (v for v in candidates if occupancy.reserve(v.id, v.capacity)), None
+        )
         if not available_vehicle:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
-                detail="No available vehicles found on this route"
+                detail="No available vehicles with free seats found on this route"
             )
 
         vehicle_id = available_vehicle.id
+    else:
+        vehicle = db.query(Vehicle).filter(Vehicle.id == vehicle_id).first()
+        if not vehicle:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Vehicle not found"
+            )
+        if not occupancy.reserve(vehicle.id, vehicle.capacity):
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Vehicle is full"
+            )
 
     # Create new trip
     new_trip = Trip(
@@ -72,8 +96,13 @@ def start_trip(
         trip_status="ongoing"
     )
 
-    db.add(new_trip)
-    db.commit()
+    try:
+        db.add(new_trip)
+        db.commit()
+    except Exception:
+        occupancy.release(vehicle_id)
+        raise
+    fleet_changes.record(vehicle_id)
     db.refresh(new_trip)
 
     return new_trip
@@ -100,17 +129,35 @@ def end_trip(
         )
 
     # Update trip with end details
-    trip.end_latitude = trip_end.end_latitude
-    trip.end_longitude = trip_end.end_longitude
-    trip.end_time = datetime.utcnow()
-    trip.trip_status = "completed"
+    end_time = datetime.utcnow()
+    values = {
+        Trip.end_latitude: trip_end.end_latitude,
+        Trip.end_longitude: trip_end.end_longitude,
+        Trip.end_time: end_time,
+        Trip.trip_status: "completed",
+    }
 
     # Calculate duration in minutes
-    if trip.start_time and trip.end_time:
-        duration = trip.end_time - trip.start_time
-        trip.duration_minutes = int(duration.total_seconds() / 60)
+    if trip.start_time:
+        values[Trip.duration_minutes] = int((end_time - trip.start_time).total_seconds() / 60)
 
+    # Conditional on the trip still being ongoing: of two concurrent ends only
+    # one updates the row, and only that one frees the seat
+    ended = db.query(Trip).filter(
+        Trip.id == trip.id,
+        Trip.trip_status == "ongoing"
+    ).update(values, synchronize_session=False)
     db.commit()
+
+    if not ended:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Trip is not ongoing"
+        )
+
+    occupancy.release(trip.vehicle_id)
+    fleet_changes.record(trip.vehicle_id)
+    trip_cache.invalidate(trip.id)
     db.refresh(trip)
 
     return trip
@@ -119,24 +166,49 @@ def end_trip(
 def get_trips(
     user_id: str = None,
     status: str = None,
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. id,trip_status,start_time"),
+    compact: bool = Query(False, description="Return {fields, rows} with each row as an array of values"),
     db: Session = Depends(get_db)
 ):
     """Get all trips with optional filters"""
-    query = db.query(Trip)
+    try:
+        rows = _trip_rows.only(fields)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=str(e)
+        )
+
+    query = select(*rows.columns)
 
     if user_id:
-        query = query.filter(Trip.user_id == user_id)
+        query = query.where(Trip.user_id == user_id)
 
     if status:
-        query = query.filter(Trip.trip_status == status)
+        query = query.where(Trip.trip_status == status)
 
-    trips = query.order_by(Trip.start_time.desc()).all()
-    return trips
+    # Rows go straight to JSON, without building and validating TripResponse models
+    trips = db.execute(query.order_by(Trip.start_time.desc()))
+    return FastJSONResponse(rows.content(trips, compact))
 
 @router.get("/{trip_id}", response_model=TripResponse)
+# Trips still running or awaiting payment change under other writers, so only settled ones are cached
+@trip_cache.read_through(
+    "trip_id", TripResponse,
+    cacheable=lambda trip: trip["trip_status"] in ("completed", "cancelled")
+    and trip["payment_status"] in ("completed", "refunded")
+)
 def get_trip(trip_id: str, db: Session = Depends(get_db)):
     """Get a specific trip by ID"""
-    trip = db.query(Trip).filter(Trip.id == trip_id).first()
+    try:
+        trip_uuid = UUID(trip_id)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid trip ID format"
+        )
+
+    trip = db.query(Trip).filter(Trip.id == trip_uuid).first()
     if not trip:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -243,6 +315,7 @@ def sync_trip_locations(
         trip.distance_km = trip.distance_km + total_distance
 
     db.commit()
+    trip_cache.invalidate(trip.id)
     db.refresh(trip)
 
     return trip
\ No newline at end of file
@@ -5,10 +5,12 @@ from app.db.database import get_db
 from app.models.user import User
 from app.schemas.user import UserResponse, UserUpdate
 from app.core.security import get_current_user
+from app.core.cache import user_cache
 
 router = APIRouter(prefix="/api/users", tags=["Users"])
 
 @router.get("/{user_id}", response_model=UserResponse)
+@user_cache.read_through("user_id", UserResponse)
 def get_user_profile(
     user_id: str,
     db: Session = Depends(get_db)
@@ -80,6 +82,7 @@ def update_user_profile(
         user.profile_photo_url = user_update.profile_photo_url
     
     db.commit()
+    user_cache.invalidate(uuid_id)
     db.refresh(user)
     
     return user
@@ -1,43 +1,187 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, status, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from typing import List, Optional
-from datetime import datetime
+from uuid import UUID
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import select
 from app.db.database import get_db
+from app.core.cache import vehicle_cache
+from app.core.responses import FastJSONResponse, SchemaRows
+from app.core.timestamps import to_naive_utc
 from app.models.vehicle import Vehicle
+from app.models.gps_point import GpsPoint
 from app.schemas.vehicle import VehicleResponse, VehicleCreate, VehicleLocationUpdate
+from app.schemas.gps_point import GpsPointResponse
+from app.services.fleet_changes import fleet_changes
+from app.services.occupancy import occupancy
 
 router = APIRouter(prefix="/api/vehicles", tags=["Vehicles"])
 
+# vehicles.occupancy is only a checkpoint; the live count comes from the tracker
+_location_rows = SchemaRows(
+    VehicleResponse, Vehicle.__table__, sources={"occupancy": (Vehicle.id, occupancy.count)}
+)
+
+
+def _vehicle_response(vehicle: Vehicle) -> VehicleResponse:
+    """vehicles.occupancy is only a checkpoint; the live count comes from the tracker"""
+    response = VehicleResponse.model_validate(vehicle, from_attributes=True)
+    response.occupancy = occupancy.count(vehicle.id)
+    return response
+
+
 @router.get("/location", response_model=List[VehicleResponse])
 def get_vehicle_locations(
     route_id: Optional[str] = Query(None, description="Filter by route ID"),
     is_online: Optional[bool] = Query(None, description="Filter by online status"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. id,current_latitude,current_longitude"),
+    compact: bool = Query(False, description="Return {fields, rows} with each row as an array of values"),
+    since: Optional[int] = Query(None, ge=0, description="X-Fleet-Version or version of a previous response; returns only what changed"),
     db: Session = Depends(get_db)
 ):
-    """Get all vehicle locations with optional filters"""
+    """
+    Get all vehicle locations with optional filters.
+
+    The X-Fleet-Version header carries the version the list is current to. Passing
+    it back as `since` returns {version, full, vehicles, removed}: the vehicles
+    that changed, and the ids of changed vehicles that no longer match the
+    filters (gone offline, inactive, moved route). When the version is too old
+    to answer from the change log, `full` is true and `vehicles` is everything.
+    """
     from sqlalchemy import or_
-    
-    query = db.query(Vehicle).filter(Vehicle.is_active == True)
+
+    try:
+        rows = _location_rows.only(fields)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+    conditions = [Vehicle.is_active == True]
     
     if route_id:
+        try:
+            route_uuid = UUID(route_id)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid route ID format"
+            )
         # Return vehicles assigned to this route OR unassigned (available for any route)
-        query = query.filter(
+        conditions.append(
             or_(
-                Vehicle.route_id == route_id,
+                Vehicle.route_id == route_uuid,
                 Vehicle.route_id == None
             )
         )
     
     if is_online is not None:
-        query = query.filter(Vehicle.is_online == is_online)
-    
-    vehicles = query.all()
-    return vehicles
+        conditions.append(Vehicle.is_online == is_online)
+
+    # Versions are read before the rows, so a change racing this request is sent again next time, never lost
+    if since is None:
+        version, changed = fleet_changes.version, None
+    else:
+        version, changed = fleet_changes.changes_since(since)
+
+    query = select(*rows.columns).where(*conditions)
+    removed = []
+    if changed is None:
+        result = db.execute(query)
+    elif changed:
+        # Changed vehicles still matching the filters are sent; the rest are tombstones
+        matched = set(db.scalars(select(Vehicle.id).where(*conditions, Vehicle.id.in_(changed))))
+        removed = list(changed - matched)
+        result = db.execute(query.where(Vehicle.id.in_(matched))) if matched else []
+    else:
+        result = []
+
+    # Rows go straight to JSON, without building and validating VehicleResponse models
+    vehicles = rows.content(result, compact)
+    headers = {"X-Fleet-Version": str(version)}
+    if since is None:
+        return FastJSONResponse(vehicles, headers=headers)
+    return FastJSONResponse(
+        {"version": version, "full": changed is None, "vehicles": vehicles, "removed": removed},
+        headers=headers
+    )
+
+@router.get("/stream")
+async def stream_vehicle_updates(
+    route_id: Optional[str] = Query(None, description="Only this route's vehicles"),
+    bbox: Optional[str] = Query(None, description="Only vehicles inside min_lat,min_lng,max_lat,max_lng"),
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID"),
+):
+    """
+    Server-Sent Events feed of vehicle updates, for clients that can't hold a
+    WebSocket. Carries the same events as /ws/tracking (vehicle_location_update,
+    vehicle_offline, vehicle_arrived, vehicle_departed) for a route, a box, or
+    both. EventSource reconnects with Last-Event-ID and gets the events it
+    missed; a `reset` event means they are gone and the list should be refetched.
+    """
+    from app.websockets.sse import sse_broadcaster
+
+    if not route_id and not bbox:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="route_id or bbox is required"
+        )
+
+    if route_id:
+        try:
+            route_id = str(UUID(route_id))
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid route ID format"
+            )
+
+    box = None
+    if bbox:
+        try:
+            box = tuple(float(v) for v in bbox.split(","))
+        except ValueError:
+            box = None
+        if box is None or len(box) != 4:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="bbox must be min_lat,min_lng,max_lat,max_lng"
+            )
+
+    try:
+        resume_from = int(last_event_id) if last_event_id else None
+    except ValueError:
+        resume_from = None
+
+    return StreamingResponse(
+        sse_broadcaster.stream(route_id, box, resume_from),
+        media_type="text/event-stream",
+        # Proxies must pass events through as they come
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @router.get("/{vehicle_id}", response_model=VehicleResponse)
 def get_vehicle(vehicle_id: str, db: Session = Depends(get_db)):
     """Get a specific vehicle by ID"""
-    vehicle = db.query(Vehicle).filter(Vehicle.id == vehicle_id).first()
+    vehicle = _load_vehicle(vehicle_id, db)
+    # Cached without the live occupancy, which is filled in on every read
+    return {**vehicle, "occupancy": occupancy.count(UUID(vehicle["id"]))}
+
+
+@vehicle_cache.read_through("vehicle_id", VehicleResponse)
+def _load_vehicle(vehicle_id: str, db: Session):
+    try:
+        vehicle_uuid = UUID(vehicle_id)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid vehicle ID format"
+        )
+
+    vehicle = db.query(Vehicle).filter(Vehicle.id == vehicle_uuid).first()
     if not vehicle:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -45,6 +189,39 @@ def get_vehicle(vehicle_id: str, db: Session = Depends(get_db)):
         )
     return vehicle
 
+@router.get("/{vehicle_id}/history", response_model=List[GpsPointResponse])
+def get_vehicle_history(
+    vehicle_id: str,
+    start: Optional[datetime] = Query(None, description="From (UTC), defaults to one hour before `end`"),
+    end: Optional[datetime] = Query(None, description="Until (UTC, exclusive), defaults to now"),
+    limit: int = Query(5000, ge=1, le=50000),
+    db: Session = Depends(get_db)
+):
+    """GPS track of a vehicle over a time range"""
+    try:
+        vehicle_uuid = UUID(vehicle_id)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid vehicle ID format"
+        )
+
+    end = to_naive_utc(end) or datetime.utcnow()
+    start = to_naive_utc(start) or end - timedelta(hours=1)
+    if start >= end:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="start must be before end"
+        )
+
+    # Bounding timestamp lets PostgreSQL prune to the partitions covering the range,
+    # then (vehicle_id, timestamp) serves the scan inside them
+    return db.query(GpsPoint).filter(
+        GpsPoint.vehicle_id == vehicle_uuid,
+        GpsPoint.timestamp >= start,
+        GpsPoint.timestamp < end
+    ).order_by(GpsPoint.timestamp).limit(limit).all()
+
 @router.post("", response_model=VehicleResponse, status_code=status.HTTP_201_CREATED)
 def create_vehicle(vehicle_data: VehicleCreate, db: Session = Depends(get_db)):
     """Create a new vehicle (admin only for now)"""
@@ -62,6 +239,7 @@ def create_vehicle(vehicle_data: VehicleCreate, db: Session = Depends(get_db)):
     db.add(new_vehicle)
     db.commit()
     db.refresh(new_vehicle)
+    fleet_changes.record(new_vehicle.id)
     return new_vehicle
 
 @router.patch("/{vehicle_id}/location", response_model=VehicleResponse)
@@ -71,31 +249,61 @@ async def update_vehicle_location(
     db: Session = Depends(get_db)
 ):
     """Update vehicle location (for GPS tracking)"""
-    from app.models.gps_point import GpsPoint
     from app.websockets.manager import connection_manager
+    from app.services.track_compaction import track_compactor
+    from app.services.presence import presence
+    from app.services.geofence import geofence
+    from app.services.driving_safety import driving_safety
+    from app.services.headway import headway
+    
+    try:
+        vehicle_uuid = UUID(vehicle_id)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid vehicle ID format"
+        )
     
-    vehicle = db.query(Vehicle).filter(Vehicle.id == vehicle_id).first()
+    vehicle = db.query(Vehicle).filter(Vehicle.id == vehicle_uuid).first()
     if not vehicle:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Vehicle not found"
         )
     
+    now = datetime.utcnow()
     vehicle.current_latitude = location_data.current_latitude
     vehicle.current_longitude = location_data.current_longitude
-    vehicle.last_location_update = datetime.utcnow()
+    vehicle.last_location_update = now
     vehicle.is_online = True
+    speed_kmh, heading, safety_events = driving_safety.observe(
+        vehicle.id, vehicle.route_id, location_data.current_latitude, location_data.current_longitude, now
+    )
     
     # Save to GPS History
     gps_point = GpsPoint(
+        id=uuid.uuid4(),
         vehicle_id=vehicle.id,
         latitude=location_data.current_latitude,
         longitude=location_data.current_longitude,
-        timestamp=datetime.utcnow()
+        speed_kmh=speed_kmh,
+        heading=heading,
+        timestamp=now
     )
     db.add(gps_point)
+    track_compactor.observe(db, gps_point)
     db.commit()
     db.refresh(vehicle)
+    fleet_changes.record(vehicle.id)
+    vehicle_cache.invalidate(vehicle.id)
+    presence.seen(vehicle.id, vehicle.route_id, now)
+    stop_events = geofence.observe(
+        vehicle.id, vehicle.route_id, location_data.current_latitude, location_data.current_longitude, now
+    )
+    headway_alerts = headway.observe(
+        vehicle.id, vehicle.route_id, vehicle.sacco_id,
+        location_data.current_latitude, location_data.current_longitude, now
+    )
     
     # Broadcast to websocket listeners
     if vehicle.route_id:
@@ -106,8 +314,33 @@ async def update_vehicle_location(
                 "registration_number": vehicle.registration_number,
                 "latitude": float(vehicle.current_latitude),
                 "longitude": float(vehicle.current_longitude),
+                "occupancy": occupancy.count(vehicle.id),
+                "capacity": vehicle.capacity,
                 "timestamp": vehicle.last_location_update.isoformat()
             }
         )
+        for event, fence in stop_events:
+            await connection_manager.broadcast_stop_event(
+                route_id=str(vehicle.route_id),
+                event="vehicle_arrived" if event == "arrival" else "vehicle_departed",
+                data={
+                    "vehicle_id": str(vehicle.id),
+                    "stop_id": str(fence.stop_id),
+                    "sequence": fence.sequence,
+                    "timestamp": now.isoformat()
+                }
+            )
+    for event, data in safety_events:
+        await connection_manager.broadcast_safety_event(
+            event=event,
+            event_data={**data, "registration_number": vehicle.registration_number},
+            sacco_id=str(vehicle.sacco_id) if vehicle.sacco_id else None
+        )
+    for alert, sacco_ids in headway_alerts:
+        await connection_manager.broadcast_headway_event(
+            event="bunching_alert",
+            event_data=alert,
+            sacco_ids=[str(sacco_id) for sacco_id in sacco_ids]
+        )
         
-    return vehicle
\ No newline at end of file
+    return _vehicle_response(vehicle)
@@ -30,3 +30,44 @@ async def tracking_endpoint(websocket: WebSocket, user_id: str):
                 
     except WebSocketDisconnect:
         connection_manager.disconnect(websocket, user_id)
+
+
+@router.websocket("/alerts/{user_id}")
+async def alerts_endpoint(websocket: WebSocket, user_id: str):
+    """
+    WebSocket endpoint for sacco admins and responders to receive emergency alerts.
+    Subscribe with {"action": "subscribe", "sacco_id": "...", "bbox": [min_lat, min_lng, max_lat, max_lng]};
+    both filters are optional. New and updated alerts are pushed as they happen,
+    as are overspeed and harsh_braking events of the sacco's vehicles, bunching_alert
+    when two of them run too close together on a route and headway_stats of the
+    routes they are on every HEADWAY_STATS_SECONDS.
+    """
+    await connection_manager.connect(websocket, user_id)
+
+    try:
+        while True:
+            data = await websocket.receive_json()
+
+            action = data.get("action")
+
+            if action == "subscribe":
+                sacco_id = data.get("sacco_id")
+                bbox = data.get("bbox")
+                if bbox is not None:
+                    try:
+                        bbox = tuple(float(v) for v in bbox)
+                    except (TypeError, ValueError):
+                        bbox = None
+                    if bbox is None or len(bbox) != 4:
+                        await websocket.send_json({"status": "error", "detail": "bbox must be [min_lat, min_lng, max_lat, max_lng]"})
+                        continue
+
+                connection_manager.subscribe_to_alerts(websocket, sacco_id=sacco_id, bbox=bbox)
+                await websocket.send_json({"status": "subscribed", "sacco_id": sacco_id, "bbox": bbox})
+
+            elif action == "unsubscribe":
+                connection_manager.unsubscribe_from_alerts(websocket)
+                await websocket.send_json({"status": "unsubscribed"})
+
+    except WebSocketDisconnect:
+        connection_manager.disconnect(websocket, user_id)
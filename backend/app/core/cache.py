@@ -0,0 +1,276 @@
+"""
+Read-through caching of single entities
+A bounded in-process LRU tier with TTLs in front of an optional shared tier
+(any CacheBackend). Read endpoints fill it; the handlers that change an entity
+invalidate it
+"""
+from collections import OrderedDict
+from functools import wraps
+from typing import Callable, Dict, Optional
+from uuid import UUID
+import inspect
+import json
+import threading
+import time
+
+from pydantic import BaseModel
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.responses import dumps
+
+_MISSING = object()
+
+
+class CacheBackend:
+    """
+    Shared tier: bytes values with a TTL, visible to every API process (a
+    Redis or memcached client fits behind these three methods)
+    """
+
+    def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: bytes, ttl: float):
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+
+class InMemoryBackend(CacheBackend):
+    """Dict-backed shared tier for tests and single-process deployments"""
+
+    def __init__(self):
+        self._items: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires <= time.monotonic():
+                del self._items[key]
+                return None
+            return value
+
+    def set(self, key: str, value: bytes, ttl: float):
+        with self._lock:
+            self._items[key] = (time.monotonic() + ttl, value)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._items.pop(key, None)
+
+
+class LRUCache:
+    """In-process tier: at most max_entries values, each kept for ttl seconds"""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._items: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, key: str):
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                expires, value = item
+                if expires > time.monotonic():
+                    self._items.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._items[key]
+                self.expired += 1
+            self.misses += 1
+            return _MISSING
+
+    def set(self, key: str, value):
+        with self._lock:
+            self._items[key] = (time.monotonic() + self.ttl, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str):
+        with self._lock:
+            self._items.pop(key, None)
+
+
+class EntityCache:
+    """
+    JSON-ready dicts of one kind of entity, keyed by id.
+
+    invalidate() bumps a generation counter, so a load that was already running
+    when the entity changed does not put its stale result back. With a shared
+    tier, other processes' local copies live until their TTL; keep the local
+    TTL short when running several workers.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_entries: int = 10000,
+        ttl: float = 30.0,
+        shared: Optional[CacheBackend] = None,
+        shared_ttl: float = 300.0,
+    ):
+        self.name = name
+        self.local = LRUCache(max_entries, ttl)
+        self.shared = shared
+        self.shared_ttl = shared_ttl
+        self._generation = 0
+
+        self.shared_hits = 0
+        self.shared_misses = 0
+        self.loads = 0
+        self.uncacheable = 0
+
+    def _shared_key(self, key: str) -> str:
+        return f"{self.name}:{key}"
+
+    def get_or_load(
+        self,
+        key: str,
+        load: Callable[[], Optional[dict]],
+        cacheable: Optional[Callable[[dict], bool]] = None,
+    ) -> Optional[dict]:
+        value = self.local.get(key)
+        if value is not _MISSING:
+            return value
+
+        if self.shared is not None:
+            raw = self.shared.get(self._shared_key(key))
+            if raw is not None:
+                self.shared_hits += 1
+                value = json.loads(raw)
+                self.local.set(key, value)
+                return value
+            self.shared_misses += 1
+
+        generation = self._generation
+        value = load()
+        self.loads += 1
+        if value is None:
+            return None
+        if cacheable is not None and not cacheable(value):
+            self.uncacheable += 1
+            return value
+        if generation == self._generation:
+            self.local.set(key, value)
+            if self.shared is not None:
+                self.shared.set(self._shared_key(key), dumps(value), self.shared_ttl)
+        return value
+
+    def invalidate(self, *keys):
+        self._generation += 1
+        for key in keys:
+            key = str(key)
+            self.local.delete(key)
+            if self.shared is not None:
+                self.shared.delete(self._shared_key(key))
+
+    def read_through(
+        self,
+        id_param: str,
+        schema: type[BaseModel],
+        cacheable: Optional[Callable[[dict], bool]] = None,
+    ):
+        """
+        Decorate a handler that loads one entity by an id parameter. Its result
+        is cached as `schema` would serialize it; exceptions (400, 404) pass
+        through uncached, as do ids that are not UUIDs.
+        """
+        def decorator(handler):
+            signature = inspect.signature(handler)
+
+            @wraps(handler)
+            def wrapper(*args, **kwargs):
+                raw = signature.bind(*args, **kwargs).arguments[id_param]
+                try:
+                    key = str(UUID(str(raw)))
+                except ValueError:
+                    return handler(*args, **kwargs)
+
+                def load():
+                    result = handler(*args, **kwargs)
+                    return schema.model_validate(result, from_attributes=True).model_dump(mode="json")
+
+                return self.get_or_load(key, load, cacheable)
+
+            return wrapper
+
+        return decorator
+
+
+def _shared_backend() -> Optional[CacheBackend]:
+    if not settings.CACHE_SHARED_BACKEND:
+        return None
+    if settings.CACHE_SHARED_BACKEND == "memory":
+        return InMemoryBackend()
+    raise ValueError(f"Unknown CACHE_SHARED_BACKEND '{settings.CACHE_SHARED_BACKEND}' (supported: memory)")
+
+
+def _entity_cache(name: str) -> EntityCache:
+    return EntityCache(
+        name,
+        max_entries=settings.CACHE_MAX_ENTRIES,
+        ttl=settings.CACHE_LOCAL_TTL_SECONDS,
+        shared=_shared,
+        shared_ttl=settings.CACHE_SHARED_TTL_SECONDS,
+    )
+
+
+_shared = _shared_backend()
+
+# Global entity caches
+user_cache = _entity_cache("users")
+vehicle_cache = _entity_cache("vehicles")
+trip_cache = _entity_cache("trips")
+sacco_cache = _entity_cache("saccos")
+trip_payment_cache = _entity_cache("trip_payments")
+# Keyed "<route_id>:<local day>"; a forecast run invalidates the days it wrote
+forecast_cache = _entity_cache("route_forecasts")
+
+CACHES = (user_cache, vehicle_cache, trip_cache, sacco_cache, trip_payment_cache, forecast_cache)
+
+
+def _cache_metrics() -> list:
+    lines = [
+        "# TYPE cache_entries gauge",
+        *(f'cache_entries{{cache="{c.name}"}} {len(c.local)}' for c in CACHES),
+        "# TYPE cache_requests_total counter",
+    ]
+    for c in CACHES:
+        lines += [
+            f'cache_requests_total{{cache="{c.name}",tier="local",result="hit"}} {c.local.hits}',
+            f'cache_requests_total{{cache="{c.name}",tier="local",result="miss"}} {c.local.misses}',
+        ]
+        if c.shared is not None:
+            lines += [
+                f'cache_requests_total{{cache="{c.name}",tier="shared",result="hit"}} {c.shared_hits}',
+                f'cache_requests_total{{cache="{c.name}",tier="shared",result="miss"}} {c.shared_misses}',
+            ]
+    lines.append("# TYPE cache_evictions_total counter")
+    lines += [f'cache_evictions_total{{cache="{c.name}",reason="size"}} {c.local.evictions}' for c in CACHES]
+    lines += [f'cache_evictions_total{{cache="{c.name}",reason="ttl"}} {c.local.expired}' for c in CACHES]
+    lines.append("# TYPE cache_loads_total counter")
+    lines += [f'cache_loads_total{{cache="{c.name}"}} {c.loads}' for c in CACHES]
+    lines.append("# TYPE cache_uncacheable_total counter")
+    lines += [f'cache_uncacheable_total{{cache="{c.name}"}} {c.uncacheable}' for c in CACHES]
+    return lines
+
+
+metrics.register_collector(_cache_metrics)
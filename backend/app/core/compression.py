@@ -0,0 +1,142 @@
+"""
+Negotiated response compression
+Brotli when the client accepts it and the brotli package is installed, gzip
+otherwise, for JSON and text responses above a size threshold. Other content
+types (npz/Arrow exports, event streams) pass through unchanged.
+"""
+from typing import Optional, Set
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+# Compressing would hold back events until the compressor flushes
+EXCLUDED_TYPES = ("text/event-stream",)
+
+
+def accepted_encodings(header: str) -> Set[str]:
+    """Codings named in an Accept-Encoding header, less those refused with q=0"""
+    codings = set()
+    for part in header.split(","):
+        coding, _, params = part.partition(";")
+        coding = coding.strip().lower()
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if coding:
+            codings.add(coding)
+    return codings
+
+
+def compressible(headers: Headers) -> bool:
+    """Whether a response with these headers is worth compressing"""
+    if "content-encoding" in headers:
+        return False
+    content_type = headers.get("content-type", "")
+    return content_type.startswith(COMPRESSIBLE_TYPES) and not content_type.startswith(EXCLUDED_TYPES)
+
+
+class _Encoder:
+    """Incremental gzip or brotli compressor for one response body"""
+
+    def __init__(self, coding: str, level: int):
+        self.coding = coding
+        if coding == "br":
+            self._compressor = brotli.Compressor(quality=level)
+        else:
+            # wbits 31 writes the gzip container rather than raw zlib
+            self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, body: bytes, more_body: bool) -> bytes:
+        """Compress a chunk; intermediate chunks are flushed so streams keep moving"""
+        if self.coding == "br":
+            data = self._compressor.process(body)
+            return data + (self._compressor.flush() if more_body else self._compressor.finish())
+        data = self._compressor.compress(body)
+        return data + self._compressor.flush(zlib.Z_SYNC_FLUSH if more_body else zlib.Z_FINISH)
+
+
+class CompressionMiddleware:
+    """
+    Wraps `send`: the response start is held back until the first body chunk,
+    so the content type and (for single-chunk responses) the size are known
+    before choosing between compressing and passing the response through.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        codings = accepted_encodings(Headers(scope=scope).get("Accept-Encoding", ""))
+        if brotli is not None and "br" in codings:
+            coding, level = "br", self.brotli_quality
+        elif "gzip" in codings:
+            coding, level = "gzip", self.gzip_level
+        else:
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[Message] = None
+        encoder: Optional[_Encoder] = None
+        passthrough = False
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start, encoder, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body":
+                if encoder is None:
+                    # e.g. http.response.pathsend: nothing to compress
+                    passthrough = True
+                    await send(start)
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if encoder is None:
+                if not compressible(Headers(raw=start["headers"])) or (
+                    not more_body and len(body) < self.minimum_size
+                ):
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+
+                encoder = _Encoder(coding, level)
+                body = encoder.compress(body, more_body)
+                headers = MutableHeaders(raw=list(start["headers"]))
+                headers["Content-Encoding"] = coding
+                headers.add_vary_header("Accept-Encoding")
+                if more_body:
+                    del headers["Content-Length"]
+                else:
+                    headers["Content-Length"] = str(len(body))
+                await send({**start, "headers": headers.raw})
+                await send({"type": "http.response.body", "body": body, "more_body": more_body})
+                return
+
+            await send({"type": "http.response.body", "body": encoder.compress(body, more_body), "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
@@ -20,6 +20,95 @@ class Settings(BaseSettings):
     SECRET_KEY: str
     PROJECT_NAME: str = "Safari Salama API"
 
+    # M-Pesa (Daraja) STK push
+    MPESA_BASE_URL: str = "https://sandbox.safaricom.co.ke"
+    MPESA_CONSUMER_KEY: Optional[str] = None
+    MPESA_CONSUMER_SECRET: Optional[str] = None
+    MPESA_SHORTCODE: str = "174379"
+    MPESA_PASSKEY: Optional[str] = None
+    MPESA_CALLBACK_URL: str = "https://safarisalama-api.onrender.com/api/payments/callback/mpesa"
+    MPESA_TIMEOUT_SECONDS: float = 10.0
+    MPESA_MAX_RETRIES: int = 3
+    MPESA_WORKERS: int = 4
+    # Callback batching: 0 applies each callback on its own right after acknowledging it
+    MPESA_CALLBACK_BATCH_INTERVAL_MS: int = 0
+    MPESA_CALLBACK_BATCH_SIZE: int = 500
+    # Payments pending or processing this long with no queued job or callback are failed
+    PAYMENT_EXPIRE_MINUTES: int = 10
+    PAYMENT_SWEEP_SECONDS: float = 60.0
+
+    # GPS history (gps_points is range-partitioned by timestamp on PostgreSQL)
+    GPS_PARTITION_INTERVAL: str = "daily"  # or "weekly"
+    GPS_PARTITIONS_PREMAKE: int = 7  # future partitions kept ready
+    # Retention and downsampling delete history, so both are opt-in (e.g. 180 and 7 days)
+    GPS_RETENTION_DAYS: int = 0  # 0 keeps history forever
+    GPS_RETENTION_ACTION: str = "drop"  # or "archive": detach and keep as a standalone table
+    GPS_DOWNSAMPLE_AFTER_DAYS: int = 0  # 0 disables downsampling
+    GPS_DOWNSAMPLE_SECONDS: int = 30
+    GPS_MAINTENANCE_INTERVAL_MINUTES: int = 60
+    # Track compaction: "ingest" simplifies each vehicle's stream as it arrives
+    # (needs all of a vehicle's fixes on one worker), "batch" simplifies closed trips
+    GPS_COMPRESSION_MODE: str = "off"
+    GPS_COMPRESSION_TOLERANCE_M: float = 15.0
+    GPS_RAW_WINDOW_HOURS: int = 24  # raw points are kept this long before compaction
+    GPS_COMPRESSION_INTERVAL_MINUTES: int = 10
+    # Coordinate columns of gps_points and vehicles: "numeric", "microdegrees" (int32)
+    # or "float" (float8). Existing databases are converted with migrate_coordinates.py
+    COORDINATE_STORAGE: str = "numeric"
+
+    # Vehicle presence: vehicles silent this long are marked offline
+    VEHICLE_OFFLINE_AFTER_SECONDS: int = 300
+    PRESENCE_SWEEP_INTERVAL_SECONDS: float = 5.0
+    # Full pass over vehicles for updates this worker never saw (other workers, direct writes)
+    PRESENCE_RECONCILE_MINUTES: int = 10
+    # Passengers aboard are counted in memory and written to vehicles.occupancy this often
+    OCCUPANCY_CHECKPOINT_SECONDS: float = 30.0
+    # Recent vehicle changes kept for ?since= delta polling; older cursors get a snapshot
+    FLEET_CHANGE_LOG_SIZE: int = 20000
+
+    # Read-through entity caches: in-process LRU, plus an optional shared tier
+    CACHE_MAX_ENTRIES: int = 10000  # per entity kind
+    CACHE_LOCAL_TTL_SECONDS: float = 30.0  # bounds staleness across workers
+    CACHE_SHARED_BACKEND: str = ""  # "" (none) or "memory"
+    CACHE_SHARED_TTL_SECONDS: float = 300.0
+
+    # Server-Sent Events vehicle feed
+    SSE_REPLAY_EVENTS: int = 1000  # recent events a reconnecting client can resume from
+    SSE_MAX_PENDING_EVENTS: int = 500  # a stream this far behind is closed
+    SSE_KEEPALIVE_SECONDS: float = 15.0
+
+    # Stop geofencing and ETAs
+    GEOFENCE_RADIUS_M: int = 50  # default stop radius; stops can override it
+    GEOFENCE_PROFILE_BUCKET_MINUTES: int = 30  # time-of-day resolution of segment travel times
+    GEOFENCE_FLUSH_MINUTES: int = 5  # how often learned travel times are saved
+    SERVICE_UTC_OFFSET_HOURS: int = 3  # local time for time-of-day profiles (EAT)
+
+    # Driving safety: speed and braking derived from consecutive fixes
+    SPEED_LIMIT_KMH: int = 80  # PSV limit; routes can set a lower one
+    OVERSPEED_TOLERANCE_KMH: int = 5
+    OVERSPEED_MIN_SECONDS: int = 10  # sustained this long before it is reported
+    HARSH_BRAKING_MPS2: float = 2.5  # averaged over ~4 s, so a hard stop from 60 km/h
+    SAFETY_FLUSH_MINUTES: int = 5  # how often driver totals are saved
+
+    # Headway monitor: vehicles ordered along their route's stops, bunching reported to sacco admins
+    HEADWAY_BUNCHING_M: float = 300.0  # consecutive vehicles running the same way closer than this are bunched
+    HEADWAY_STATS_SECONDS: float = 30.0  # how often per-route headway statistics are sent
+
+    # Demand heatmap: trip starts and alerts per geohash cell and hour of the week
+    DEMAND_GEOHASH_PRECISION: int = 7  # stored cells (~150 m); coarser maps are summed from them
+    DEMAND_UPDATE_SECONDS: float = 300.0  # how often new trips and alerts are counted
+    DEMAND_LAG_SECONDS: float = 60.0  # rows younger than this wait for the next run
+
+    # Route demand forecasts per 15-minute slot, refitted daily from trip history
+    FORECAST_HISTORY_DAYS: int = 90
+    FORECAST_HORIZON_DAYS: int = 2  # today and tomorrow (local days)
+    FORECAST_WEEK_DECAY: float = 0.8  # weight of each older week against the one after it
+
+    # Response compression: brotli if installed and accepted, else gzip
+    COMPRESSION_MIN_BYTES: int = 1024  # smaller responses are sent as they are
+    GZIP_LEVEL: int = 6
+    BROTLI_QUALITY: int = 4
+
     @property
     def database_url(self) -> str:
         """
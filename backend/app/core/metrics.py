@@ -0,0 +1,238 @@
+"""
+Request and database instrumentation for SafariSalama
+Per-route latency histograms, per-request SQL query counting with N+1 detection,
+and Prometheus text exposition
+"""
+from typing import Callable, Dict, List, Optional, Tuple
+from bisect import bisect_left
+from contextvars import ContextVar
+import logging
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# The same statement executed this many times in one request is flagged as N+1
+N_PLUS_ONE_THRESHOLD = 5
+
+
+class Histogram:
+    """Fixed-bucket histogram; observe() is a bisect and two additions"""
+
+    __slots__ = ("buckets", "counts", "total", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def render(self, name: str, labels: str) -> List[str]:
+        lines = []
+        cumulative = 0
+        sep = "," if labels else ""
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels}{sep}le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels}{sep}le="+Inf"}} {self.count}')
+        lines.append(f"{name}_sum{{{labels}}} {self.total}")
+        lines.append(f"{name}_count{{{labels}}} {self.count}")
+        return lines
+
+
+class RequestStats:
+    """SQL activity of the request being served; shared with threadpool workers via contextvars"""
+
+    __slots__ = ("queries", "db_time", "statements", "_started")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.statements: Dict[str, int] = {}
+        self._started: List[float] = []
+
+    def repeated_statements(self) -> List[Tuple[str, int]]:
+        return [(s, n) for s, n in self.statements.items() if n >= N_PLUS_ONE_THRESHOLD]
+
+
+_current_request: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests: Dict[Tuple[str, str, int], int] = {}
+        self.latency: Dict[Tuple[str, str], Histogram] = {}
+        self.queries_per_request: Dict[str, Histogram] = {}
+        self.db_time: Dict[str, float] = {}
+        self.queries: Dict[str, int] = {}
+        self.n_plus_one: Dict[str, int] = {}
+        self.background_queries = 0
+        self.background_db_time = 0.0
+        self._reported_n_plus_one = set()
+        self._collectors: List[Callable[[], List[str]]] = []
+
+    def register_collector(self, collector: Callable[[], List[str]]):
+        """Add a callable returning extra exposition lines (gauges, subsystem counters)"""
+        self._collectors.append(collector)
+
+    def observe_request(self, method: str, route: str, status_code: int, duration: float, stats: RequestStats):
+        with self._lock:
+            key = (method, route, status_code)
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+            histogram = self.latency.get((method, route))
+            if histogram is None:
+                histogram = self.latency[(method, route)] = Histogram(LATENCY_BUCKETS)
+            histogram.observe(duration)
+
+            histogram = self.queries_per_request.get(route)
+            if histogram is None:
+                histogram = self.queries_per_request[route] = Histogram(QUERY_COUNT_BUCKETS)
+            histogram.observe(stats.queries)
+
+            self.queries[route] = self.queries.get(route, 0) + stats.queries
+            self.db_time[route] = self.db_time.get(route, 0.0) + stats.db_time
+
+            repeated = stats.repeated_statements() if stats.queries >= N_PLUS_ONE_THRESHOLD else []
+            if repeated:
+                self.n_plus_one[route] = self.n_plus_one.get(route, 0) + 1
+
+        for statement, count in repeated:
+            if (route, statement) not in self._reported_n_plus_one:
+                self._reported_n_plus_one.add((route, statement))
+                logger.warning(
+                    f"Possible N+1 in {method} {route}: statement ran {count} times in one request: "
+                    f"{' '.join(statement.split())[:160]}"
+                )
+
+    def observe_background_query(self, duration: float):
+        with self._lock:
+            self.background_queries += 1
+            self.background_db_time += duration
+
+    def render(self) -> str:
+        with self._lock:
+            lines = [
+                "# HELP http_requests_total HTTP requests by route and status",
+                "# TYPE http_requests_total counter",
+            ]
+            for (method, route, code), count in sorted(self.requests.items()):
+                lines.append(f'http_requests_total{{method="{method}",route="{_escape(route)}",status="{code}"}} {count}')
+
+            lines += [
+                "# HELP http_request_duration_seconds Request latency by route",
+                "# TYPE http_request_duration_seconds histogram",
+            ]
+            for (method, route), histogram in sorted(self.latency.items()):
+                lines += histogram.render("http_request_duration_seconds", f'method="{method}",route="{_escape(route)}"')
+
+            lines += [
+                "# HELP db_queries_per_request SQL statements executed per request",
+                "# TYPE db_queries_per_request histogram",
+            ]
+            for route, histogram in sorted(self.queries_per_request.items()):
+                lines += histogram.render("db_queries_per_request", f'route="{_escape(route)}"')
+
+            lines += ["# HELP db_queries_total SQL statements executed", "# TYPE db_queries_total counter"]
+            for route, count in sorted(self.queries.items()):
+                lines.append(f'db_queries_total{{route="{_escape(route)}"}} {count}')
+            lines.append(f'db_queries_total{{route="background"}} {self.background_queries}')
+
+            lines += ["# HELP db_time_seconds_total Time spent executing SQL", "# TYPE db_time_seconds_total counter"]
+            for route, seconds in sorted(self.db_time.items()):
+                lines.append(f'db_time_seconds_total{{route="{_escape(route)}"}} {seconds}')
+            lines.append(f'db_time_seconds_total{{route="background"}} {self.background_db_time}')
+
+            lines += [
+                "# HELP db_n_plus_one_requests_total Requests that repeated one statement N+1 style",
+                "# TYPE db_n_plus_one_requests_total counter",
+            ]
+            for route, count in sorted(self.n_plus_one.items()):
+                lines.append(f'db_n_plus_one_requests_total{{route="{_escape(route)}"}} {count}')
+
+        for collector in self._collectors:
+            try:
+                lines += collector()
+            except Exception as e:
+                logger.error(f"Metrics collector failed: {e}")
+
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+def instrument_engine(engine: Engine):
+    """Count statements and DB time, attributing them to the current request if there is one"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        stats = _current_request.get()
+        if stats is not None:
+            stats._started.append(time.perf_counter())
+        else:
+            conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        stats = _current_request.get()
+        if stats is not None:
+            duration = time.perf_counter() - stats._started.pop()
+            stats.queries += 1
+            stats.db_time += duration
+            stats.statements[statement] = stats.statements.get(statement, 0) + 1
+        else:
+            started = conn.info.get("query_start")
+            if started:
+                metrics.observe_background_query(time.perf_counter() - started.pop())
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware (no BaseHTTPMiddleware task/stream overhead).
+    Labels by route template, so /api/trips/{trip_id} is one series.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current_request.set(stats)
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start
+            _current_request.reset(token)
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"
+            metrics.observe_request(scope["method"], route_path, status_code, duration, stats)
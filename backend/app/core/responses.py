@@ -0,0 +1,147 @@
+"""
+Fast JSON path for list endpoints
+Rows read with a Core select() are shaped into plain dicts matching the response
+schema and encoded straight to bytes, instead of being loaded as ORM objects,
+validated into Pydantic models and run through the stdlib encoder
+"""
+from datetime import datetime
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union, get_args, get_origin
+from uuid import UUID
+import json
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from sqlalchemy import Table
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(value):
+    # Same representations Pydantic uses when it serializes the response models
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, datetime):
+        text = value.isoformat()
+        return text[:-6] + "Z" if text.endswith("+00:00") else text
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """Encode with orjson when it is installed, the stdlib encoder otherwise"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_UTC_Z)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse for content that is already plain dicts, lists and scalars"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def _is_float(annotation) -> bool:
+    if get_origin(annotation) is Union:
+        return any(_is_float(arg) for arg in get_args(annotation) if arg is not type(None))
+    return annotation is float
+
+
+class SchemaRows:
+    """
+    The columns of `table` that a response schema reads, and how to turn the
+    selected rows into what the schema would have serialized to.
+
+    Schema fields the table has no column for keep the schema's default; Decimal
+    columns behind float fields are converted, as validation would have done.
+    `sources` maps a field to (column, function) for values computed from another
+    column. only() narrows the schema to a fields= parameter, so that just those
+    columns are selected and encoded.
+    """
+
+    # Distinct field subsets remembered per schema
+    MAX_SUBSETS = 64
+
+    def __init__(
+        self,
+        schema: type[BaseModel],
+        table: Table,
+        sources: Optional[Dict[str, Tuple[Any, Callable]]] = None,
+        fields: Optional[Sequence[str]] = None,
+    ):
+        self.schema = schema
+        self.table = table
+        self.sources = sources or {}
+        self.names: List[str] = []
+        self.columns = []
+        self.defaults = {}
+        self._convert: List[Tuple[int, Callable]] = []
+        self._subsets: Dict[frozenset, "SchemaRows"] = {}
+        for name, field in schema.model_fields.items():
+            if fields is not None and name not in fields:
+                continue
+            if name in self.sources:
+                column, convert = self.sources[name]
+                column = column.label(name)
+            else:
+                column = table.c.get(name)
+                if column is None:
+                    self.defaults[name] = field.get_default(call_default_factory=True)
+                    continue
+                convert = None
+                if _is_float(field.annotation) and column.type.python_type is Decimal:
+                    convert = float
+            if convert is not None:
+                self._convert.append((len(self.names), convert))
+            self.names.append(name)
+            self.columns.append(column)
+
+    @property
+    def fields(self) -> List[str]:
+        return self.names + list(self.defaults)
+
+    def only(self, fields: Optional[str]) -> "SchemaRows":
+        """The subset named by a comma-separated fields= parameter; ValueError on unknown names"""
+        names = frozenset(f.strip() for f in (fields or "").split(",") if f.strip())
+        if not names:
+            return self
+        unknown = sorted(names - set(self.schema.model_fields))
+        if unknown:
+            raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+        subset = self._subsets.get(names)
+        if subset is None:
+            subset = SchemaRows(self.schema, self.table, self.sources, names)
+            if len(self._subsets) < self.MAX_SUBSETS:
+                self._subsets[names] = subset
+        return subset
+
+    def lists(self, rows: Iterable) -> List[list]:
+        convert, tail = self._convert, list(self.defaults.values())
+        items = []
+        for row in rows:
+            values = list(row)
+            for index, function in convert:
+                if values[index] is not None:
+                    values[index] = function(values[index])
+            if tail:
+                values.extend(tail)
+            items.append(values)
+        return items
+
+    def dicts(self, rows: Iterable) -> List[dict]:
+        fields = self.fields
+        return [dict(zip(fields, values)) for values in self.lists(rows)]
+
+    def content(self, rows: Iterable, compact: bool = False):
+        """dicts, or {"fields": [...], "rows": [[...], ...]} in compact mode"""
+        if compact:
+            return {"fields": self.fields, "rows": self.lists(rows)}
+        return self.dicts(rows)
@@ -0,0 +1,13 @@
+from datetime import datetime, timezone
+from typing import Optional
+
+
+def to_naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """
+    Query parameters may carry an offset ("...Z", "+03:00"); columns and
+    datetime.utcnow() are naive UTC. Aware values are converted, naive ones
+    are taken as UTC already.
+    """
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
@@ -0,0 +1,107 @@
+"""
+Column types shared by the models
+Coordinate stores latitude/longitude as NUMERIC (the original schema), int32
+micro-degrees or float8, chosen by COORDINATE_STORAGE for the hot tables
+"""
+from decimal import Decimal
+from typing import Dict, List, Tuple
+
+from sqlalchemy import Float, Integer, MetaData, Numeric, inspect
+from sqlalchemy.engine import Connection
+from sqlalchemy.types import TypeDecorator
+
+from app.core.config import settings
+
+COORDINATE_STORAGES = ("numeric", "microdegrees", "float")
+
+# Digits after the decimal point in NUMERIC storage; micro-degrees keep 6 (~11 cm)
+COORDINATE_SCALE = 8
+MICRODEGREES = 1_000_000
+
+
+class Coordinate(TypeDecorator):
+    """
+    A latitude or longitude column.
+
+    numeric      NUMERIC(precision, 8), read back as Decimal (unchanged behaviour)
+    microdegrees INTEGER holding round(degrees * 1e6), read back as float
+    float        DOUBLE PRECISION, read back as float
+
+    Values may be bound as float, Decimal or int degrees in every mode.
+    """
+
+    impl = Numeric
+    cache_ok = True
+
+    def __init__(self, precision: int, storage: str = None):
+        storage = storage or settings.COORDINATE_STORAGE
+        if storage not in COORDINATE_STORAGES:
+            raise ValueError(f"Unknown coordinate storage '{storage}' (choose from {', '.join(COORDINATE_STORAGES)})")
+        self.storage = storage
+        super().__init__(precision, COORDINATE_SCALE)
+
+    def load_dialect_impl(self, dialect):
+        if self.storage == "microdegrees":
+            return dialect.type_descriptor(Integer())
+        if self.storage == "float":
+            return dialect.type_descriptor(Float(precision=53))
+        return dialect.type_descriptor(self.impl)
+
+    def process_bind_param(self, value, dialect):
+        if value is None or self.storage == "numeric":
+            return value
+        if self.storage == "microdegrees":
+            return round(float(value) * MICRODEGREES)
+        return float(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None or self.storage == "numeric":
+            return value
+        if self.storage == "microdegrees":
+            return value / MICRODEGREES
+        return float(value)
+
+    @property
+    def python_type(self):
+        return Decimal if self.storage == "numeric" else float
+
+
+def coordinate_columns(metadata: MetaData) -> Dict[str, List[str]]:
+    """Table name -> names of its Coordinate columns"""
+    tables = {}
+    for table in metadata.sorted_tables:
+        names = [c.name for c in table.columns if isinstance(c.type, Coordinate)]
+        if names:
+            tables[table.name] = names
+    return tables
+
+
+def reflected_storage(column_type) -> str:
+    # Float is a Numeric subclass, so it is checked first
+    if isinstance(column_type, Integer):
+        return "microdegrees"
+    if isinstance(column_type, Float):
+        return "float"
+    return "numeric"
+
+
+def storage_mismatches(conn: Connection, metadata: MetaData) -> List[Tuple[str, str, str, str]]:
+    """
+    (table, column, storage in the database, storage the models expect) for every
+    coordinate column whose database type disagrees with COORDINATE_STORAGE.
+    Tables that do not exist yet are skipped.
+    """
+    inspector = inspect(conn)
+    mismatches = []
+    for table_name, names in coordinate_columns(metadata).items():
+        if not inspector.has_table(table_name):
+            continue
+        reflected = {c["name"]: c["type"] for c in inspector.get_columns(table_name)}
+        expected = metadata.tables[table_name]
+        for name in names:
+            if name not in reflected:
+                continue
+            actual, declared = reflected_storage(reflected[name]), expected.c[name].type.storage
+            if actual != declared:
+                mismatches.append((table_name, name, actual, declared))
+    return mismatches
@@ -1,18 +1,120 @@
+from contextlib import asynccontextmanager
+import asyncio
+import logging
+import time
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse, PlainTextResponse
+from sqlalchemy import text
 from app.core.config import settings
-from app.api import auth, routes, vehicles, emergency, trips, users, drivers, payments, ratings, admin
+from app.core.compression import CompressionMiddleware
+from app.core.metrics import MetricsMiddleware, instrument_engine, metrics
+from app.db.database import Base, engine
+from app.db.types import storage_mismatches
+from app.api import auth, routes, vehicles, emergency, trips, users, drivers, payments, ratings, admin, exports, stops
 from app.api.routes import router as routes_router
 from fastapi.middleware.cors import CORSMiddleware
 
-# DEBUG - Show which database we're connecting to
-print("=" * 60)
-print(f"DATABASE_URL: {settings.database_url}")
-print(f"Using Render DATABASE_URL: {settings.DATABASE_URL is not None}")
-print(f"Using Local DB Components: {settings.DATABASE_URL is None}")
-print("=" * 60)
+logger = logging.getLogger(__name__)
 
-app = FastAPI(title=settings.PROJECT_NAME)
+# Show which database we're connecting to, without the password
+logger.info(
+    f"Database: {engine.url.render_as_string(hide_password=True)} "
+    f"({'Render DATABASE_URL' if settings.DATABASE_URL else 'local DB components'})"
+)
+
+instrument_engine(engine)
+
+
+def _pool_status() -> dict:
+    pool = engine.pool
+    status = {"class": type(pool).__name__}
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        if hasattr(pool, name):
+            status[name] = getattr(pool, name)()
+    if "size" in status and "checkedout" in status:
+        limit = status["size"] + getattr(pool, "_max_overflow", 0)
+        status["saturated"] = status["checkedout"] >= limit
+    return status
+
+
+def _pool_metrics() -> list:
+    status = _pool_status()
+    lines = []
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        if name in status:
+            lines += [f"# TYPE db_pool_{name} gauge", f"db_pool_{name} {status[name]}"]
+    return lines
+
+
+metrics.register_collector(_pool_metrics)
+
+
+def _check_coordinate_storage():
+    # Reading micro-degree integers as NUMERIC degrees (or the reverse) would
+    # silently corrupt every position, so refuse to start on a mismatch
+    try:
+        with engine.connect() as conn:
+            mismatches = storage_mismatches(conn, Base.metadata)
+    except Exception as e:
+        logger.warning(f"Could not check coordinate column types: {e}")
+        return
+    if mismatches:
+        columns = ", ".join(f"{table}.{column} is {actual}" for table, column, actual, _ in mismatches)
+        raise RuntimeError(
+            f"COORDINATE_STORAGE is '{settings.COORDINATE_STORAGE}' but {columns}; "
+            f"run migrate_coordinates.py convert --to {settings.COORDINATE_STORAGE}"
+        )
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    from app.services.payment_queue import payment_queue
+    from app.services.mpesa_callbacks import callback_processor
+    from app.services.gps_partitions import gps_partitions
+    from app.services.track_compaction import track_compactor
+    from app.services.presence import presence
+    from app.services.geofence import geofence
+    from app.services.driving_safety import driving_safety
+    from app.services.headway import headway
+    from app.services.occupancy import occupancy
+    from app.services.demand import demand_heatmap
+    from app.services.demand_forecast import demand_forecast
+
+    _check_coordinate_storage()
+    payment_queue.start()
+    callback_processor.start()
+    gps_partitions.start()
+    track_compactor.start()
+    presence.start(loop=asyncio.get_running_loop())
+    geofence.start()
+    driving_safety.start()
+    headway.start(loop=asyncio.get_running_loop())
+    occupancy.start()
+    demand_heatmap.start()
+    demand_forecast.start()
+    yield
+    demand_forecast.stop()
+    demand_heatmap.stop()
+    occupancy.stop()
+    headway.stop()
+    driving_safety.stop()
+    geofence.stop()
+    presence.stop()
+    track_compactor.stop()
+    gps_partitions.stop()
+    callback_processor.stop()
+    payment_queue.stop()
+
+
+app = FastAPI(title=settings.PROJECT_NAME, lifespan=lifespan)
+
+# Innermost, so request latency includes compression
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.COMPRESSION_MIN_BYTES,
+    gzip_level=settings.GZIP_LEVEL,
+    brotli_quality=settings.BROTLI_QUALITY,
+)
+app.add_middleware(MetricsMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -37,6 +139,8 @@ app.include_router(drivers.router)
 app.include_router(payments.router)
 app.include_router(ratings.router)
 app.include_router(admin.router)
+app.include_router(exports.router)
+app.include_router(stops.router)
 
 from app.api import websockets
 app.include_router(websockets.router)
@@ -47,4 +151,34 @@ def root():
 
 @app.get("/health")
 def health_check():
-    return {"status": "healthy", "database": "connected"}
+    """Liveness: the process is up and serving requests"""
+    return {"status": "healthy"}
+
+@app.get("/ready")
+def readiness_check():
+    """Readiness: the connection pool has capacity and the database answers"""
+    pool = _pool_status()
+    if pool.get("saturated"):
+        return JSONResponse(
+            status_code=503,
+            content={"status": "unavailable", "database": "pool exhausted", "pool": pool}
+        )
+
+    try:
+        start = time.perf_counter()
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+        latency_ms = (time.perf_counter() - start) * 1000
+    except Exception as e:
+        logger.error(f"Readiness check failed: {e}")
+        return JSONResponse(
+            status_code=503,
+            content={"status": "unavailable", "database": "unreachable", "pool": pool}
+        )
+
+    return {"status": "ready", "database": "connected", "latency_ms": round(latency_ms, 2), "pool": pool}
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def prometheus_metrics():
+    """Prometheus text exposition of request and database metrics"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
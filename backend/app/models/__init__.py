@@ -1,8 +1,16 @@
 from app.models.user import User
 from app.models.sacco import Sacco
 from app.models.route import Route
+from app.models.stop import Stop
+from app.models.route_stop import RouteStop
 from app.models.vehicle import Vehicle
 from app.models.emergency_alert import EmergencyAlert
 from app.models.trip import Trip
+from app.models.payment import Payment
 from app.models.rating import Rating
-from app.models.gps_point import GpsPoint
\ No newline at end of file
+from app.models.gps_point import GpsPoint
+from app.models.segment_travel_time import SegmentTravelTime
+from app.models.driver_safety_score import DriverSafetyScore
+from app.models.demand_cell import DemandCell
+from app.models.demand_watermark import DemandWatermark
+from app.models.route_demand_forecast import RouteDemandForecast
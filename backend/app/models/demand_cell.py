@@ -0,0 +1,16 @@
+from sqlalchemy import Column, DateTime, Integer, SmallInteger, String
+from datetime import datetime
+from app.db.database import Base
+
+class DemandCell(Base):
+    """
+    Trip starts or emergency alerts counted per geohash cell and local hour of
+    the week, maintained by app.services.demand
+    """
+    __tablename__ = "demand_cells"
+
+    source = Column(SmallInteger, primary_key=True)  # 0 trip starts, 1 emergency alerts
+    geohash = Column(String(12), primary_key=True)
+    hour_of_week = Column(SmallInteger, primary_key=True)  # 0 = Monday 00:00-01:00, local time
+    count = Column(Integer, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,12 @@
+from sqlalchemy import Column, DateTime, SmallInteger
+from app.db.database import Base
+
+class DemandWatermark(Base):
+    """
+    How far app.services.demand has counted a source: every row created before
+    processed_until is in demand_cells
+    """
+    __tablename__ = "demand_watermarks"
+
+    source = Column(SmallInteger, primary_key=True)
+    processed_until = Column(DateTime, nullable=False)
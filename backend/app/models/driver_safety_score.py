@@ -0,0 +1,20 @@
+from sqlalchemy import Column, Date, DateTime, Float, ForeignKey, Integer
+from sqlalchemy.dialects.postgresql import UUID
+from datetime import datetime
+from app.db.database import Base
+
+class DriverSafetyScore(Base):
+    """
+    A driver's driving totals for one local day, added to by
+    app.services.driving_safety; the score is derived from them when read
+    """
+    __tablename__ = "driver_safety_scores"
+
+    driver_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    distance_m = Column(Float, nullable=False, default=0.0)
+    driving_seconds = Column(Float, nullable=False, default=0.0)
+    overspeed_seconds = Column(Float, nullable=False, default=0.0)
+    overspeed_events = Column(Integer, nullable=False, default=0)
+    harsh_brakes = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Boolean, DateTime, Enum, ForeignKey, Numeric
+from sqlalchemy import Column, String, Boolean, DateTime, Enum, ForeignKey, Numeric, Index
 from sqlalchemy.dialects.postgresql import UUID
 import uuid
 from datetime import datetime
@@ -34,4 +34,11 @@ class EmergencyAlert(Base):
     acknowledged_at = Column(DateTime)
     resolved_at = Column(DateTime)
     created_at = Column(DateTime, default=datetime.utcnow, server_default = 'now()')
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, server_default = 'now()')
\ No newline at end of file
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, server_default = 'now()')
+
+    __table_args__ = (
+        # Active-alerts view: WHERE status = ? ORDER BY created_at DESC, id DESC
+        Index("ix_emergency_alerts_status_created_at", "status", "created_at", "id"),
+        # Unfiltered history, paginated by (created_at, id)
+        Index("ix_emergency_alerts_created_at", "created_at", "id"),
+    )
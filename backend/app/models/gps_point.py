@@ -1,18 +1,33 @@
-from sqlalchemy import Column, DateTime, ForeignKey, Numeric
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Index, Numeric, text
 from sqlalchemy.dialects.postgresql import UUID
 import uuid
 from datetime import datetime
 from app.db.database import Base
+from app.db.types import Coordinate
 
 class GpsPoint(Base):
     __tablename__ = "gps_points"
+    # On PostgreSQL the table is range-partitioned by timestamp; partitions are
+    # created and retired by app.services.gps_partitions. The partition key has
+    # to be part of the primary key.
+    __table_args__ = (
+        Index("ix_gps_points_vehicle_id_timestamp", "vehicle_id", "timestamp"),
+        # Only raw points still waiting for track compaction
+        Index(
+            "ix_gps_points_undecided", "vehicle_id", "timestamp",
+            postgresql_where=text("keyframe IS NULL"), sqlite_where=text("keyframe IS NULL"),
+        ),
+        {"postgresql_partition_by": "RANGE (timestamp)"},
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    vehicle_id = Column(UUID(as_uuid=True), ForeignKey("vehicles.id"), nullable=False, index=True)
+    vehicle_id = Column(UUID(as_uuid=True), ForeignKey("vehicles.id"), nullable=False)
     trip_id = Column(UUID(as_uuid=True), ForeignKey("trips.id"), nullable=True, index=True)
-    latitude = Column(Numeric(10, 8), nullable=False)
-    longitude = Column(Numeric(11, 8), nullable=False)
+    latitude = Column(Coordinate(10), nullable=False)
+    longitude = Column(Coordinate(11), nullable=False)
     speed_kmh = Column(Numeric(5, 2), nullable=True)
     heading = Column(Numeric(5, 2), nullable=True)
-    timestamp = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+    timestamp = Column(DateTime, default=datetime.utcnow, primary_key=True, nullable=False, index=True)
+    # Track compaction: NULL = raw, True = needed to rebuild the track, False = droppable
+    keyframe = Column(Boolean, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow, server_default='now()')
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, Numeric, ForeignKey, Enum
+from sqlalchemy import Column, String, DateTime, Numeric, ForeignKey, Enum, Index
 from sqlalchemy.dialects.postgresql import UUID
 import uuid
 from datetime import datetime
@@ -33,5 +33,16 @@ class Payment(Base):
     payment_status = Column(Enum(PaymentStatus), default=PaymentStatus.pending)
     reference_number = Column(String(100), index=True)
     mpesa_transaction_id = Column(String(100), unique=True, index=True)
+    # One key per payment attempt on a trip; concurrent double-taps collide on it
+    idempotency_key = Column(String(100), unique=True, index=True)
     created_at = Column(DateTime, default=datetime.utcnow, server_default='now()')
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, server_default='now()')
+
+    __table_args__ = (
+        # Only the few payments still in flight, for the stale payment sweeper
+        Index(
+            "ix_payments_in_flight_updated_at", "updated_at",
+            postgresql_where=payment_status.in_([PaymentStatus.pending, PaymentStatus.processing]),
+            sqlite_where=payment_status.in_([PaymentStatus.pending, PaymentStatus.processing]),
+        ),
+    )
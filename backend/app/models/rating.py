@@ -10,7 +10,7 @@ class Rating(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     trip_id = Column(UUID(as_uuid=True), ForeignKey("trips.id"), nullable=False, unique=True)
     passenger_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
-    driver_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
+    driver_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False, index=True)
     score = Column(Integer, nullable=False) # 1 to 5
     feedback = Column(String(500))
     created_at = Column(DateTime, default=datetime.utcnow, server_default='now()')
@@ -16,6 +16,7 @@ class Route(Base):
     description = Column(String)
     estimated_duration_minutes = Column(Integer)
     distance_km = Column(Numeric(10, 2))
+    speed_limit_kmh = Column(Integer)  # NULL: settings.SPEED_LIMIT_KMH
     is_active = Column(Boolean, default=True, server_default='true')
     created_at = Column(DateTime, default=datetime.utcnow, server_default='now()')
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, server_default='now()')
@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Date, DateTime, Float, ForeignKey, SmallInteger
+from sqlalchemy.dialects.postgresql import UUID
+from datetime import datetime
+from app.db.database import Base
+
+class RouteDemandForecast(Base):
+    """
+    Trips expected to start on a route in one 15-minute slot of a local day,
+    written by app.services.demand_forecast
+    """
+    __tablename__ = "route_demand_forecasts"
+
+    route_id = Column(UUID(as_uuid=True), ForeignKey("routes.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    slot = Column(SmallInteger, primary_key=True)  # 0 = 00:00-00:15 local time
+    expected_trips = Column(Float, nullable=False)
+    generated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
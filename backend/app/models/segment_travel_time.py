@@ -0,0 +1,20 @@
+from sqlalchemy import Column, DateTime, Float, ForeignKey, Integer, SmallInteger
+from sqlalchemy.dialects.postgresql import UUID
+from datetime import datetime
+from app.db.database import Base
+
+class SegmentTravelTime(Base):
+    """
+    Time-of-day profile of the time between arrivals at two neighbouring stops
+    of a route (dwell at the first stop included), maintained by app.services.geofence
+    """
+    __tablename__ = "segment_travel_times"
+
+    route_id = Column(UUID(as_uuid=True), ForeignKey("routes.id", ondelete="CASCADE"), primary_key=True)
+    from_sequence = Column(Integer, primary_key=True)
+    to_sequence = Column(Integer, primary_key=True)
+    day_type = Column(SmallInteger, primary_key=True)  # 0 weekday, 1 weekend
+    bucket = Column(SmallInteger, primary_key=True)  # time-of-day slot, local time
+    samples = Column(Integer, nullable=False)
+    mean_seconds = Column(Float, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
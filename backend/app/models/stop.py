@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime
+from sqlalchemy import Column, String, DateTime, Integer, Numeric
 from sqlalchemy.dialects.postgresql import UUID
 import uuid
 from datetime import datetime
@@ -9,5 +9,10 @@ class Stop(Base):
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     name = Column(String(200), nullable=False, unique=True)
+    # Stage position; stops without one are left out of geofencing and ETAs
+    latitude = Column(Numeric(10, 8), nullable=True)
+    longitude = Column(Numeric(11, 8), nullable=True)
+    # Geofence radius; NULL uses GEOFENCE_RADIUS_M
+    radius_m = Column(Integer, nullable=True)
 
     created_at = Column(DateTime, default=datetime.utcnow, server_default="now()")
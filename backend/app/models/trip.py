@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Numeric, ForeignKey, Enum
+from sqlalchemy import Column, Integer, String, DateTime, Numeric, ForeignKey, Enum, Index
 from sqlalchemy.dialects.postgresql import UUID
 import uuid
 from datetime import datetime
@@ -19,6 +19,22 @@ class TripStatus(str, enum.Enum):
 
 class Trip(Base):
     __tablename__ = "trips"
+    __table_args__ = (
+        # Driver dashboard: a driver's ongoing trip, and completed trips by end_time
+        # with their fares (index-only on PostgreSQL)
+        Index(
+            "ix_trips_user_id_trip_status_end_time", "user_id", "trip_status", "end_time",
+            postgresql_include=["fare_amount"],
+        ),
+        # Sacco analytics: completed trips of the sacco's vehicles by end_time,
+        # with what they are summed and grouped by
+        Index(
+            "ix_trips_vehicle_id_trip_status_end_time", "vehicle_id", "trip_status", "end_time",
+            postgresql_include=["fare_amount", "route_id", "driver_id"],
+        ),
+        # Demand heatmap: trips created since its watermark
+        Index("ix_trips_created_at", "created_at"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
@@ -1,23 +1,30 @@
-from sqlalchemy import Column, String, Integer, Boolean, DateTime, Numeric, ForeignKey
+from sqlalchemy import Column, String, Integer, Boolean, DateTime, ForeignKey, Index
 from sqlalchemy.dialects.postgresql import UUID
 import uuid
 from datetime import datetime
 from app.db.database import Base
+from app.db.types import Coordinate
 
 class Vehicle(Base):
     __tablename__ = "vehicles"
+    __table_args__ = (
+        # A sacco's vehicle ids without touching the table (sacco analytics)
+        Index("ix_vehicles_sacco_id", "sacco_id", "id"),
+    )
 
     id = Column(UUID(as_uuid= True), primary_key = True, default = uuid.uuid4)
     registration_number = Column(String(20), unique = True, nullable = False, index = True)
     sacco_id = Column(UUID(as_uuid = True), ForeignKey('saccos.id'))
     route_id = Column(UUID(as_uuid = True), ForeignKey('routes.id'))
     capacity = Column(Integer, default = 14)
+    # Passengers aboard as of the last checkpoint; the live count is app.services.occupancy's
+    occupancy = Column(Integer, default = 0, server_default = '0', nullable = False)
     vehicle_type = Column(String(50), default = 'minibus')
     make = Column(String(50))
     model = Column(String(50))
     year_of_manufacture = Column(Integer)
-    current_latitude = Column(Numeric(10, 8))
-    current_longitude = Column(Numeric(11, 8))
+    current_latitude = Column(Coordinate(10))
+    current_longitude = Column(Coordinate(11))
     last_location_update = Column(DateTime)
     is_active = Column(Boolean, default = True, server_default = 'true')
     is_online = Column(Boolean, default = False, server_default = 'false')
@@ -17,8 +17,8 @@ class GpsPointResponse(BaseModel):
     id: UUID
     vehicle_id: UUID
     trip_id: Optional[UUID]
-    latitude: Decimal
-    longitude: Decimal
+    latitude: float
+    longitude: float
     speed_kmh: Optional[Decimal]
     heading: Optional[Decimal]
     timestamp: datetime
@@ -8,11 +8,34 @@ from decimal import Decimal
 class StopResponse(BaseModel):
     id: UUID
     name: str
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    radius_m: Optional[int] = None
 
     class Config:
         from_attributes = True
 
 
+class StopLocationUpdate(BaseModel):
+    latitude: float = Field(..., ge=-90, le=90, description="Stage latitude")
+    longitude: float = Field(..., ge=-180, le=180, description="Stage longitude")
+    radius_m: Optional[int] = Field(None, gt=0, le=500, description="Geofence radius, default GEOFENCE_RADIUS_M")
+
+
+class StopArrival(BaseModel):
+    vehicle_id: UUID
+    route_id: UUID
+    stops_away: int
+    eta: datetime
+    eta_seconds: int
+
+
+class StopArrivalsResponse(BaseModel):
+    stop_id: UUID
+    generated_at: datetime
+    arrivals: List[StopArrival]
+
+
 class RouteStopResponse(BaseModel):
     sequence: int
     stop: StopResponse
@@ -29,6 +52,7 @@ class RouteBase(BaseModel):
     description: Optional[str] = None
     estimated_duration_minutes: Optional[int] = None
     distance_km: Optional[Decimal] = None
+    speed_limit_kmh: Optional[int] = Field(None, gt=0, le=120)
 
 
 class RouteCreate(RouteBase):
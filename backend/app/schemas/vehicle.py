@@ -2,7 +2,6 @@ from pydantic import BaseModel
 from typing import Optional
 from datetime import datetime
 from uuid import UUID
-from decimal import Decimal
 
 class VehicleBase(BaseModel):
     registration_number: str
@@ -18,16 +17,17 @@ class VehicleCreate(VehicleBase):
     pass
 
 class VehicleLocationUpdate(BaseModel):
-    current_latitude: Decimal
-    current_longitude: Decimal
+    current_latitude: float
+    current_longitude: float
 
 class VehicleResponse(VehicleBase):
     id: UUID
-    current_latitude: Optional[Decimal]
-    current_longitude: Optional[Decimal]
+    current_latitude: Optional[float]
+    current_longitude: Optional[float]
     last_location_update: Optional[datetime]
     is_active: bool
     is_online: bool
+    occupancy: int = 0
     created_at: datetime
 
 class Config:
@@ -0,0 +1,355 @@
+"""
+Demand heatmap for SafariSalama
+Counts where and when passengers start trips, and where emergency alerts are
+raised, per geohash cell and local hour of the week. A background job adds the
+rows created since a per-source watermark; a full recount is the same
+vectorized pass over every row.
+"""
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime, timedelta
+import logging
+import threading
+import time
+
+from sqlalchemy import BigInteger, Float, Integer, cast, delete, func, insert, select, update
+from sqlalchemy.engine import Connection
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.db.database import engine
+from app.models.demand_cell import DemandCell
+from app.models.demand_watermark import DemandWatermark
+from app.models.emergency_alert import EmergencyAlert
+from app.models.trip import Trip
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - the heatmap job is disabled without it
+    np = None
+
+logger = logging.getLogger(__name__)
+
+SOURCES = {"trips": 0, "alerts": 1}
+HOURS_PER_WEEK = 168
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+# Cell codes times HOURS_PER_WEEK must stay exact in int64 (and float64)
+MAX_PRECISION = 9
+# A heatmap covers at most 32**3 cells of its region
+MAX_REGION_DEPTH = 3
+CHUNK_ROWS = 100000
+INSERT_CHUNK = 10000
+
+# 1970-01-01 was a Thursday; Monday is day 0 of the week
+_EPOCH_WEEKDAY = 3
+
+
+def _spread(v):
+    """Move the low 32 bits of each uint64 to the even bit positions"""
+    v = v & np.uint64(0xFFFFFFFF)
+    for shift, mask in ((16, 0x0000FFFF0000FFFF), (8, 0x00FF00FF00FF00FF), (4, 0x0F0F0F0F0F0F0F0F),
+                        (2, 0x3333333333333333), (1, 0x5555555555555555)):
+        v = (v | (v << np.uint64(shift))) & np.uint64(mask)
+    return v
+
+
+def geohash_codes(lat, lon, precision: int):
+    """Geohash of each point as its 5 * precision bit integer"""
+    bits = 5 * precision
+    lon_bits, lat_bits = (bits + 1) // 2, bits // 2
+    lon_q = np.clip(np.floor((lon + 180.0) * ((1 << lon_bits) / 360.0)), 0, (1 << lon_bits) - 1).astype(np.uint64)
+    lat_q = np.clip(np.floor((lat + 90.0) * ((1 << lat_bits) / 180.0)), 0, (1 << lat_bits) - 1).astype(np.uint64)
+    # Bits alternate from the top starting with longitude, so longitude holds
+    # the lowest bit when the count is odd and the second lowest when even
+    if bits % 2:
+        return _spread(lon_q) | (_spread(lat_q) << np.uint64(1))
+    return (_spread(lon_q) << np.uint64(1)) | _spread(lat_q)
+
+
+def geohash_strings(codes, precision: int) -> List[str]:
+    alphabet = np.frombuffer(GEOHASH_ALPHABET.encode(), dtype=np.uint8)
+    shifts = np.arange(precision - 1, -1, -1, dtype=np.uint64) * np.uint64(5)
+    chars = alphabet[((codes.astype(np.uint64)[:, None] >> shifts) & np.uint64(31)).astype(np.intp)]
+    return np.ascontiguousarray(chars).view(f"S{precision}").ravel().astype(f"U{precision}").tolist()
+
+
+def hours_of_week(epoch_seconds, utc_offset_hours: int):
+    hours = (epoch_seconds.astype(np.int64) // 3600) + utc_offset_hours
+    return ((hours // 24 + _EPOCH_WEEKDAY) % 7) * 24 + hours % 24
+
+
+def count_cells(lat, lon, epoch_seconds, precision: int, utc_offset_hours: int):
+    """(keys, counts) with key = geohash code * HOURS_PER_WEEK + hour of week, keys unique"""
+    keys = geohash_codes(lat, lon, precision).astype(np.int64) * HOURS_PER_WEEK
+    keys += hours_of_week(epoch_seconds, utc_offset_hours)
+    return np.unique(keys, return_counts=True)
+
+
+def merge_counts(parts: List[Tuple[object, object]]):
+    if not parts:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    if len(parts) == 1:
+        return parts[0]
+    keys = np.concatenate([k for k, _ in parts])
+    unique, inverse = np.unique(keys, return_inverse=True)
+    counts = np.bincount(inverse, weights=np.concatenate([c for _, c in parts]), minlength=len(unique))
+    return unique, counts.astype(np.int64)
+
+
+def check_region(region: str, precision: int, stored_precision: int):
+    if not region or any(c not in GEOHASH_ALPHABET for c in region):
+        raise ValueError("region must be a geohash prefix")
+    if not len(region) <= precision <= stored_precision:
+        raise ValueError(f"precision must be between the region's length and {stored_precision}")
+    if precision - len(region) > MAX_REGION_DEPTH:
+        raise ValueError(f"precision may be at most {MAX_REGION_DEPTH} more than the region's length")
+
+
+def _prefix_upper_bound(prefix: str) -> Optional[str]:
+    """Smallest string above every string starting with prefix (None if there is none)"""
+    while prefix and prefix[-1] == GEOHASH_ALPHABET[-1]:
+        prefix = prefix[:-1]
+    if not prefix:
+        return None
+    return prefix[:-1] + GEOHASH_ALPHABET[GEOHASH_ALPHABET.index(prefix[-1]) + 1]
+
+
+def epoch_seconds(dialect: str, column):
+    """A (naive UTC) DateTime column as integer seconds since 1970, in SQL"""
+    if dialect == "sqlite":
+        return cast(func.strftime("%s", column), Integer)
+    return cast(func.extract("epoch", column), BigInteger)
+
+
+class DemandHeatmap:
+    """
+    demand_cells holds counts at the stored precision; coarser heatmaps are
+    summed from them when read. Rows are taken by created_at up to `lag`
+    seconds ago, so a row whose transaction commits late is still counted by
+    the next run. The watermark row is locked while a source is counted, so
+    several workers do not count the same rows twice.
+    """
+
+    def __init__(self, precision: int = 7, utc_offset_hours: int = 3,
+                 update_interval: float = 300.0, lag_seconds: float = 60.0):
+        if not 1 <= precision <= MAX_PRECISION:
+            raise ValueError(f"Geohash precision must be between 1 and {MAX_PRECISION}")
+        self.precision = precision
+        self.utc_offset_hours = utc_offset_hours
+        self.update_interval = update_interval
+        self.lag = timedelta(seconds=lag_seconds)
+
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+
+        self.runs = 0
+        self.run_seconds = 0.0
+        self.counted: Dict[int, int] = {source: 0 for source in SOURCES.values()}
+
+    @staticmethod
+    def _columns(source: int):
+        """latitude, longitude, when it happened, when the row was created"""
+        if source == SOURCES["trips"]:
+            return Trip.start_latitude, Trip.start_longitude, Trip.start_time, Trip.created_at
+        return EmergencyAlert.latitude, EmergencyAlert.longitude, EmergencyAlert.created_at, EmergencyAlert.created_at
+
+    def _count(self, conn: Connection, source: int, since: Optional[datetime], until: datetime):
+        """(keys, counts, rows read) over rows created in [since, until)"""
+        lat, lon, at, created = self._columns(source)
+        query = select(cast(lat, Float), cast(lon, Float), epoch_seconds(conn.dialect.name, at)).where(
+            lat != None, lon != None, at != None, created < until
+        )
+        if since is not None:
+            query = query.where(created >= since)
+        parts, rows = [], 0
+        result = conn.execution_options(stream_results=True, yield_per=CHUNK_ROWS).execute(query)
+        for chunk in result.partitions(CHUNK_ROWS):
+            data = np.array(chunk, dtype=np.float64)
+            parts.append(count_cells(data[:, 0], data[:, 1], data[:, 2], self.precision, self.utc_offset_hours))
+            rows += len(chunk)
+            if len(parts) >= 16:
+                parts = [merge_counts(parts)]
+        keys, counts = merge_counts(parts)
+        return keys, counts, rows
+
+    def _rows(self, source: int, keys, counts, now: datetime) -> List[dict]:
+        cells = geohash_strings(keys // HOURS_PER_WEEK, self.precision)
+        return [
+            {"source": source, "geohash": cell, "hour_of_week": int(hour), "count": int(count), "updated_at": now}
+            for cell, hour, count in zip(cells, (keys % HOURS_PER_WEEK).tolist(), counts.tolist())
+        ]
+
+    def _add(self, conn: Connection, rows: List[dict]):
+        dialect = conn.dialect.name
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as upsert
+        elif dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as upsert
+        else:
+            table = DemandCell.__table__
+            for row in rows:
+                key = (table.c.source == row["source"]) & (table.c.geohash == row["geohash"]) & \
+                      (table.c.hour_of_week == row["hour_of_week"])
+                added = conn.execute(update(table).where(key).values(
+                    count=table.c.count + row["count"], updated_at=row["updated_at"]
+                ))
+                if not added.rowcount:
+                    conn.execute(insert(table).values(**row))
+            return
+        stmt = upsert(DemandCell)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["source", "geohash", "hour_of_week"],
+            set_={"count": DemandCell.__table__.c.count + stmt.excluded["count"], "updated_at": stmt.excluded.updated_at},
+        )
+        for offset in range(0, len(rows), INSERT_CHUNK):
+            conn.execute(stmt, rows[offset:offset + INSERT_CHUNK])
+
+    @staticmethod
+    def _watermark(conn: Connection, source: int) -> Tuple[bool, Optional[datetime]]:
+        """(row exists, processed_until), locking the row until the transaction ends"""
+        row = conn.execute(
+            select(DemandWatermark.processed_until).where(DemandWatermark.source == source).with_for_update()
+        ).first()
+        return row is not None, row[0] if row else None
+
+    @staticmethod
+    def _set_watermark(conn: Connection, source: int, exists: bool, until: datetime):
+        if exists:
+            conn.execute(update(DemandWatermark).where(DemandWatermark.source == source).values(processed_until=until))
+        else:
+            # Two workers starting together both insert; one fails on the key and is rolled back
+            conn.execute(insert(DemandWatermark).values(source=source, processed_until=until))
+
+    def _require_numpy(self):
+        if np is None:
+            raise RuntimeError("The demand heatmap needs numpy installed on the server")
+
+    def update(self, now: Optional[datetime] = None) -> int:
+        """Add rows created since each source's watermark; returns the rows counted"""
+        self._require_numpy()
+        started = time.perf_counter()
+        until = (now or datetime.utcnow()) - self.lag
+        total = 0
+        for source in SOURCES.values():
+            with engine.begin() as conn:
+                exists, since = self._watermark(conn, source)
+                if since is not None and since >= until:
+                    continue
+                keys, counts, rows = self._count(conn, source, since, until)
+                if rows:
+                    self._add(conn, self._rows(source, keys, counts, datetime.utcnow()))
+                self._set_watermark(conn, source, exists, until)
+            self.counted[source] += rows
+            total += rows
+        self.runs += 1
+        self.run_seconds += time.perf_counter() - started
+        return total
+
+    def rebuild(self, sources: Optional[List[str]] = None, now: Optional[datetime] = None) -> Dict[str, int]:
+        """Recount sources from scratch; returns rows counted per source"""
+        self._require_numpy()
+        until = (now or datetime.utcnow()) - self.lag
+        counted = {}
+        for name in sources or list(SOURCES):
+            source = SOURCES[name]
+            with engine.begin() as conn:
+                exists, _ = self._watermark(conn, source)
+                keys, counts, rows = self._count(conn, source, None, until)
+                conn.execute(delete(DemandCell).where(DemandCell.source == source))
+                cells = self._rows(source, keys, counts, datetime.utcnow())
+                for offset in range(0, len(cells), INSERT_CHUNK):
+                    conn.execute(insert(DemandCell), cells[offset:offset + INSERT_CHUNK])
+                self._set_watermark(conn, source, exists, until)
+            logger.info(f"Recounted demand for {name}: {rows} rows into {len(cells)} cells")
+            counted[name] = rows
+        return counted
+
+    def heatmap(self, conn: Connection, source: str, region: str, precision: int) -> dict:
+        """
+        Counts of the cells of `precision` inside the region (a geohash
+        prefix) that have any: one list of HOURS_PER_WEEK counts per cell
+        """
+        source_id = SOURCES[source]
+        cell = func.substr(DemandCell.geohash, 1, precision)
+        conditions = [DemandCell.source == source_id, DemandCell.geohash >= region]
+        upper = _prefix_upper_bound(region)
+        if upper is not None:
+            conditions.append(DemandCell.geohash < upper)
+        rows = conn.execute(
+            select(cell, DemandCell.hour_of_week, func.sum(DemandCell.count))
+            .where(*conditions)
+            .group_by(cell, DemandCell.hour_of_week)
+            .order_by(cell)
+        ).all()
+        watermark = conn.execute(
+            select(DemandWatermark.processed_until).where(DemandWatermark.source == source_id)
+        ).scalar()
+
+        cells, counts, total = [], [], 0
+        for geohash, hour, count in rows:
+            if not cells or cells[-1] != geohash:
+                cells.append(geohash)
+                counts.append([0] * HOURS_PER_WEEK)
+            counts[-1][hour] = int(count)
+            total += int(count)
+        return {
+            "source": source,
+            "region": region,
+            "precision": precision,
+            "utc_offset_hours": self.utc_offset_hours,
+            "counted_until": watermark,
+            "total": total,
+            "cells": cells,
+            "counts": counts,
+        }
+
+    def start(self):
+        if np is None:
+            logger.warning("numpy is not installed; the demand heatmap will not be updated")
+            return
+        with self._lock:
+            if self._thread:
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="demand-heatmap", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread:
+            self._stopping.set()
+            thread.join(timeout=timeout)
+
+    def _run(self):
+        while True:
+            try:
+                self.update()
+            except Exception as e:
+                logger.error(f"Demand heatmap update failed: {e}")
+            if self._stopping.wait(self.update_interval):
+                return
+
+
+# Global demand heatmap instance
+demand_heatmap = DemandHeatmap(
+    precision=settings.DEMAND_GEOHASH_PRECISION,
+    utc_offset_hours=settings.SERVICE_UTC_OFFSET_HOURS,
+    update_interval=settings.DEMAND_UPDATE_SECONDS,
+    lag_seconds=settings.DEMAND_LAG_SECONDS,
+)
+
+
+def _demand_metrics() -> list:
+    return [
+        "# TYPE demand_rows_counted_total counter",
+        *(f'demand_rows_counted_total{{source="{name}"}} {demand_heatmap.counted[source]}'
+          for name, source in SOURCES.items()),
+        "# TYPE demand_update_runs_total counter",
+        f"demand_update_runs_total {demand_heatmap.runs}",
+        "# TYPE demand_update_seconds_total counter",
+        f"demand_update_seconds_total {demand_heatmap.run_seconds:.6f}",
+    ]
+
+
+metrics.register_collector(_demand_metrics)
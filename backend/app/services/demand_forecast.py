@@ -0,0 +1,267 @@
+"""
+Route demand forecasts for SafariSalama
+Once a day, fits a weekly-seasonal profile of trip starts per route and
+15-minute slot from the trip history and stores the trips expected over the
+coming days, so saccos can plan how many vehicles each route needs and when
+"""
+from typing import Dict, List, Optional
+from datetime import date, datetime, timedelta
+from uuid import UUID
+import logging
+import threading
+import time
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from app.core.cache import forecast_cache
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.db.database import engine
+from app.models.route_demand_forecast import RouteDemandForecast
+from app.models.trip import Trip, TripStatus
+from app.services.demand import epoch_seconds
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - forecasting is disabled without it
+    np = None
+
+logger = logging.getLogger(__name__)
+
+SLOT_MINUTES = 15
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+MAX_HISTORY_DAYS = 366
+# Routes fitted together; bounds the dense (routes, days, slots) array to ~35 MB at 366 days
+ROUTE_CHUNK = 250
+CHUNK_ROWS = 100000
+INSERT_CHUNK = 10000
+# How often the worker checks whether today's forecasts exist yet
+CHECK_SECONDS = 3600.0
+
+_EPOCH = datetime(1970, 1, 1)
+_EPOCH_DAY = date(1970, 1, 1)
+
+
+def fit(counts, first_day: int, target_days: List[int], decay: float):
+    """
+    counts: (routes, days, SLOTS_PER_DAY) trips per slot, day 0 being local
+    day number first_day. Returns (routes, len(target_days), SLOTS_PER_DAY)
+    expected trips: for each target day the mean of the same weekday in the
+    history, each week weighing `decay` times the week after it, smoothed over
+    neighbouring slots (single 15-minute counts are noisy).
+    """
+    routes, days, _ = counts.shape
+    forecast = np.zeros((routes, len(target_days), SLOTS_PER_DAY), dtype=np.float32)
+    for i, target in enumerate(target_days):
+        same_weekday = np.arange(target - first_day - 7, -1, -7)
+        same_weekday = same_weekday[same_weekday < days]
+        if not len(same_weekday):
+            continue
+        weights = (decay ** np.arange(len(same_weekday))).astype(np.float32)
+        profile = np.tensordot(counts[:, same_weekday, :], weights / weights.sum(), axes=([1], [0]))
+        padded = np.pad(profile, ((0, 0), (1, 1)), mode="edge")
+        forecast[:, i, :] = 0.25 * padded[:, :-2] + 0.5 * padded[:, 1:-1] + 0.25 * padded[:, 2:]
+    return forecast
+
+
+class DemandForecaster:
+    """
+    Fitting is a few array operations per route chunk, linear in routes x
+    weeks of history; reading the per-slot counts from the database is most of
+    a run. Each run replaces the forecasts of its target days, so workers that
+    run it at the same time leave the same rows.
+    """
+
+    def __init__(self, history_days: int = 90, horizon_days: int = 2, week_decay: float = 0.8,
+                 utc_offset_hours: int = 3):
+        if not 7 <= history_days <= MAX_HISTORY_DAYS:
+            raise ValueError(f"Forecast history must be between 7 and {MAX_HISTORY_DAYS} days")
+        self.history_days = history_days
+        self.horizon_days = horizon_days
+        self.week_decay = week_decay
+        self.utc_offset = timedelta(hours=utc_offset_hours)
+
+        self._fitted_day: Optional[date] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+
+        self.runs = 0
+        self.routes = 0
+        self.load_seconds = 0.0
+        self.fit_seconds = 0.0
+        self.store_seconds = 0.0
+
+    def local_date(self, now: Optional[datetime] = None) -> date:
+        return ((now or datetime.utcnow()) + self.utc_offset).date()
+
+    def _load(self, conn, first_day: int, today: int):
+        """Route ids and (route index, absolute local slot, trips) arrays of the history"""
+        offset = int(self.utc_offset.total_seconds())
+        slot = (epoch_seconds(conn.dialect.name, Trip.start_time) + offset) // (SLOT_MINUTES * 60)
+        query = select(Trip.route_id, slot, func.count()).where(
+            Trip.route_id != None,
+            Trip.trip_status != TripStatus.cancelled,
+            Trip.start_time >= _EPOCH + timedelta(days=first_day) - self.utc_offset,
+            Trip.start_time < _EPOCH + timedelta(days=today) - self.utc_offset,
+        ).group_by(Trip.route_id, slot)
+
+        route_ids: List[UUID] = []
+        index: Dict[UUID, int] = {}
+        parts = []
+        result = conn.execution_options(stream_results=True, yield_per=CHUNK_ROWS).execute(query)
+        for chunk in result.partitions(CHUNK_ROWS):
+            routes = np.empty(len(chunk), dtype=np.int32)
+            for i, (route_id, _, _) in enumerate(chunk):
+                position = index.get(route_id)
+                if position is None:
+                    position = index[route_id] = len(route_ids)
+                    route_ids.append(route_id)
+                routes[i] = position
+            values = np.array([(s, n) for _, s, n in chunk], dtype=np.int64)
+            parts.append((routes, values[:, 0], values[:, 1]))
+        if not parts:
+            return route_ids, np.empty(0, np.int32), np.empty(0, np.int64), np.empty(0, np.int64)
+        return route_ids, *(np.concatenate([part[i] for part in parts]) for i in range(3))
+
+    def run(self, now: Optional[datetime] = None) -> dict:
+        """Fit and store the forecasts of today and the following days"""
+        if np is None:
+            raise RuntimeError("Demand forecasting needs numpy installed on the server")
+        started = time.perf_counter()
+        today = (self.local_date(now) - _EPOCH_DAY).days
+        first_day = today - self.history_days
+        target_days = [today + i for i in range(self.horizon_days)]
+        generated_at = datetime.utcnow()
+
+        with engine.connect() as conn:
+            route_ids, routes, slots, trips = self._load(conn, first_day, today)
+        loaded = time.perf_counter()
+
+        order = np.argsort(routes, kind="stable")
+        routes, slots, trips = routes[order], slots[order], trips[order]
+        bounds = np.searchsorted(routes, np.arange(0, len(route_ids) + ROUTE_CHUNK, ROUTE_CHUNK))
+        dates = [_EPOCH_DAY + timedelta(days=day) for day in target_days]
+        rows = []
+        for chunk, start in enumerate(range(0, len(route_ids), ROUTE_CHUNK)):
+            lo, hi = bounds[chunk], bounds[chunk + 1]
+            counts = np.zeros((min(ROUTE_CHUNK, len(route_ids) - start), self.history_days, SLOTS_PER_DAY),
+                              dtype=np.float32)
+            counts[routes[lo:hi] - start, slots[lo:hi] // SLOTS_PER_DAY - first_day, slots[lo:hi] % SLOTS_PER_DAY] = trips[lo:hi]
+            forecast = np.round(fit(counts, first_day, target_days, self.week_decay), 3)
+            for r, d, s in zip(*np.nonzero(forecast)):
+                rows.append({
+                    "route_id": route_ids[start + r], "day": dates[d], "slot": int(s),
+                    "expected_trips": float(forecast[r, d, s]), "generated_at": generated_at,
+                })
+        fitted = time.perf_counter()
+
+        with engine.begin() as conn:
+            conn.execute(delete(RouteDemandForecast).where(RouteDemandForecast.day.in_(dates)))
+            for offset in range(0, len(rows), INSERT_CHUNK):
+                conn.execute(insert(RouteDemandForecast), rows[offset:offset + INSERT_CHUNK])
+        forecast_cache.invalidate(*(f"{route_id}:{day}" for route_id in route_ids for day in dates))
+        stored = time.perf_counter()
+
+        self._fitted_day = self.local_date(now)
+        self.runs += 1
+        self.routes = len(route_ids)
+        self.load_seconds, self.fit_seconds, self.store_seconds = loaded - started, fitted - loaded, stored - fitted
+        logger.info(
+            f"Forecast demand of {len(route_ids)} routes for {', '.join(map(str, dates))}: "
+            f"load {self.load_seconds:.2f}s, fit {self.fit_seconds:.2f}s, store {self.store_seconds:.2f}s"
+        )
+        return {
+            "routes": len(route_ids),
+            "days": [str(d) for d in dates],
+            "rows": len(rows),
+            "load_seconds": round(self.load_seconds, 3),
+            "fit_seconds": round(self.fit_seconds, 3),
+            "store_seconds": round(self.store_seconds, 3),
+        }
+
+    def forecast(self, db: Session, route_id: UUID, day: date) -> Optional[dict]:
+        """A route's stored forecast for one local day, every slot included; None if there is none"""
+        rows = db.execute(
+            select(RouteDemandForecast.slot, RouteDemandForecast.expected_trips, RouteDemandForecast.generated_at)
+            .where(RouteDemandForecast.route_id == route_id, RouteDemandForecast.day == day)
+        ).all()
+        if not rows:
+            return None
+        expected = [0.0] * SLOTS_PER_DAY
+        for slot, trips, _ in rows:
+            expected[slot] = trips
+        return {
+            "route_id": str(route_id),
+            "day": str(day),
+            "slot_minutes": SLOT_MINUTES,
+            "utc_offset_hours": int(self.utc_offset.total_seconds() // 3600),
+            "generated_at": max(row[2] for row in rows).isoformat(),
+            "total_trips": round(sum(expected), 1),
+            "expected_trips": expected,
+        }
+
+    def _due(self) -> bool:
+        today = self.local_date()
+        if self._fitted_day == today:
+            return False
+        with engine.connect() as conn:
+            latest = conn.execute(select(func.max(RouteDemandForecast.generated_at))).scalar()
+        if latest is not None and self.local_date(latest) == today:
+            self._fitted_day = today
+            return False
+        return True
+
+    def start(self):
+        if np is None:
+            logger.warning("numpy is not installed; route demand will not be forecast")
+            return
+        with self._lock:
+            if self._thread:
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="demand-forecast", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread:
+            self._stopping.set()
+            thread.join(timeout=timeout)
+
+    def _run(self):
+        while True:
+            try:
+                if self._due():
+                    self.run()
+            except Exception as e:
+                logger.error(f"Demand forecast failed: {e}")
+            if self._stopping.wait(CHECK_SECONDS):
+                return
+
+
+# Global demand forecaster instance
+demand_forecast = DemandForecaster(
+    history_days=settings.FORECAST_HISTORY_DAYS,
+    horizon_days=settings.FORECAST_HORIZON_DAYS,
+    week_decay=settings.FORECAST_WEEK_DECAY,
+    utc_offset_hours=settings.SERVICE_UTC_OFFSET_HOURS,
+)
+
+
+def _demand_forecast_metrics() -> list:
+    return [
+        "# TYPE demand_forecast_runs_total counter",
+        f"demand_forecast_runs_total {demand_forecast.runs}",
+        "# TYPE demand_forecast_routes gauge",
+        f"demand_forecast_routes {demand_forecast.routes}",
+        "# TYPE demand_forecast_last_run_seconds gauge",
+        f'demand_forecast_last_run_seconds{{phase="load"}} {demand_forecast.load_seconds:.6f}',
+        f'demand_forecast_last_run_seconds{{phase="fit"}} {demand_forecast.fit_seconds:.6f}',
+        f'demand_forecast_last_run_seconds{{phase="store"}} {demand_forecast.store_seconds:.6f}',
+    ]
+
+
+metrics.register_collector(_demand_forecast_metrics)
@@ -0,0 +1,421 @@
+"""
+Driving safety analytics for SafariSalama
+Derives speed, heading and deceleration from each vehicle's consecutive fixes,
+reports overspeeding and harsh braking to sacco admins as it happens and keeps
+per-driver daily totals from which safety scores are computed
+"""
+from typing import Dict, List, Optional, Tuple
+from array import array
+from datetime import date, datetime, timedelta
+from math import atan2, cos, degrees, hypot, radians
+import logging
+import threading
+import time
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.db.database import SessionLocal
+from app.models.driver_safety_score import DriverSafetyScore
+from app.models.route import Route
+from app.models.trip import Trip, TripStatus
+from app.services.trajectory import EARTH_RADIUS_M
+
+logger = logging.getLogger(__name__)
+
+METRES_PER_DEGREE = radians(1.0) * EARTH_RADIUS_M
+
+# Fixes kept per vehicle; enough for two speed spans of 1 Hz fixes
+RING = 10
+# Fixes further apart than this start afresh instead of giving a (meaningless) average speed
+MAX_GAP_SECONDS = 60
+# Faster than this between two fixes is a GPS jump, not driving (~180 km/h)
+MAX_PLAUSIBLE_MPS = 50.0
+# Moves shorter than this leave the heading as it was; GPS jitter at a stop spins it
+MIN_HEADING_M = 5.0
+# Speed is measured over at least this span of fixes: over a second or two a
+# few metres of position noise is a speed swing that reads as hard braking.
+# Deceleration is then an average over such spans and lower than the peak.
+SPEED_SPAN_SECONDS = 4.0
+# Longer spans average a braking manoeuvre away
+MAX_SPEED_SPAN_SECONDS = 12.0
+# One braking manoeuvre is reported once
+BRAKE_COOLDOWN_SECONDS = 15.0
+# Slower than this is standing, not driving time
+MOVING_MPS = 1.0
+# Vehicle state kept this long after the last fix
+STATE_TTL_SECONDS = 3600
+# How often ongoing trips (who drives what) and route limits are re-read
+REFRESH_SECONDS = 60.0
+
+# Score: points lost per event per 100 km, and for the share of driving time spent overspeeding
+POINTS_PER_EVENT_PER_100KM = 10.0
+POINTS_FOR_OVERSPEED_SHARE = 100.0
+# Below this distance a score says nothing
+MIN_SCORED_DISTANCE_M = 1000.0
+
+COUNTERS = ("distance_m", "driving_seconds", "overspeed_seconds", "overspeed_events", "harsh_brakes")
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def safety_score(totals: Dict[str, float]) -> Optional[float]:
+    """0-100 from driving totals (keys as in COUNTERS); None for too little driving"""
+    distance = totals.get("distance_m") or 0.0
+    if distance < MIN_SCORED_DISTANCE_M:
+        return None
+    events = (totals.get("overspeed_events") or 0) + (totals.get("harsh_brakes") or 0)
+    penalty = POINTS_PER_EVENT_PER_100KM * events * 100_000 / distance
+    if totals.get("driving_seconds"):
+        penalty += POINTS_FOR_OVERSPEED_SHARE * min(totals["overspeed_seconds"] / totals["driving_seconds"], 1.0)
+    return round(max(0.0, 100.0 - penalty), 1)
+
+
+class VehicleSafety:
+    """
+    Everything kept per vehicle: a ring of its last (time, x, y) fixes in
+    metres, in one array of doubles - a few hundred bytes a vehicle
+    """
+    __slots__ = ("kx", "fixes", "head", "count", "heading", "over_since", "over_reported", "brake_quiet_until")
+
+    def __init__(self, lat: float):
+        # Fixed per vehicle so positions in the ring stay comparable
+        self.kx = METRES_PER_DEGREE * cos(radians(lat))
+        self.fixes = array("d", bytes(24 * RING))
+        self.head = 0
+        self.count = 0
+        self.heading: Optional[float] = None
+        self.over_since: Optional[float] = None
+        self.over_reported = False
+        self.brake_quiet_until = 0.0
+
+    def push(self, t: float, x: float, y: float):
+        i = 3 * self.head
+        self.fixes[i], self.fixes[i + 1], self.fixes[i + 2] = t, x, y
+        self.head = (self.head + 1) % RING
+        self.count = min(self.count + 1, RING)
+
+    def fix(self, back: int) -> Tuple[float, float, float]:
+        """(t, x, y) of the fix `back` places before the latest"""
+        i = 3 * ((self.head - 1 - back) % RING)
+        return self.fixes[i], self.fixes[i + 1], self.fixes[i + 2]
+
+    def speed_until(self, back: int) -> Optional[Tuple[float, int]]:
+        """
+        Speed (m/s) over the shortest span of at least SPEED_SPAN_SECONDS that
+        ends at fix `back`, and where that span starts
+        """
+        t0, x0, y0 = self.fix(back)
+        for start in range(back + 1, self.count):
+            t, x, y = self.fix(start)
+            span = t0 - t
+            if span >= SPEED_SPAN_SECONDS:
+                if span > MAX_SPEED_SPAN_SECONDS:
+                    return None
+                return hypot(x0 - x, y0 - y) / span, start
+        return None
+
+
+class DrivingSafetyMonitor:
+    """
+    observe() is called for every location fix and costs a handful of float
+    operations on the vehicle's state; no database access. Driver totals
+    accumulate in memory as deltas and are added to driver_safety_scores every
+    flush interval, so several workers can flush into the same rows. Speed and
+    braking need consecutive fixes of a vehicle, so like the stop geofences this
+    assumes one process sees all of a vehicle's fixes.
+    """
+
+    def __init__(self, default_limit_kmh: float = 80.0, tolerance_kmh: float = 5.0,
+                 overspeed_min_seconds: float = 10.0, harsh_braking_mps2: float = 2.5,
+                 utc_offset_hours: int = 3, flush_interval: float = 300.0):
+        self.default_limit_kmh = default_limit_kmh
+        self.tolerance_kmh = tolerance_kmh
+        self.overspeed_min_seconds = overspeed_min_seconds
+        self.harsh_braking_mps2 = harsh_braking_mps2
+        self.utc_offset = timedelta(hours=utc_offset_hours)
+        self.flush_interval = flush_interval
+
+        self._vehicles: Dict[object, VehicleSafety] = {}
+        self._drivers: Dict[object, object] = {}  # vehicle_id -> driver of its ongoing trip
+        self._limits: Dict[object, float] = {}  # route_id -> km/h, routes with their own limit
+        # (driver_id, local day) -> [distance_m, driving_seconds, overspeed_seconds, overspeed_events, harsh_brakes]
+        self._pending: Dict[Tuple[object, date], list] = {}
+
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+
+        self.fixes = 0
+        self.rejected = 0
+        self.observe_seconds = 0.0
+        self.overspeed_events = 0
+        self.harsh_brakes = 0
+
+    @property
+    def tracked(self) -> int:
+        return len(self._vehicles)
+
+    # Loading
+
+    def load(self, db: Session):
+        limits = dict(db.execute(
+            select(Route.id, Route.speed_limit_kmh).where(Route.speed_limit_kmh != None)
+        ).all())
+        drivers = dict(db.execute(
+            select(Trip.vehicle_id, Trip.driver_id)
+            .where(Trip.trip_status == TripStatus.ongoing, Trip.driver_id != None)
+            .order_by(Trip.start_time)  # the latest trip wins if a vehicle has several open
+        ).all())
+        with self._lock:
+            self._limits = {route_id: float(limit) for route_id, limit in limits.items()}
+            self._drivers = drivers
+
+    def reload(self):
+        db = SessionLocal()
+        try:
+            self.load(db)
+        finally:
+            db.close()
+
+    def limit_kmh(self, route_id) -> float:
+        return self._limits.get(route_id, self.default_limit_kmh)
+
+    # Ingest path
+
+    def observe(self, vehicle_id, route_id, lat, lon, at: datetime) -> Tuple[Optional[float], Optional[float], List[Tuple[str, dict]]]:
+        """
+        Feed one location fix. Returns the derived speed (km/h) and heading
+        (degrees from north) - None without a usable previous fix - and the
+        ("overspeed" | "harsh_braking", data) events it raised, usually none.
+        """
+        started = time.perf_counter()
+        t = (at - _EPOCH).total_seconds()
+        lat, lon = float(lat), float(lon)
+        events = []
+        with self._lock:
+            self.fixes += 1
+            state = self._vehicles.get(vehicle_id)
+            if state is None:
+                state = self._vehicles[vehicle_id] = VehicleSafety(lat)
+                state.push(t, lon * state.kx, lat * METRES_PER_DEGREE)
+                self.observe_seconds += time.perf_counter() - started
+                return None, None, events
+
+            x, y = lon * state.kx, lat * METRES_PER_DEGREE
+            last_t, last_x, last_y = state.fix(0)
+            dt = t - last_t
+            if dt <= 0:
+                # Duplicate or out of order; keep the newer fix
+                self.observe_seconds += time.perf_counter() - started
+                return None, state.heading, events
+            if dt > MAX_GAP_SECONDS:
+                state = self._vehicles[vehicle_id] = VehicleSafety(lat)
+                state.push(t, lon * state.kx, lat * METRES_PER_DEGREE)
+                self.observe_seconds += time.perf_counter() - started
+                return None, None, events
+
+            dx, dy = x - last_x, y - last_y
+            distance = hypot(dx, dy)
+            if distance / dt > MAX_PLAUSIBLE_MPS:
+                # A jump; the next fix is measured against the last good one
+                self.rejected += 1
+                self.observe_seconds += time.perf_counter() - started
+                return None, state.heading, events
+            if distance >= MIN_HEADING_M:
+                state.heading = degrees(atan2(dx, dy)) % 360.0
+            state.push(t, x, y)
+
+            recent = state.speed_until(0)
+            speed = recent[0] if recent else distance / dt
+            deceleration = None
+            if recent:
+                earlier = state.speed_until(recent[1])
+                if earlier:
+                    # Between the middles of the two spans
+                    deceleration = (earlier[0] - speed) / ((t - state.fix(earlier[1])[0]) / 2)
+
+            speed_kmh = speed * 3.6
+            limit = self.limit_kmh(route_id)
+            driver_id = self._drivers.get(vehicle_id)
+            totals = None
+            if driver_id is not None:
+                day = (at + self.utc_offset).date()
+                totals = self._pending.get((driver_id, day))
+                if totals is None:
+                    totals = self._pending[(driver_id, day)] = [0.0, 0.0, 0.0, 0, 0]
+                totals[0] += distance
+                if distance / dt >= MOVING_MPS:
+                    totals[1] += dt
+
+            if speed_kmh > limit + self.tolerance_kmh:
+                if state.over_since is None:
+                    state.over_since = t - dt
+                if state.over_reported:
+                    if totals:
+                        totals[2] += dt
+                elif t - state.over_since >= self.overspeed_min_seconds:
+                    state.over_reported = True
+                    self.overspeed_events += 1
+                    if totals:
+                        totals[2] += t - state.over_since
+                        totals[3] += 1
+                    events.append(("overspeed", self._event(
+                        vehicle_id, driver_id, route_id, lat, lon, at, speed_kmh,
+                        limit_kmh=limit, seconds=round(t - state.over_since),
+                    )))
+            else:
+                state.over_since, state.over_reported = None, False
+
+            if deceleration is not None and deceleration >= self.harsh_braking_mps2 and t >= state.brake_quiet_until:
+                state.brake_quiet_until = t + BRAKE_COOLDOWN_SECONDS
+                self.harsh_brakes += 1
+                if totals:
+                    totals[4] += 1
+                events.append(("harsh_braking", self._event(
+                    vehicle_id, driver_id, route_id, lat, lon, at, speed_kmh,
+                    deceleration_mps2=round(deceleration, 2),
+                )))
+
+            self.observe_seconds += time.perf_counter() - started
+            return round(speed_kmh, 2), round(state.heading, 2) if state.heading is not None else None, events
+
+    @staticmethod
+    def _event(vehicle_id, driver_id, route_id, lat, lon, at, speed_kmh, **extra) -> dict:
+        return {
+            "vehicle_id": str(vehicle_id),
+            "driver_id": str(driver_id) if driver_id else None,
+            "route_id": str(route_id) if route_id else None,
+            "latitude": lat,
+            "longitude": lon,
+            "speed_kmh": round(speed_kmh, 1),
+            **extra,
+            "timestamp": at.isoformat(),
+        }
+
+    # Scores
+
+    def pending_totals(self, driver_id, since: date) -> Dict[str, float]:
+        """Totals observed since the last flush, from local day `since` on"""
+        with self._lock:
+            rows = [v for (d, day), v in self._pending.items() if d == driver_id and day >= since]
+        return {name: sum(row[i] for row in rows) for i, name in enumerate(COUNTERS)}
+
+    # Persistence
+
+    def flush(self) -> int:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            cutoff = (datetime.utcnow() - _EPOCH).total_seconds() - STATE_TTL_SECONDS
+            for vehicle_id in [v for v, state in self._vehicles.items() if state.fix(0)[0] < cutoff]:
+                del self._vehicles[vehicle_id]
+        if not pending:
+            return 0
+
+        now = datetime.utcnow()
+        rows = [
+            {"driver_id": driver_id, "day": day, **dict(zip(COUNTERS, totals)), "updated_at": now}
+            for (driver_id, day), totals in pending.items()
+        ]
+        db = SessionLocal()
+        try:
+            self._upsert(db, rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            # Fold the deltas back in so the next flush retries them
+            with self._lock:
+                for key, totals in pending.items():
+                    current = self._pending.setdefault(key, [0.0, 0.0, 0.0, 0, 0])
+                    for i, value in enumerate(totals):
+                        current[i] += value
+            raise
+        finally:
+            db.close()
+        return len(rows)
+
+    def _upsert(self, db: Session, rows: List[dict]):
+        dialect = db.get_bind().dialect.name
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        elif dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            for row in rows:
+                existing = db.get(DriverSafetyScore, (row["driver_id"], row["day"]))
+                if existing is None:
+                    db.add(DriverSafetyScore(**row))
+                    continue
+                for name in COUNTERS:
+                    setattr(existing, name, getattr(existing, name) + row[name])
+            return
+        stmt = insert(DriverSafetyScore)
+        table = DriverSafetyScore.__table__
+        # Deltas are added, so totals from several workers accumulate
+        set_ = {name: table.c[name] + stmt.excluded[name] for name in COUNTERS}
+        set_["updated_at"] = stmt.excluded.updated_at
+        db.execute(stmt.on_conflict_do_update(index_elements=["driver_id", "day"], set_=set_), rows)
+
+    def start(self):
+        with self._lock:
+            if self._thread:
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="driving-safety", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread:
+            self._stopping.set()
+            thread.join(timeout=timeout)
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"Saving driver safety totals failed: {e}")
+
+    def _run(self):
+        next_flush = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                self.reload()
+                if time.monotonic() >= next_flush:
+                    self.flush()
+                    next_flush = time.monotonic() + self.flush_interval
+            except Exception as e:
+                logger.error(f"Driving safety refresh failed: {e}")
+            if self._stopping.wait(min(REFRESH_SECONDS, self.flush_interval)):
+                return
+
+
+# Global driving safety monitor instance
+driving_safety = DrivingSafetyMonitor(
+    default_limit_kmh=settings.SPEED_LIMIT_KMH,
+    tolerance_kmh=settings.OVERSPEED_TOLERANCE_KMH,
+    overspeed_min_seconds=settings.OVERSPEED_MIN_SECONDS,
+    harsh_braking_mps2=settings.HARSH_BRAKING_MPS2,
+    utc_offset_hours=settings.SERVICE_UTC_OFFSET_HOURS,
+    flush_interval=settings.SAFETY_FLUSH_MINUTES * 60.0,
+)
+
+
+def _driving_safety_metrics() -> list:
+    return [
+        "# TYPE driving_safety_fixes_total counter",
+        f"driving_safety_fixes_total {driving_safety.fixes}",
+        "# TYPE driving_safety_rejected_fixes_total counter",
+        f"driving_safety_rejected_fixes_total {driving_safety.rejected}",
+        "# TYPE driving_safety_observe_seconds_total counter",
+        f"driving_safety_observe_seconds_total {driving_safety.observe_seconds:.6f}",
+        "# TYPE driving_safety_events_total counter",
+        f'driving_safety_events_total{{event="overspeed"}} {driving_safety.overspeed_events}',
+        f'driving_safety_events_total{{event="harsh_braking"}} {driving_safety.harsh_brakes}',
+        "# TYPE driving_safety_tracked_vehicles gauge",
+        f"driving_safety_tracked_vehicles {driving_safety.tracked}",
+    ]
+
+
+metrics.register_collector(_driving_safety_metrics)
@@ -0,0 +1,91 @@
+"""
+Fleet change log for SafariSalama
+Numbers every change to a vehicle's position or status and keeps the recent
+ones in a ring buffer, so polling clients can ask only for what changed since
+the version they last saw
+"""
+from collections import deque
+from typing import Optional, Set, Tuple
+import logging
+import threading
+import time
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Deltas naming more vehicles than this are answered with a snapshot instead
+MAX_DELTA_VEHICLES = 1000
+
+
+class FleetChangeLog:
+    """
+    Versions start at the process start time in milliseconds and go up by one
+    per change, so a cursor handed out before a restart is below the floor of
+    the new process and gets a snapshot rather than a wrong delta.
+
+    The ring holds the last `size` changes. A cursor older than the oldest
+    change still held, or newer than the current version, cannot be answered
+    from it: changes_since() returns None and the caller sends a full snapshot.
+    Like the other in-memory trackers this assumes one API process.
+    """
+
+    def __init__(self, size: int = 20000):
+        self._log: deque = deque(maxlen=size)
+        self._version = int(time.time() * 1000)
+        # Changes at or below the floor are no longer in the ring
+        self._floor = self._version
+        self._lock = threading.Lock()
+
+        self.deltas = 0
+        self.snapshots = 0
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def record(self, *vehicle_ids) -> int:
+        """Note that these vehicles changed; returns the new version"""
+        with self._lock:
+            for vehicle_id in vehicle_ids:
+                if len(self._log) == self._log.maxlen:
+                    self._floor = self._log[0][0]
+                self._version += 1
+                self._log.append((self._version, vehicle_id))
+            return self._version
+
+    def changes_since(self, since: int) -> Tuple[int, Optional[Set]]:
+        """(current version, vehicles changed after `since`), or (version, None) if a snapshot is needed"""
+        with self._lock:
+            version = self._version
+            if since < self._floor or since > version:
+                self.snapshots += 1
+                return version, None
+            changed = set()
+            for entry_version, vehicle_id in reversed(self._log):
+                if entry_version <= since:
+                    break
+                changed.add(vehicle_id)
+                if len(changed) > MAX_DELTA_VEHICLES:
+                    self.snapshots += 1
+                    return version, None
+        self.deltas += 1
+        return version, changed
+
+
+# Global fleet change log instance
+fleet_changes = FleetChangeLog(size=settings.FLEET_CHANGE_LOG_SIZE)
+
+
+def _fleet_change_metrics() -> list:
+    return [
+        "# TYPE fleet_change_version gauge",
+        f"fleet_change_version {fleet_changes.version}",
+        "# TYPE fleet_change_requests_total counter",
+        f'fleet_change_requests_total{{answer="delta"}} {fleet_changes.deltas}',
+        f'fleet_change_requests_total{{answer="snapshot"}} {fleet_changes.snapshots}',
+    ]
+
+
+metrics.register_collector(_fleet_change_metrics)
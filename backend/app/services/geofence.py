@@ -0,0 +1,459 @@
+"""
+Stop geofencing and arrival predictions for SafariSalama
+Detects vehicles arriving at and leaving the stops of their route as fixes come
+in, learns time-of-day travel times between neighbouring stops and answers
+"when does the next matatu reach this stop" from memory
+"""
+from typing import Dict, List, Optional, Set, Tuple
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from math import cos, floor, hypot, radians
+import logging
+import threading
+import time
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.db.database import SessionLocal
+from app.models.route import Route
+from app.models.route_stop import RouteStop
+from app.models.segment_travel_time import SegmentTravelTime
+from app.models.stop import Stop
+from app.services.trajectory import EARTH_RADIUS_M
+
+logger = logging.getLogger(__name__)
+
+METRES_PER_DEGREE = radians(1.0) * EARTH_RADIUS_M
+
+# Grid cell edge; each stop is listed in every cell its fence overlaps
+CELL_M = 250.0
+# Leaving takes this many radii, so GPS jitter at the edge of a fence is not read as leave + arrive
+EXIT_FACTOR = 1.5
+# Arrivals further apart than this are not one segment (off duty, detour, lost signal)
+MAX_SEGMENT_SECONDS = 3600
+MIN_SEGMENT_SECONDS = 10
+# Caps the weight of old samples, so a profile follows changes over roughly this many trips
+SAMPLE_CAP = 200
+# For segments with no history yet (~20 km/h)
+DEFAULT_SPEED_MPS = 5.5
+# Vehicle state kept this long after the last fix
+STATE_TTL = timedelta(hours=1)
+
+
+@dataclass(frozen=True)
+class StopFence:
+    stop_id: object
+    sequence: int
+    position: int  # index among the route's geofenced stops
+    x: float
+    y: float
+    radius_m: float
+
+
+def load_route_stops(db: Session, default_radius_m: float) -> Dict[object, list]:
+    """route_id -> [(stop_id, sequence, lat, lon, radius_m)] of every active route, ordered by sequence"""
+    rows = db.execute(
+        select(RouteStop.route_id, Stop.id, RouteStop.sequence, Stop.latitude, Stop.longitude, Stop.radius_m)
+        .join(Stop, Stop.id == RouteStop.stop_id)
+        .join(Route, Route.id == RouteStop.route_id)
+        .where(Route.is_active == True, Stop.latitude != None, Stop.longitude != None)
+        .order_by(RouteStop.route_id, RouteStop.sequence)
+    ).all()
+
+    by_route: Dict[object, list] = {}
+    for route_id, stop_id, sequence, lat, lon, radius in rows:
+        by_route.setdefault(route_id, []).append(
+            (stop_id, sequence, float(lat), float(lon), float(radius or default_radius_m))
+        )
+    return by_route
+
+
+class RouteIndex:
+    """
+    A route's geofenced stops projected to metres and bucketed on a CELL_M
+    grid, so finding the fences a fix may be inside is one dict lookup
+    """
+
+    def __init__(self, route_id, stops: List[Tuple[object, int, float, float, float]]):
+        """stops: (stop_id, sequence, lat, lon, radius_m), ordered by sequence"""
+        self.route_id = route_id
+        self.ky = METRES_PER_DEGREE
+        self.kx = METRES_PER_DEGREE * cos(radians(stops[0][2]))
+        self.fences: List[StopFence] = []
+        self.cells: Dict[Tuple[int, int], List[StopFence]] = {}
+
+        for position, (stop_id, sequence, lat, lon, radius) in enumerate(stops):
+            fence = StopFence(stop_id, sequence, position, lon * self.kx, lat * self.ky, radius)
+            self.fences.append(fence)
+            for i in range(floor((fence.x - radius) / CELL_M), floor((fence.x + radius) / CELL_M) + 1):
+                for j in range(floor((fence.y - radius) / CELL_M), floor((fence.y + radius) / CELL_M) + 1):
+                    self.cells.setdefault((i, j), []).append(fence)
+
+        self.segment_m = [
+            hypot(b.x - a.x, b.y - a.y) for a, b in zip(self.fences, self.fences[1:])
+        ]
+
+    def project(self, lat: float, lon: float) -> Tuple[float, float]:
+        return lon * self.kx, lat * self.ky
+
+    def candidates(self, x: float, y: float) -> List[StopFence]:
+        return self.cells.get((floor(x / CELL_M), floor(y / CELL_M)), ())
+
+
+class VehicleState:
+    __slots__ = ("route_id", "x", "y", "at", "inside", "last_position", "last_arrival", "direction")
+
+    def __init__(self, route_id):
+        self.route_id = route_id
+        self.x = self.y = 0.0
+        self.at: Optional[datetime] = None
+        self.inside: Optional[StopFence] = None
+        self.last_position: Optional[int] = None  # last stop arrived at
+        self.last_arrival: Optional[datetime] = None
+        self.direction = 0  # +1 along the stop sequence, -1 against it, 0 not known yet
+
+
+class GeofenceEngine:
+    """
+    observe() is called for every location fix. Per fix it costs a projection,
+    one grid lookup and a distance check against the (usually zero or one)
+    fences in that cell; no database access. Arrival at the neighbouring stop
+    after the previous one records a segment travel time into an in-memory
+    time-of-day profile, saved to segment_travel_times every flush interval.
+
+    Like ingest-mode track compaction, this assumes one process sees all of a
+    vehicle's fixes; profiles saved by several workers are last-writer-wins.
+    """
+
+    def __init__(self, default_radius_m: float = 50.0, bucket_minutes: int = 30, utc_offset_hours: int = 3,
+                 flush_interval: float = 300.0, fresh_seconds: float = 300.0):
+        self.default_radius_m = default_radius_m
+        self.bucket_minutes = bucket_minutes
+        self.buckets_per_day = 24 * 60 // bucket_minutes
+        self.utc_offset = timedelta(hours=utc_offset_hours)
+        self.flush_interval = flush_interval
+        self.fresh = timedelta(seconds=fresh_seconds)
+
+        self._routes: Dict[object, RouteIndex] = {}
+        self._stop_routes: Dict[object, List[Tuple[object, int]]] = {}
+        self._vehicles: Dict[object, VehicleState] = {}
+        self._route_vehicles: Dict[object, Set[object]] = {}
+        # (route_id, from_sequence, to_sequence) -> {(day_type, bucket): [samples, mean_seconds]}
+        self._profiles: Dict[Tuple[object, int, int], Dict[Tuple[int, int], list]] = {}
+        self._dirty: Set[Tuple[object, int, int, int, int]] = set()
+
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+
+        self.fixes = 0
+        self.observe_seconds = 0.0
+        self.arrivals = 0
+        self.departures = 0
+        self.segments = 0
+
+    # Loading
+
+    def load_routes(self, db: Session):
+        return self.set_routes(load_route_stops(db, self.default_radius_m))
+
+    def set_routes(self, by_route: Dict[object, list]) -> int:
+        """by_route: route_id -> [(stop_id, sequence, lat, lon, radius_m)] ordered by sequence"""
+        routes = {route_id: RouteIndex(route_id, stops) for route_id, stops in by_route.items()}
+        stop_routes: Dict[object, List[Tuple[object, int]]] = {}
+        for route_id, index in routes.items():
+            for fence in index.fences:
+                stop_routes.setdefault(fence.stop_id, []).append((route_id, fence.position))
+
+        with self._lock:
+            for route_id, vehicle_ids in self._route_vehicles.items():
+                previous, current = self._routes.get(route_id), routes.get(route_id)
+                if previous is not None and (current is None or previous.fences != current.fences):
+                    # Stop positions changed under these vehicles; start them afresh
+                    for vehicle_id in vehicle_ids:
+                        self._vehicles[vehicle_id] = VehicleState(route_id)
+            self._routes, self._stop_routes = routes, stop_routes
+        return len(routes)
+
+    def load_profiles(self, db: Session):
+        profiles: Dict[Tuple[object, int, int], Dict[Tuple[int, int], list]] = {}
+        for row in db.execute(select(SegmentTravelTime)).scalars():
+            key = (row.route_id, row.from_sequence, row.to_sequence)
+            profiles.setdefault(key, {})[(row.day_type, row.bucket)] = [row.samples, row.mean_seconds]
+        with self._lock:
+            # Keep anything learned since the last flush
+            for key, buckets in self._profiles.items():
+                profiles.setdefault(key, {}).update(buckets)
+            self._profiles = profiles
+
+    def reload(self):
+        db = SessionLocal()
+        try:
+            self.load_routes(db)
+        finally:
+            db.close()
+
+    # Ingest path
+
+    def observe(self, vehicle_id, route_id, lat, lon, at: datetime) -> List[Tuple[str, StopFence]]:
+        """
+        Feed one location fix. Returns ("arrival" | "departure", fence) events,
+        usually none.
+        """
+        started = time.perf_counter()
+        events = []
+        with self._lock:
+            self.fixes += 1
+            state = self._vehicles.get(vehicle_id)
+            if state is None or state.route_id != route_id:
+                state = self._track(vehicle_id, route_id, state)
+            index = self._routes.get(route_id)
+            if index is None:
+                state.at = at
+                self.observe_seconds += time.perf_counter() - started
+                return events
+
+            x, y = index.project(float(lat), float(lon))
+            state.x, state.y, state.at = x, y, at
+
+            fence = state.inside
+            if fence is not None and hypot(fence.x - x, fence.y - y) > fence.radius_m * EXIT_FACTOR:
+                state.inside = None
+                self.departures += 1
+                events.append(("departure", fence))
+
+            if state.inside is None:
+                for fence in index.candidates(x, y):
+                    if hypot(fence.x - x, fence.y - y) <= fence.radius_m:
+                        self._arrive(index, state, fence, at)
+                        events.append(("arrival", fence))
+                        break
+            self.observe_seconds += time.perf_counter() - started
+        return events
+
+    def _track(self, vehicle_id, route_id, previous: Optional[VehicleState]) -> VehicleState:
+        if previous is not None:
+            self._route_vehicles.get(previous.route_id, set()).discard(vehicle_id)
+        state = self._vehicles[vehicle_id] = VehicleState(route_id)
+        if route_id is not None:
+            self._route_vehicles.setdefault(route_id, set()).add(vehicle_id)
+        return state
+
+    def _arrive(self, index: RouteIndex, state: VehicleState, fence: StopFence, at: datetime):
+        self.arrivals += 1
+        last = state.last_position
+        if last is not None and fence.position != last:
+            step = fence.position - last
+            state.direction = 1 if step > 0 else -1
+            if abs(step) == 1:
+                seconds = (at - state.last_arrival).total_seconds()
+                if MIN_SEGMENT_SECONDS <= seconds <= MAX_SEGMENT_SECONDS:
+                    self._record(index.route_id, index.fences[last].sequence, fence.sequence, state.last_arrival, seconds)
+        state.inside = fence
+        state.last_position = fence.position
+        state.last_arrival = at
+
+    def _slot(self, at: datetime) -> Tuple[int, int]:
+        local = at + self.utc_offset
+        return (1 if local.weekday() >= 5 else 0), (local.hour * 60 + local.minute) // self.bucket_minutes
+
+    def _record(self, route_id, from_sequence: int, to_sequence: int, started: datetime, seconds: float):
+        slot = self._slot(started)
+        buckets = self._profiles.setdefault((route_id, from_sequence, to_sequence), {})
+        entry = buckets.get(slot)
+        if entry is None:
+            buckets[slot] = [1, seconds]
+        else:
+            entry[0] = min(entry[0] + 1, SAMPLE_CAP)
+            entry[1] += (seconds - entry[1]) / entry[0]
+        self._dirty.add((route_id, from_sequence, to_sequence) + slot)
+        self.segments += 1
+
+    # Predictions
+
+    def segment_seconds(self, index: RouteIndex, from_position: int, to_position: int, at: datetime) -> float:
+        """Expected time between arrivals at two neighbouring stops, leaving at `at`"""
+        key = (index.route_id, index.fences[from_position].sequence, index.fences[to_position].sequence)
+        buckets = self._profiles.get(key)
+        if buckets:
+            day_type, bucket = self._slot(at)
+            for b in (bucket, bucket - 1, bucket + 1):
+                entry = buckets.get((day_type, b % self.buckets_per_day))
+                if entry:
+                    return entry[1]
+            samples = sum(e[0] for e in buckets.values())
+            return sum(e[0] * e[1] for e in buckets.values()) / samples
+        return index.segment_m[min(from_position, to_position)] / DEFAULT_SPEED_MPS
+
+    def arrivals_at(self, stop_id, now: Optional[datetime] = None, limit: int = 5) -> Optional[List[dict]]:
+        """
+        Next vehicles expected at a stop, soonest first. None when the stop is
+        not geofenced on any active route.
+        """
+        now = now or datetime.utcnow()
+        with self._lock:
+            placements = self._stop_routes.get(stop_id)
+            if placements is None:
+                return None
+            predictions = []
+            for route_id, target in placements:
+                index = self._routes[route_id]
+                last_stop = len(index.fences) - 1
+                for vehicle_id in self._route_vehicles.get(route_id, ()):
+                    state = self._vehicles[vehicle_id]
+                    if state.last_position is None or state.at is None or now - state.at > self.fresh:
+                        continue
+                    position = state.last_position
+                    # At a terminus the only way is back
+                    direction = 1 if position == 0 else -1 if position == last_stop else state.direction
+                    if direction == 0:
+                        continue
+                    stops_away = (target - position) * direction
+                    if stops_away < 0 or (stops_away == 0 and state.inside is None):
+                        continue
+
+                    seconds = 0.0
+                    if stops_away:
+                        # Remaining share of the current segment, by distance still to cover
+                        following = index.fences[position + direction]
+                        length = index.segment_m[min(position, position + direction)]
+                        left = hypot(following.x - state.x, following.y - state.y)
+                        share = min(left / length, 1.0) if length else 1.0
+                        seconds = share * self.segment_seconds(index, position, position + direction, now)
+                        for p in range(position + direction, target, direction):
+                            seconds += self.segment_seconds(index, p, p + direction, now + timedelta(seconds=seconds))
+                    predictions.append({
+                        "vehicle_id": vehicle_id,
+                        "route_id": route_id,
+                        "stops_away": stops_away,
+                        "eta": now + timedelta(seconds=seconds),
+                        "eta_seconds": round(seconds),
+                    })
+        predictions.sort(key=lambda p: p["eta_seconds"])
+        return predictions[:limit]
+
+    # Persistence
+
+    def flush(self):
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            rows = []
+            for route_id, from_sequence, to_sequence, day_type, bucket in dirty:
+                samples, mean_seconds = self._profiles[(route_id, from_sequence, to_sequence)][(day_type, bucket)]
+                rows.append({
+                    "route_id": route_id, "from_sequence": from_sequence, "to_sequence": to_sequence,
+                    "day_type": day_type, "bucket": bucket, "samples": samples, "mean_seconds": mean_seconds,
+                    "updated_at": datetime.utcnow(),
+                })
+            cutoff = datetime.utcnow() - STATE_TTL
+            for vehicle_id, state in list(self._vehicles.items()):
+                if state.at is None or state.at < cutoff:
+                    self._route_vehicles.get(state.route_id, set()).discard(vehicle_id)
+                    del self._vehicles[vehicle_id]
+        if not rows:
+            return 0
+
+        db = SessionLocal()
+        try:
+            self._upsert(db, rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            with self._lock:
+                self._dirty.update((r["route_id"], r["from_sequence"], r["to_sequence"], r["day_type"], r["bucket"]) for r in rows)
+            raise
+        finally:
+            db.close()
+        return len(rows)
+
+    def _upsert(self, db: Session, rows: List[dict]):
+        dialect = db.get_bind().dialect.name
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        elif dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            for row in rows:
+                db.merge(SegmentTravelTime(**row))
+            return
+        stmt = insert(SegmentTravelTime)
+        db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["route_id", "from_sequence", "to_sequence", "day_type", "bucket"],
+                set_={
+                    "samples": stmt.excluded.samples,
+                    "mean_seconds": stmt.excluded.mean_seconds,
+                    "updated_at": stmt.excluded.updated_at,
+                },
+            ),
+            rows,
+        )
+
+    def start(self):
+        with self._lock:
+            if self._thread:
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="stop-geofence", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread:
+            self._stopping.set()
+            thread.join(timeout=timeout)
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"Saving segment travel times failed: {e}")
+
+    def _run(self):
+        try:
+            db = SessionLocal()
+            try:
+                routes = self.load_routes(db)
+                self.load_profiles(db)
+            finally:
+                db.close()
+            logger.info(f"Stop geofencing loaded {routes} routes")
+        except Exception as e:
+            logger.error(f"Loading stop geofences failed: {e}")
+
+        while not self._stopping.wait(self.flush_interval):
+            try:
+                self.flush()
+                # Picks up stop changes made through other workers
+                self.reload()
+            except Exception as e:
+                logger.error(f"Stop geofence flush failed: {e}")
+
+
+# Global geofence engine instance
+geofence = GeofenceEngine(
+    default_radius_m=settings.GEOFENCE_RADIUS_M,
+    bucket_minutes=settings.GEOFENCE_PROFILE_BUCKET_MINUTES,
+    utc_offset_hours=settings.SERVICE_UTC_OFFSET_HOURS,
+    flush_interval=settings.GEOFENCE_FLUSH_MINUTES * 60.0,
+    fresh_seconds=settings.VEHICLE_OFFLINE_AFTER_SECONDS,
+)
+
+
+def _geofence_metrics() -> list:
+    return [
+        "# TYPE geofence_fixes_total counter",
+        f"geofence_fixes_total {geofence.fixes}",
+        "# TYPE geofence_observe_seconds_total counter",
+        f"geofence_observe_seconds_total {geofence.observe_seconds:.6f}",
+        "# TYPE geofence_events_total counter",
+        f'geofence_events_total{{event="arrival"}} {geofence.arrivals}',
+        f'geofence_events_total{{event="departure"}} {geofence.departures}',
+        "# TYPE geofence_segments_total counter",
+        f"geofence_segments_total {geofence.segments}",
+    ]
+
+
+metrics.register_collector(_geofence_metrics)
@@ -0,0 +1,244 @@
+"""
+Columnar GPS history export for SafariSalama
+Streams gps_points from a server-side cursor in fixed-size chunks and encodes
+them as NumPy .npz or Arrow IPC, so month-long exports run in bounded memory
+"""
+from typing import BinaryIO, Dict, Iterator, List
+from datetime import datetime
+from tempfile import SpooledTemporaryFile
+import logging
+import zipfile
+
+from sqlalchemy import select
+from sqlalchemy.engine import Connection
+
+from app.models.gps_point import GpsPoint
+from app.models.vehicle import Vehicle
+
+logger = logging.getLogger(__name__)
+
+CHUNK_ROWS = 50000
+# Per-column spill threshold for .npz assembly; beyond this columns go to disk
+SPOOL_BYTES = 8 * 1024 * 1024
+
+EXPORT_FORMATS = {
+    "npz": ("application/zip", "npz"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+}
+
+# Column name -> NumPy dtype; vehicle is an index into the vehicle_ids array
+COLUMNS = {
+    "vehicle": "<i4",
+    "latitude": "<f8",
+    "longitude": "<f8",
+    "timestamp_ms": "<i8",
+    "speed_kmh": "<f4",
+    "heading": "<f4",
+}
+
+# Timestamps are stored as naive UTC
+_EPOCH = datetime(1970, 1, 1)
+
+
+class ExportUnavailable(Exception):
+    """The format's library is not installed on this server"""
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ExportUnavailable("The npz export format needs numpy installed on the server")
+    return numpy
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise ExportUnavailable("The arrow export format needs pyarrow installed on the server")
+    return pyarrow
+
+
+def check_format(fmt: str):
+    """Raise ValueError / ExportUnavailable before any response has been started"""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format '{fmt}' (choose from {', '.join(EXPORT_FORMATS)})")
+    _numpy()
+    if fmt == "arrow":
+        _pyarrow()
+
+
+def export_query(start: datetime, end: datetime, vehicle_id=None, route_id=None):
+    """
+    Points of one vehicle, or of the vehicles currently assigned to a route,
+    ordered so each vehicle's track is contiguous. The time bounds let
+    PostgreSQL prune to the partitions in range.
+    """
+    query = select(
+        GpsPoint.vehicle_id,
+        GpsPoint.latitude,
+        GpsPoint.longitude,
+        GpsPoint.timestamp,
+        GpsPoint.speed_kmh,
+        GpsPoint.heading,
+    ).where(GpsPoint.timestamp >= start, GpsPoint.timestamp < end)
+
+    if vehicle_id is not None:
+        query = query.where(GpsPoint.vehicle_id == vehicle_id)
+    if route_id is not None:
+        query = query.where(GpsPoint.vehicle_id.in_(select(Vehicle.id).where(Vehicle.route_id == route_id)))
+    return query.order_by(GpsPoint.vehicle_id, GpsPoint.timestamp)
+
+
+class _ChunkEncoder:
+    """Turns row chunks into column arrays, assigning vehicle indices as vehicles appear"""
+
+    def __init__(self):
+        self.np = _numpy()
+        self.vehicle_ids: List[str] = []
+        self._vehicle_index: Dict[object, int] = {}
+
+    def encode(self, rows) -> Dict[str, object]:
+        np = self.np
+        n = len(rows)
+        columns = {name: np.empty(n, dtype=dtype) for name, dtype in COLUMNS.items()}
+        vehicle, lat, lon, ts = columns["vehicle"], columns["latitude"], columns["longitude"], columns["timestamp_ms"]
+        speed, heading = columns["speed_kmh"], columns["heading"]
+        nan = float("nan")
+
+        for i, row in enumerate(rows):
+            index = self._vehicle_index.get(row[0])
+            if index is None:
+                index = self._vehicle_index[row[0]] = len(self.vehicle_ids)
+                self.vehicle_ids.append(str(row[0]))
+            vehicle[i] = index
+            lat[i] = row[1]
+            lon[i] = row[2]
+            ts[i] = int((row[3] - _EPOCH).total_seconds() * 1000)
+            speed[i] = nan if row[4] is None else row[4]
+            heading[i] = nan if row[5] is None else row[5]
+        return columns
+
+
+def iter_chunks(conn: Connection, query, chunk_rows: int = CHUNK_ROWS) -> Iterator[list]:
+    """Server-side cursor on PostgreSQL; only one chunk of rows is held at a time"""
+    result = conn.execution_options(stream_results=True, yield_per=chunk_rows).execute(query)
+    for chunk in result.partitions(chunk_rows):
+        yield chunk
+
+
+class _Sink:
+    """Write-only file object whose contents are drained by a generator"""
+
+    # Checked by pyarrow before it wraps a Python file object
+    closed = False
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+def iter_npz(chunks: Iterator[list], compress: bool = False) -> Iterator[bytes]:
+    """
+    .npz with one .npy member per column plus vehicle_ids. A .npy header needs
+    the final length, so columns are spooled (to disk past SPOOL_BYTES) while
+    the cursor is read, then zipped out member by member.
+    """
+    np = _numpy()
+    encoder = _ChunkEncoder()
+    spools = {name: SpooledTemporaryFile(max_size=SPOOL_BYTES) for name in COLUMNS}
+    rows = 0
+    try:
+        for chunk in chunks:
+            for name, array in encoder.encode(chunk).items():
+                spools[name].write(array.tobytes())
+            rows += len(chunk)
+
+        sink = _Sink()
+        method = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+        with zipfile.ZipFile(sink, "w", compression=method, allowZip64=True) as archive:
+            for name, dtype in COLUMNS.items():
+                with archive.open(f"{name}.npy", "w", force_zip64=True) as member:
+                    np.lib.format.write_array_header_1_0(
+                        member, {"descr": dtype, "fortran_order": False, "shape": (rows,)}
+                    )
+                    spool = spools[name]
+                    spool.seek(0)
+                    while True:
+                        block = spool.read(1024 * 1024)
+                        if not block:
+                            break
+                        member.write(block)
+                        yield sink.drain()
+            vehicle_ids = np.array(encoder.vehicle_ids, dtype="<U36")
+            with archive.open("vehicle_ids.npy", "w") as member:
+                np.lib.format.write_array(member, vehicle_ids)
+        yield sink.drain()
+    finally:
+        for spool in spools.values():
+            spool.close()
+
+
+def iter_arrow(chunks: Iterator[list]) -> Iterator[bytes]:
+    """Arrow IPC stream: one record batch per chunk, written as soon as it is read"""
+    pa = _pyarrow()
+    encoder = _ChunkEncoder()
+    schema = pa.schema([
+        ("vehicle_id", pa.dictionary(pa.int32(), pa.string())),
+        ("latitude", pa.float64()),
+        ("longitude", pa.float64()),
+        ("timestamp", pa.timestamp("ms", tz="UTC")),
+        ("speed_kmh", pa.float32()),
+        ("heading", pa.float32()),
+    ])
+    sink = _Sink()
+    # The vehicle dictionary only ever grows, so later batches send just the new entries
+    options = pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True)
+    writer = pa.ipc.new_stream(sink, schema, options=options)
+    yield sink.drain()
+
+    for chunk in chunks:
+        columns = encoder.encode(chunk)
+        vehicles = pa.DictionaryArray.from_arrays(
+            pa.array(columns["vehicle"], type=pa.int32()), pa.array(encoder.vehicle_ids, type=pa.string())
+        )
+        batch = pa.record_batch([
+            vehicles,
+            pa.array(columns["latitude"]),
+            pa.array(columns["longitude"]),
+            pa.array(columns["timestamp_ms"]).cast(pa.timestamp("ms", tz="UTC")),
+            pa.array(columns["speed_kmh"], from_pandas=True),
+            pa.array(columns["heading"], from_pandas=True),
+        ], schema=schema)
+        writer.write_batch(batch)
+        yield sink.drain()
+
+    writer.close()
+    yield sink.drain()
+
+
+def stream_export(fmt: str, chunks: Iterator[list], compress: bool = False) -> Iterator[bytes]:
+    if fmt == "arrow":
+        return iter_arrow(chunks)
+    return iter_npz(chunks, compress=compress)
+
+
+def write_export(fmt: str, chunks: Iterator[list], out: BinaryIO, compress: bool = False) -> int:
+    """Write an export to a file; returns the number of bytes written"""
+    written = 0
+    for block in stream_export(fmt, chunks, compress=compress):
+        out.write(block)
+        written += len(block)
+    return written
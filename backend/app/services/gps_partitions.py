@@ -0,0 +1,396 @@
+"""
+GPS history maintenance for SafariSalama
+Keeps gps_points range-partitioned by timestamp on PostgreSQL: creates upcoming
+partitions ahead of time, retires old ones, and downsamples aging history
+"""
+from typing import List, Optional, Tuple
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+import logging
+import re
+import threading
+
+from sqlalchemy import Integer, cast, delete, func, select, text
+from sqlalchemy.engine import Connection, Engine
+
+from app.core.config import settings
+from app.db.database import engine as default_engine
+from app.models.gps_point import GpsPoint
+
+logger = logging.getLogger(__name__)
+
+PARENT = GpsPoint.__tablename__
+DEFAULT_PARTITION = f"{PARENT}_default"
+INTERVALS = {"daily": timedelta(days=1), "weekly": timedelta(weeks=1)}
+RETENTION_ACTIONS = ("drop", "archive")
+
+_BOUNDS = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+_DOWNSAMPLED = re.compile(r"^downsampled:(\d+)$")
+
+# Columns copied when converting or rewriting a partition, in table order
+_COLUMNS = ", ".join(f'"{c.name}"' for c in GpsPoint.__table__.columns)
+
+
+@dataclass
+class Partition:
+    name: str
+    start: datetime
+    end: datetime
+    downsampled_to: Optional[int] = None  # seconds per point, once downsampled
+
+
+def _ts(value: datetime) -> str:
+    return value.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _partition_indexes() -> List[Tuple[str, str]]:
+    """
+    (suffix, DDL template) for the primary key and each index of gps_points, to
+    build on a standalone table before it is attached as a partition. The
+    templates take the index `name` and `table`.
+    """
+    table = GpsPoint.__table__
+    key = ", ".join(f'"{c.name}"' for c in table.primary_key.columns)
+    indexes = [("pkey", f"ALTER TABLE {{table}} ADD CONSTRAINT {{name}} PRIMARY KEY ({key})")]
+    for index in sorted(table.indexes, key=lambda i: i.name):
+        columns = ", ".join(f'"{c.name}"' for c in index.columns)
+        where = index.dialect_options["postgresql"]["where"]
+        predicate = f" WHERE {where}" if where is not None else ""
+        suffix = index.name.replace(f"ix_{PARENT}_", "", 1)
+        indexes.append((suffix, f"CREATE INDEX {{name}} ON {{table}} ({columns}){predicate}"))
+    return indexes
+
+
+class GpsPartitionManager:
+    """
+    Owns the partition lifecycle of gps_points.
+    Partitions are named gps_points_pYYYYMMDD after their lower bound; a DEFAULT
+    partition catches late fixes older than the oldest partition. Retention and
+    downsampling only run when their day counts are set. On other
+    databases (SQLite in development and benchmarks) retention and downsampling
+    fall back to plain DELETEs.
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        interval: str = "daily",
+        premake: int = 7,
+        retention_days: int = 0,
+        retention_action: str = "drop",
+        downsample_after_days: int = 0,
+        downsample_seconds: int = 30,
+        maintenance_interval: float = 3600.0,
+    ):
+        if interval not in INTERVALS:
+            raise ValueError(f"GPS partition interval must be one of {', '.join(INTERVALS)}")
+        if retention_action not in RETENTION_ACTIONS:
+            raise ValueError(f"GPS retention action must be one of {', '.join(RETENTION_ACTIONS)}")
+        self.engine = engine
+        self.interval = interval
+        self.step = INTERVALS[interval]
+        self.premake = premake
+        self.retention_days = retention_days
+        self.retention_action = retention_action
+        self.downsample_after_days = downsample_after_days
+        self.downsample_seconds = int(downsample_seconds)
+        self.maintenance_interval = maintenance_interval
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def native(self) -> bool:
+        """Whether the database supports declarative partitioning"""
+        return self.engine.dialect.name == "postgresql"
+
+    def partition_start(self, ts: datetime) -> datetime:
+        start = datetime(ts.year, ts.month, ts.day)
+        if self.interval == "weekly":
+            start -= timedelta(days=start.weekday())
+        return start
+
+    # Inspection
+
+    def is_partitioned(self, conn: Connection) -> bool:
+        return bool(conn.execute(
+            text("SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:parent))"),
+            {"parent": PARENT},
+        ).scalar())
+
+    def partitions(self, conn: Connection) -> List[Partition]:
+        """Range partitions currently attached, oldest first (the DEFAULT partition is excluded)"""
+        rows = conn.execute(text(
+            "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), obj_description(c.oid, 'pg_class') "
+            "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(:parent)"
+        ), {"parent": PARENT}).all()
+
+        partitions = []
+        for name, bound, comment in rows:
+            match = _BOUNDS.search(bound or "")
+            if not match:
+                continue
+            downsampled = _DOWNSAMPLED.match(comment or "")
+            partitions.append(Partition(
+                name=name,
+                start=datetime.fromisoformat(match.group(1)),
+                end=datetime.fromisoformat(match.group(2)),
+                downsampled_to=int(downsampled.group(1)) if downsampled else None,
+            ))
+        return sorted(partitions, key=lambda p: p.start)
+
+    # Lifecycle steps; each runs inside the caller's transaction
+
+    def ensure_partitions(self, conn: Connection, start: Optional[datetime] = None,
+                          until: Optional[datetime] = None) -> List[str]:
+        """
+        Create partitions covering [start, until], by default from today to
+        `premake` intervals ahead. Gaps between existing partitions are filled
+        without overlapping them, so changing the interval is safe.
+        """
+        now = datetime.utcnow()
+        cursor = self.partition_start(start or now)
+        until = until or now + self.step * self.premake
+        existing = self.partitions(conn)
+        created = []
+
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {PARENT} DEFAULT"))
+
+        while cursor <= until:
+            covering = next((p for p in existing if p.start <= cursor < p.end), None)
+            if covering:
+                cursor = covering.end
+                continue
+
+            upper = self.partition_start(cursor) + self.step
+            later = [p.start for p in existing if p.start > cursor]
+            if later:
+                upper = min(upper, later[0])
+
+            name = f"{PARENT}_p{cursor:%Y%m%d}"
+            conn.execute(text(
+                f"CREATE TABLE {name} PARTITION OF {PARENT} "
+                f"FOR VALUES FROM ('{_ts(cursor)}') TO ('{_ts(upper)}')"
+            ))
+            existing.append(Partition(name, cursor, upper))
+            existing.sort(key=lambda p: p.start)
+            created.append(name)
+            cursor = upper
+
+        if created:
+            logger.info(f"Created GPS partitions: {', '.join(created)}")
+        return created
+
+    def apply_retention(self, conn: Connection, now: Optional[datetime] = None) -> List[str]:
+        """Drop (or detach and rename) partitions entirely older than the retention window"""
+        if not self.retention_days:
+            return []
+        cutoff = (now or datetime.utcnow()) - timedelta(days=self.retention_days)
+
+        if not self.native:
+            conn.execute(delete(GpsPoint.__table__).where(GpsPoint.timestamp < cutoff))
+            return []
+
+        retired = []
+        for partition in self.partitions(conn):
+            if partition.end > cutoff:
+                break
+            if self.retention_action == "drop":
+                conn.execute(text(f"DROP TABLE {partition.name}"))
+            else:
+                archive = partition.name.replace(f"{PARENT}_p", f"{PARENT}_archive_", 1)
+                conn.execute(text(f"ALTER TABLE {PARENT} DETACH PARTITION {partition.name}"))
+                conn.execute(text(f"ALTER TABLE {partition.name} RENAME TO {archive}"))
+            retired.append(partition.name)
+
+        conn.execute(text(f'DELETE FROM {DEFAULT_PARTITION} WHERE "timestamp" < :cutoff'), {"cutoff": cutoff})
+        if retired:
+            verb = "Dropped" if self.retention_action == "drop" else "Archived"
+            logger.info(f"{verb} GPS partitions older than {cutoff:%Y-%m-%d}: {', '.join(retired)}")
+        return retired
+
+    def downsample_candidates(self, conn: Connection, now: Optional[datetime] = None) -> List[Partition]:
+        if not self.downsample_after_days:
+            return []
+        cutoff = (now or datetime.utcnow()) - timedelta(days=self.downsample_after_days)
+        return [
+            p for p in self.partitions(conn)
+            if p.end <= cutoff and (p.downsampled_to or 0) < self.downsample_seconds
+        ]
+
+    def downsample_partition(self, conn: Connection, partition: Partition) -> int:
+        """
+        Keep the first point per vehicle per `downsample_seconds` bucket, plus
+        any keyframes chosen by track compaction.
+        The survivors are written to a new table that is swapped in for the
+        partition, which leaves no dead tuples behind (unlike a mass DELETE).
+        The primary key and indexes are built on the new table before DETACH,
+        and a CHECK constraint matching the bounds lets ATTACH skip its
+        validation scan, so the swap under ACCESS EXCLUSIVE is metadata-only.
+        Returns the number of points removed.
+        """
+        seconds = self.downsample_seconds
+        bucket = f'floor(extract(epoch FROM "timestamp") / {seconds})'
+        staging = f"{partition.name}_ds"
+        lower, upper = _ts(partition.start), _ts(partition.end)
+
+        before = conn.execute(text(f"SELECT count(*) FROM {partition.name}")).scalar()
+        conn.execute(text(f"CREATE TABLE {staging} (LIKE {PARENT} INCLUDING DEFAULTS)"))
+        # Keyframes from track compaction are kept as they are
+        conn.execute(text(
+            f"INSERT INTO {staging} ({_COLUMNS}) SELECT {_COLUMNS} FROM {partition.name} WHERE keyframe"
+        ))
+        conn.execute(text(
+            f"INSERT INTO {staging} ({_COLUMNS}) "
+            f"SELECT DISTINCT ON (vehicle_id, {bucket}) {_COLUMNS} FROM {partition.name} "
+            f"WHERE keyframe IS NOT TRUE "
+            f'ORDER BY vehicle_id, {bucket}, "timestamp"'
+        ))
+        after = conn.execute(text(f"SELECT count(*) FROM {staging}")).scalar()
+        # Matching indexes are adopted by ATTACH instead of being built under its lock
+        indexes = _partition_indexes()
+        for suffix, definition in indexes:
+            conn.execute(text(definition.format(name=f"{staging}_{suffix}", table=staging)))
+        conn.execute(text(
+            f"ALTER TABLE {staging} ADD CONSTRAINT {staging}_bounds "
+            f"CHECK (\"timestamp\" >= '{lower}' AND \"timestamp\" < '{upper}')"
+        ))
+        conn.execute(text(f"ALTER TABLE {PARENT} DETACH PARTITION {partition.name}"))
+        conn.execute(text(f"DROP TABLE {partition.name}"))
+        conn.execute(text(f"ALTER TABLE {staging} RENAME TO {partition.name}"))
+        for suffix, _ in indexes:
+            conn.execute(text(f"ALTER INDEX {staging}_{suffix} RENAME TO {partition.name}_{suffix}"))
+        conn.execute(text(
+            f"ALTER TABLE {PARENT} ATTACH PARTITION {partition.name} "
+            f"FOR VALUES FROM ('{lower}') TO ('{upper}')"
+        ))
+        conn.execute(text(f"ALTER TABLE {partition.name} DROP CONSTRAINT {staging}_bounds"))
+        conn.execute(text(f"COMMENT ON TABLE {partition.name} IS 'downsampled:{seconds}'"))
+
+        logger.info(f"Downsampled {partition.name} to 1 point per {seconds}s: {before} -> {after} points")
+        return before - after
+
+    def downsample_portable(self, conn: Connection, now: Optional[datetime] = None) -> int:
+        """DELETE-based downsampling for databases without partitions; safe to repeat"""
+        if not self.downsample_after_days:
+            return 0
+        cutoff = (now or datetime.utcnow()) - timedelta(days=self.downsample_after_days)
+        if conn.dialect.name == "sqlite":
+            epoch = cast(func.strftime("%s", GpsPoint.timestamp), Integer)
+        else:
+            epoch = cast(func.extract("epoch", GpsPoint.timestamp), Integer)
+
+        ranked = (
+            select(
+                GpsPoint.id,
+                func.row_number().over(
+                    partition_by=(GpsPoint.vehicle_id, epoch // self.downsample_seconds),
+                    order_by=(GpsPoint.timestamp, GpsPoint.id),
+                ).label("position"),
+            )
+            .where(GpsPoint.timestamp < cutoff, GpsPoint.keyframe.is_not(True))
+            .subquery()
+        )
+        result = conn.execute(
+            delete(GpsPoint.__table__).where(
+                GpsPoint.timestamp < cutoff,
+                GpsPoint.id.in_(select(ranked.c.id).where(ranked.c.position > 1)),
+            )
+        )
+        return result.rowcount or 0
+
+    def convert_table(self, conn: Connection, keep_legacy: bool = False) -> int:
+        """
+        One-off migration of an existing unpartitioned gps_points table:
+        rename it aside, create the partitioned table, copy the rows across.
+        Returns the number of rows copied.
+        """
+        if self.is_partitioned(conn):
+            return 0
+
+        legacy = f"{PARENT}_legacy"
+        conn.execute(text(f"ALTER TABLE {PARENT} RENAME TO {legacy}"))
+        # Index names are global per schema; move the legacy ones out of the way
+        for (index,) in conn.execute(text(
+            "SELECT indexname FROM pg_indexes WHERE tablename = :table"
+        ), {"table": legacy}).all():
+            conn.execute(text(f'ALTER INDEX "{index}" RENAME TO "{index[:55]}_legacy"'))
+
+        GpsPoint.__table__.create(conn)
+        oldest = conn.execute(text(f'SELECT min("timestamp") FROM {legacy}')).scalar()
+        self.ensure_partitions(conn, start=oldest)
+        copied = conn.execute(text(
+            f"INSERT INTO {PARENT} ({_COLUMNS}) SELECT {_COLUMNS} FROM {legacy}"
+        )).rowcount
+        if not keep_legacy:
+            conn.execute(text(f"DROP TABLE {legacy}"))
+        logger.info(f"Converted {PARENT} to a partitioned table ({copied} rows copied)")
+        return copied
+
+    # Scheduling
+
+    def run_maintenance(self, now: Optional[datetime] = None) -> dict:
+        """Create upcoming partitions, apply retention, then downsample; each step commits on its own"""
+        summary = {"created": [], "retired": [], "downsampled": [], "points_removed": 0}
+
+        if not self.native:
+            with self.engine.begin() as conn:
+                self.apply_retention(conn, now)
+                summary["points_removed"] = self.downsample_portable(conn, now)
+            return summary
+
+        with self.engine.begin() as conn:
+            if not self.is_partitioned(conn):
+                logger.warning(f"{PARENT} is not partitioned; run `python manage_gps_history.py convert`")
+                return summary
+            summary["created"] = self.ensure_partitions(conn)
+        with self.engine.begin() as conn:
+            summary["retired"] = self.apply_retention(conn, now)
+        with self.engine.connect() as conn:
+            candidates = self.downsample_candidates(conn, now)
+        for partition in candidates:
+            # One transaction per partition keeps each swap's locks short
+            with self.engine.begin() as conn:
+                summary["points_removed"] += self.downsample_partition(conn, partition)
+            summary["downsampled"].append(partition.name)
+        return summary
+
+    def start(self):
+        with self._lock:
+            if self._thread:
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="gps-partitions", daemon=True)
+            self._thread.start()
+        logger.info(f"GPS partition maintenance started ({self.interval}, every {self.maintenance_interval:.0f}s)")
+
+    def stop(self, timeout: float = 5.0):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread:
+            self._stopping.set()
+            thread.join(timeout=timeout)
+
+    def _run(self):
+        # Runs once at startup so partitions for today exist before the first GPS fix
+        while True:
+            try:
+                self.run_maintenance()
+            except Exception as e:
+                logger.error(f"GPS partition maintenance failed: {e}")
+            if self._stopping.wait(self.maintenance_interval):
+                break
+
+
+# Global GPS partition manager instance
+gps_partitions = GpsPartitionManager(
+    default_engine,
+    interval=settings.GPS_PARTITION_INTERVAL,
+    premake=settings.GPS_PARTITIONS_PREMAKE,
+    retention_days=settings.GPS_RETENTION_DAYS,
+    retention_action=settings.GPS_RETENTION_ACTION,
+    downsample_after_days=settings.GPS_DOWNSAMPLE_AFTER_DAYS,
+    downsample_seconds=settings.GPS_DOWNSAMPLE_SECONDS,
+    maintenance_interval=settings.GPS_MAINTENANCE_INTERVAL_MINUTES * 60.0,
+)
@@ -0,0 +1,521 @@
+"""
+Headway monitoring for SafariSalama
+Places every online vehicle along the stop sequence of its route as fixes come
+in, keeps the vehicles running each way in order, and tells sacco admins when
+consecutive matatus bunch together and how evenly each route is spaced
+"""
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+from datetime import datetime
+from itertools import count
+from math import cos, hypot, radians, sqrt
+import asyncio
+import logging
+import random
+import threading
+import time
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.db.database import SessionLocal
+from app.services.geofence import METRES_PER_DEGREE, load_route_stops
+
+logger = logging.getLogger(__name__)
+
+# Further than this from the line through the route's stops is off the route (detour, depot)
+OFF_ROUTE_M = 300.0
+# Segments either side of the last one tried before searching the whole line
+SEARCH_SEGMENTS = 2
+# Vehicles this close to either end are queueing at the stage, not in service
+TERMINUS_M = 200.0
+# Moves shorter than this along the route leave the direction as it was; GPS jitter at a stop flips it
+MIN_MOVE_M = 30.0
+# A bunched pair counts as spaced out again only past this many bunching distances
+CLEAR_FACTOR = 1.5
+# A vehicle is reported as bunched at most once in this long
+ALERT_COOLDOWN_SECONDS = 300.0
+# Slower than this (standing at a stage) a vehicle's speed says nothing about headway in time
+MOVING_MPS = 1.0
+# How often stop changes made through other workers are picked up
+RELOAD_SECONDS = 300.0
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+class RouteLine:
+    """A route's stops projected to metres, joined in sequence into a line with the distance along it"""
+
+    def __init__(self, stops: List[Tuple[float, float]]):
+        """stops: (lat, lon) ordered by sequence"""
+        self.ky = METRES_PER_DEGREE
+        self.kx = METRES_PER_DEGREE * cos(radians(stops[0][0]))
+        self.points = [(lon * self.kx, lat * self.ky) for lat, lon in stops]
+        self.along = [0.0]
+        for (ax, ay), (bx, by) in zip(self.points, self.points[1:]):
+            self.along.append(self.along[-1] + hypot(bx - ax, by - ay))
+        self.length = self.along[-1]
+
+    def locate(self, lat: float, lon: float, hint: Optional[int]) -> Tuple[float, int, float]:
+        """
+        (metres along the route, segment, metres off it) of the closest point
+        of the line. With the segment of the previous fix as hint only its
+        neighbourhood is searched, unless the fix is off the route there.
+        """
+        x, y = lon * self.kx, lat * self.ky
+        last = len(self.points) - 2
+        if hint is not None:
+            closest = self._closest(x, y, max(hint - SEARCH_SEGMENTS, 0), min(hint + SEARCH_SEGMENTS, last))
+            if closest[2] <= OFF_ROUTE_M:
+                return closest
+        return self._closest(x, y, 0, last)
+
+    def _closest(self, x: float, y: float, first: int, last: int) -> Tuple[float, int, float]:
+        closest = None
+        for i in range(first, last + 1):
+            (ax, ay), (bx, by) = self.points[i], self.points[i + 1]
+            dx, dy = bx - ax, by - ay
+            span = dx * dx + dy * dy
+            share = min(max(((x - ax) * dx + (y - ay) * dy) / span, 0.0), 1.0) if span else 0.0
+            off = hypot(ax + share * dx - x, ay + share * dy - y)
+            if closest is None or off < closest[2]:
+                closest = (self.along[i] + share * (self.along[i + 1] - self.along[i]), i, off)
+        return closest
+
+
+class _Node:
+    __slots__ = ("key", "priority", "left", "right")
+
+    def __init__(self, key):
+        self.key = key
+        self.priority = random.random()
+        self.left = self.right = None
+
+
+class VehicleOrder:
+    """
+    The vehicles running one way along a route, by distance along it: a treap
+    keyed by (metres, vehicle number, vehicle_id), so placing or removing a
+    vehicle and finding its neighbours cost O(log n) expected in vehicles
+    """
+
+    def __init__(self):
+        self.root: Optional[_Node] = None
+        self.size = 0
+
+    def insert(self, key):
+        left, right = self._split(self.root, key)
+        self.root = self._merge(self._merge(left, _Node(key)), right)
+        self.size += 1
+
+    def remove(self, key) -> bool:
+        parent, node = None, self.root
+        while node is not None and node.key != key:
+            parent, node = node, node.left if key < node.key else node.right
+        if node is None:
+            return False
+        joined = self._merge(node.left, node.right)
+        if parent is None:
+            self.root = joined
+        elif parent.left is node:
+            parent.left = joined
+        else:
+            parent.right = joined
+        self.size -= 1
+        return True
+
+    def before(self, key):
+        """The largest key below `key`, or None"""
+        node, found = self.root, None
+        while node is not None:
+            if node.key < key:
+                found, node = node.key, node.right
+            else:
+                node = node.left
+        return found
+
+    def after(self, key):
+        """The smallest key above `key`, or None"""
+        node, found = self.root, None
+        while node is not None:
+            if node.key > key:
+                found, node = node.key, node.left
+            else:
+                node = node.right
+        return found
+
+    def __iter__(self) -> Iterator[tuple]:
+        stack, node = [], self.root
+        while stack or node is not None:
+            while node is not None:
+                stack.append(node)
+                node = node.left
+            node = stack.pop()
+            yield node.key
+            node = node.right
+
+    @classmethod
+    def _split(cls, node: Optional[_Node], key) -> Tuple[Optional[_Node], Optional[_Node]]:
+        """(keys below `key`, the rest)"""
+        if node is None:
+            return None, None
+        if node.key < key:
+            node.right, right = cls._split(node.right, key)
+            return node, right
+        left, node.left = cls._split(node.left, key)
+        return left, node
+
+    @classmethod
+    def _merge(cls, left: Optional[_Node], right: Optional[_Node]) -> Optional[_Node]:
+        """Every key of `left` is below every key of `right`"""
+        if left is None:
+            return right
+        if right is None:
+            return left
+        if left.priority > right.priority:
+            left.right = cls._merge(left.right, right)
+            return left
+        right.left = cls._merge(left, right.left)
+        return right
+
+
+class VehicleHeadway:
+    __slots__ = ("route_id", "number", "sacco_id", "lat", "lon", "at", "segment", "anchor", "anchor_at",
+                 "direction", "speed", "order", "key", "bunched_with", "quiet_until")
+
+    def __init__(self, route_id, number: int):
+        self.route_id = route_id
+        self.number = number  # orders vehicles at the same distance
+        self.sacco_id = None
+        self.lat = self.lon = 0.0
+        self.at = 0.0
+        self.segment: Optional[int] = None
+        # Where direction and speed were last measured from
+        self.anchor: Optional[float] = None
+        self.anchor_at = 0.0
+        self.direction = 0  # +1 along the stop sequence, -1 against it, 0 not known yet
+        self.speed = 0.0  # m/s along the route, stops included
+        self.order: Optional[VehicleOrder] = None  # the one it is placed in, if any
+        self.key: Optional[tuple] = None
+        self.bunched_with = None
+        self.quiet_until = 0.0
+
+
+class HeadwayMonitor:
+    """
+    observe() is called for every location fix. It finds the vehicle on its
+    route's line (a few segments around the previous fix), moves it within the
+    order of the vehicles running the same way - O(log n) in vehicles on the
+    route - and compares it with the vehicles now directly ahead of and behind
+    it. No database access. Statistics over all the gaps of a route are worked
+    out off the fix path, every stats interval.
+
+    Like the stop geofences, this assumes one process sees all of a vehicle's
+    fixes; the order of a route is only complete if it also sees the route's
+    other vehicles.
+    """
+
+    def __init__(self, bunching_m: float = 300.0, stats_interval: float = 30.0, fresh_seconds: float = 300.0):
+        self.bunching_m = bunching_m
+        self.stats_interval = stats_interval
+        self.fresh_seconds = fresh_seconds
+
+        self._lines: Dict[object, RouteLine] = {}
+        self._stops: Dict[object, List[Tuple[float, float]]] = {}
+        self._orders: Dict[Tuple[object, int], VehicleOrder] = {}
+        self._vehicles: Dict[object, VehicleHeadway] = {}
+        self._numbers = count()
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+
+        self.fixes = 0
+        self.observe_seconds = 0.0
+        self.bunching_alerts = 0
+        self.stats_sent = 0
+
+    @property
+    def tracked(self) -> int:
+        return len(self._vehicles)
+
+    @property
+    def placed(self) -> int:
+        return sum(order.size for order in list(self._orders.values()))
+
+    # Loading
+
+    def load_routes(self, db: Session) -> int:
+        return self.set_routes(load_route_stops(db, settings.GEOFENCE_RADIUS_M))
+
+    def set_routes(self, by_route: Dict[object, list]) -> int:
+        """by_route: route_id -> [(stop_id, sequence, lat, lon, radius_m)] ordered by sequence"""
+        stops = {route_id: [(lat, lon) for _, _, lat, lon, _ in rows] for route_id, rows in by_route.items()}
+        lines = {route_id: RouteLine(points) for route_id, points in stops.items() if len(points) >= 2}
+        lines = {route_id: line for route_id, line in lines.items() if line.length > 0}
+
+        with self._lock:
+            changed = {route_id for route_id in self._lines if stops.get(route_id) != self._stops.get(route_id)}
+            if changed:
+                # The line moved under these vehicles; they are placed again from their next fix
+                for state in self._vehicles.values():
+                    if state.route_id in changed:
+                        state.order = state.key = state.segment = state.anchor = None
+                        state.direction = 0
+                for key in [key for key in self._orders if key[0] in changed]:
+                    del self._orders[key]
+            self._lines, self._stops = lines, stops
+        return len(lines)
+
+    def reload(self) -> int:
+        db = SessionLocal()
+        try:
+            return self.load_routes(db)
+        finally:
+            db.close()
+
+    # Ingest path
+
+    def observe(self, vehicle_id, route_id, sacco_id, lat, lon, at: datetime) -> List[Tuple[dict, Set[object]]]:
+        """
+        Feed one location fix. Returns a (bunching alert, sacco ids of the two
+        vehicles) for each pair of consecutive vehicles it found newly bunched,
+        usually none.
+        """
+        started = time.perf_counter()
+        lat, lon = float(lat), float(lon)
+        t = (at - _EPOCH).total_seconds()
+        alerts = []
+        with self._lock:
+            self.fixes += 1
+            state = self._vehicles.get(vehicle_id)
+            if state is None or state.route_id != route_id:
+                if state is not None:
+                    self._unplace(state)
+                state = self._vehicles[vehicle_id] = VehicleHeadway(route_id, next(self._numbers))
+            state.sacco_id, state.lat, state.lon, state.at = sacco_id, lat, lon, t
+
+            line = self._lines.get(route_id)
+            if line is None:
+                self.observe_seconds += time.perf_counter() - started
+                return alerts
+
+            along, segment, off = line.locate(lat, lon, state.segment)
+            if off > OFF_ROUTE_M:
+                state.segment = state.anchor = None
+                self._unplace(state)
+            else:
+                state.segment = segment
+                self._move(state, along, t)
+                if along < TERMINUS_M:
+                    # At a terminus the only way is back
+                    state.direction = 1
+                    self._unplace(state)
+                elif along > line.length - TERMINUS_M:
+                    state.direction = -1
+                    self._unplace(state)
+                elif state.direction:
+                    self._place(vehicle_id, state, along, at, alerts)
+            self.observe_seconds += time.perf_counter() - started
+        return alerts
+
+    def _move(self, state: VehicleHeadway, along: float, t: float):
+        if state.anchor is None:
+            state.anchor, state.anchor_at = along, t
+            return
+        moved = along - state.anchor
+        if abs(moved) >= MIN_MOVE_M:
+            state.direction = 1 if moved > 0 else -1
+            if t > state.anchor_at:
+                state.speed = abs(moved) / (t - state.anchor_at)
+            state.anchor, state.anchor_at = along, t
+
+    def _place(self, vehicle_id, state: VehicleHeadway, along: float, at: datetime, alerts: list):
+        self._unplace(state)
+        order = self._orders.get((state.route_id, state.direction))
+        if order is None:
+            order = self._orders[(state.route_id, state.direction)] = VehicleOrder()
+        key = (along, state.number, vehicle_id)
+        order.insert(key)
+        state.order, state.key = order, key
+
+        lower, upper = order.before(key), order.after(key)
+        ahead, behind = (upper, lower) if state.direction > 0 else (lower, upper)
+        if ahead is not None:
+            self._check(state, vehicle_id, ahead[2], abs(ahead[0] - along), at, alerts)
+        if behind is not None:
+            self._check(self._vehicles[behind[2]], behind[2], vehicle_id, abs(along - behind[0]), at, alerts)
+
+    def _unplace(self, state: VehicleHeadway):
+        if state.order is not None:
+            state.order.remove(state.key)
+            state.order = state.key = None
+
+    def _check(self, follower: VehicleHeadway, follower_id, leader_id, gap: float, at: datetime, alerts: list):
+        leader = self._vehicles[leader_id]
+        # A pair stays one bunch when the two overtake each other
+        reported = follower.bunched_with == leader_id or leader.bunched_with == follower_id
+        if gap >= self.bunching_m:
+            if reported and gap > self.bunching_m * CLEAR_FACTOR:
+                if follower.bunched_with == leader_id:
+                    follower.bunched_with = None
+                if leader.bunched_with == follower_id:
+                    leader.bunched_with = None
+            return
+        t = (at - _EPOCH).total_seconds()
+        if reported or t < follower.quiet_until:
+            return
+        follower.bunched_with = leader_id
+        follower.quiet_until = t + ALERT_COOLDOWN_SECONDS
+        self.bunching_alerts += 1
+        alerts.append(({
+            "route_id": str(follower.route_id),
+            "vehicle_id": str(follower_id),
+            "ahead_vehicle_id": str(leader_id),
+            "gap_m": round(gap),
+            "direction": follower.direction,
+            "latitude": follower.lat,
+            "longitude": follower.lon,
+            "timestamp": at.isoformat(),
+        }, {follower.sacco_id, leader.sacco_id} - {None}))
+
+    # Statistics
+
+    def stats(self, now: Optional[datetime] = None) -> List[Tuple[dict, Set[object]]]:
+        """
+        Forget vehicles not heard from within the fresh window, then the
+        headway statistics of every route with vehicles in service, each with
+        the sacco ids of those vehicles. Walks every placed vehicle once.
+        """
+        now = now or datetime.utcnow()
+        cutoff = (now - _EPOCH).total_seconds() - self.fresh_seconds
+        by_route: Dict[object, Tuple[dict, Set[object]]] = {}
+        with self._lock:
+            for vehicle_id, state in list(self._vehicles.items()):
+                if state.at < cutoff:
+                    self._unplace(state)
+                    del self._vehicles[vehicle_id]
+
+            for (route_id, direction), order in list(self._orders.items()):
+                if not order.size:
+                    del self._orders[(route_id, direction)]
+                    continue
+                keys = list(order)
+                states = [self._vehicles[key[2]] for key in keys]
+                gaps = [b[0] - a[0] for a, b in zip(keys, keys[1:])]
+                speeds = [state.speed for state in states if state.speed >= MOVING_MPS]
+
+                entry = {
+                    "direction": direction,
+                    "vehicles": len(keys),
+                    "bunched_pairs": sum(1 for gap in gaps if gap < self.bunching_m),
+                    "mean_gap_m": None,
+                    "min_gap_m": None,
+                    "max_gap_m": None,
+                    "gap_cv": None,
+                    "mean_headway_seconds": None,
+                }
+                if gaps:
+                    mean = sum(gaps) / len(gaps)
+                    entry["mean_gap_m"] = round(mean)
+                    entry["min_gap_m"] = round(min(gaps))
+                    entry["max_gap_m"] = round(max(gaps))
+                    if mean:
+                        # Coefficient of variation: 0 for evenly spaced vehicles, ~1 and up when they bunch
+                        entry["gap_cv"] = round(sqrt(sum((gap - mean) ** 2 for gap in gaps) / len(gaps)) / mean, 2)
+                    if speeds:
+                        entry["mean_headway_seconds"] = round(mean * len(speeds) / sum(speeds))
+
+                data, saccos = by_route.setdefault(route_id, ({
+                    "route_id": str(route_id),
+                    "timestamp": now.isoformat(),
+                    "bunching_m": self.bunching_m,
+                    "directions": [],
+                }, set()))
+                data["directions"].append(entry)
+                saccos.update(state.sacco_id for state in states if state.sacco_id is not None)
+
+        for data, _ in by_route.values():
+            data["directions"].sort(key=lambda entry: -entry["direction"])
+        return list(by_route.values())
+
+    def _announce(self, route_stats: List[Tuple[dict, Set[object]]]):
+        loop = self._loop
+        if not route_stats or loop is None or loop.is_closed():
+            return
+        from app.websockets.manager import connection_manager
+
+        for data, saccos in route_stats:
+            asyncio.run_coroutine_threadsafe(
+                connection_manager.broadcast_headway_event(
+                    event="headway_stats",
+                    event_data=data,
+                    sacco_ids=[str(sacco_id) for sacco_id in saccos],
+                ),
+                loop,
+            )
+        self.stats_sent += len(route_stats)
+
+    def start(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        """loop: the event loop WebSocket broadcasts are scheduled on"""
+        with self._lock:
+            if self._thread:
+                return
+            self._loop = loop
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="headway-monitor", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread:
+            self._stopping.set()
+            thread.join(timeout=timeout)
+        self._loop = None
+
+    def _run(self):
+        next_reload = time.monotonic()
+        loaded = False
+        while True:
+            try:
+                if time.monotonic() >= next_reload:
+                    routes = self.reload()
+                    next_reload = time.monotonic() + RELOAD_SECONDS
+                    if not loaded:
+                        logger.info(f"Headway monitor loaded {routes} routes")
+                        loaded = True
+                self._announce(self.stats())
+            except Exception as e:
+                logger.error(f"Headway statistics failed: {e}")
+            if self._stopping.wait(self.stats_interval):
+                return
+
+
+# Global headway monitor instance
+headway = HeadwayMonitor(
+    bunching_m=settings.HEADWAY_BUNCHING_M,
+    stats_interval=settings.HEADWAY_STATS_SECONDS,
+    fresh_seconds=settings.VEHICLE_OFFLINE_AFTER_SECONDS,
+)
+
+
+def _headway_metrics() -> list:
+    return [
+        "# TYPE headway_fixes_total counter",
+        f"headway_fixes_total {headway.fixes}",
+        "# TYPE headway_observe_seconds_total counter",
+        f"headway_observe_seconds_total {headway.observe_seconds:.6f}",
+        "# TYPE headway_bunching_alerts_total counter",
+        f"headway_bunching_alerts_total {headway.bunching_alerts}",
+        "# TYPE headway_stats_sent_total counter",
+        f"headway_stats_sent_total {headway.stats_sent}",
+        "# TYPE headway_tracked_vehicles gauge",
+        f"headway_tracked_vehicles {headway.tracked}",
+        "# TYPE headway_placed_vehicles gauge",
+        f"headway_placed_vehicles {headway.placed}",
+    ]
+
+
+metrics.register_collector(_headway_metrics)
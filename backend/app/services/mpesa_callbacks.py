@@ -0,0 +1,369 @@
+"""
+M-Pesa callback processing for SafariSalama
+Acknowledges callbacks immediately and applies payment/trip status transitions
+in set-based statements, optionally batching queued callbacks together, and
+retries callbacks that could not be applied
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+import json
+import logging
+import queue
+import threading
+import time
+
+from sqlalchemy import Boolean, String, and_, bindparam, case, cast, column, func, literal, or_, select, update, values
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.models.payment import Payment, PaymentStatus
+from app.models.trip import Trip, PaymentStatus as TripPaymentStatus
+
+logger = logging.getLogger(__name__)
+
+# Transitions a callback may apply. Terminal states (completed, refunded) are never
+# touched, and a late failure never overrides a payment that already failed/completed.
+SUCCESS_FROM = (PaymentStatus.pending, PaymentStatus.processing, PaymentStatus.failed)
+FAILURE_FROM = (PaymentStatus.pending, PaymentStatus.processing)
+
+# Callbacks that fail are applied again this many times in all, backing off from
+# RETRY_BASE_SECONDS (5 s ... 80 s, about 2.5 minutes), then logged as dead letters
+MAX_ATTEMPTS = 6
+RETRY_BASE_SECONDS = 5.0
+
+
+@dataclass(frozen=True)
+class MpesaCallback:
+    reference: str
+    transaction_id: str
+    succeeded: bool
+
+    @property
+    def dedup_key(self) -> str:
+        # Failed STK pushes don't always carry a unique transaction id
+        return self.transaction_id if self.succeeded else f"{self.reference}:failed"
+
+
+class SeenCache:
+    """Bounded LRU set of callback keys already accepted by this process"""
+
+    def __init__(self, maxsize: int = 100000):
+        self.maxsize = maxsize
+        self._keys: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, key: str) -> bool:
+        """Record key; returns False if it was already present"""
+        with self._lock:
+            if key in self._keys:
+                self._keys.move_to_end(key)
+                return False
+            self._keys[key] = None
+            if len(self._keys) > self.maxsize:
+                self._keys.popitem(last=False)
+            return True
+
+    def discard(self, key: str):
+        with self._lock:
+            self._keys.pop(key, None)
+
+    def __len__(self):
+        return len(self._keys)
+
+
+def _collapse(callbacks: Iterable[MpesaCallback]) -> List[MpesaCallback]:
+    """One callback per reference; a success wins over a failure for the same payment"""
+    by_reference: Dict[str, MpesaCallback] = {}
+    for cb in callbacks:
+        current = by_reference.get(cb.reference)
+        if current is None or (cb.succeeded and not current.succeeded):
+            by_reference[cb.reference] = cb
+    return list(by_reference.values())
+
+
+def apply_callbacks(db: Session, callbacks: Iterable[MpesaCallback]) -> int:
+    """
+    Apply a set of callbacks in one transaction.
+    On PostgreSQL this is a single statement: an UPDATE of payments joined to the
+    callback VALUES list, feeding an UPDATE of trips through a data-modifying CTE.
+    Returns the number of callbacks applied.
+    """
+    callbacks = _collapse(callbacks)
+    if not callbacks:
+        return 0
+
+    status_type = Payment.__table__.c.payment_status.type
+    completed = literal(PaymentStatus.completed, status_type)
+    failed = literal(PaymentStatus.failed, status_type)
+
+    if db.bind.dialect.name == "postgresql":
+        cb = values(
+            column("reference", String),
+            column("transaction_id", String),
+            column("succeeded", Boolean),
+            name="cb",
+        ).data([(c.reference, c.transaction_id, c.succeeded) for c in callbacks])
+
+        updated_payments = (
+            update(Payment)
+            .where(
+                Payment.reference_number == cb.c.reference,
+                or_(
+                    and_(cb.c.succeeded, Payment.payment_status.in_(SUCCESS_FROM)),
+                    and_(~cb.c.succeeded, Payment.payment_status.in_(FAILURE_FROM)),
+                ),
+            )
+            .values(
+                payment_status=cast(case((cb.c.succeeded, completed), else_=failed), status_type),
+                mpesa_transaction_id=case(
+                    (cb.c.succeeded, cb.c.transaction_id),
+                    else_=Payment.mpesa_transaction_id,
+                ),
+                updated_at=func.now(),
+            )
+            .returning(Payment.trip_id, Payment.payment_status)
+            .cte("updated_payments")
+        )
+
+        stmt = (
+            update(Trip)
+            .where(
+                Trip.id == updated_payments.c.trip_id,
+                updated_payments.c.payment_status == completed,
+            )
+            .values(payment_status=TripPaymentStatus.completed)
+            .add_cte(updated_payments)
+        )
+        db.execute(stmt)
+    else:
+        # Portable path (e.g. SQLite): one executemany UPDATE for payments,
+        # then one set-based UPDATE for the trips of completed payments
+        successes = [c for c in callbacks if c.succeeded]
+        failures = [c for c in callbacks if not c.succeeded]
+
+        if successes:
+            # Core table + connection: an ORM update with a parameter list would be
+            # treated as a bulk update by primary key
+            payments = Payment.__table__
+            db.connection().execute(
+                update(payments)
+                .where(
+                    payments.c.reference_number == bindparam("ref"),
+                    # executemany can't expand IN lists
+                    or_(*(payments.c.payment_status == s for s in SUCCESS_FROM)),
+                )
+                .values(
+                    payment_status=PaymentStatus.completed,
+                    mpesa_transaction_id=bindparam("txn"),
+                    updated_at=func.now(),
+                ),
+                [{"ref": c.reference, "txn": c.transaction_id} for c in successes],
+            )
+            db.execute(
+                update(Trip)
+                .where(Trip.id.in_(
+                    select(Payment.trip_id).where(
+                        Payment.reference_number.in_([c.reference for c in successes]),
+                        Payment.payment_status == PaymentStatus.completed,
+                    )
+                ))
+                .values(payment_status=TripPaymentStatus.completed)
+                .execution_options(synchronize_session=False)
+            )
+
+        if failures:
+            db.execute(
+                update(Payment)
+                .where(
+                    Payment.reference_number.in_([c.reference for c in failures]),
+                    Payment.payment_status.in_(FAILURE_FROM),
+                )
+                .values(payment_status=PaymentStatus.failed, updated_at=func.now())
+                .execution_options(synchronize_session=False)
+            )
+
+    db.commit()
+    return len(callbacks)
+
+
+class CallbackProcessor:
+    """
+    Accepts callbacks, short-circuits duplicates through a seen-transaction cache,
+    and applies them on a background thread. With batch_interval > 0 callbacks are
+    drained together, up to batch_size per transaction.
+
+    An acknowledged callback is never resent by Safaricom, so one that fails to
+    apply is not dropped: a failed batch is applied callback by callback, so a
+    bad one cannot sink the rest, and whatever still fails is retried with
+    backoff. Callbacks that run out of attempts, or whose retry is pending at
+    shutdown, are logged in full for reconciliation or replay.
+    """
+
+    def __init__(self, batch_size: int = 500, batch_interval: float = 0.0, cache_size: int = 100000):
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.seen = SeenCache(cache_size)
+        self._queue: "queue.Queue[Optional[MpesaCallback]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._attempts: Dict[str, int] = {}  # dedup_key -> failed attempts so far
+        self._retries: Dict[int, Tuple[threading.Timer, List[MpesaCallback]]] = {}
+
+        self.accepted = 0
+        self.duplicates = 0
+        self.applied = 0
+        self.batches = 0
+        self.retried = 0
+        self.dead_lettered = 0
+
+    @property
+    def batch_mode(self) -> bool:
+        return self.batch_interval > 0
+
+    def start(self):
+        with self._lock:
+            if self._thread or not self.batch_mode:
+                return
+            self._thread = threading.Thread(target=self._run, name="mpesa-callbacks", daemon=True)
+            self._thread.start()
+        logger.info(f"Mpesa callback batcher started (batch_size={self.batch_size}, interval={self.batch_interval}s)")
+
+    def stop(self, timeout: float = 5.0):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread:
+            self._queue.put(None)
+            thread.join(timeout=timeout)
+        with self._lock:
+            retries, self._retries = self._retries, {}
+        for timer, callbacks in retries.values():
+            timer.cancel()
+            for cb in callbacks:
+                self._dead_letter(cb, "retry pending at shutdown")
+
+    def submit(self, callback: MpesaCallback) -> bool:
+        """
+        Accept a callback. Returns False for duplicates, which are dropped.
+        In batch mode the callback is queued; otherwise the caller applies it with process().
+        """
+        if not self.seen.add(callback.dedup_key):
+            self.duplicates += 1
+            return False
+
+        self.accepted += 1
+        if self.batch_mode:
+            if not self._thread:
+                self.start()
+            self._queue.put(callback)
+        return True
+
+    def process(self, callbacks: List[MpesaCallback]):
+        """
+        Apply callbacks now in a single transaction, falling back to one
+        transaction per callback; those that still fail are retried later
+        """
+        failed = []
+        db = SessionLocal()
+        try:
+            try:
+                self.applied += apply_callbacks(db, callbacks)
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Failed to apply {len(callbacks)} Mpesa callbacks together: {e}")
+                failed = self._apply_each(db, callbacks) if len(callbacks) > 1 else list(callbacks)
+            self.batches += 1
+        finally:
+            db.close()
+
+        with self._lock:
+            for cb in callbacks:
+                if cb not in failed:
+                    self._attempts.pop(cb.dedup_key, None)
+        if failed:
+            self._retry(failed)
+
+    def _apply_each(self, db: Session, callbacks: List[MpesaCallback]) -> List[MpesaCallback]:
+        failed = []
+        for cb in callbacks:
+            try:
+                self.applied += apply_callbacks(db, [cb])
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Failed to apply Mpesa callback for {cb.reference}: {e}")
+                failed.append(cb)
+        return failed
+
+    def _retry(self, callbacks: List[MpesaCallback]):
+        retry, attempt = [], 0
+        with self._lock:
+            for cb in callbacks:
+                attempts = self._attempts.get(cb.dedup_key, 0) + 1
+                if attempts >= MAX_ATTEMPTS:
+                    self._attempts.pop(cb.dedup_key, None)
+                    self._dead_letter(cb, f"failed {attempts} times")
+                    continue
+                self._attempts[cb.dedup_key] = attempts
+                retry.append(cb)
+                attempt = max(attempt, attempts)
+            if not retry:
+                return
+            timer = threading.Timer(RETRY_BASE_SECONDS * 2 ** (attempt - 1), self._requeue, args=(retry,))
+            timer.daemon = True
+            self._retries[id(retry)] = (timer, retry)
+            self.retried += len(retry)
+        logger.warning(f"Retrying {len(retry)} Mpesa callbacks in {timer.interval:.0f}s")
+        timer.start()
+
+    def _requeue(self, callbacks: List[MpesaCallback]):
+        with self._lock:
+            if self._retries.pop(id(callbacks), None) is None:
+                return  # stopped meanwhile
+            batching = self._thread is not None
+        if batching:
+            for cb in callbacks:
+                self._queue.put(cb)
+        else:
+            self.process(callbacks)
+
+    def _dead_letter(self, cb: MpesaCallback, reason: str):
+        self.dead_lettered += 1
+        # A replay of the same callback must not be dropped as a duplicate
+        self.seen.discard(cb.dedup_key)
+        logger.error(f"Mpesa callback not applied ({reason}); settle through reconciliation or replay: "
+                     f"{json.dumps(asdict(cb))}")
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is None:
+                break
+
+            batch = [first]
+            deadline = time.monotonic() + self.batch_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    cb = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if cb is None:
+                    stopping = True
+                    break
+                batch.append(cb)
+
+            self.process(batch)
+
+
+# Global callback processor instance
+callback_processor = CallbackProcessor(
+    batch_size=settings.MPESA_CALLBACK_BATCH_SIZE,
+    batch_interval=settings.MPESA_CALLBACK_BATCH_INTERVAL_MS / 1000.0,
+)
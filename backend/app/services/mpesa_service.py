@@ -0,0 +1,209 @@
+"""
+M-Pesa (Daraja) client for SafariSalama
+Handles OAuth token caching and STK push requests with timeouts and retries
+"""
+from typing import Optional
+from datetime import datetime
+from urllib import request, error
+import base64
+import http.client
+import json
+import logging
+import secrets
+import threading
+import time
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Daraja rejects STK pushes with longer AccountReference / TransactionDesc values
+ACCOUNT_REFERENCE_MAX = 12
+TRANSACTION_DESC_MAX = 13
+
+
+def new_account_reference() -> str:
+    """
+    A random payment reference that fits AccountReference as it is, so the
+    statement's account number and callbacks map straight back to the payment
+    (60 random bits; base32 avoids lower case, which phones display oddly)
+    """
+    return base64.b32encode(secrets.token_bytes(8)).decode("ascii")[:ACCOUNT_REFERENCE_MAX]
+
+
+class MpesaError(Exception):
+    """Raised when an STK push cannot be completed"""
+
+    def __init__(self, message: str, retryable: bool = False):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class MpesaOutcomeUnknown(MpesaError):
+    """
+    Raised when an STK push reached Daraja but no answer came back: the
+    customer may already have the PIN prompt, so it must not be sent again.
+    The callback or reconciliation settles the payment.
+    """
+
+
+class MpesaClient:
+    """
+    Thread-safe Daraja client shared by the payment workers.
+    The OAuth access token is cached until shortly before it expires,
+    so a burst of STK pushes costs a single token request.
+    """
+
+    # Refresh the token this many seconds before Daraja expires it
+    TOKEN_EXPIRY_MARGIN = 60
+
+    def __init__(
+        self,
+        base_url: str = None,
+        consumer_key: Optional[str] = None,
+        consumer_secret: Optional[str] = None,
+        shortcode: str = None,
+        passkey: Optional[str] = None,
+        callback_url: str = None,
+        timeout: float = None,
+        max_retries: int = None,
+    ):
+        self.base_url = (base_url or settings.MPESA_BASE_URL).rstrip("/")
+        self.consumer_key = consumer_key or settings.MPESA_CONSUMER_KEY
+        self.consumer_secret = consumer_secret or settings.MPESA_CONSUMER_SECRET
+        self.shortcode = shortcode or settings.MPESA_SHORTCODE
+        self.passkey = passkey or settings.MPESA_PASSKEY
+        self.callback_url = callback_url or settings.MPESA_CALLBACK_URL
+        self.timeout = timeout if timeout is not None else settings.MPESA_TIMEOUT_SECONDS
+        self.max_retries = max_retries if max_retries is not None else settings.MPESA_MAX_RETRIES
+
+        self._token: Optional[str] = None
+        self._token_expires_at = 0.0
+        self._token_lock = threading.Lock()
+
+    @property
+    def is_configured(self) -> bool:
+        return bool(self.consumer_key and self.consumer_secret and self.passkey)
+
+    def _request(self, method: str, path: str, headers: dict, body: Optional[dict] = None,
+                 idempotent: bool = True) -> dict:
+        """
+        Failures before the request was sent are retryable. After it was sent
+        only idempotent requests are; others raise MpesaOutcomeUnknown.
+        """
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        req = request.Request(f"{self.base_url}{path}", data=data, method=method)
+        for key, value in headers.items():
+            req.add_header(key, value)
+        if data is not None:
+            req.add_header("Content-Type", "application/json")
+
+        try:
+            with request.urlopen(req, timeout=self.timeout) as response:
+                return json.loads(response.read().decode("utf-8") or "{}")
+        except error.HTTPError as e:
+            # 401 means our cached token went stale; 5xx is Daraja having a bad moment
+            if e.code == 401:
+                self.invalidate_token()
+            if e.code >= 500 and not idempotent:
+                raise MpesaOutcomeUnknown(f"Daraja returned HTTP {e.code} for {path}; it may have been processed")
+            raise MpesaError(f"Daraja returned HTTP {e.code} for {path}", retryable=e.code == 401 or e.code >= 500)
+        except error.URLError as e:
+            # urllib wraps failures while connecting and sending: Daraja never got the request
+            raise MpesaError(f"Daraja request to {path} failed: {e}", retryable=True)
+        except (TimeoutError, ConnectionError, http.client.HTTPException) as e:
+            # Failed waiting for the response, after the request was sent
+            if not idempotent:
+                raise MpesaOutcomeUnknown(f"No response from Daraja for {path}: {e}")
+            raise MpesaError(f"Daraja request to {path} failed: {e}", retryable=True)
+
+    def get_access_token(self) -> str:
+        """Return a cached OAuth token, fetching a new one if it is missing or about to expire"""
+        with self._token_lock:
+            if self._token and time.monotonic() < self._token_expires_at:
+                return self._token
+
+            credentials = base64.b64encode(
+                f"{self.consumer_key}:{self.consumer_secret}".encode("utf-8")
+            ).decode("ascii")
+            payload = self._request(
+                "GET",
+                "/oauth/v1/generate?grant_type=client_credentials",
+                headers={"Authorization": f"Basic {credentials}"},
+            )
+
+            token = payload.get("access_token")
+            if not token:
+                raise MpesaError("Daraja OAuth response did not include an access token", retryable=True)
+
+            expires_in = int(payload.get("expires_in", 3599))
+            self._token = token
+            self._token_expires_at = time.monotonic() + max(expires_in - self.TOKEN_EXPIRY_MARGIN, 0)
+            return token
+
+    def invalidate_token(self):
+        with self._token_lock:
+            self._token = None
+            self._token_expires_at = 0.0
+
+    def stk_push(self, phone_number: str, amount: float, reference: str, description: str = "Matatu fare") -> dict:
+        """
+        Send an STK push to the customer's phone.
+        Token fetches, connection failures before the push is sent and 401s are
+        retried with exponential backoff. A push that was sent and timed out or
+        got a 5xx is never repeated - that could prompt the customer twice - and
+        raises MpesaOutcomeUnknown.
+        """
+        if not self.is_configured:
+            raise MpesaError("M-Pesa credentials not configured")
+        if len(reference) > ACCOUNT_REFERENCE_MAX:
+            # Payments made before references were shortened; their callback is matched by the full one
+            logger.warning(f"Account reference {reference} cut to {ACCOUNT_REFERENCE_MAX} characters for Daraja")
+
+        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+        password = base64.b64encode(
+            f"{self.shortcode}{self.passkey}{timestamp}".encode("utf-8")
+        ).decode("ascii")
+        body = {
+            "BusinessShortCode": self.shortcode,
+            "Password": password,
+            "Timestamp": timestamp,
+            "TransactionType": "CustomerPayBillOnline",
+            "Amount": int(round(amount)),
+            "PartyA": phone_number,
+            "PartyB": self.shortcode,
+            "PhoneNumber": phone_number,
+            "CallBackURL": self.callback_url,
+            "AccountReference": reference[:ACCOUNT_REFERENCE_MAX],
+            "TransactionDesc": description[:TRANSACTION_DESC_MAX],
+        }
+
+        attempt = 0
+        while True:
+            try:
+                token = self.get_access_token()
+                response = self._request(
+                    "POST",
+                    "/mpesa/stkpush/v1/processrequest",
+                    headers={"Authorization": f"Bearer {token}"},
+                    body=body,
+                    idempotent=False,
+                )
+            except MpesaError as e:
+                attempt += 1
+                if not e.retryable or attempt > self.max_retries:
+                    raise
+                backoff = 0.5 * (2 ** (attempt - 1))
+                logger.warning(f"STK push for {reference} failed ({e}); retry {attempt} in {backoff:.1f}s")
+                time.sleep(backoff)
+                continue
+
+            if str(response.get("ResponseCode", "")) != "0":
+                raise MpesaError(
+                    f"STK push rejected: {response.get('ResponseDescription') or response.get('errorMessage')}"
+                )
+            return response
+
+
+# Global client instance shared by the payment workers
+mpesa_client = MpesaClient()
@@ -0,0 +1,172 @@
+"""
+Vehicle occupancy tracking for SafariSalama
+Counts passengers aboard each vehicle as trips start and end, refuses seats in
+a full vehicle and checkpoints the counts to vehicles.occupancy
+"""
+from typing import Dict, Optional, Set
+import logging
+import threading
+
+from sqlalchemy import func, select, update
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.db.database import SessionLocal
+from app.models.trip import Trip, TripStatus
+from app.models.vehicle import Vehicle
+
+logger = logging.getLogger(__name__)
+
+
+class OccupancyTracker:
+    """
+    The count of a vehicle is changed only under the tracker's lock, so two
+    trips starting at once cannot both take the last seat. Counts live in
+    memory and are written to vehicles.occupancy for vehicles that changed
+    every checkpoint interval; at startup they are rebuilt from ongoing trips.
+
+    Like the other in-memory trackers this assumes one API process: workers
+    would each count only the trips they started.
+    """
+
+    def __init__(self, checkpoint_interval: float = 30.0):
+        self.checkpoint_interval = checkpoint_interval
+
+        self._counts: Dict[object, int] = {}
+        self._dirty: Set[object] = set()
+
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+
+        self.boarded = 0
+        self.refused = 0
+        self.alighted = 0
+
+    def count(self, vehicle_id) -> int:
+        return self._counts.get(vehicle_id, 0)
+
+    def reserve(self, vehicle_id, capacity: Optional[int]) -> bool:
+        """Take a seat; False if the vehicle is full. capacity None means no limit"""
+        with self._lock:
+            current = self._counts.get(vehicle_id, 0)
+            if capacity is not None and current >= capacity:
+                self.refused += 1
+                return False
+            self._counts[vehicle_id] = current + 1
+            self._dirty.add(vehicle_id)
+            self.boarded += 1
+            return True
+
+    def release(self, vehicle_id):
+        """Give a seat back (trip ended, or a reserved trip was never saved)"""
+        with self._lock:
+            current = self._counts.get(vehicle_id, 0)
+            if current <= 1:
+                self._counts.pop(vehicle_id, None)
+            else:
+                self._counts[vehicle_id] = current - 1
+            self._dirty.add(vehicle_id)
+            self.alighted += 1
+
+    @property
+    def passengers(self) -> int:
+        with self._lock:
+            return sum(self._counts.values())
+
+    def reconcile(self) -> int:
+        """Rebuild every count from ongoing trips and store them; returns vehicles occupied"""
+        db = SessionLocal()
+        try:
+            counts = dict(db.execute(
+                select(Trip.vehicle_id, func.count())
+                .where(Trip.trip_status == TripStatus.ongoing)
+                .group_by(Trip.vehicle_id)
+            ).all())
+            # Clear the old checkpoint, then write the occupied vehicles
+            db.execute(
+                update(Vehicle).where(Vehicle.occupancy != 0).values(occupancy=0)
+                .execution_options(synchronize_session=False)
+            )
+            if counts:
+                db.execute(update(Vehicle), [{"id": v, "occupancy": n} for v, n in counts.items()])
+            db.commit()
+        finally:
+            db.close()
+
+        with self._lock:
+            self._counts = counts
+            self._dirty.clear()
+        return len(counts)
+
+    def checkpoint(self) -> int:
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            rows = [{"id": vehicle_id, "occupancy": self._counts.get(vehicle_id, 0)} for vehicle_id in dirty]
+        if not rows:
+            return 0
+
+        db = SessionLocal()
+        try:
+            # Bulk UPDATE by primary key, one statement executed for all rows
+            db.execute(update(Vehicle), rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            with self._lock:
+                self._dirty.update(dirty)
+            raise
+        finally:
+            db.close()
+        return len(rows)
+
+    def start(self):
+        with self._lock:
+            if self._thread:
+                return
+        # Before requests are served, so the first trips see true counts
+        try:
+            occupied = self.reconcile()
+            logger.info(f"Occupancy reconciled: {occupied} vehicles with passengers aboard")
+        except Exception as e:
+            logger.error(f"Occupancy reconcile failed: {e}")
+        with self._lock:
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="vehicle-occupancy", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread:
+            self._stopping.set()
+            thread.join(timeout=timeout)
+        try:
+            self.checkpoint()
+        except Exception as e:
+            logger.error(f"Occupancy checkpoint failed: {e}")
+
+    def _run(self):
+        while not self._stopping.wait(self.checkpoint_interval):
+            try:
+                self.checkpoint()
+            except Exception as e:
+                logger.error(f"Occupancy checkpoint failed: {e}")
+
+
+# Global occupancy tracker instance
+occupancy = OccupancyTracker(checkpoint_interval=settings.OCCUPANCY_CHECKPOINT_SECONDS)
+
+
+def _occupancy_metrics() -> list:
+    return [
+        "# TYPE occupancy_passengers gauge",
+        f"occupancy_passengers {occupancy.passengers}",
+        "# TYPE occupancy_seats_total counter",
+        f'occupancy_seats_total{{outcome="boarded"}} {occupancy.boarded}',
+        f'occupancy_seats_total{{outcome="refused"}} {occupancy.refused}',
+        f'occupancy_seats_total{{outcome="alighted"}} {occupancy.alighted}',
+    ]
+
+
+metrics.register_collector(_occupancy_metrics)
@@ -0,0 +1,203 @@
+"""
+Payment initiation queue for SafariSalama
+Moves M-Pesa STK pushes off the request path onto a pool of worker threads,
+and expires payments left pending or processing with nothing to settle them
+"""
+from typing import Optional, Set
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from uuid import UUID
+import logging
+import queue
+import threading
+
+from sqlalchemy import func, update
+
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.models.payment import Payment, PaymentMethod, PaymentStatus
+from app.services.mpesa_service import MpesaClient, MpesaError, MpesaOutcomeUnknown, mpesa_client
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class StkPushJob:
+    payment_id: str
+    phone_number: str
+    amount: float
+    reference: str
+
+
+class PaymentQueue:
+    """
+    Bounded job queue drained by a fixed pool of worker threads.
+    A payment is only ever queued once at a time, so a double-tapped
+    "Pay" button cannot trigger two STK prompts on the customer's phone.
+
+    Jobs live in memory only: a full queue or a restart drops them, and an
+    accepted push may never get its callback. A sweeper thread fails pending
+    and processing M-Pesa payments untouched for expire_after that this queue does
+    not hold, so the trip can be charged with a new attempt; a late success
+    callback still completes them. Like the queue, it assumes one process.
+    """
+
+    def __init__(self, client: MpesaClient, workers: int = 4, maxsize: int = 10000,
+                 expire_after: float = 600.0, sweep_interval: float = 60.0):
+        self.client = client
+        self.workers = workers
+        self.expire_after = timedelta(seconds=expire_after)
+        self.sweep_interval = sweep_interval
+        self._queue: "queue.Queue[Optional[StkPushJob]]" = queue.Queue(maxsize=maxsize)
+        self._threads = []
+        self._sweeper: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._in_flight: Set[str] = set()
+        self._lock = threading.Lock()
+
+        self.expired = 0
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f"mpesa-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            self._stopping.clear()
+            self._sweeper = threading.Thread(target=self._sweep, name="payment-sweeper", daemon=True)
+            self._sweeper.start()
+        logger.info(f"Payment queue started with {self.workers} workers")
+
+    def stop(self, timeout: float = 5.0):
+        with self._lock:
+            threads, self._threads = self._threads, []
+            sweeper, self._sweeper = self._sweeper, None
+        for _ in threads:
+            self._queue.put(None)
+        self._stopping.set()
+        for thread in threads + ([sweeper] if sweeper else []):
+            thread.join(timeout=timeout)
+
+    def enqueue(self, job: StkPushJob) -> bool:
+        """
+        Queue an STK push. Returns False if the payment is already queued/in progress
+        or the queue is full (the payment then stays pending and can be retried).
+        """
+        if not self._threads:
+            self.start()
+
+        with self._lock:
+            if job.payment_id in self._in_flight:
+                return False
+            self._in_flight.add(job.payment_id)
+
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                self._in_flight.discard(job.payment_id)
+            logger.error(f"Payment queue full; STK push for {job.reference} not queued")
+            return False
+        return True
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            try:
+                self._process(job)
+            except Exception as e:
+                logger.error(f"Unexpected error processing STK push for {job.reference}: {e}")
+            finally:
+                with self._lock:
+                    self._in_flight.discard(job.payment_id)
+                self._queue.task_done()
+
+    def _process(self, job: StkPushJob):
+        try:
+            response = self.client.stk_push(
+                phone_number=job.phone_number,
+                amount=job.amount,
+                reference=job.reference,
+            )
+        except MpesaOutcomeUnknown as e:
+            # The prompt may be on the customer's phone; wait for the callback, reconciliation or expiry
+            logger.warning(f"Mpesa STK push for {job.reference} may have been sent: {e}")
+            self._transition(job.payment_id, PaymentStatus.processing)
+            return
+        except MpesaError as e:
+            logger.error(f"Mpesa STK initiation failed for {job.reference}: {e}")
+            self._transition(job.payment_id, PaymentStatus.failed)
+            return
+
+        logger.info(f"Mpesa STK push accepted for {job.reference}: {response.get('CheckoutRequestID')}")
+        self._transition(job.payment_id, PaymentStatus.processing)
+
+    def expire_stale(self, now: Optional[datetime] = None) -> int:
+        """Fail pending/processing M-Pesa payments untouched for expire_after and not queued here"""
+        cutoff = (now or datetime.utcnow()) - self.expire_after
+        with self._lock:
+            queued = [UUID(payment_id) for payment_id in self._in_flight]
+        stmt = update(Payment).where(
+            # Cash, card and wallet payments wait for manual confirmation; only STK pushes expire
+            Payment.payment_method == PaymentMethod.mpesa,
+            Payment.payment_status.in_((PaymentStatus.pending, PaymentStatus.processing)),
+            Payment.updated_at < cutoff,
+        )
+        if queued:
+            stmt = stmt.where(Payment.id.notin_(queued))
+        db = SessionLocal()
+        try:
+            expired = db.execute(
+                stmt.values(payment_status=PaymentStatus.failed, updated_at=func.now())
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        if expired:
+            self.expired += expired
+            logger.info(f"Expired {expired} payments left pending or processing")
+        return expired
+
+    def _sweep(self):
+        while not self._stopping.wait(self.sweep_interval):
+            try:
+                self.expire_stale()
+            except Exception as e:
+                logger.error(f"Expiring stale payments failed: {e}")
+
+    @staticmethod
+    def _transition(payment_id: str, new_status: PaymentStatus):
+        # Only move payments that are still pending, so a callback that
+        # already completed the payment is never overwritten.
+        db = SessionLocal()
+        try:
+            db.query(Payment).filter(
+                Payment.id == UUID(payment_id),
+                Payment.payment_status == PaymentStatus.pending
+            ).update({"payment_status": new_status}, synchronize_session=False)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+
+# Global payment queue instance
+payment_queue = PaymentQueue(
+    client=mpesa_client,
+    workers=settings.MPESA_WORKERS,
+    expire_after=settings.PAYMENT_EXPIRE_MINUTES * 60.0,
+    sweep_interval=settings.PAYMENT_SWEEP_SECONDS,
+)
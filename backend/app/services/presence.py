@@ -0,0 +1,259 @@
+"""
+Vehicle presence tracking for SafariSalama
+Keeps each vehicle's offline deadline in a timing wheel and marks vehicles that
+went silent as offline in one bulk UPDATE per sweep, telling route subscribers
+"""
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime, timedelta
+import asyncio
+import logging
+import threading
+import time
+
+from sqlalchemy import or_, select, update
+
+from app.core.cache import vehicle_cache
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.db.database import SessionLocal
+from app.models.vehicle import Vehicle
+from app.services.fleet_changes import fleet_changes
+
+logger = logging.getLogger(__name__)
+
+# Vehicle ids per UPDATE statement; bounds the IN list
+CHUNK_VEHICLES = 1000
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+class PresenceTracker:
+    """
+    Each vehicle has one entry in a timing wheel, in the slot of the offline
+    deadline (last seen + offline_after) it had when the entry was made. A
+    location update only records the new last-seen time. A sweep pops the slots
+    whose time has passed: vehicles heard from since are moved to their new
+    deadline, the rest have expired. A tick therefore costs O(expired +
+    rescheduled) - each vehicle is looked at about once per offline window,
+    not once per update and not once per tick.
+
+    Workers only see their own updates, so the UPDATE re-checks
+    last_location_update and never takes offline a vehicle another worker heard
+    from. A periodic reconcile pass over the vehicles table catches vehicles this
+    process never saw (other workers, direct DB writes, restarts).
+    """
+
+    def __init__(self, offline_after: float = 300.0, interval: float = 5.0,
+                 reconcile_interval: float = 600.0, resolution: float = 1.0):
+        self.offline_after = timedelta(seconds=offline_after)
+        self.interval = interval
+        self.reconcile_interval = reconcile_interval
+        self.resolution = resolution
+
+        self._slots: Dict[int, List[object]] = {}
+        self._last_seen: Dict[object, datetime] = {}
+        self._routes: Dict[object, Optional[object]] = {}
+        self._cursor: Optional[int] = None
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+
+        self.marked_offline = 0
+
+    def _slot(self, at: datetime) -> int:
+        return int((at - _EPOCH).total_seconds() // self.resolution)
+
+    def _schedule(self, vehicle_id, deadline: datetime):
+        slot = self._slot(deadline)
+        if self._cursor is not None and slot < self._cursor:
+            slot = self._cursor  # already overdue: expires on the next sweep
+        self._slots.setdefault(slot, []).append(vehicle_id)
+
+    @property
+    def tracked(self) -> int:
+        return len(self._last_seen)
+
+    def seen(self, vehicle_id, route_id, at: datetime):
+        """Record a location update; a timestamp older than the one held is ignored"""
+        with self._lock:
+            self._routes[vehicle_id] = route_id
+            previous = self._last_seen.get(vehicle_id)
+            if previous is None:
+                self._last_seen[vehicle_id] = at
+                self._schedule(vehicle_id, at + self.offline_after)
+            elif at > previous:
+                self._last_seen[vehicle_id] = at
+
+    def expire(self, now: datetime) -> List[Tuple[object, Optional[object]]]:
+        """Remove and return (vehicle_id, route_id) of every vehicle past its deadline"""
+        now_slot = self._slot(now)
+        expired = []
+        with self._lock:
+            if self._cursor is None or now_slot - self._cursor > len(self._slots):
+                # First sweep or a long pause: cheaper to look at the occupied slots than walk the gap
+                due = sorted(s for s in self._slots if s < now_slot)
+            else:
+                due = range(self._cursor, now_slot)
+            self._cursor = now_slot
+            for slot in due:
+                for vehicle_id in self._slots.pop(slot, ()):
+                    deadline = self._last_seen[vehicle_id] + self.offline_after
+                    if deadline >= now:
+                        self._schedule(vehicle_id, deadline)
+                    else:
+                        del self._last_seen[vehicle_id]
+                        expired.append((vehicle_id, self._routes.pop(vehicle_id, None)))
+        return expired
+
+    def sweep(self, now: Optional[datetime] = None) -> int:
+        """Mark expired vehicles offline; returns how many actually went offline"""
+        now = now or datetime.utcnow()
+        expired = self.expire(now)
+        if not expired:
+            return 0
+
+        cutoff = now - self.offline_after
+        ids = [vehicle_id for vehicle_id, _ in expired]
+        offline = []
+        db = SessionLocal()
+        try:
+            for start in range(0, len(ids), CHUNK_VEHICLES):
+                offline += db.execute(
+                    update(Vehicle)
+                    .where(
+                        Vehicle.id.in_(ids[start:start + CHUNK_VEHICLES]),
+                        Vehicle.is_online == True,
+                        Vehicle.last_location_update < cutoff,
+                    )
+                    .values(is_online=False)
+                    .returning(Vehicle.id, Vehicle.route_id, Vehicle.last_location_update)
+                    .execution_options(synchronize_session=False)
+                ).all()
+            db.commit()
+        except Exception:
+            db.rollback()
+            # Put them back so the next sweep retries
+            for vehicle_id, route_id in expired:
+                self.seen(vehicle_id, route_id, cutoff)
+            raise
+        finally:
+            db.close()
+
+        self._announce(offline)
+        return len(offline)
+
+    def reconcile(self, now: Optional[datetime] = None) -> int:
+        """
+        Full pass over the vehicles table: take stale online vehicles offline and
+        start tracking online vehicles this process has not heard from.
+        """
+        now = now or datetime.utcnow()
+        cutoff = now - self.offline_after
+        db = SessionLocal()
+        try:
+            offline = db.execute(
+                update(Vehicle)
+                .where(
+                    Vehicle.is_online == True,
+                    or_(Vehicle.last_location_update == None, Vehicle.last_location_update < cutoff),
+                )
+                .values(is_online=False)
+                .returning(Vehicle.id, Vehicle.route_id, Vehicle.last_location_update)
+                .execution_options(synchronize_session=False)
+            ).all()
+            db.commit()
+            online = db.execute(
+                select(Vehicle.id, Vehicle.route_id, Vehicle.last_location_update)
+                .where(Vehicle.is_online == True)
+            ).all()
+        finally:
+            db.close()
+
+        for vehicle_id, route_id, last_seen in online:
+            if last_seen:
+                self.seen(vehicle_id, route_id, last_seen)
+        self._announce(offline)
+        return len(offline)
+
+    def _announce(self, offline: list):
+        if not offline:
+            return
+        self.marked_offline += len(offline)
+        fleet_changes.record(*(vehicle_id for vehicle_id, _, _ in offline))
+        vehicle_cache.invalidate(*(vehicle_id for vehicle_id, _, _ in offline))
+        logger.info(f"Marked {len(offline)} silent vehicles offline")
+
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        from app.websockets.manager import connection_manager
+
+        for vehicle_id, route_id, last_seen in offline:
+            if not route_id:
+                continue
+            asyncio.run_coroutine_threadsafe(
+                connection_manager.broadcast_vehicle_offline(
+                    route_id=str(route_id),
+                    vehicle_data={
+                        "vehicle_id": str(vehicle_id),
+                        "last_seen": last_seen.isoformat() if last_seen else None,
+                    },
+                ),
+                loop,
+            )
+
+    def start(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        """loop: the event loop WebSocket broadcasts are scheduled on"""
+        with self._lock:
+            if self._thread:
+                return
+            self._loop = loop
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="vehicle-presence", daemon=True)
+            self._thread.start()
+        logger.info(f"Vehicle presence started (offline after {self.offline_after.total_seconds():.0f}s)")
+
+    def stop(self, timeout: float = 5.0):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread:
+            self._stopping.set()
+            thread.join(timeout=timeout)
+        self._loop = None
+
+    def _run(self):
+        # Reconcile first so vehicles left online by a previous run are swept
+        next_reconcile = time.monotonic()
+        while True:
+            try:
+                if time.monotonic() >= next_reconcile:
+                    self.reconcile()
+                    next_reconcile = time.monotonic() + self.reconcile_interval
+                else:
+                    self.sweep()
+            except Exception as e:
+                logger.error(f"Vehicle presence sweep failed: {e}")
+            if self._stopping.wait(self.interval):
+                return
+
+
+# Global presence tracker instance
+presence = PresenceTracker(
+    offline_after=settings.VEHICLE_OFFLINE_AFTER_SECONDS,
+    interval=settings.PRESENCE_SWEEP_INTERVAL_SECONDS,
+    reconcile_interval=settings.PRESENCE_RECONCILE_MINUTES * 60.0,
+)
+
+
+def _presence_metrics() -> list:
+    return [
+        "# TYPE presence_tracked_vehicles gauge",
+        f"presence_tracked_vehicles {presence.tracked}",
+        "# TYPE presence_marked_offline_total counter",
+        f"presence_marked_offline_total {presence.marked_offline}",
+    ]
+
+
+metrics.register_collector(_presence_metrics)
@@ -0,0 +1,247 @@
+"""
+Payment reconciliation for SafariSalama
+Streams an M-Pesa statement (CSV) and reconciles it against the payments table
+in fixed-size chunks, so memory stays bounded for multi-million-row statements
+"""
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+import csv
+import logging
+
+from sqlalchemy import or_, select
+from sqlalchemy.orm import Session
+
+from app.models.payment import Payment, PaymentStatus
+from app.services.mpesa_callbacks import MpesaCallback, apply_callbacks
+
+logger = logging.getLogger(__name__)
+
+# Accepted header names, in order of preference (M-Pesa org statement, B2C report, our own exports)
+RECEIPT_COLUMNS = ("Receipt No.", "Receipt No", "TransactionID", "transaction_id", "mpesa_transaction_id")
+REFERENCE_COLUMNS = ("A/C No.", "Account No.", "AccountReference", "reference", "reference_number")
+AMOUNT_COLUMNS = ("Paid In", "Amount", "amount")
+STATUS_COLUMNS = ("Transaction Status", "Status", "status")
+
+SUCCESS_STATUSES = {"completed", "complete", "success", "successful"}
+FAILURE_STATUSES = {"failed", "cancelled", "canceled", "expired", "reversed"}
+
+
+@dataclass
+class StatementRow:
+    line: int
+    receipt: Optional[str]
+    reference: Optional[str]
+    amount: Optional[Decimal]
+    succeeded: Optional[bool]
+
+
+@dataclass
+class ReconciliationSummary:
+    rows: int = 0
+    matched: int = 0
+    corrected_completed: int = 0
+    corrected_failed: int = 0
+    amount_mismatches: int = 0
+    status_conflicts: int = 0
+    unmatched: int = 0
+    unreadable: int = 0
+    chunks: int = 0
+    by_kind: Dict[str, int] = field(default_factory=dict)
+
+    def as_dict(self) -> dict:
+        return {
+            "rows": self.rows,
+            "matched": self.matched,
+            "corrected_completed": self.corrected_completed,
+            "corrected_failed": self.corrected_failed,
+            "amount_mismatches": self.amount_mismatches,
+            "status_conflicts": self.status_conflicts,
+            "unmatched": self.unmatched,
+            "unreadable": self.unreadable,
+            "chunks": self.chunks,
+            "by_kind": dict(self.by_kind),
+        }
+
+
+def _pick(header: List[str], candidates) -> Optional[str]:
+    for name in candidates:
+        if name in header:
+            return name
+    return None
+
+
+def _field(record: dict, column: Optional[str]) -> Optional[str]:
+    if not column:
+        return None
+    return (record.get(column) or "").strip() or None
+
+
+def _parse_amount(value: Optional[str]) -> Optional[Decimal]:
+    if not value:
+        return None
+    try:
+        return Decimal(value.replace(",", "").strip())
+    except InvalidOperation:
+        return None
+
+
+def _parse_status(value: Optional[str]) -> Optional[bool]:
+    if not value:
+        return True  # statements of settled transactions often omit the column
+    value = value.strip().lower()
+    if value in SUCCESS_STATUSES:
+        return True
+    if value in FAILURE_STATUSES:
+        return False
+    return None
+
+
+def read_statement(stream: TextIO) -> Iterator[StatementRow]:
+    """Lazily parse statement rows; only the current row is held in memory"""
+    reader = csv.DictReader(stream)
+    header = reader.fieldnames or []
+    receipt_col = _pick(header, RECEIPT_COLUMNS)
+    reference_col = _pick(header, REFERENCE_COLUMNS)
+    amount_col = _pick(header, AMOUNT_COLUMNS)
+    status_col = _pick(header, STATUS_COLUMNS)
+
+    if not receipt_col and not reference_col:
+        raise ValueError(
+            f"Statement needs a receipt column {RECEIPT_COLUMNS} or a reference column {REFERENCE_COLUMNS}"
+        )
+
+    for line, record in enumerate(reader, start=2):
+        yield StatementRow(
+            line=line,
+            receipt=_field(record, receipt_col),
+            reference=_field(record, reference_col),
+            amount=_parse_amount(_field(record, amount_col)),
+            succeeded=_parse_status(_field(record, status_col)),
+        )
+
+
+def _chunks(rows: Iterable[StatementRow], size: int) -> Iterator[List[StatementRow]]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class PaymentReconciler:
+    """
+    Reconciles statement rows against payments chunk by chunk:
+    one query fetches the payments a chunk refers to, an in-memory hash join
+    on receipt and reference matches them, and corrections are applied with
+    the same set-based transitions as M-Pesa callbacks.
+    """
+
+    def __init__(self, db: Session, chunk_size: int = 5000, dry_run: bool = False, report: Optional[TextIO] = None):
+        self.db = db
+        self.chunk_size = chunk_size
+        self.dry_run = dry_run
+        self.summary = ReconciliationSummary()
+        self._report = csv.writer(report) if report is not None else None
+        if self._report:
+            self._report.writerow(["line", "kind", "receipt", "reference", "payment_id", "db_status", "db_amount", "statement_amount"])
+
+    def _write(self, kind: str, row: StatementRow, payment=None):
+        self.summary.by_kind[kind] = self.summary.by_kind.get(kind, 0) + 1
+        if self._report:
+            self._report.writerow([
+                row.line, kind, row.receipt, row.reference,
+                payment.id if payment else None,
+                payment.payment_status.value if payment and payment.payment_status else None,
+                payment.amount if payment else None,
+                row.amount,
+            ])
+
+    def _load_payments(self, chunk: List[StatementRow]):
+        receipts = {r.receipt for r in chunk if r.receipt}
+        references = {r.reference for r in chunk if r.reference}
+        conditions = []
+        if receipts:
+            conditions.append(Payment.mpesa_transaction_id.in_(receipts))
+        if references:
+            conditions.append(Payment.reference_number.in_(references))
+        if not conditions:
+            return {}, {}
+
+        rows = self.db.execute(
+            select(
+                Payment.id,
+                Payment.reference_number,
+                Payment.mpesa_transaction_id,
+                Payment.amount,
+                Payment.payment_status,
+            ).where(or_(*conditions))
+        ).all()
+
+        by_receipt = {p.mpesa_transaction_id: p for p in rows if p.mpesa_transaction_id}
+        by_reference = {p.reference_number: p for p in rows if p.reference_number}
+        return by_receipt, by_reference
+
+    def reconcile_chunk(self, chunk: List[StatementRow]):
+        by_receipt, by_reference = self._load_payments(chunk)
+        corrections: List[MpesaCallback] = []
+        claimed_receipts: Dict[str, object] = {}
+
+        for row in chunk:
+            self.summary.rows += 1
+            if row.succeeded is None:
+                self.summary.unreadable += 1
+                self._write("unreadable_status", row)
+                continue
+
+            payment = by_receipt.get(row.receipt) if row.receipt else None
+            if payment is None and row.reference:
+                payment = by_reference.get(row.reference)
+            if payment is None:
+                self.summary.unmatched += 1
+                self._write("unmatched", row)
+                continue
+
+            if row.receipt:
+                # mpesa_transaction_id is unique: one receipt can only settle one payment
+                claimed = claimed_receipts.setdefault(row.receipt, payment.id)
+                if claimed != payment.id:
+                    self.summary.status_conflicts += 1
+                    self._write("duplicate_receipt", row, payment)
+                    continue
+
+            self.summary.matched += 1
+            if row.amount is not None and payment.amount is not None and row.amount != payment.amount:
+                self.summary.amount_mismatches += 1
+                # Not corrected automatically: a statement line for less must not complete the payment
+                self._write("amount_mismatch", row, payment)
+                continue
+
+            status = payment.payment_status
+            if row.succeeded and status in (PaymentStatus.pending, PaymentStatus.processing, PaymentStatus.failed):
+                self.summary.corrected_completed += 1
+                self._write("corrected_to_completed", row, payment)
+                if payment.reference_number:
+                    corrections.append(MpesaCallback(payment.reference_number, row.receipt or payment.mpesa_transaction_id, True))
+            elif not row.succeeded and status in (PaymentStatus.pending, PaymentStatus.processing):
+                self.summary.corrected_failed += 1
+                self._write("corrected_to_failed", row, payment)
+                if payment.reference_number:
+                    corrections.append(MpesaCallback(payment.reference_number, row.receipt or "", False))
+            elif not row.succeeded and status == PaymentStatus.completed:
+                # Never downgrade automatically; finance has to look at these
+                self.summary.status_conflicts += 1
+                self._write("completed_but_failed_on_statement", row, payment)
+
+        if corrections and not self.dry_run:
+            apply_callbacks(self.db, corrections)
+        self.summary.chunks += 1
+
+    def run(self, rows: Iterable[StatementRow]) -> ReconciliationSummary:
+        for chunk in _chunks(rows, self.chunk_size):
+            self.reconcile_chunk(chunk)
+            logger.info(f"Reconciled {self.summary.rows} statement rows")
+        return self.summary
@@ -0,0 +1,127 @@
+"""
+Sacco trip analytics for SafariSalama
+Counts and fares of a sacco's completed trips, aggregated in the database by
+time bucket and optionally by route, vehicle or driver, and streamed to the
+client as the rows arrive
+"""
+from typing import Iterator, Optional
+from datetime import datetime, timedelta
+from uuid import UUID
+import logging
+
+from sqlalchemy import func, select
+from sqlalchemy.engine import Connection
+
+from app.core.config import settings
+from app.core.responses import dumps
+from app.models.trip import Trip, TripStatus
+from app.models.vehicle import Vehicle
+
+logger = logging.getLogger(__name__)
+
+BUCKETS = ("hour", "day", "week")
+BREAKDOWNS = {
+    "route": Trip.route_id,
+    "vehicle": Trip.vehicle_id,
+    "driver": Trip.driver_id,
+}
+
+# Rows fetched from the cursor per round-trip while streaming
+CHUNK_ROWS = 5000
+
+# SQLite has no date_trunc; these strftime calls produce the same bucket starts
+_SQLITE_BUCKETS = {
+    "hour": ("%Y-%m-%dT%H:00:00",),
+    "day": ("%Y-%m-%dT00:00:00",),
+    # Back to the Monday on or before the day, as date_trunc('week') does
+    "week": ("%Y-%m-%dT00:00:00", "-6 days", "weekday 1"),
+}
+
+
+def check_options(bucket: Optional[str], group_by: Optional[str]):
+    if bucket is not None and bucket not in BUCKETS:
+        raise ValueError(f"bucket must be one of: {', '.join(BUCKETS)}")
+    if group_by is not None and group_by not in BREAKDOWNS:
+        raise ValueError(f"group_by must be one of: {', '.join(BREAKDOWNS)}")
+
+
+def _bucket_start(dialect: str, bucket: str):
+    """Start of the bucket holding a trip's end_time, in service-local time, as ISO text"""
+    offset = settings.SERVICE_UTC_OFFSET_HOURS
+    if dialect == "sqlite":
+        fmt, *modifiers = _SQLITE_BUCKETS[bucket]
+        return func.strftime(fmt, Trip.end_time, f"{offset:+d} hours", *modifiers)
+    local = Trip.end_time + timedelta(hours=offset)
+    return func.to_char(func.date_trunc(bucket, local), 'YYYY-MM-DD"T"HH24:MI:SS')
+
+
+def _sacco_trips(sacco_id: UUID, start: datetime, end: datetime) -> list:
+    return [
+        Vehicle.sacco_id == sacco_id,
+        Trip.trip_status == TripStatus.completed,
+        Trip.end_time >= start,
+        Trip.end_time < end,
+    ]
+
+
+def totals_query(sacco_id: UUID, start: datetime, end: datetime):
+    """One row: trips and fares in the window, and the sacco's vehicle count"""
+    vehicles = select(func.count()).select_from(Vehicle).where(Vehicle.sacco_id == sacco_id).scalar_subquery()
+    return select(
+        func.count().label("trips"),
+        func.coalesce(func.sum(Trip.fare_amount), 0).label("earnings"),
+        vehicles.label("vehicles"),
+    ).select_from(Trip).join(Vehicle, Vehicle.id == Trip.vehicle_id).where(*_sacco_trips(sacco_id, start, end))
+
+
+def breakdown_query(
+    dialect: str,
+    sacco_id: UUID,
+    start: datetime,
+    end: datetime,
+    bucket: Optional[str] = None,
+    group_by: Optional[str] = None,
+):
+    """Trips and fares per bucket and/or key, ordered by bucket then key"""
+    keys = []
+    if bucket is not None:
+        keys.append(_bucket_start(dialect, bucket).label("bucket"))
+    if group_by is not None:
+        keys.append(BREAKDOWNS[group_by].label(f"{group_by}_id"))
+    return select(
+        *keys,
+        func.count().label("trips"),
+        func.coalesce(func.sum(Trip.fare_amount), 0).label("earnings"),
+    ).select_from(Trip).join(Vehicle, Vehicle.id == Trip.vehicle_id).where(
+        *_sacco_trips(sacco_id, start, end)
+    ).group_by(*keys).order_by(*keys)
+
+
+def stream_breakdown(conn: Connection, query, header: dict, chunk_rows: int = CHUNK_ROWS) -> Iterator[bytes]:
+    """
+    A JSON object: the header fields, "rows" as they come off a server-side
+    cursor, then the totals over those rows
+    """
+    result = conn.execution_options(stream_results=True, yield_per=chunk_rows).execute(query)
+    names = list(result.keys())
+    trips = 0
+    earnings = 0.0
+    yield dumps(header)[:-1] + b',"rows":['
+    first = True
+    for chunk in result.partitions(chunk_rows):
+        parts = []
+        for row in chunk:
+            item = dict(zip(names, row))
+            item["earnings"] = float(item["earnings"])
+            item["average_trip_value"] = item["earnings"] / item["trips"] if item["trips"] else 0.0
+            trips += item["trips"]
+            earnings += item["earnings"]
+            parts.append(dumps(item))
+        if parts:
+            yield (b"" if first else b",") + b",".join(parts)
+            first = False
+    yield b"]," + dumps({
+        "total_trips": trips,
+        "total_earnings": earnings,
+        "average_trip_value": earnings / trips if trips else 0.0,
+    })[1:]
@@ -0,0 +1,275 @@
+"""
+GPS track compaction for SafariSalama
+Decides which gps_points are keyframes (needed to rebuild a track within
+tolerance) and removes the rest once they leave the raw window
+"""
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime, timedelta
+import logging
+import threading
+
+from sqlalchemy import delete, exists, select, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.db.database import SessionLocal
+from app.models.gps_point import GpsPoint
+from app.models.trip import Trip, TripStatus
+from app.services.trajectory import Fix, OnlineSimplifier, simplify
+
+logger = logging.getLogger(__name__)
+
+COMPRESSION_MODES = ("off", "ingest", "batch")
+
+# Rows simplified per statement batch; also bounds the size of IN lists
+CHUNK_POINTS = 5000
+
+
+def _fix(point) -> Fix:
+    return Fix(float(point.latitude), float(point.longitude), point.timestamp.timestamp(), (point.id, point.timestamp))
+
+
+class TrackCompactor:
+    """
+    keyframe is NULL for raw points, True for points that must be kept and False
+    for points that may go once older than the raw window.
+
+    ingest: an OnlineSimplifier per vehicle marks points as fixes arrive.
+            Assumes one process sees all of a vehicle's fixes; anything it never
+            decided (restarts, other workers) is picked up by the batch pass.
+    batch:  closed trips, then any other undecided history, are simplified with
+            Douglas-Peucker once they leave the raw window.
+    """
+
+    def __init__(self, mode: str = "off", tolerance_m: float = 15.0, raw_window_hours: float = 24,
+                 interval: float = 600.0, max_trips: int = 500):
+        if mode not in COMPRESSION_MODES:
+            raise ValueError(f"GPS compression mode must be one of {', '.join(COMPRESSION_MODES)}")
+        self.mode = mode
+        self.tolerance_m = tolerance_m
+        self.raw_window = timedelta(hours=raw_window_hours)
+        self.interval = interval
+        self.max_trips = max_trips
+        self._online: Dict[object, OnlineSimplifier] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+
+        self.points_kept = 0
+        self.points_dropped = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    # Ingest path
+
+    def observe(self, db: Session, point: GpsPoint):
+        """
+        Feed a new fix (added to db but not yet flushed) to its vehicle's simplifier
+        and record any decisions in the same transaction. The point needs its id set.
+        """
+        if self.mode != "ingest":
+            return
+        with self._lock:
+            simplifier = self._online.get(point.vehicle_id)
+            if simplifier is None:
+                simplifier = self._online[point.vehicle_id] = OnlineSimplifier(self.tolerance_m)
+            decisions = simplifier.push(_fix(point))
+
+        earlier = []
+        for fix, keep in decisions:
+            if fix.ref[0] == point.id:
+                point.keyframe = keep
+            else:
+                earlier.append((fix, keep))
+        self._mark(db, earlier)
+
+    def _mark(self, db: Session, decisions: List[Tuple[Fix, bool]]):
+        if not decisions:
+            return
+        ids = [fix.ref[0] for fix, _ in decisions]
+        keep_ids = [fix.ref[0] for fix, keep in decisions if keep]
+        timestamps = [fix.ref[1] for fix, _ in decisions]
+        db.execute(
+            update(GpsPoint)
+            .where(
+                GpsPoint.id.in_(ids),
+                # Lets PostgreSQL prune to the partitions the window spans
+                GpsPoint.timestamp.between(min(timestamps), max(timestamps)),
+            )
+            .values(keyframe=GpsPoint.id.in_(keep_ids) if keep_ids else False)
+            .execution_options(synchronize_session=False)
+        )
+        self.points_kept += len(keep_ids)
+        self.points_dropped += len(ids) - len(keep_ids)
+
+    def flush_online(self):
+        """Finalize open windows so a clean shutdown leaves nothing undecided"""
+        with self._lock:
+            simplifiers, self._online = self._online, {}
+        decisions = [d for s in simplifiers.values() for d in s.flush()]
+        if not decisions:
+            return
+        db = SessionLocal()
+        try:
+            for start in range(0, len(decisions), CHUNK_POINTS):
+                self._mark(db, decisions[start:start + CHUNK_POINTS])
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to flush GPS keyframe decisions: {e}")
+        finally:
+            db.close()
+
+    # Batch path
+
+    def compact_span(self, db: Session, vehicle_id, start: Optional[datetime], end: datetime) -> Tuple[int, int]:
+        """
+        Simplify the undecided points of one vehicle in [start, end) and delete
+        the ones not needed. Returns (kept, dropped).
+        """
+        kept_total = dropped_total = 0
+        cursor = start
+        while True:
+            query = (
+                select(GpsPoint.id, GpsPoint.latitude, GpsPoint.longitude, GpsPoint.timestamp)
+                .where(GpsPoint.vehicle_id == vehicle_id, GpsPoint.keyframe.is_(None), GpsPoint.timestamp < end)
+                .order_by(GpsPoint.timestamp)
+                .limit(CHUNK_POINTS)
+            )
+            if cursor is not None:
+                query = query.where(GpsPoint.timestamp >= cursor)
+            rows = db.execute(query).all()
+            if not rows:
+                break
+
+            fixes = [_fix(r) for r in rows]
+            kept = [fixes[i].ref for i in simplify(fixes, self.tolerance_m)]
+            first, last = rows[0].timestamp, rows[-1].timestamp
+            db.execute(
+                update(GpsPoint)
+                .where(GpsPoint.id.in_([k[0] for k in kept]), GpsPoint.timestamp.between(first, last))
+                .values(keyframe=True)
+                .execution_options(synchronize_session=False)
+            )
+            dropped = db.execute(
+                delete(GpsPoint)
+                .where(
+                    GpsPoint.vehicle_id == vehicle_id,
+                    GpsPoint.keyframe.is_(None),
+                    GpsPoint.timestamp.between(first, last),
+                )
+                .execution_options(synchronize_session=False)
+            ).rowcount or 0
+            db.commit()
+
+            kept_total += len(kept)
+            dropped_total += dropped
+            if len(rows) < CHUNK_POINTS:
+                break
+            # The chunk's last point is a keyframe, so the next chunk starts after it
+            cursor = last
+        return kept_total, dropped_total
+
+    def compact(self, now: Optional[datetime] = None) -> dict:
+        """One batch pass: closed trips, then remaining undecided history, then ingest drops"""
+        cutoff = (now or datetime.utcnow()) - self.raw_window
+        summary = {"trips": 0, "vehicles": 0, "kept": 0, "dropped": 0}
+        db = SessionLocal()
+        try:
+            # Closed trips first, so each trip is simplified as one track
+            has_raw = exists().where(
+                GpsPoint.vehicle_id == Trip.vehicle_id,
+                GpsPoint.keyframe.is_(None),
+                GpsPoint.timestamp.between(Trip.start_time, Trip.end_time),
+            )
+            trips = db.execute(
+                select(Trip.vehicle_id, Trip.start_time, Trip.end_time)
+                .where(Trip.trip_status == TripStatus.completed, Trip.end_time < cutoff, has_raw)
+                .order_by(Trip.end_time)
+                .limit(self.max_trips)
+            ).all()
+            for trip in trips:
+                kept, dropped = self.compact_span(db, trip.vehicle_id, trip.start_time, trip.end_time + timedelta(microseconds=1))
+                summary["trips"] += 1
+                summary["kept"] += kept
+                summary["dropped"] += dropped
+
+            vehicle_ids = db.execute(
+                select(GpsPoint.vehicle_id).where(GpsPoint.keyframe.is_(None), GpsPoint.timestamp < cutoff).distinct()
+            ).scalars().all()
+            for vehicle_id in vehicle_ids:
+                kept, dropped = self.compact_span(db, vehicle_id, None, cutoff)
+                summary["vehicles"] += 1
+                summary["kept"] += kept
+                summary["dropped"] += dropped
+
+            # Points the online simplifier already ruled out
+            summary["dropped"] += db.execute(
+                delete(GpsPoint)
+                .where(GpsPoint.keyframe.is_(False), GpsPoint.timestamp < cutoff)
+                .execution_options(synchronize_session=False)
+            ).rowcount or 0
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        self.points_kept += summary["kept"]
+        self.points_dropped += summary["dropped"]
+        if summary["kept"] or summary["dropped"]:
+            ratio = (summary["kept"] + summary["dropped"]) / summary["kept"] if summary["kept"] else 0.0
+            logger.info(
+                f"Compacted GPS history: {summary['trips']} trips, {summary['vehicles']} vehicles, "
+                f"{summary['kept']} kept / {summary['dropped']} dropped ({ratio:.1f}x)"
+            )
+        return summary
+
+    def start(self):
+        with self._lock:
+            if self._thread or not self.enabled:
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="gps-compaction", daemon=True)
+            self._thread.start()
+        logger.info(f"GPS track compaction started (mode={self.mode}, tolerance={self.tolerance_m}m)")
+
+    def stop(self, timeout: float = 5.0):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread:
+            self._stopping.set()
+            thread.join(timeout=timeout)
+        if self.mode == "ingest":
+            self.flush_online()
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            try:
+                self.compact()
+            except Exception as e:
+                logger.error(f"GPS track compaction failed: {e}")
+
+
+# Global track compactor instance
+track_compactor = TrackCompactor(
+    mode=settings.GPS_COMPRESSION_MODE,
+    tolerance_m=settings.GPS_COMPRESSION_TOLERANCE_M,
+    raw_window_hours=settings.GPS_RAW_WINDOW_HOURS,
+    interval=settings.GPS_COMPRESSION_INTERVAL_MINUTES * 60.0,
+)
+
+
+def _compaction_metrics() -> list:
+    return [
+        "# TYPE gps_compaction_points_total counter",
+        f'gps_compaction_points_total{{outcome="kept"}} {track_compactor.points_kept}',
+        f'gps_compaction_points_total{{outcome="dropped"}} {track_compactor.points_dropped}',
+    ]
+
+
+metrics.register_collector(_compaction_metrics)
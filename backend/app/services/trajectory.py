@@ -0,0 +1,183 @@
+"""
+Trajectory simplification for SafariSalama
+Douglas-Peucker for stored tracks and an online opening-window simplifier for
+live ingest. Both measure error as synchronized Euclidean distance (SED): how far
+the position interpolated at a fix's timestamp is from where the vehicle really was
+"""
+from typing import Any, Iterable, List, Optional, Sequence, Tuple
+from dataclasses import dataclass
+from math import cos, hypot, radians
+
+EARTH_RADIUS_M = 6371008.8
+
+# A gap this long means the device was off; never interpolate across it
+DEFAULT_MAX_GAP_SECONDS = 300.0
+
+
+@dataclass(frozen=True)
+class Fix:
+    lat: float
+    lon: float
+    t: float  # epoch seconds
+    ref: Any = None  # caller's handle (e.g. the gps_points key), carried through untouched
+
+
+class _Projection:
+    """Equirectangular projection to metres; accurate to well under 1% across a city"""
+
+    __slots__ = ("kx", "ky")
+
+    def __init__(self, ref_lat: float):
+        self.ky = radians(1.0) * EARTH_RADIUS_M
+        self.kx = self.ky * cos(radians(ref_lat))
+
+    def xy(self, fix: Fix) -> Tuple[float, float]:
+        return fix.lon * self.kx, fix.lat * self.ky
+
+
+def _sed(a, b, p) -> float:
+    """Distance (m) of projected point p from its time-synchronized position on segment a-b"""
+    (ax, ay, at), (bx, by, bt), (px, py, pt) = a, b, p
+    ratio = (pt - at) / (bt - at) if bt != at else 0.0
+    return hypot(px - (ax + (bx - ax) * ratio), py - (ay + (by - ay) * ratio))
+
+
+def _project(fixes: Sequence[Fix]) -> List[Tuple[float, float, float]]:
+    projection = _Projection(fixes[0].lat)
+    return [(*projection.xy(f), f.t) for f in fixes]
+
+
+def split_on_gaps(fixes: Sequence[Fix], max_gap: float = DEFAULT_MAX_GAP_SECONDS) -> List[Sequence[Fix]]:
+    segments, start = [], 0
+    for i in range(1, len(fixes)):
+        if fixes[i].t - fixes[i - 1].t > max_gap:
+            segments.append(fixes[start:i])
+            start = i
+    if fixes:
+        segments.append(fixes[start:])
+    return segments
+
+
+def douglas_peucker(fixes: Sequence[Fix], tolerance_m: float) -> List[int]:
+    """
+    Indices of the fixes to keep so that linear interpolation in time
+    reconstructs every dropped fix within tolerance_m. Iterative, so long
+    tracks don't hit the recursion limit.
+    """
+    n = len(fixes)
+    if n <= 2:
+        return list(range(n))
+
+    points = _project(fixes)
+    keep = [False] * n
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        a, b = points[first], points[last]
+        worst, worst_error = 0, tolerance_m
+        for i in range(first + 1, last):
+            error = _sed(a, b, points[i])
+            if error > worst_error:
+                worst, worst_error = i, error
+        if worst:
+            keep[worst] = True
+            stack.append((first, worst))
+            stack.append((worst, last))
+    return [i for i in range(n) if keep[i]]
+
+
+def simplify(fixes: Sequence[Fix], tolerance_m: float, max_gap: float = DEFAULT_MAX_GAP_SECONDS) -> List[int]:
+    """Douglas-Peucker applied independently to each gap-free segment of a track"""
+    kept, offset = [], 0
+    for segment in split_on_gaps(fixes, max_gap):
+        kept += [offset + i for i in douglas_peucker(segment, tolerance_m)]
+        offset += len(segment)
+    return kept
+
+
+class OnlineSimplifier:
+    """
+    Opening-window simplification of one vehicle's live stream.
+
+    push() returns decisions [(fix, keep)] as they become final: when a new fix
+    can no longer be reached from the anchor without some buffered fix drifting
+    beyond tolerance, the last buffered fix becomes a keyframe and everything
+    before it is dropped. Every dropped fix is within tolerance of the segment
+    between the keyframes around it.
+    """
+
+    def __init__(self, tolerance_m: float, max_window: int = 120, max_gap: float = DEFAULT_MAX_GAP_SECONDS):
+        self.tolerance_m = tolerance_m
+        self.max_window = max_window
+        self.max_gap = max_gap
+        self.anchor: Optional[Fix] = None
+        self.buffer: List[Fix] = []
+        self._projection: Optional[_Projection] = None
+
+    def _xyt(self, fix: Fix):
+        return (*self._projection.xy(fix), fix.t)
+
+    def _fits(self, candidate: Fix) -> bool:
+        a, b = self._xyt(self.anchor), self._xyt(candidate)
+        return all(_sed(a, b, self._xyt(f)) <= self.tolerance_m for f in self.buffer)
+
+    def _close(self) -> List[Tuple[Fix, bool]]:
+        """Keep the newest buffered fix as the next anchor; drop the rest"""
+        if not self.buffer:
+            return []
+        decisions = [(f, False) for f in self.buffer[:-1]]
+        self.anchor = self.buffer[-1]
+        decisions.append((self.anchor, True))
+        self.buffer = []
+        return decisions
+
+    def push(self, fix: Fix) -> List[Tuple[Fix, bool]]:
+        if self.anchor is None:
+            self.anchor = fix
+            self._projection = _Projection(fix.lat)
+            return [(fix, True)]
+
+        last = self.buffer[-1] if self.buffer else self.anchor
+        if fix.t - last.t > self.max_gap:
+            decisions = self._close()
+            self.anchor, self.buffer = fix, []
+            return decisions + [(fix, True)]
+
+        if len(self.buffer) < self.max_window and self._fits(fix):
+            self.buffer.append(fix)
+            return []
+
+        decisions = self._close()
+        self.buffer = [fix]
+        return decisions
+
+    def flush(self) -> List[Tuple[Fix, bool]]:
+        """Finalize the open window, e.g. on shutdown; the newest fix is kept"""
+        return self._close()
+
+
+def reconstruction_error(fixes: Sequence[Fix], kept: Iterable[int]) -> Tuple[float, float]:
+    """(max, mean) SED in metres of all fixes against the track rebuilt from the kept ones"""
+    kept = sorted(kept)
+    if len(fixes) < 3 or len(kept) < 2:
+        return 0.0, 0.0
+    points = _project(fixes)
+    errors = []
+    for first, last in zip(kept, kept[1:]):
+        a, b = points[first], points[last]
+        errors += [_sed(a, b, points[i]) for i in range(first + 1, last)]
+    if not errors:
+        return 0.0, 0.0
+    return max(errors), sum(errors) / len(fixes)
+
+
+def compression_stats(fixes: Sequence[Fix], kept: Sequence[int]) -> dict:
+    max_error, mean_error = reconstruction_error(fixes, kept)
+    return {
+        "points": len(fixes),
+        "kept": len(kept),
+        "ratio": round(len(fixes) / len(kept), 2) if kept else 0.0,
+        "max_error_m": round(max_error, 2),
+        "mean_error_m": round(mean_error, 2),
+    }
@@ -1,8 +1,10 @@
 from fastapi import WebSocket
-from typing import Dict, Set, Any
+from typing import Dict, Iterable, Set, Any, Optional, Tuple
 import json
 import logging
 
+from app.websockets.sse import sse_broadcaster
+
 logger = logging.getLogger(__name__)
 
 class ConnectionManager:
@@ -11,6 +13,9 @@ class ConnectionManager:
         self.route_connections: Dict[str, Set[WebSocket]] = {}
         # Dictionary mapping user_id to their active websocket connection
         self.user_connections: Dict[str, WebSocket] = {}
+        # Emergency alert subscribers keyed by sacco_id (None = all saccos),
+        # each mapped to an optional (min_lat, min_lng, max_lat, max_lng) region
+        self.alert_connections: Dict[Optional[str], Dict[WebSocket, Optional[Tuple[float, float, float, float]]]] = {}
 
     async def connect(self, websocket: WebSocket, user_id: str):
         await websocket.accept()
@@ -25,6 +30,8 @@ class ConnectionManager:
         for route_id, connections in self.route_connections.items():
             if websocket in connections:
                 connections.remove(websocket)
+
+        self.unsubscribe_from_alerts(websocket)
                 
         logger.info(f"User {user_id} disconnected from WebSocket")
 
@@ -45,13 +52,34 @@ class ConnectionManager:
         """
         Broadcasts a vehicle's updated location to all passengers subscribed to that route.
         """
+        await self._broadcast_to_route(route_id, {
+            "type": "vehicle_location_update",
+            "data": vehicle_data
+        })
+
+    async def broadcast_vehicle_offline(self, route_id: str, vehicle_data: dict):
+        """
+        Tells passengers on the route that a vehicle stopped reporting its location.
+        """
+        await self._broadcast_to_route(route_id, {
+            "type": "vehicle_offline",
+            "data": vehicle_data
+        })
+
+    async def broadcast_stop_event(self, route_id: str, event: str, data: dict):
+        """
+        Tells passengers on the route that a vehicle arrived at or left a stop
+        (event is "vehicle_arrived" or "vehicle_departed").
+        """
+        await self._broadcast_to_route(route_id, {"type": event, "data": data})
+
+    async def _broadcast_to_route(self, route_id: str, message: dict):
+        # Server-Sent Events streams get the same events
+        sse_broadcaster.publish(route_id, message)
+
         if route_id in self.route_connections:
-            message = {
-                "type": "vehicle_location_update",
-                "data": vehicle_data
-            }
             dead_connections = set()
-            for connection in self.route_connections[route_id]:
+            for connection in list(self.route_connections[route_id]):
                 try:
                     await connection.send_json(message)
                 except Exception as e:
@@ -60,7 +88,81 @@ class ConnectionManager:
             
             # Cleanup dead connections
             for dead in dead_connections:
-                self.route_connections[route_id].remove(dead)
+                self.route_connections[route_id].discard(dead)
+
+    def subscribe_to_alerts(
+        self,
+        websocket: WebSocket,
+        sacco_id: Optional[str] = None,
+        bbox: Optional[Tuple[float, float, float, float]] = None,
+    ):
+        """
+        Subscribe an admin/responder to emergency alerts.
+        A connection holds a single alert subscription; subscribing again replaces it.
+        """
+        self.unsubscribe_from_alerts(websocket)
+        self.alert_connections.setdefault(sacco_id, {})[websocket] = bbox
+        logger.info(f"WebSocket subscribed to alerts (sacco={sacco_id}, bbox={bbox})")
+
+    def unsubscribe_from_alerts(self, websocket: WebSocket):
+        for sacco_id in list(self.alert_connections):
+            connections = self.alert_connections[sacco_id]
+            if websocket in connections:
+                del connections[websocket]
+                if not connections:
+                    del self.alert_connections[sacco_id]
+
+    async def broadcast_emergency_alert(self, event: str, alert_data: dict, sacco_id: Optional[str] = None):
+        """
+        Push a new/updated emergency alert to subscribers of its sacco and to
+        subscribers watching all saccos, honouring each subscriber's region.
+        The message is encoded once and shared by every connection.
+        """
+        await self._broadcast_to_alert_subscribers({"type": event, "data": alert_data}, sacco_id)
+
+    async def broadcast_safety_event(self, event: str, event_data: dict, sacco_id: Optional[str] = None):
+        """
+        Push an overspeed / harsh braking event to the sacco's admins; it goes
+        to the alert subscribers, filtered the same way as emergency alerts.
+        """
+        await self._broadcast_to_alert_subscribers({"type": event, "data": event_data}, sacco_id)
+
+    async def broadcast_headway_event(self, event: str, event_data: dict, sacco_ids: Iterable[str] = ()):
+        """
+        Push a bunching alert or a route's headway statistics to the admins of
+        the saccos whose vehicles it concerns. Statistics carry no position, so
+        subscribers watching a region do not get them.
+        """
+        await self._broadcast_to_alert_subscribers({"type": event, "data": event_data}, *sacco_ids)
+
+    async def _broadcast_to_alert_subscribers(self, payload: dict, *sacco_ids: Optional[str]):
+        # Subscribers watching all saccos get a message once, however many saccos it concerns
+        buckets = [self.alert_connections.get(None)]
+        buckets += [self.alert_connections.get(sacco_id) for sacco_id in dict.fromkeys(sacco_ids) if sacco_id]
+
+        message = json.dumps(payload)
+        latitude = payload["data"].get("latitude")
+        longitude = payload["data"].get("longitude")
+
+        dead_connections = []
+        for connections in buckets:
+            if not connections:
+                continue
+            for connection, bbox in list(connections.items()):
+                if bbox is not None:
+                    min_lat, min_lng, max_lat, max_lng = bbox
+                    if latitude is None or longitude is None:
+                        continue
+                    if not (min_lat <= latitude <= max_lat and min_lng <= longitude <= max_lng):
+                        continue
+                try:
+                    await connection.send_text(message)
+                except Exception as e:
+                    logger.error(f"Error sending alert to connection: {e}")
+                    dead_connections.append(connection)
+
+        for dead in dead_connections:
+            self.unsubscribe_from_alerts(dead)
 
 # Global connection manager instance
 connection_manager = ConnectionManager()
@@ -0,0 +1,180 @@
+"""
+Server-Sent Events feed of vehicle updates for SafariSalama
+Route broadcasts of the ConnectionManager are also published here. Each event is
+encoded once into its SSE frame and the same bytes are queued on every stream
+watching its route or a box containing it; recent frames are kept so a client
+reconnecting with Last-Event-ID gets what it missed.
+"""
+from collections import deque
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+import asyncio
+import json
+import logging
+import time
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Sent when Last-Event-ID is older than the replay buffer: refetch the vehicle list
+RESET_FRAME = b"event: reset\ndata: {}\n\n"
+KEEPALIVE_FRAME = b": keepalive\n\n"
+
+
+class _Stream:
+    __slots__ = ("route_id", "bbox", "pending", "waiter", "closed")
+
+    def __init__(self, route_id: Optional[str], bbox: Optional[Tuple[float, float, float, float]]):
+        self.route_id = route_id
+        self.bbox = bbox
+        self.pending: List[bytes] = []
+        self.waiter: Optional[asyncio.Future] = None
+        self.closed = False
+
+    def wants(self, route_id: str, latitude, longitude) -> bool:
+        if self.route_id is not None and self.route_id != route_id:
+            return False
+        if self.bbox is None or latitude is None or longitude is None:
+            # Events without a position (vehicle_offline) go to every box on the route
+            return True
+        min_lat, min_lng, max_lat, max_lng = self.bbox
+        return min_lat <= latitude <= max_lat and min_lng <= longitude <= max_lng
+
+    def push(self, frame: bytes, max_pending: int):
+        if len(self.pending) >= max_pending:
+            # Too slow to keep up: end the stream; the client resumes with Last-Event-ID
+            self.closed = True
+        else:
+            self.pending.append(frame)
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_result(None)
+
+
+class SseBroadcaster:
+    """
+    Streams are indexed by route; box-only streams (no route) see every event
+    and filter by position. A stream is a list of shared frame references and
+    a future that exists only while its response is waiting, so an idle stream
+    costs a few hundred bytes plus the HTTP connection.
+
+    Event ids start at the process start time in milliseconds and go up by one,
+    so an id from before a restart is recognised as too old and answered with a
+    reset event. Publishing happens on the event loop, like the WebSocket
+    broadcasts that feed it, and assumes one API process.
+    """
+
+    def __init__(self, replay_size: int = 1000, max_pending: int = 500, keepalive_seconds: float = 15.0):
+        self.max_pending = max_pending
+        self.keepalive_seconds = keepalive_seconds
+        self._next_id = int(time.time() * 1000)
+        # (event id, route_id, latitude, longitude, frame)
+        self._replay: deque = deque(maxlen=replay_size)
+        self._by_route: Dict[str, Set[_Stream]] = {}
+        self._boxes: Set[_Stream] = set()
+
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    @property
+    def streams(self) -> int:
+        return len(self._boxes) + sum(len(streams) for streams in self._by_route.values())
+
+    def publish(self, route_id: str, message: dict):
+        """Encode one route broadcast and queue it on every matching stream"""
+        self._next_id += 1
+        event_id = self._next_id
+        data = message.get("data") or {}
+        latitude, longitude = data.get("latitude"), data.get("longitude")
+        frame = (
+            f"id: {event_id}\nevent: {message['type']}\n"
+            f"data: {json.dumps(data, separators=(',', ':'))}\n\n"
+        ).encode("utf-8")
+        self._replay.append((event_id, route_id, latitude, longitude, frame))
+        self.published += 1
+
+        for streams in (self._by_route.get(route_id), self._boxes):
+            if not streams:
+                continue
+            for stream in streams:
+                if stream.wants(route_id, latitude, longitude):
+                    stream.push(frame, self.max_pending)
+                    self.delivered += 1
+
+    def _subscribe(self, stream: _Stream, last_event_id: Optional[int]):
+        if last_event_id is not None:
+            oldest = self._replay[0][0] if self._replay else self._next_id + 1
+            if last_event_id < oldest - 1 or last_event_id > self._next_id:
+                stream.pending.append(RESET_FRAME)
+            else:
+                stream.pending.extend(
+                    frame for event_id, route_id, latitude, longitude, frame in self._replay
+                    if event_id > last_event_id and stream.wants(route_id, latitude, longitude)
+                )
+        if stream.route_id is None:
+            self._boxes.add(stream)
+        else:
+            self._by_route.setdefault(stream.route_id, set()).add(stream)
+
+    def _unsubscribe(self, stream: _Stream):
+        if stream.route_id is None:
+            self._boxes.discard(stream)
+            return
+        streams = self._by_route.get(stream.route_id)
+        if streams is not None:
+            streams.discard(stream)
+            if not streams:
+                del self._by_route[stream.route_id]
+
+    async def stream(
+        self,
+        route_id: Optional[str] = None,
+        bbox: Optional[Tuple[float, float, float, float]] = None,
+        last_event_id: Optional[int] = None,
+    ) -> AsyncIterator[bytes]:
+        """SSE frames for one client until it disconnects (or falls too far behind)"""
+        stream = _Stream(route_id, bbox)
+        self._subscribe(stream, last_event_id)
+        loop = asyncio.get_running_loop()
+        try:
+            yield b"retry: 3000\n\n"
+            while not stream.closed:
+                if not stream.pending:
+                    stream.waiter = loop.create_future()
+                    try:
+                        await asyncio.wait_for(stream.waiter, self.keepalive_seconds)
+                    except asyncio.TimeoutError:
+                        yield KEEPALIVE_FRAME
+                        continue
+                    finally:
+                        stream.waiter = None
+                frames, stream.pending = stream.pending, []
+                yield b"".join(frames)
+            self.dropped += 1
+        finally:
+            self._unsubscribe(stream)
+
+
+# Global SSE broadcaster instance
+sse_broadcaster = SseBroadcaster(
+    replay_size=settings.SSE_REPLAY_EVENTS,
+    max_pending=settings.SSE_MAX_PENDING_EVENTS,
+    keepalive_seconds=settings.SSE_KEEPALIVE_SECONDS,
+)
+
+
+def _sse_metrics() -> list:
+    return [
+        "# TYPE sse_streams gauge",
+        f"sse_streams {sse_broadcaster.streams}",
+        "# TYPE sse_events_published_total counter",
+        f"sse_events_published_total {sse_broadcaster.published}",
+        "# TYPE sse_frames_delivered_total counter",
+        f"sse_frames_delivered_total {sse_broadcaster.delivered}",
+        "# TYPE sse_streams_dropped_total counter",
+        f"sse_streams_dropped_total {sse_broadcaster.dropped}",
+    ]
+
+
+metrics.register_collector(_sse_metrics)
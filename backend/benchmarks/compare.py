@@ -0,0 +1,88 @@
+# benchmarks/compare.py
+"""
+Compare two benchmark result files and report regressions.
+
+A scenario regresses when a latency metric grows by more than --threshold
+percent, or when it issues more SQL statements per request than before.
+Exits with status 1 if anything regressed, so it can gate CI.
+
+Usage (from backend/):
+    python -m benchmarks.compare baseline.json candidate.json --threshold 10
+"""
+import argparse
+import json
+import sys
+
+# p99 is reported but too noisy at a few hundred requests to gate on by default
+LATENCY_METRICS = ("p50_ms", "p95_ms")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare benchmark results")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Allowed latency growth in percent")
+    parser.add_argument("--metrics", default=",".join(LATENCY_METRICS), help="Latency metrics to gate on")
+    return parser.parse_args()
+
+
+def change(old: float, new: float) -> float:
+    if not old:
+        return 0.0 if not new else float("inf")
+    return (new - old) / old * 100
+
+
+def compare(baseline: dict, candidate: dict, threshold: float, latency_metrics) -> list:
+    """Returns (scenario, metric, old, new, pct, regressed) rows"""
+    rows = []
+    for name, new in candidate["scenarios"].items():
+        old = baseline["scenarios"].get(name)
+        if old is None:
+            rows.append((name, "new scenario", None, None, None, False))
+            continue
+        for metric in latency_metrics:
+            pct = change(old[metric], new[metric])
+            rows.append((name, metric, old[metric], new[metric], pct, pct > threshold))
+        queries_old, queries_new = old["queries_per_request"], new["queries_per_request"]
+        rows.append((name, "queries_per_request", queries_old, queries_new,
+                     change(queries_old, queries_new), queries_new > queries_old))
+        if new.get("errors", 0) > old.get("errors", 0):
+            rows.append((name, "errors", old.get("errors", 0), new["errors"], None, True))
+    return rows
+
+
+def main():
+    args = parse_args()
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    b_meta, c_meta = baseline["meta"], candidate["meta"]
+    print(f"baseline  {b_meta['commit']}  {b_meta['dialect']}  scale {b_meta['scale']}")
+    print(f"candidate {c_meta['commit']}  {c_meta['dialect']}  scale {c_meta['scale']}")
+    for key in ("dialect", "scale", "seed"):
+        if b_meta.get(key) != c_meta.get(key):
+            print(f"warning: {key} differs ({b_meta.get(key)} vs {c_meta.get(key)}), results are not comparable")
+    print()
+
+    rows = compare(baseline, candidate, args.threshold, [m for m in args.metrics.split(",") if m])
+    print(f"{'scenario':<16}{'metric':<22}{'baseline':>12}{'candidate':>12}{'change':>10}")
+    for name, metric, old, new, pct, regressed in rows:
+        if old is None:
+            print(f"{name:<16}{metric:<22}")
+            continue
+        pct_text = f"{pct:+.1f}%" if pct is not None else ""
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{name:<16}{metric:<22}{old:>12}{new:>12}{pct_text:>10}{flag}")
+
+    regressions = [r for r in rows if r[5]]
+    print()
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {args.threshold}%")
+        sys.exit(1)
+    print(f"No regressions beyond {args.threshold}%")
+
+
+if __name__ == "__main__":
+    main()
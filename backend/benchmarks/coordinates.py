@@ -0,0 +1,181 @@
+# benchmarks/coordinates.py
+"""
+Row size, insert rate and read/serialization cost of each coordinate storage.
+
+For every COORDINATE_STORAGE a scratch copy of gps_points is filled with the
+same Nairobi fixes, then read back and serialized to JSON the way the history
+API does: the old Decimal response schema against the float one.
+
+Usage (from backend/):
+    python -m benchmarks.coordinates --rows 200000
+    python -m benchmarks.coordinates --database-url postgresql://... --rows 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import List, Optional
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Coordinate storage benchmark")
+    parser.add_argument("--database-url", default="sqlite:///bench_coordinates.db")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--serialize-rows", type=int, default=50000, help="Rows per JSON serialization run")
+    return parser.parse_args()
+
+
+args = parse_args()
+os.environ["DATABASE_URL"] = args.database_url
+os.environ.setdefault("SECRET_KEY", "benchmark")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pydantic import BaseModel, TypeAdapter  # noqa: E402
+from sqlalchemy import Column, DateTime, MetaData, Numeric, Table, insert, select, text  # noqa: E402
+from sqlalchemy.dialects.postgresql import UUID  # noqa: E402
+
+from app.db.database import engine  # noqa: E402
+from app.db.types import COORDINATE_STORAGES, Coordinate  # noqa: E402
+from benchmarks.seed import INSERT_CHUNK, NAIROBI  # noqa: E402
+
+
+class DecimalPoint(BaseModel):
+    id: uuid.UUID
+    vehicle_id: uuid.UUID
+    latitude: Decimal
+    longitude: Decimal
+    speed_kmh: Optional[Decimal]
+    heading: Optional[Decimal]
+    timestamp: datetime
+
+
+class FloatPoint(DecimalPoint):
+    latitude: float
+    longitude: float
+
+
+def scratch_table(storage: str) -> Table:
+    return Table(
+        f"bench_gps_points_{storage}", MetaData(),
+        Column("id", UUID(as_uuid=True), primary_key=True),
+        Column("vehicle_id", UUID(as_uuid=True), nullable=False),
+        Column("latitude", Coordinate(10, storage=storage), nullable=False),
+        Column("longitude", Coordinate(11, storage=storage), nullable=False),
+        Column("speed_kmh", Numeric(5, 2)),
+        Column("heading", Numeric(5, 2)),
+        Column("timestamp", DateTime, nullable=False),
+    )
+
+
+def generate_rows(count: int, seed: int) -> list:
+    rng = random.Random(seed)
+    vehicles = [uuid.UUID(int=rng.getrandbits(128)) for _ in range(max(count // 500, 1))]
+    start = datetime(2026, 1, 1)
+    return [
+        {
+            "id": uuid.UUID(int=rng.getrandbits(128)),
+            "vehicle_id": vehicles[i % len(vehicles)],
+            # Phone GPS reports 8 decimals; the NUMERIC schema keeps them all
+            "latitude": Decimal(f"{NAIROBI[0] + rng.uniform(-0.2, 0.2):.8f}"),
+            "longitude": Decimal(f"{NAIROBI[1] + rng.uniform(-0.2, 0.2):.8f}"),
+            "speed_kmh": Decimal(f"{rng.uniform(0, 80):.2f}"),
+            "heading": Decimal(f"{rng.uniform(0, 360):.2f}"),
+            "timestamp": start + timedelta(seconds=5 * i),
+        }
+        for i in range(count)
+    ]
+
+
+def storage_size(conn, table: Table) -> dict:
+    if conn.dialect.name == "postgresql":
+        row = conn.execute(text(
+            f"SELECT avg(pg_column_size(t.*)), avg(pg_column_size(t.latitude)), "
+            f"pg_table_size('{table.name}') FROM {table.name} t"
+        )).one()
+        return {"row_bytes": float(row[0]), "coordinate_bytes": float(row[1]), "table_bytes": row[2]}
+    try:
+        table_bytes = conn.execute(
+            text("SELECT sum(pgsize) FROM dbstat WHERE name = :name"), {"name": table.name}
+        ).scalar()
+    except Exception:
+        return {}  # SQLite built without the dbstat table
+    count = conn.execute(text(f"SELECT count(*) FROM {table.name}")).scalar()
+    return {"row_bytes": table_bytes / count, "table_bytes": table_bytes}
+
+
+def run_storage(storage: str, rows: list) -> dict:
+    table = scratch_table(storage)
+    table.drop(engine, checkfirst=True)
+    table.create(engine)
+    try:
+        start = time.perf_counter()
+        with engine.begin() as conn:
+            for i in range(0, len(rows), INSERT_CHUNK):
+                conn.execute(insert(table), rows[i:i + INSERT_CHUNK])
+        insert_seconds = time.perf_counter() - start
+
+        with engine.begin() as conn:
+            if conn.dialect.name == "postgresql":
+                conn.execute(text(f"VACUUM ANALYZE {table.name}").execution_options(isolation_level="AUTOCOMMIT"))
+            size = storage_size(conn, table)
+
+        start = time.perf_counter()
+        with engine.connect() as conn:
+            read = [dict(r) for r in conn.execute(select(table).order_by(table.c.timestamp)).mappings()]
+        read_seconds = time.perf_counter() - start
+
+        sample = read[:args.serialize_rows]
+        serialize = {}
+        for schema in (DecimalPoint, FloatPoint):
+            adapter = TypeAdapter(List[schema])
+            start = time.perf_counter()
+            payload = adapter.dump_json(adapter.validate_python(sample))
+            serialize[schema.__name__] = (time.perf_counter() - start, len(payload))
+
+        max_error = max(
+            max(abs(float(a["latitude"]) - float(b["latitude"])), abs(float(a["longitude"]) - float(b["longitude"])))
+            for a, b in zip(sorted(rows, key=lambda r: r["timestamp"]), read)
+        )
+        return {
+            "storage": storage,
+            **size,
+            "inserts_per_second": len(rows) / insert_seconds,
+            "reads_per_second": len(read) / read_seconds,
+            "serialize": serialize,
+            "python_type": type(read[0]["latitude"]).__name__,
+            "max_error_m": max_error * 111_320,
+        }
+    finally:
+        table.drop(engine)
+
+
+def main():
+    # VACUUM cannot run inside a transaction block
+    if engine.dialect.name == "postgresql":
+        engine.update_execution_options(isolation_level="AUTOCOMMIT")
+    rows = generate_rows(args.rows, args.seed)
+    print(f"{args.rows} rows on {engine.dialect.name}; serializing {min(args.serialize_rows, args.rows)} per run\n")
+
+    results = [run_storage(storage, rows) for storage in COORDINATE_STORAGES]
+    print(f"{'storage':<14}{'row B':>8}{'coord B':>9}{'table KB':>10}{'insert/s':>10}{'read/s':>9}"
+          f"{'type':>9}{'json Decimal ms':>17}{'json float ms':>15}{'max err m':>11}")
+    for r in results:
+        dec_time, dec_bytes = r["serialize"]["DecimalPoint"]
+        flt_time, flt_bytes = r["serialize"]["FloatPoint"]
+        row_bytes = f"{r['row_bytes']:>8.1f}" if "row_bytes" in r else f"{'n/a':>8}"
+        coord_bytes = f"{r['coordinate_bytes']:>9.1f}" if "coordinate_bytes" in r else f"{'n/a':>9}"
+        table_kb = f"{r['table_bytes'] / 1024:>10.0f}" if "table_bytes" in r else f"{'n/a':>10}"
+        print(f"{r['storage']:<14}{row_bytes}{coord_bytes}{table_kb}{r['inserts_per_second']:>10.0f}"
+              f"{r['reads_per_second']:>9.0f}{r['python_type']:>9}{dec_time * 1000:>17.1f}{flt_time * 1000:>15.1f}"
+              f"{r['max_error_m']:>11.3f}")
+    print(f"\nJSON bytes/row: Decimal schema {dec_bytes / min(args.serialize_rows, args.rows):.1f}, "
+          f"float schema {flt_bytes / min(args.serialize_rows, args.rows):.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+# benchmarks/demand_forecast.py
+"""
+Training time and accuracy of the route demand forecast, and the cost of a
+full run against the database.
+
+1. Fits synthetic per-slot trip counts of 1,000 routes x 90 days (daily peaks,
+   quieter weekends, Poisson noise) in the route chunks a run uses, and
+   backtests the last week against the seasonal-naive forecast (same slot a
+   week earlier).
+2. Seeds trips from synthetic counts for fewer routes, runs the forecaster
+   (load, fit, store), checks the stored forecasts equal a fit of the counts
+   the trips were made from, and times the endpoint cold and cached.
+
+Usage (from backend/):
+    python -m benchmarks.demand_forecast --routes 1000 --days 90 --db-routes 50
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///bench_demand_forecast.db")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+
+from app.api import routes as routes_api  # noqa: E402
+from app.core.cache import forecast_cache  # noqa: E402
+from app.db.database import Base, SessionLocal, engine  # noqa: E402
+from app.models import Route, Trip  # noqa: E402
+from app.models.trip import PaymentStatus, TripStatus  # noqa: E402
+from app.services.demand_forecast import (  # noqa: E402
+    ROUTE_CHUNK, SLOT_MINUTES, SLOTS_PER_DAY, _EPOCH, _EPOCH_DAY, demand_forecast, fit,
+)
+
+INSERT_CHUNK = 20000
+
+
+def synthetic_counts(routes: int, days: int, first_day: int, trips_per_day: float, rng: np.random.Generator):
+    hours = np.arange(SLOTS_PER_DAY) * SLOT_MINUTES / 60
+    # Morning and evening peaks over a daytime base, nothing overnight
+    shape = 0.2 + np.exp(-((hours - 7.0) ** 2) / 2) + 0.8 * np.exp(-((hours - 17.5) ** 2) / 3)
+    shape[(hours < 5) | (hours >= 23)] = 0.0
+    shape /= shape.sum()
+    weekday = (np.arange(first_day, first_day + days) + 3) % 7  # Monday = 0
+    day_factor = np.where(weekday == 6, 0.5, np.where(weekday == 5, 0.75, 1.0))
+    scale = rng.lognormal(0.0, 0.6, routes) * trips_per_day
+    rate = scale[:, None, None] * day_factor[None, :, None] * shape[None, None, :]
+    return rng.poisson(rate).astype(np.float32)
+
+
+def wape(actual, forecast) -> float:
+    return float(np.abs(actual - forecast).sum() / actual.sum())
+
+
+def train(args, rng: np.random.Generator):
+    counts = synthetic_counts(args.routes, args.days, 0, args.trips_per_day, rng)
+    history = args.days - 7
+    targets = list(range(history, args.days))
+    started = time.perf_counter()
+    for start in range(0, args.routes, ROUTE_CHUNK):
+        fit(counts[start:start + ROUTE_CHUNK], 0, [history], demand_forecast.week_decay)
+    seconds = time.perf_counter() - started
+
+    forecast = fit(counts[:, :history], 0, targets, demand_forecast.week_decay)
+    actual = counts[:, history:]
+    naive = counts[:, history - 7:history]
+    print(f"Fit: {args.routes:,} routes x {args.days} days in {seconds * 1000:.0f} ms "
+          f"({ROUTE_CHUNK} routes and {ROUTE_CHUNK * args.days * SLOTS_PER_DAY * 4 / 2**20:.0f} MiB per chunk)")
+    hourly = lambda a: a.reshape(*a.shape[:2], 24, -1).sum(axis=-1)  # noqa: E731
+    print(f"Backtest over the last 7 days, WAPE per slot: {wape(actual, forecast):.1%} "
+          f"(seasonal naive {wape(actual, naive):.1%}); per hour: {wape(hourly(actual), hourly(forecast)):.1%} "
+          f"(seasonal naive {wape(hourly(actual), hourly(naive)):.1%})\n")
+
+
+def seed(counts, route_ids, first_day: int, rng: random.Random):
+    """Trips at random times inside the slots they are counted in"""
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    now = datetime.utcnow()
+    offset = demand_forecast.utc_offset
+    with engine.begin() as conn:
+        conn.execute(insert(Route), [{
+            "id": route_id, "name": f"Route {i}", "route_number": f"{i:05d}", "origin": "CBD",
+            "destination": f"Stage {i}", "is_active": True, "created_at": now, "updated_at": now,
+        } for i, route_id in enumerate(route_ids)])
+        rows = []
+        for r, d, s in zip(*np.nonzero(counts)):
+            slot_start = _EPOCH + timedelta(days=first_day + int(d), minutes=SLOT_MINUTES * int(s)) - offset
+            for _ in range(int(counts[r, d, s])):
+                start = slot_start + timedelta(seconds=rng.randrange(SLOT_MINUTES * 60))
+                rows.append({
+                    "id": uuid.UUID(int=rng.getrandbits(128), version=4), "user_id": uuid.uuid4(),
+                    "vehicle_id": uuid.uuid4(), "route_id": route_ids[r], "start_time": start,
+                    "end_time": start + timedelta(minutes=40), "fare_amount": Decimal("100.00"),
+                    "payment_status": PaymentStatus.completed, "trip_status": TripStatus.completed,
+                    "created_at": start,
+                })
+            if len(rows) >= INSERT_CHUNK:
+                conn.execute(insert(Trip), rows)
+                rows = []
+        if rows:
+            conn.execute(insert(Trip), rows)
+
+
+def end_to_end(args, rng: np.random.Generator):
+    today = (demand_forecast.local_date() - _EPOCH_DAY).days
+    first_day = today - demand_forecast.history_days
+    counts = synthetic_counts(args.db_routes, demand_forecast.history_days, first_day, args.trips_per_day, rng)
+    route_ids = [uuid.UUID(int=int(rng.integers(1 << 62)) << 64, version=4) for _ in range(args.db_routes)]
+    seed(counts, route_ids, first_day, random.Random(args.seed))
+
+    result = demand_forecast.run()
+    print(f"Run over {int(counts.sum()):,} trips of {result['routes']} routes: load {result['load_seconds']:.2f}s, "
+          f"fit {result['fit_seconds']:.3f}s, store {result['store_seconds']:.2f}s ({result['rows']:,} rows)")
+
+    expected = np.round(fit(counts, first_day, [today], demand_forecast.week_decay), 3)
+    db = SessionLocal()
+    try:
+        day = demand_forecast.local_date()
+        for r, route_id in enumerate(route_ids):
+            stored = demand_forecast.forecast(db, route_id, day)
+            got = np.array(stored["expected_trips"] if stored else [0.0] * SLOTS_PER_DAY, dtype=np.float32)
+            if not np.allclose(got, expected[r, 0], atol=1e-3):
+                raise SystemExit(f"Route {r}: stored forecast differs from a fit of the seeded counts")
+    finally:
+        db.close()
+    print("Stored forecasts match a fit of the seeded counts")
+
+    app = FastAPI()
+    app.include_router(routes_api.router)
+    client = TestClient(app)
+    paths = [f"/api/routes/{route_id}/demand-forecast" for route_id in route_ids]
+    for name, before in (("cold", lambda: forecast_cache.invalidate(*(f"{r}:{day}" for r in route_ids))), ("cached", None)):
+        samples = []
+        for i in range(args.requests):
+            if before:
+                before()
+            begun = time.perf_counter()
+            client.get(paths[i % len(paths)]).raise_for_status()
+            samples.append(time.perf_counter() - begun)
+        print(f"Endpoint {name}: {statistics.median(samples) * 1000:.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Route demand forecast benchmark")
+    parser.add_argument("--routes", type=int, default=1000, help="Routes in the fit-only run")
+    parser.add_argument("--days", type=int, default=90, help="History in the fit-only run")
+    parser.add_argument("--db-routes", type=int, default=50, help="Routes seeded into the database")
+    parser.add_argument("--trips-per-day", type=float, default=40.0, help="Mean weekday trips per route")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    train(args, rng)
+    end_to_end(args, rng)
+
+
+if __name__ == "__main__":
+    main()
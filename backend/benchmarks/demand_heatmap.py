@@ -0,0 +1,153 @@
+# benchmarks/demand_heatmap.py
+"""
+Speed of the demand heatmap pipeline:
+
+1. the vectorized counting pass alone (geohash, hour of week, per-cell counts)
+   over synthetic points, in the chunks a recount reads them in;
+2. a full recount and an incremental update against the database, checking
+   that update-after-rebuild leaves the same cells as a fresh recount;
+3. the heatmap endpoint.
+
+Usage (from backend/):
+    python -m benchmarks.demand_heatmap --points 10000000 --trips 200000 --new-trips 5000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///bench_demand_heatmap.db")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import insert, select  # noqa: E402
+
+from app.api import admin  # noqa: E402
+from app.db.database import Base, engine  # noqa: E402
+from app.models import DemandCell, EmergencyAlert, Trip  # noqa: E402
+from app.models.emergency_alert import AlertStatus, AlertType  # noqa: E402
+from app.models.trip import PaymentStatus, TripStatus  # noqa: E402
+from app.services.demand import CHUNK_ROWS, count_cells, demand_heatmap, geohash_strings, merge_counts  # noqa: E402
+from benchmarks.seed import NAIROBI  # noqa: E402
+
+INSERT_CHUNK = 20000
+HISTORY_DAYS = 90
+
+
+def vectorized(points: int, rng: np.random.Generator) -> tuple:
+    lat = NAIROBI[0] + rng.normal(0, 0.08, points)
+    lon = NAIROBI[1] + rng.normal(0, 0.08, points)
+    epoch = rng.integers(1_760_000_000, 1_760_000_000 + HISTORY_DAYS * 86400, points).astype(np.float64)
+    started = time.perf_counter()
+    parts = []
+    for offset in range(0, points, CHUNK_ROWS):
+        window = slice(offset, offset + CHUNK_ROWS)
+        parts.append(count_cells(lat[window], lon[window], epoch[window],
+                                 demand_heatmap.precision, demand_heatmap.utc_offset_hours))
+        if len(parts) >= 16:
+            parts = [merge_counts(parts)]
+    keys, counts = merge_counts(parts)
+    geohash_strings(keys // 168, demand_heatmap.precision)
+    return time.perf_counter() - started, len(keys), int(counts.sum())
+
+
+def trip_rows(count: int, now: datetime, rng: random.Random, recent: bool = False) -> list:
+    rows = []
+    for _ in range(count):
+        # Recent trips are created after the recount they follow
+        created = now + timedelta(minutes=rng.randint(1, 20)) if recent else \
+            now - timedelta(minutes=rng.randint(120, HISTORY_DAYS * 1440))
+        rows.append({
+            "id": uuid.UUID(int=rng.getrandbits(128), version=4), "user_id": uuid.uuid4(),
+            "vehicle_id": uuid.uuid4(),
+            "start_latitude": Decimal(f"{rng.gauss(NAIROBI[0], 0.08):.8f}"),
+            "start_longitude": Decimal(f"{rng.gauss(NAIROBI[1], 0.08):.8f}"),
+            "start_time": created, "fare_amount": Decimal("100.00"),
+            "payment_status": PaymentStatus.completed, "trip_status": TripStatus.completed, "created_at": created,
+        })
+    return rows
+
+
+def seed(trips: int, alerts: int, now: datetime, rng: random.Random):
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        for offset in range(0, trips, INSERT_CHUNK):
+            conn.execute(insert(Trip), trip_rows(min(INSERT_CHUNK, trips - offset), now, rng))
+        conn.execute(insert(EmergencyAlert), [{
+            "id": uuid.uuid4(), "user_id": uuid.uuid4(), "alert_type": AlertType.general,
+            "latitude": Decimal(f"{rng.gauss(NAIROBI[0], 0.08):.8f}"),
+            "longitude": Decimal(f"{rng.gauss(NAIROBI[1], 0.08):.8f}"),
+            "status": AlertStatus.resolved, "created_at": now - timedelta(minutes=rng.randint(120, HISTORY_DAYS * 1440)),
+        } for _ in range(alerts)])
+
+
+def cells() -> set:
+    with engine.connect() as conn:
+        return set(conn.execute(select(
+            DemandCell.source, DemandCell.geohash, DemandCell.hour_of_week, DemandCell.count
+        )).all())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Demand heatmap benchmark")
+    parser.add_argument("--points", type=int, default=10_000_000, help="Synthetic points for the counting pass")
+    parser.add_argument("--trips", type=int, default=200_000, help="Trips in the database")
+    parser.add_argument("--alerts", type=int, default=2000)
+    parser.add_argument("--new-trips", type=int, default=5000, help="Trips added before the incremental update")
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    seconds, keys, total = vectorized(args.points, np.random.default_rng(args.seed))
+    print(f"Counting pass: {args.points:,} points -> {keys:,} (cell, hour) counts in {seconds:.2f}s "
+          f"({args.points / seconds / 1e6:.1f}M points/s, precision {demand_heatmap.precision})")
+    assert total == args.points
+
+    rng = random.Random(args.seed)
+    now = datetime.utcnow()
+    seed(args.trips, args.alerts, now, rng)
+    started = time.perf_counter()
+    counted = demand_heatmap.rebuild(now=now)
+    rebuild_seconds = time.perf_counter() - started
+
+    with engine.begin() as conn:
+        conn.execute(insert(Trip), trip_rows(args.new_trips, now, rng, recent=True))
+    later = now + timedelta(minutes=30)
+    started = time.perf_counter()
+    added = demand_heatmap.update(now=later)
+    update_seconds = time.perf_counter() - started
+    incremental = cells()
+    demand_heatmap.rebuild(now=later)
+    if cells() != incremental:
+        raise SystemExit("Incremental update and full recount disagree")
+
+    print(f"Full recount:  {sum(counted.values()):,} rows in {rebuild_seconds:.2f}s ({counted})")
+    print(f"Update:        {added:,} new rows in {update_seconds * 1000:.0f} ms, cells match a full recount")
+
+    app = FastAPI()
+    app.include_router(admin.router)
+    client = TestClient(app)
+    for region, precision in (("kzf", 5), ("kzf", 6), ("kzf0", 7)):
+        path = f"/api/admin/demand/heatmap?region={region}&precision={precision}"
+        client.get(path).raise_for_status()
+        samples = []
+        for _ in range(args.requests):
+            begun = time.perf_counter()
+            response = client.get(path)
+            samples.append(time.perf_counter() - begun)
+        body = response.json()
+        print(f"Heatmap {region} at {precision}: {len(body['cells']):,} cells, {body['total']:,} trips, "
+              f"{len(response.content):,} bytes, {statistics.median(samples) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
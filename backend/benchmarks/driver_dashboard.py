@@ -0,0 +1,197 @@
+# benchmarks/driver_dashboard.py
+"""
+Latency and statement count of GET /api/drivers/{id}/dashboard against the
+previous handler (five ORM queries, two of them loading every completed trip),
+for a driver with a long trip history.
+
+The previous handler is kept here as a reference route. Both are called
+in-process on the same data; their bodies are checked to match (apart from the
+rating, which used to be a constant) and the new one is checked to issue a
+single SQL statement before timing.
+
+Usage (from backend/):
+    python -m benchmarks.driver_dashboard --trips 50000 --requests 50
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///bench_driver_dashboard.db")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import Depends, FastAPI  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event, insert  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from app.api import drivers  # noqa: E402
+from app.db.database import Base, engine, get_db  # noqa: E402
+from app.models import Rating, Route, Trip, User, Vehicle  # noqa: E402
+from app.models.trip import PaymentStatus, TripStatus  # noqa: E402
+from app.models.user import UserType  # noqa: E402
+
+INSERT_CHUNK = 5000
+OTHER_DRIVERS = 20
+
+
+def reference_app() -> FastAPI:
+    """The drivers router, plus the previous dashboard handler under /reference"""
+    app = FastAPI()
+    app.include_router(drivers.router)
+
+    @app.get("/reference/{driver_id}/dashboard")
+    def reference_dashboard(driver_id: str, db: Session = Depends(get_db)):
+        driver_uuid = uuid.UUID(driver_id)
+        driver = db.query(User).filter(User.id == driver_uuid).first()
+        active_trip = db.query(Trip).filter(Trip.user_id == driver_uuid, Trip.trip_status == "ongoing").first()
+        today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        today_trips = db.query(Trip).filter(
+            Trip.user_id == driver_uuid, Trip.trip_status == "completed",
+            Trip.end_time >= today_start, Trip.end_time < today_start + timedelta(days=1),
+        ).all()
+        all_completed_trips = db.query(Trip).filter(Trip.user_id == driver_uuid, Trip.trip_status == "completed").all()
+        today_earnings = sum(float(trip.fare_amount or 0) for trip in today_trips)
+        total_earnings = sum(float(trip.fare_amount or 0) for trip in all_completed_trips)
+        total_trips = len(all_completed_trips)
+        vehicle = None
+        if active_trip and active_trip.vehicle_id:
+            vehicle = db.query(Vehicle).filter(Vehicle.id == active_trip.vehicle_id).first()
+        return {
+            "driver": {"id": str(driver.id), "name": driver.name, "phone": driver.phone, "rating": 4.5},
+            "active_trip": {
+                "id": str(active_trip.id), "vehicle_id": str(active_trip.vehicle_id),
+                "route_id": str(active_trip.route_id), "start_time": active_trip.start_time.isoformat(),
+                "fare_amount": float(active_trip.fare_amount or 0),
+            } if active_trip else None,
+            "vehicle": {
+                "id": str(vehicle.id), "registration": vehicle.registration_number,
+                "type": vehicle.vehicle_type, "capacity": vehicle.capacity,
+            } if vehicle else None,
+            "earnings": {
+                "today": today_earnings, "today_trips": len(today_trips), "total": total_earnings,
+                "total_trips": total_trips,
+                "average_per_trip": total_earnings / total_trips if total_trips > 0 else 0,
+            },
+            "stats": {"total_trips": total_trips, "completed_today": len(today_trips), "average_rating": 4.5},
+        }
+
+    return app
+
+
+def seed(trips: int, rng: random.Random) -> str:
+    """A driver with `trips` historical trips (some today, one ongoing) among other drivers; returns its id"""
+    def uid():
+        return uuid.UUID(int=rng.getrandbits(128), version=4)
+
+    now = datetime.utcnow()
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    drivers_ = [uid() for _ in range(OTHER_DRIVERS + 1)]
+    route_id, vehicle_id = uid(), uid()
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{
+            "id": driver_id, "name": f"Driver {i}", "phone": f"+2547{i:08d}", "email": f"driver{i}@bench.local",
+            "password_hash": "x", "user_type": UserType.driver, "is_verified": True, "is_active": True,
+            "created_at": now,
+        } for i, driver_id in enumerate(drivers_)])
+        conn.execute(insert(Route), [{
+            "id": route_id, "name": "Route 1", "route_number": "00001", "origin": "CBD", "destination": "Stage 1",
+            "is_active": True, "created_at": now, "updated_at": now,
+        }])
+        conn.execute(insert(Vehicle), [{
+            "id": vehicle_id, "registration_number": "KB000001", "route_id": route_id, "capacity": 14,
+            "vehicle_type": "minibus", "is_active": True, "is_online": True, "created_at": now,
+        }])
+        # The benchmarked driver gets `trips`, every other driver a tenth of that
+        owners = [drivers_[0]] * trips + [d for d in drivers_[1:] for _ in range(trips // 10)]
+        for offset in range(0, len(owners), INSERT_CHUNK):
+            rows = []
+            for i, owner in enumerate(owners[offset:offset + INSERT_CHUNK], offset):
+                end = now - timedelta(minutes=37 * (i % trips) + rng.randint(0, 30))
+                rows.append({
+                    "id": uid(), "user_id": owner, "vehicle_id": vehicle_id, "route_id": route_id,
+                    "start_time": end - timedelta(minutes=30), "end_time": end, "duration_minutes": 30,
+                    "fare_amount": Decimal(rng.choice(["50.00", "80.00", "100.00", "150.00"])),
+                    "payment_status": PaymentStatus.completed,
+                    "trip_status": rng.choices([TripStatus.completed, TripStatus.cancelled], [19, 1])[0],
+                    "created_at": end,
+                })
+            conn.execute(insert(Trip), rows)
+            conn.execute(insert(Rating), [{
+                "id": uid(), "trip_id": row["id"], "passenger_id": uid(), "driver_id": row["user_id"],
+                "score": rng.choices([1, 2, 3, 4, 5], [1, 1, 3, 8, 12])[0], "created_at": row["end_time"],
+            } for row in rows if rng.random() < 0.3])
+        conn.execute(insert(Trip), [{
+            "id": uid(), "user_id": drivers_[0], "vehicle_id": vehicle_id, "route_id": route_id,
+            "start_time": now - timedelta(minutes=5), "fare_amount": Decimal("100.00"),
+            "payment_status": PaymentStatus.pending, "trip_status": TripStatus.ongoing, "created_at": now,
+        }])
+    return str(drivers_[0])
+
+
+def statements(client: TestClient, path: str) -> int:
+    count = 0
+
+    def counter(*args):
+        nonlocal count
+        count += 1
+
+    event.listen(engine, "before_cursor_execute", counter)
+    try:
+        client.get(path).raise_for_status()
+    finally:
+        event.remove(engine, "before_cursor_execute", counter)
+    return count
+
+
+def timed(client: TestClient, path: str, requests: int) -> float:
+    client.get(path)
+    samples = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        client.get(path).raise_for_status()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+
+def without_rating(body: dict) -> dict:
+    body["driver"].pop("rating")
+    body["stats"].pop("average_rating")
+    body["stats"].pop("total_ratings", None)
+    return body
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Driver dashboard benchmark")
+    parser.add_argument("--trips", type=int, nargs="+", default=[1000, 50000], help="Historical trips of the driver")
+    parser.add_argument("--requests", type=int, default=50, help="Timed requests per handler")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    client = TestClient(reference_app())
+    print(f"Median of {args.requests} requests\n")
+    print(f"{'trips':>7}{'previous ms':>13}{'queries':>9}{'single ms':>11}{'queries':>9}{'speedup':>9}  rating")
+    for trips in args.trips:
+        driver_id = seed(trips, random.Random(args.seed))
+        fast, reference = f"/api/drivers/{driver_id}/dashboard", f"/reference/{driver_id}/dashboard"
+        body = client.get(fast).json()
+        if without_rating(dict(body, driver=dict(body["driver"]), stats=dict(body["stats"]))) != \
+                without_rating(client.get(reference).json()):
+            raise SystemExit(f"{trips} trips: dashboard body differs from the previous one")
+        fast_statements, reference_statements = statements(client, fast), statements(client, reference)
+        if fast_statements != 1:
+            raise SystemExit(f"{trips} trips: dashboard issued {fast_statements} statements, expected 1")
+        previous_ms, fast_ms = timed(client, reference, args.requests), timed(client, fast, args.requests)
+        print(f"{trips:>7}{previous_ms:>13.1f}{reference_statements:>9}{fast_ms:>11.2f}{fast_statements:>9}"
+              f"{previous_ms / fast_ms:>8.1f}x  {body['driver']['rating']} ({body['stats']['total_ratings']})")
+
+
+if __name__ == "__main__":
+    main()
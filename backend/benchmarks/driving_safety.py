@@ -0,0 +1,110 @@
+# benchmarks/driving_safety.py
+"""
+Memory per vehicle and per-fix cost of the driving safety monitor, and how
+well it finds injected overspeeding and hard stops in noisy GPS, without a
+database.
+
+Vehicles cruise around 30-50 km/h with GPS noise; some are made to speed for
+a minute and some to stop hard (6 m/s^2) from 60 km/h once.
+
+Usage (from backend/):
+    python -m benchmarks.driving_safety --vehicles 20000 --minutes 5 --interval 2
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from math import cos, radians, sin
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///bench_driving_safety.db")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.driving_safety import DrivingSafetyMonitor  # noqa: E402
+from benchmarks.seed import NAIROBI  # noqa: E402
+
+METRES_PER_DEGREE = 111_320
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Driving safety benchmark")
+    parser.add_argument("--vehicles", type=int, default=20000)
+    parser.add_argument("--minutes", type=float, default=5, help="Simulated time")
+    parser.add_argument("--interval", type=float, default=2, help="Seconds between fixes")
+    parser.add_argument("--noise-m", type=float, default=3, help="GPS noise (standard deviation)")
+    parser.add_argument("--speeders", type=float, default=0.05, help="Share of vehicles driving at 100 km/h for a minute")
+    parser.add_argument("--brakers", type=float, default=0.05, help="Share of vehicles stopping hard once")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    monitor = DrivingSafetyMonitor()
+    steps = int(args.minutes * 60 / args.interval)
+    kx = METRES_PER_DEGREE * cos(radians(NAIROBI[0]))
+
+    # Per vehicle: x, y (m), heading (rad), cruise speed (m/s), special manoeuvre and when it starts
+    vehicles = []
+    for v in range(args.vehicles):
+        roll = rng.random()
+        kind = "speed" if roll < args.speeders else "brake" if roll < args.speeders + args.brakers else None
+        vehicles.append([rng.uniform(-5000, 5000), rng.uniform(-5000, 5000), rng.uniform(0, 6.283),
+                         rng.uniform(30, 50) / 3.6, kind, rng.uniform(0.2, 0.6) * steps * args.interval])
+
+    start = datetime(2026, 1, 1, 6)
+    fixes = []
+    for step in range(steps):
+        t = step * args.interval
+        for v, (x, y, heading, cruise, kind, at) in enumerate(vehicles):
+            speed = cruise * rng.uniform(0.9, 1.1)
+            if kind == "speed" and at <= t:
+                # A minute at 100 km/h, then easing back to cruising speed
+                speed = max(100 / 3.6 - max(t - at - 60, 0.0), speed)
+            elif kind == "brake" and at <= t < at + 30:
+                # 60 km/h, then 6 m/s^2 to a standstill, then waiting
+                since = t - at - 10
+                speed = 60 / 3.6 if since < 0 else max(60 / 3.6 - 6 * since, 0.0)
+            x += speed * args.interval * sin(heading)
+            y += speed * args.interval * cos(heading)
+            vehicles[v][0], vehicles[v][1] = x, y
+            fixes.append((
+                v,
+                NAIROBI[0] + (y + rng.gauss(0, args.noise_m)) / METRES_PER_DEGREE,
+                NAIROBI[1] + (x + rng.gauss(0, args.noise_m)) / kx,
+                start + timedelta(seconds=t),
+            ))
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    found = {"overspeed": set(), "harsh_braking": set()}
+    for v, lat, lon, at in fixes:
+        for event, data in monitor.observe(v, None, lat, lon, at)[2]:
+            found[event].add(v)
+    state_bytes = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    # Timed again without tracemalloc, which slows allocation-heavy code
+    monitor = DrivingSafetyMonitor()
+    gc.disable()
+    started = time.perf_counter()
+    for v, lat, lon, at in fixes:
+        monitor.observe(v, None, lat, lon, at)
+    seconds = time.perf_counter() - started
+    gc.enable()
+
+    print(f"{args.vehicles} vehicles, {len(fixes)} fixes every {args.interval:g}s, noise {args.noise_m:g} m\n")
+    print(f"observe():        {seconds / len(fixes) * 1e6:.2f} us/fix ({len(fixes) / seconds:,.0f} fixes/s)")
+    print(f"Vehicle state:    {state_bytes / args.vehicles:.0f} B/vehicle, {state_bytes / 2**20:.1f} MiB in total")
+    for event, kind in (("overspeed", "speed"), ("harsh_braking", "brake")):
+        injected = {v for v, vehicle in enumerate(vehicles) if vehicle[4] == kind}
+        hits = len(found[event] & injected)
+        false_alarms = len(found[event] - injected)
+        print(f"{event:<17} found {hits}/{len(injected)} injected, {false_alarms} false alarms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# benchmarks/entity_cache.py
+"""
+Latency of the single-entity read endpoints with the read-through cache cold
+(every request loads from the database) and warm, plus hit ratios.
+
+Seeds a fresh dataset, then requests random ids from a working set per
+endpoint in-process. Trips and trip payments are drawn from settled ones, the
+only ones cached.
+
+Usage (from backend/):
+    python -m benchmarks.entity_cache --scale 0.1 --ids 200 --requests 2000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///bench_entity_cache.db")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import select  # noqa: E402
+
+from app.core.cache import sacco_cache, trip_cache, trip_payment_cache, user_cache, vehicle_cache  # noqa: E402
+from app.db.database import engine  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models import Payment, Sacco, Trip, User, Vehicle  # noqa: E402
+from app.models.payment import PaymentStatus  # noqa: E402
+from app.models.trip import PaymentStatus as TripPaymentStatus, TripStatus  # noqa: E402
+from benchmarks.seed import seed_database  # noqa: E402
+
+
+def working_sets(limit: int) -> dict:
+    with engine.connect() as conn:
+        ids = lambda query: [str(i) for i in conn.execute(query.limit(limit)).scalars()]  # noqa: E731
+        return {
+            "user": ids(select(User.id)),
+            "vehicle": ids(select(Vehicle.id)),
+            "trip": ids(select(Trip.id).where(
+                Trip.trip_status == TripStatus.completed, Trip.payment_status == TripPaymentStatus.completed
+            )),
+            "sacco": ids(select(Sacco.id)),
+            "trip payment": ids(select(Payment.trip_id).where(Payment.payment_status == PaymentStatus.completed)),
+        }
+
+
+ENDPOINTS = [
+    ("user", "/api/users/{}", user_cache),
+    ("vehicle", "/api/vehicles/{}", vehicle_cache),
+    ("trip", "/api/trips/{}", trip_cache),
+    ("sacco", "/api/admin/saccos/{}", sacco_cache),
+    ("trip payment", "/api/payments/trip/{}", trip_payment_cache),
+]
+
+
+def timed(client: TestClient, path: str, ids: list, requests: int, rng: random.Random, before=None) -> float:
+    samples = []
+    for _ in range(requests):
+        if before:
+            before()
+        url = path.format(rng.choice(ids))
+        started = time.perf_counter()
+        client.get(url).raise_for_status()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Entity cache benchmark")
+    parser.add_argument("--scale", type=float, default=0.1, help="Dataset scale (see benchmarks.seed)")
+    parser.add_argument("--ids", type=int, default=200, help="Working set per endpoint")
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per endpoint and mode")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    seed_database(engine, scale=args.scale, seed=args.seed)
+    sets = working_sets(args.ids)
+    client = TestClient(app)
+    rng = random.Random(args.seed)
+
+    print(f"Scale {args.scale}, {args.requests} requests per endpoint over up to {args.ids} ids (median ms)\n")
+    print(f"{'endpoint':<14}{'ids':>5}{'cold':>9}{'warm':>9}{'speedup':>9}{'hit ratio':>11}")
+    for name, path, cache in ENDPOINTS:
+        ids = sets[name]
+        if not ids:
+            print(f"{name:<14}  no rows in the dataset")
+            continue
+        cold = timed(client, path, ids, args.requests, rng, before=lambda: cache.invalidate(*ids))
+        hits, misses = cache.local.hits, cache.local.misses
+        warm = timed(client, path, ids, args.requests, rng)
+        hits, misses = cache.local.hits - hits, cache.local.misses - misses
+        print(f"{name:<14}{len(ids):>5}{cold:>9.2f}{warm:>9.2f}{cold / warm:>8.1f}x{hits / (hits + misses):>11.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# benchmarks/geofence.py
+"""
+Per-fix cost of stop geofencing and the cost of an arrivals query, without a
+database.
+
+Vehicles shuttle along the seeded straight-line routes reporting every 5 s with
+GPS jitter. Times GeofenceEngine.observe() against checking every stop of the
+route on each fix, then asks for the next arrivals at random stops.
+
+Usage (from backend/):
+    python -m benchmarks.geofence --routes 40 --vehicles 2000 --minutes 60
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from math import hypot
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///bench_geofence.db")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.geofence import GeofenceEngine  # noqa: E402
+from benchmarks.seed import BASE_COUNTS, DatasetGenerator  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stop geofencing benchmark")
+    parser.add_argument("--routes", type=int, default=BASE_COUNTS["routes"])
+    parser.add_argument("--stops", type=int, default=BASE_COUNTS["stops_per_route"], help="Stops per route")
+    parser.add_argument("--vehicles", type=int, default=2000)
+    parser.add_argument("--minutes", type=float, default=60, help="Simulated time")
+    parser.add_argument("--interval", type=float, default=5, help="Seconds between fixes")
+    parser.add_argument("--queries", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    engine = GeofenceEngine()
+    stops = {
+        r: [(f"stop-{r}-{s}", s, *map(float, DatasetGenerator._stop_coord(r, s)), 50.0) for s in range(args.stops)]
+        for r in range(args.routes)
+    }
+    engine.set_routes(stops)
+
+    # Each vehicle: route, distance along the line in metres, speed (signed)
+    length = (args.stops - 1) * 800.0
+    vehicles = [
+        [v % args.routes, rng.uniform(0, length), rng.choice((-1, 1)) * rng.uniform(5, 12)]
+        for v in range(args.vehicles)
+    ]
+    start = datetime(2026, 1, 1, 5)
+    fixes = []
+    for step in range(int(args.minutes * 60 / args.interval)):
+        at = start + timedelta(seconds=step * args.interval)
+        for v, vehicle in enumerate(vehicles):
+            route, along, speed = vehicle
+            along += speed * args.interval
+            if along < 0 or along > length:
+                speed = -speed
+                along = min(max(along, 0.0), length)
+            vehicle[1], vehicle[2] = along, speed
+            first, last = stops[route][0], stops[route][-1]
+            share = along / length
+            lat = first[2] + (last[2] - first[2]) * share + rng.gauss(0, 5) / 111_320
+            lon = first[3] + (last[3] - first[3]) * share + rng.gauss(0, 5) / 111_320
+            fixes.append((v, route, lat, lon, at))
+
+    gc.collect()
+    gc.disable()
+    t = time.perf_counter()
+    events = 0
+    for v, route, lat, lon, at in fixes:
+        events += len(engine.observe(v, route, lat, lon, at))
+    engine_seconds = time.perf_counter() - t
+
+    # Reference: distance to every stop of the route on each fix
+    indexes = engine._routes
+    t = time.perf_counter()
+    for v, route, lat, lon, at in fixes:
+        index = indexes[route]
+        x, y = index.project(lat, lon)
+        for fence in index.fences:
+            if hypot(fence.x - x, fence.y - y) <= fence.radius_m:
+                break
+    scan_seconds = time.perf_counter() - t
+
+    now = fixes[-1][4]
+    targets = [f"stop-{rng.randrange(args.routes)}-{rng.randrange(args.stops)}" for _ in range(args.queries)]
+    t = time.perf_counter()
+    predicted = sum(len(engine.arrivals_at(stop_id, now=now)) for stop_id in targets)
+    query_seconds = time.perf_counter() - t
+    gc.enable()
+
+    print(f"{args.routes} routes x {args.stops} stops, {args.vehicles} vehicles, {len(fixes)} fixes\n")
+    print(f"{'per fix':<22}{'us':>8}")
+    print(f"{'grid (observe)':<22}{engine_seconds / len(fixes) * 1e6:>8.2f}")
+    print(f"{'all stops of route':<22}{scan_seconds / len(fixes) * 1e6:>8.2f}")
+    print(f"\nEvents: {engine.arrivals} arrivals, {engine.departures} departures, {engine.segments} segments learned")
+    print(f"arrivals_at(): {query_seconds / args.queries * 1e6:.1f} us/query "
+          f"({args.vehicles // args.routes} vehicles per route, {predicted / args.queries:.1f} predictions each)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+# benchmarks/gps_export.py
+"""
+Payload size and export time of columnar GPS exports against the JSON history API.
+
+Seeds a dataset, then pulls every point of the busiest route in each format
+through the real app (ASGI transport), checking all formats return the same rows.
+
+Usage (from backend/):
+    python -m benchmarks.gps_export --database-url sqlite:///bench_export.db --scale 1
+"""
+import argparse
+import asyncio
+import gzip
+import io
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="GPS export format benchmark")
+    parser.add_argument("--database-url", default="sqlite:///bench_export.db")
+    parser.add_argument("--scale", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per format; the fastest is reported")
+    return parser.parse_args()
+
+
+args = parse_args()
+os.environ["DATABASE_URL"] = args.database_url
+os.environ.setdefault("SECRET_KEY", "benchmark")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+import numpy  # noqa: E402
+from sqlalchemy import func, select  # noqa: E402
+
+from app.db.database import engine  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models import GpsPoint, Vehicle  # noqa: E402
+from benchmarks.seed import seed_database  # noqa: E402
+
+
+def count_rows(payload: bytes, fmt: str) -> int:
+    if fmt.startswith("npz"):
+        return len(numpy.load(io.BytesIO(payload))["latitude"])
+    import pyarrow
+    return pyarrow.ipc.open_stream(payload).read_all().num_rows
+
+
+async def fetch(client, url, params):
+    start = time.perf_counter()
+    response = await client.get(url, params=params)
+    response.raise_for_status()
+    return response.content, time.perf_counter() - start
+
+
+async def main():
+    now = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+    print(f"Seeding scale {args.scale} into {engine.url.render_as_string(hide_password=True)}")
+    seed_database(engine, scale=args.scale, seed=args.seed, now=now)
+
+    with engine.connect() as conn:
+        route_id, points = conn.execute(
+            select(Vehicle.route_id, func.count())
+            .join(GpsPoint, GpsPoint.vehicle_id == Vehicle.id)
+            .group_by(Vehicle.route_id)
+            .order_by(func.count().desc())
+            .limit(1)
+        ).one()
+        vehicle_ids = conn.execute(select(Vehicle.id).where(Vehicle.route_id == route_id)).scalars().all()
+    start, end = (now - timedelta(days=1)).isoformat(), (now + timedelta(seconds=1)).isoformat()
+    print(f"Route {route_id}: {len(vehicle_ids)} vehicles, {points} points\n")
+
+    formats = {"npz": {"format": "npz"}, "npz+deflate": {"format": "npz", "compress": "true"}}
+    try:
+        import pyarrow  # noqa: F401
+        formats["arrow"] = {"format": "arrow"}
+    except ImportError:
+        print("pyarrow not installed; skipping arrow\n")
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        results = {}
+
+        # JSON baseline: the history API, one request per vehicle on the route
+        best, size, rows = None, 0, 0
+        for _ in range(args.repeat):
+            elapsed, size, rows, gzipped = 0.0, 0, 0, 0
+            for vehicle_id in vehicle_ids:
+                body, seconds = await fetch(client, f"/api/vehicles/{vehicle_id}/history",
+                                            {"start": start, "end": end, "limit": 50000})
+                elapsed += seconds
+                size += len(body)
+                gzipped += len(gzip.compress(body))
+                rows += body.count(b'"vehicle_id"')
+            best = elapsed if best is None else min(best, elapsed)
+        results["json"] = (size, best, rows)
+        results["json (gzip)"] = (gzipped, None, rows)
+
+        for name, params in formats.items():
+            best = None
+            for _ in range(args.repeat):
+                body, seconds = await fetch(client, "/api/exports/gps",
+                                            {"route_id": str(route_id), "start": start, "end": end, **params})
+                best = seconds if best is None else min(best, seconds)
+            results[name] = (len(body), best, count_rows(body, name))
+
+    json_size, json_time, _ = results["json"]
+    print(f"{'format':<14}{'rows':>9}{'bytes':>13}{'bytes/row':>11}{'vs json':>9}{'time ms':>10}{'speedup':>9}")
+    for name, (size, seconds, rows) in results.items():
+        time_text = f"{seconds * 1000:>10.1f}{json_time / seconds:>8.1f}x" if seconds else f"{'':>10}{'':>9}"
+        print(f"{name:<14}{rows:>9}{size:>13,}{size / max(rows, 1):>11.1f}{json_size / size:>8.1f}x{time_text}")
+
+    mismatched = {name for name, (_, _, rows) in results.items() if rows != points}
+    if mismatched:
+        print(f"\nRow count mismatch in: {', '.join(sorted(mismatched))}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
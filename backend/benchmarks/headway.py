@@ -0,0 +1,155 @@
+# benchmarks/headway.py
+"""
+Per-fix cost of the headway monitor as vehicles per route grow, without a
+database.
+
+Vehicles shuttle along one straight seeded route reporting every 5 s with GPS
+jitter. For each fleet size, times HeadwayMonitor.observe() against finding a
+vehicle's neighbours by sorting the route's vehicles on every fix, checks the
+monitor's order of every direction against a sort of the vehicles' positions,
+and times the statistics pass. The vehicle order itself is first checked
+against a sorted list under random inserts and removals.
+
+Usage (from backend/):
+    python -m benchmarks.headway --sizes 10,100,1000,10000 --stops 40
+"""
+import argparse
+import bisect
+import gc
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///bench_headway.db")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.headway import HeadwayMonitor, VehicleOrder  # noqa: E402
+from benchmarks.seed import STOP_SPACING_M, DatasetGenerator  # noqa: E402
+
+ROUTE = "route-0"
+# Fixes timed for the re-sorting reference; it is O(n log n) a fix
+REFERENCE_FIXES = 2000
+
+
+def check_order(operations: int, rng: random.Random):
+    order, reference = VehicleOrder(), []
+    for _ in range(operations):
+        if reference and rng.random() < 0.45:
+            key = reference.pop(rng.randrange(len(reference)))
+            assert order.remove(key)
+        else:
+            key = (rng.uniform(0, 1000), rng.getrandbits(32), None)
+            bisect.insort(reference, key)
+            order.insert(key)
+        probe = (rng.uniform(0, 1000), 0, None)
+        i = bisect.bisect_left(reference, probe)
+        assert order.before(probe) == (reference[i - 1] if i else None)
+        assert order.after(probe) == (reference[i] if i < len(reference) else None)
+    assert list(order) == reference and order.size == len(reference)
+
+
+def simulate(vehicles: int, stops: list, rounds: int, interval: float, rng: random.Random) -> list:
+    """Fixes (vehicle, lat, lon, at) of `rounds` rounds in which every vehicle reports once"""
+    length = (len(stops) - 1) * STOP_SPACING_M
+    fleet = [[rng.uniform(0, length), rng.choice((-1, 1)) * rng.uniform(5, 12)] for _ in range(vehicles)]
+    (lat0, lon0), (lat1, lon1) = stops[0], stops[-1]
+    start = datetime(2026, 1, 1, 6)
+    fixes = []
+    for step in range(rounds):
+        at = start + timedelta(seconds=step * interval)
+        for v, vehicle in enumerate(fleet):
+            along, speed = vehicle
+            along += speed * interval
+            if along < 0 or along > length:
+                speed = -speed
+                along = min(max(along, 0.0), length)
+            vehicle[0], vehicle[1] = along, speed
+            share = along / length
+            fixes.append((v, lat0 + (lat1 - lat0) * share + rng.gauss(0, 5) / 111_320,
+                          lon0 + (lon1 - lon0) * share + rng.gauss(0, 5) / 111_320, at))
+    return fixes
+
+
+def run(vehicles: int, stops: list, args, rng: random.Random) -> dict:
+    monitor = HeadwayMonitor(bunching_m=args.bunching_m)
+    monitor.set_routes({ROUTE: [(f"stop-{s}", s, lat, lon, 50.0) for s, (lat, lon) in enumerate(stops)]})
+    warmup = simulate(vehicles, stops, args.rounds + 3, args.interval, rng)
+    split = 3 * vehicles
+    for v, lat, lon, at in warmup[:split]:
+        monitor.observe(v, ROUTE, "sacco", lat, lon, at)
+    fixes = warmup[split:]
+
+    gc.collect()
+    gc.disable()
+    t = time.perf_counter()
+    for v, lat, lon, at in fixes:
+        monitor.observe(v, ROUTE, "sacco", lat, lon, at)
+    observe_seconds = time.perf_counter() - t
+
+    # Reference: same placement, neighbours found by sorting the route's vehicles each fix
+    states = monitor._vehicles
+    line = monitor._lines[ROUTE]
+    sample = fixes[:REFERENCE_FIXES]
+    t = time.perf_counter()
+    for v, lat, lon, at in sample:
+        along, _, _ = line.locate(lat, lon, states[v].segment)
+        direction = states[v].direction
+        ordered = sorted(
+            (s.key[0], s.number, u) for u, s in states.items() if s.key is not None and s.direction == direction
+        )
+        i = bisect.bisect_left(ordered, (along, states[v].number, v))
+        ordered[i - 1:i + 2]
+    reference_seconds = time.perf_counter() - t
+
+    t = time.perf_counter()
+    route_stats = monitor.stats(now=fixes[-1][3])
+    stats_seconds = time.perf_counter() - t
+    gc.enable()
+
+    for direction in (1, -1):
+        order = monitor._orders.get((ROUTE, direction))
+        placed = sorted(s.key for s in states.values() if s.key is not None and s.direction == direction)
+        if (list(order) if order else []) != placed:
+            raise SystemExit(f"{vehicles} vehicles: order of direction {direction} differs from a sort")
+    return {
+        "observe_us": observe_seconds / len(fixes) * 1e6,
+        "reference_us": reference_seconds / len(sample) * 1e6,
+        "stats_ms": stats_seconds * 1000,
+        "placed": monitor.placed,
+        "alerts": monitor.bunching_alerts,
+        "stats": route_stats[0][0]["directions"] if route_stats else [],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headway monitor benchmark")
+    parser.add_argument("--sizes", default="10,100,1000,10000", help="Vehicles on the route, comma separated")
+    parser.add_argument("--stops", type=int, default=40, help="Stops on the route")
+    parser.add_argument("--rounds", type=int, default=20, help="Timed fixes per vehicle")
+    parser.add_argument("--interval", type=float, default=5, help="Seconds between fixes")
+    parser.add_argument("--bunching-m", type=float, default=300.0)
+    parser.add_argument("--order-operations", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    check_order(args.order_operations, rng)
+    print(f"Vehicle order matches a sorted list over {args.order_operations:,} random inserts and removals\n")
+
+    stops = [tuple(map(float, DatasetGenerator._stop_coord(0, s))) for s in range(args.stops)]
+    print(f"One route of {args.stops} stops ({(args.stops - 1) * STOP_SPACING_M / 1000:.1f} km), "
+          f"{args.rounds} timed fixes per vehicle, bunched under {args.bunching_m:.0f} m\n")
+    print(f"{'vehicles':>9}{'placed':>8}{'observe us':>12}{'re-sort us':>12}{'stats ms':>10}"
+          f"{'alerts':>8}  mean gap m / cv (along, against)")
+    for size in (int(s) for s in args.sizes.split(",")):
+        result = run(size, stops, args, rng)
+        gaps = ", ".join(f"{d['mean_gap_m']} / {d['gap_cv']}" for d in result["stats"])
+        print(f"{size:>9,}{result['placed']:>8,}{result['observe_us']:>12.2f}{result['reference_us']:>12.1f}"
+              f"{result['stats_ms']:>10.2f}{result['alerts']:>8,}  {gaps}")
+
+
+if __name__ == "__main__":
+    main()
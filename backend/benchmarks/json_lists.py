@@ -0,0 +1,158 @@
+# benchmarks/json_lists.py
+"""
+Response time of the list endpoints on the fast JSON path against the previous
+one (ORM objects validated through response_model), at 1k and 10k rows.
+
+The previous handlers are kept here as reference routes; both are called
+in-process on the same SQLite data and their JSON bodies are checked to be
+identical before timing.
+
+Usage (from backend/):
+    python -m benchmarks.json_lists --rows 1000 10000 --requests 20
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import List
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///bench_json_lists.db")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import Depends, FastAPI  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from app.api import emergency, routes, trips, vehicles  # noqa: E402
+from app.core import responses  # noqa: E402
+from app.db.database import Base, engine, get_db  # noqa: E402
+from app.models import EmergencyAlert, Route, Trip, Vehicle  # noqa: E402
+from app.models.emergency_alert import AlertStatus, AlertType  # noqa: E402
+from app.models.trip import PaymentStatus, TripStatus  # noqa: E402
+from app.schemas.emergency_alert import EmergencyAlertResponse  # noqa: E402
+from app.schemas.route import RouteResponse  # noqa: E402
+from app.schemas.trip import TripResponse  # noqa: E402
+from app.schemas.vehicle import VehicleResponse  # noqa: E402
+from benchmarks.seed import NAIROBI  # noqa: E402
+
+ALERT_PAGE = 200
+
+
+def reference_app() -> FastAPI:
+    """The application routers, plus the previous list handlers under /reference"""
+    app = FastAPI()
+    for module in (vehicles, trips, routes, emergency):
+        app.include_router(module.router)
+
+    @app.get("/reference/vehicles/location", response_model=List[VehicleResponse])
+    def reference_vehicles(db: Session = Depends(get_db)):
+        return [
+            VehicleResponse.model_validate(v, from_attributes=True)
+            for v in db.query(Vehicle).filter(Vehicle.is_active == True).all()
+        ]
+
+    @app.get("/reference/trips", response_model=List[TripResponse])
+    def reference_trips(db: Session = Depends(get_db)):
+        return db.query(Trip).order_by(Trip.start_time.desc()).all()
+
+    @app.get("/reference/routes", response_model=List[RouteResponse])
+    def reference_routes(db: Session = Depends(get_db)):
+        return db.query(Route).filter(Route.is_active == True).order_by(Route.route_number).all()
+
+    @app.get("/reference/emergency", response_model=List[EmergencyAlertResponse])
+    def reference_alerts(db: Session = Depends(get_db)):
+        return db.query(EmergencyAlert).order_by(
+            EmergencyAlert.created_at.desc(), EmergencyAlert.id.desc()
+        ).limit(ALERT_PAGE).all()
+
+    return app
+
+
+def seed(rows: int, rng: random.Random):
+    def uid():
+        return uuid.UUID(int=rng.getrandbits(128), version=4)
+
+    def coord(base):
+        return Decimal(f"{base + rng.uniform(-0.15, 0.15):.8f}")
+
+    now = datetime(2026, 1, 1)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    route_ids = [uid() for _ in range(rows)]
+    with engine.begin() as conn:
+        conn.execute(insert(Route), [{
+            "id": route_ids[i], "name": f"Route {i}", "route_number": f"{i:05d}", "origin": "CBD",
+            "destination": f"Stage {i}", "distance_km": Decimal(f"{rng.uniform(3, 40):.2f}"),
+            "estimated_duration_minutes": rng.randint(15, 120), "is_active": True,
+            "created_at": now, "updated_at": now,
+        } for i in range(rows)])
+        conn.execute(insert(Vehicle), [{
+            "id": uid(), "registration_number": f"KB{i:06d}", "route_id": rng.choice(route_ids),
+            "capacity": 14, "make": "Toyota", "model": "Hiace", "year_of_manufacture": 2018,
+            "current_latitude": coord(NAIROBI[0]), "current_longitude": coord(NAIROBI[1]),
+            "last_location_update": now, "is_active": True, "is_online": True, "created_at": now,
+        } for i in range(rows)])
+        conn.execute(insert(Trip), [{
+            "id": uid(), "user_id": uid(), "vehicle_id": uid(), "route_id": rng.choice(route_ids),
+            "start_latitude": coord(NAIROBI[0]), "start_longitude": coord(NAIROBI[1]),
+            "end_latitude": coord(NAIROBI[0]), "end_longitude": coord(NAIROBI[1]),
+            "start_time": now - timedelta(minutes=i), "end_time": now - timedelta(minutes=i - 30),
+            "duration_minutes": 30, "distance_km": Decimal("12.50"), "fare_amount": Decimal("100.00"),
+            "payment_status": PaymentStatus.completed, "trip_status": TripStatus.completed, "created_at": now,
+        } for i in range(rows)])
+        conn.execute(insert(EmergencyAlert), [{
+            "id": uid(), "user_id": uid(), "alert_type": AlertType.general,
+            "latitude": coord(NAIROBI[0]), "longitude": coord(NAIROBI[1]), "description": "Benchmark",
+            "status": AlertStatus.active, "created_at": now - timedelta(seconds=i),
+        } for i in range(ALERT_PAGE + 1)])
+
+
+def timed(client: TestClient, path: str, requests: int) -> float:
+    client.get(path)
+    samples = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        client.get(path).raise_for_status()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List endpoint serialization benchmark")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--requests", type=int, default=20, help="Timed requests per endpoint and path")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    client = TestClient(reference_app())
+    endpoints = [
+        ("vehicle locations", "/api/vehicles/location", "/reference/vehicles/location"),
+        ("trips", "/api/trips", "/reference/trips"),
+        ("routes", "/api/routes", "/reference/routes"),
+        (f"alerts ({ALERT_PAGE})", f"/api/emergency?limit={ALERT_PAGE}", "/reference/emergency"),
+    ]
+
+    print(f"Encoder: {'orjson' if responses.orjson is not None else 'stdlib json'} "
+          f"(median of {args.requests} requests)\n")
+    print(f"{'endpoint':<20}{'rows':>7}{'previous ms':>13}{'fast ms':>10}{'speedup':>9}{'bytes':>11}")
+    for rows in args.rows:
+        seed(rows, random.Random(args.seed))
+        for name, fast, reference in endpoints:
+            body = client.get(fast)
+            if body.json() != client.get(reference).json():
+                raise SystemExit(f"{name}: fast path body differs from the previous one")
+            previous_ms, fast_ms = timed(client, reference, args.requests), timed(client, fast, args.requests)
+            count = len(body.json())
+            print(f"{name:<20}{count:>7}{previous_ms:>13.1f}{fast_ms:>10.1f}"
+                  f"{previous_ms / fast_ms:>8.1f}x{len(body.content):>11,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# benchmarks/map_polling.py
+"""
+Bytes on the wire and server CPU per request for the passenger map poll of
+/api/vehicles/location: full objects against a sparse fieldset and compact
+rows, each uncompressed, gzip and (if installed) brotli.
+
+Requests are made straight into the ASGI application (middleware included),
+so the CPU time measured is the server's alone.
+
+Usage (from backend/):
+    python -m benchmarks.map_polling --vehicles 2000 --requests 50
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///bench_map_polling.db")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core import compression  # noqa: E402
+from app.main import app  # noqa: E402
+from benchmarks.json_lists import seed  # noqa: E402
+
+MAP_FIELDS = "id,current_latitude,current_longitude"
+
+PAYLOADS = [
+    ("full", ""),
+    ("fields", f"fields={MAP_FIELDS}"),
+    ("fields+compact", f"fields={MAP_FIELDS}&compact=true"),
+]
+
+
+async def get(path: str, query: str, accept_encoding: str):
+    """One GET through the ASGI app; returns (status, headers, body bytes as sent)"""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": query.encode(),
+        "root_path": "", "server": ("bench", 80), "client": ("127.0.0.1", 1),
+        "headers": [(b"host", b"bench"), (b"accept-encoding", accept_encoding.encode())],
+    }
+    received = False
+    start, chunks = {}, []
+
+    async def receive():
+        nonlocal received
+        if received:
+            await asyncio.sleep(3600)
+        received = True
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            start.update(message)
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    headers = {k.decode().lower(): v.decode() for k, v in start["headers"]}
+    return start["status"], headers, b"".join(chunks)
+
+
+async def run(args):
+    encodings = [("identity", "identity"), ("gzip", "gzip")]
+    if compression.brotli is not None:
+        encodings.append(("br", "br"))
+
+    print(f"{args.vehicles} vehicles, {args.requests} requests per variant, "
+          f"brotli {'installed' if compression.brotli else 'not installed'}\n")
+    print(f"{'payload':<16}{'encoding':<10}{'bytes':>11}{'vs full':>9}{'cpu ms/req':>12}")
+    full_bytes = None
+    for name, query in PAYLOADS:
+        for label, accept in encodings:
+            status, headers, body = await get("/api/vehicles/location", query, accept)
+            assert status == 200, (status, body[:200])
+            assert headers.get("content-encoding", "identity") == label, headers
+            full_bytes = full_bytes or len(body)
+
+            cpu = time.process_time()
+            for _ in range(args.requests):
+                await get("/api/vehicles/location", query, accept)
+            cpu_ms = (time.process_time() - cpu) / args.requests * 1000
+            print(f"{name:<16}{label:<10}{len(body):>11,}{len(body) / full_bytes:>8.1%}{cpu_ms:>12.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Map polling payload benchmark")
+    parser.add_argument("--vehicles", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=50, help="Timed requests per variant")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    seed(args.vehicles, random.Random(args.seed))
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
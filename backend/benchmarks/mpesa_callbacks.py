@@ -0,0 +1,217 @@
+# benchmarks/mpesa_callbacks.py
+"""
+Benchmark M-Pesa callback processing against a local database.
+
+Seeds N pending payments, then replays N callbacks (plus a share of duplicates)
+through three strategies:
+  legacy  - the old handler: look up payment, look up trip, commit, per callback
+  single  - CallbackProcessor applying each callback in its own set-based UPDATE
+  batch   - CallbackProcessor draining queued callbacks together
+
+Usage (from backend/):
+    python -m benchmarks.mpesa_callbacks --database-url sqlite:///bench.db --callbacks 10000
+    python -m benchmarks.mpesa_callbacks --database-url postgresql://... --rate 10000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import uuid
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="M-Pesa callback processing benchmark")
+    parser.add_argument("--database-url", default="sqlite:///bench_callbacks.db")
+    parser.add_argument("--callbacks", type=int, default=10000, help="Distinct callbacks to replay")
+    parser.add_argument("--duplicate-rate", type=float, default=0.1, help="Extra share of duplicate deliveries")
+    parser.add_argument("--failure-rate", type=float, default=0.05, help="Share of failed payments")
+    parser.add_argument("--rate", type=float, default=0, help="Callbacks per minute to offer (0 = as fast as possible)")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--batch-interval-ms", type=int, default=50)
+    parser.add_argument("--modes", default="legacy,single,batch")
+    parser.add_argument("--seed", type=int, default=42)
+    return parser.parse_args()
+
+
+args = parse_args()
+os.environ["DATABASE_URL"] = args.database_url
+os.environ.setdefault("SECRET_KEY", "benchmark")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import delete, insert, update  # noqa: E402
+
+from app.db.database import Base, SessionLocal, engine  # noqa: E402
+from app.models import User, Vehicle, Trip  # noqa: E402
+from app.models.payment import Payment, PaymentStatus  # noqa: E402
+from app.models.trip import PaymentStatus as TripPaymentStatus, TripStatus  # noqa: E402
+from app.models.user import UserType  # noqa: E402
+from app.services.mpesa_callbacks import CallbackProcessor, MpesaCallback  # noqa: E402
+
+
+def seed(n: int):
+    Base.metadata.create_all(bind=engine)
+    user_id, vehicle_id = uuid.uuid4(), uuid.uuid4()
+    trip_ids = [uuid.uuid4() for _ in range(n)]
+
+    with engine.begin() as conn:
+        conn.execute(delete(Payment.__table__))
+        conn.execute(delete(Trip.__table__))
+        conn.execute(insert(User.__table__).values(
+            id=user_id, phone=f"07{random.randint(10**7, 10**8 - 1)}", name="Bench Passenger",
+            password_hash="x", user_type=UserType.passenger,
+        ))
+        conn.execute(insert(Vehicle.__table__).values(
+            id=vehicle_id, registration_number=f"KBENCH{random.randint(0, 99999)}",
+        ))
+        conn.execute(insert(Trip.__table__), [
+            {"id": t, "user_id": user_id, "vehicle_id": vehicle_id, "trip_status": TripStatus.completed,
+             "payment_status": TripPaymentStatus.pending, "fare_amount": 100}
+            for t in trip_ids
+        ])
+        conn.execute(insert(Payment.__table__), [
+            {"id": uuid.uuid4(), "trip_id": t, "user_id": user_id, "amount": 100,
+             "payment_status": PaymentStatus.pending, "reference_number": f"PAY-BENCH-{i}"}
+            for i, t in enumerate(trip_ids)
+        ])
+
+
+def reset():
+    with engine.begin() as conn:
+        conn.execute(update(Payment.__table__).values(
+            payment_status=PaymentStatus.pending, mpesa_transaction_id=None))
+        conn.execute(update(Trip.__table__).values(payment_status=TripPaymentStatus.pending))
+
+
+def make_callbacks(n: int, duplicate_rate: float, failure_rate: float):
+    callbacks = [
+        MpesaCallback(
+            reference=f"PAY-BENCH-{i}",
+            transaction_id=f"BENCH{i:010d}",
+            succeeded=random.random() >= failure_rate,
+        )
+        for i in range(n)
+    ]
+    deliveries = callbacks + random.sample(callbacks, int(n * duplicate_rate))
+    random.shuffle(deliveries)
+    return deliveries
+
+
+def legacy_apply(cb: MpesaCallback):
+    db = SessionLocal()
+    try:
+        payment = db.query(Payment).filter(Payment.reference_number == cb.reference).first()
+        if not payment:
+            return
+        if cb.succeeded:
+            payment.payment_status = PaymentStatus.completed
+            payment.mpesa_transaction_id = cb.transaction_id
+            trip = db.query(Trip).filter(Trip.id == payment.trip_id).first()
+            if trip:
+                trip.payment_status = "completed"
+        else:
+            payment.payment_status = PaymentStatus.failed
+        db.commit()
+        db.refresh(payment)
+    finally:
+        db.close()
+
+
+def paced(deliveries, rate_per_minute: float):
+    interval = 60.0 / rate_per_minute if rate_per_minute else 0.0
+    start = time.perf_counter()
+    for i, cb in enumerate(deliveries):
+        if interval:
+            delay = start + i * interval - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        yield cb
+
+
+def run_legacy(deliveries, rate):
+    ack = []
+    start = time.perf_counter()
+    for cb in paced(deliveries, rate):
+        t0 = time.perf_counter()
+        legacy_apply(cb)
+        ack.append(time.perf_counter() - t0)
+    return time.perf_counter() - start, ack, len(deliveries)
+
+
+def run_single(deliveries, rate):
+    processor = CallbackProcessor(batch_interval=0)
+    ack = []
+    start = time.perf_counter()
+    for cb in paced(deliveries, rate):
+        t0 = time.perf_counter()
+        accepted = processor.submit(cb)
+        ack.append(time.perf_counter() - t0)
+        if accepted:
+            processor.process([cb])
+    return time.perf_counter() - start, ack, processor.batches
+
+
+def run_batch(deliveries, rate, batch_size, batch_interval):
+    processor = CallbackProcessor(batch_size=batch_size, batch_interval=batch_interval)
+    processor.start()
+    ack = []
+    start = time.perf_counter()
+    for cb in paced(deliveries, rate):
+        t0 = time.perf_counter()
+        processor.submit(cb)
+        ack.append(time.perf_counter() - t0)
+    offered = time.perf_counter() - start
+    processor.stop(timeout=600)
+    elapsed = time.perf_counter() - start
+    print(f"    drain lag after last callback: {(elapsed - offered) * 1000:.1f} ms")
+    return elapsed, ack, processor.batches
+
+
+def verify(expected_completed: int):
+    db = SessionLocal()
+    try:
+        completed = db.query(Payment).filter(Payment.payment_status == PaymentStatus.completed).count()
+        paid_trips = db.query(Trip).filter(Trip.payment_status == TripPaymentStatus.completed).count()
+    finally:
+        db.close()
+    ok = completed == expected_completed == paid_trips
+    return ok, completed, paid_trips
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))] if ordered else 0.0
+
+
+def main():
+    random.seed(args.seed)
+    print(f"Seeding {args.callbacks} pending payments into {engine.url.render_as_string(hide_password=True)}")
+    seed(args.callbacks)
+    deliveries = make_callbacks(args.callbacks, args.duplicate_rate, args.failure_rate)
+    expected_completed = len({cb.reference for cb in deliveries if cb.succeeded})
+    rate_label = f"{args.rate:.0f}/min" if args.rate else "max rate"
+    print(f"Replaying {len(deliveries)} deliveries ({args.callbacks} distinct) at {rate_label}\n")
+
+    for mode in args.modes.split(","):
+        reset()
+        print(f"[{mode}]")
+        if mode == "legacy":
+            elapsed, ack, transactions = run_legacy(deliveries, args.rate)
+        elif mode == "single":
+            elapsed, ack, transactions = run_single(deliveries, args.rate)
+        elif mode == "batch":
+            elapsed, ack, transactions = run_batch(
+                deliveries, args.rate, args.batch_size, args.batch_interval_ms / 1000.0)
+        else:
+            print(f"    unknown mode {mode}")
+            continue
+
+        ok, completed, paid_trips = verify(expected_completed)
+        print(f"    elapsed: {elapsed:.2f} s  throughput: {len(deliveries) / elapsed * 60:,.0f} callbacks/min")
+        print(f"    handler time p50/p99: {percentile(ack, 0.5) * 1000:.3f} / {percentile(ack, 0.99) * 1000:.3f} ms")
+        print(f"    DB transactions: {transactions}")
+        print(f"    completed payments: {completed}  paid trips: {paid_trips}  {'OK' if ok else 'MISMATCH'}\n")
+
+
+if __name__ == "__main__":
+    main()
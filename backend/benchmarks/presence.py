@@ -0,0 +1,103 @@
+# benchmarks/presence.py
+"""
+Cost of vehicle presence tracking at fleet scale, without a database.
+
+Simulates vehicles reporting every 5-10 s with some going silent each tick,
+and times PresenceTracker.seen() and the per-tick expiry against a full scan
+of every vehicle's last-seen time.
+
+Usage (from backend/):
+    python -m benchmarks.presence --vehicles 50000 --minutes 15
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///bench_presence.db")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.presence import PresenceTracker  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vehicle presence benchmark")
+    parser.add_argument("--vehicles", type=int, default=50000)
+    parser.add_argument("--minutes", type=float, default=15, help="Simulated time")
+    parser.add_argument("--offline-after", type=float, default=300)
+    parser.add_argument("--tick", type=float, default=5, help="Sweep interval in seconds")
+    parser.add_argument("--silent-rate", type=float, default=0.002, help="Chance a vehicle goes silent per tick")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    tracker = PresenceTracker(offline_after=args.offline_after)
+    offline_after = timedelta(seconds=args.offline_after)
+    start = datetime(2026, 1, 1)
+    vehicles = list(range(args.vehicles))
+    next_report = {v: rng.uniform(0, 10) for v in vehicles}
+    last_seen = {}
+    silent = set()
+
+    seen_calls = seen_seconds = 0.0
+    wheel_seconds, scan_seconds, expired_total, ticks = [], [], 0, 0
+    now_s = 0.0
+    while now_s < args.minutes * 60:
+        now_s += args.tick
+        now = start + timedelta(seconds=now_s)
+
+        reports = []
+        for v in vehicles:
+            if v in silent:
+                continue
+            if rng.random() < args.silent_rate:
+                silent.add(v)
+                continue
+            while next_report[v] <= now_s:
+                reports.append((v, start + timedelta(seconds=next_report[v])))
+                next_report[v] += rng.uniform(5, 10)
+
+        t = time.perf_counter()
+        for v, at in reports:
+            tracker.seen(v, None, at)
+            last_seen[v] = at
+        seen_seconds += time.perf_counter() - t
+        seen_calls += len(reports)
+
+        # Collector pauses from the simulation's allocations would swamp the timings
+        gc.collect()
+        gc.disable()
+        t = time.perf_counter()
+        expired = tracker.expire(now)
+        wheel_seconds.append(time.perf_counter() - t)
+
+        # Reference: what a sweep has to do without the wheel
+        t = time.perf_counter()
+        cutoff = now - offline_after
+        scanned = [v for v, at in last_seen.items() if at < cutoff]
+        scan_seconds.append(time.perf_counter() - t)
+        gc.enable()
+        for v in scanned:
+            del last_seen[v]
+
+        expired_total += len(expired)
+        ticks += 1
+        if len(expired) != len(scanned):
+            print(f"Mismatch at {now_s:.0f}s: wheel {len(expired)} vs scan {len(scanned)}")
+
+    wheel_seconds.sort()
+    scan_seconds.sort()
+    print(f"{args.vehicles} vehicles, {ticks} ticks of {args.tick:.0f}s, {expired_total} went offline\n")
+    print(f"seen():            {seen_calls / seen_seconds:>12,.0f} calls/s")
+    print(f"{'per tick':<19}{'p50 ms':>12}{'max ms':>10}")
+    print(f"{'timing wheel':<19}{wheel_seconds[len(wheel_seconds) // 2] * 1000:>12.3f}{wheel_seconds[-1] * 1000:>10.3f}")
+    print(f"{'full scan':<19}{scan_seconds[len(scan_seconds) // 2] * 1000:>12.3f}{scan_seconds[-1] * 1000:>10.3f}")
+    print(f"\nTracked at the end: {tracker.tracked}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+# benchmarks/run.py
+"""
+Drive the real FastAPI app in-process (httpx ASGI transport) against a seeded
+database and record latency and SQL statements per request for hot endpoints.
+
+Usage (from backend/):
+    python -m benchmarks.run --database-url sqlite:///bench.db --scale 1 --output results.json
+    python -m benchmarks.run --database-url postgresql://... --scale 10 --scenarios dashboard,history
+    python -m benchmarks.compare baseline.json results.json --threshold 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="SafariSalama API benchmark")
+    parser.add_argument("--database-url", default="sqlite:///bench_api.db")
+    parser.add_argument("--scale", type=float, default=1.0, help="Dataset size relative to today's fleet (1, 10, 100)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-seed", action="store_true", help="Reuse an already seeded database")
+    parser.add_argument("--iterations", type=int, default=200, help="Measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=20, help="Unmeasured requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=1, help="Requests in flight per scenario")
+    parser.add_argument("--scenarios", default="", help="Comma-separated subset (default: all)")
+    parser.add_argument("--output", default="benchmark_results.json")
+    return parser.parse_args()
+
+
+args = parse_args()
+os.environ["DATABASE_URL"] = args.database_url
+os.environ.setdefault("SECRET_KEY", "benchmark")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+from sqlalchemy import func, select  # noqa: E402
+
+from app.core.metrics import metrics  # noqa: E402
+from app.db.database import engine  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models import Route, Sacco, Trip, Vehicle  # noqa: E402
+from benchmarks.seed import BASE_COUNTS, seed_database  # noqa: E402
+
+
+def discover_dataset() -> dict:
+    """Ids the scenarios need, read back from a database seeded earlier"""
+    with engine.connect() as conn:
+        busiest = lambda col: conn.execute(  # noqa: E731
+            select(col).where(col.is_not(None)).group_by(col).order_by(func.count().desc()).limit(1)
+        ).scalar()
+        trips = conn.execute(select(func.count()).select_from(Trip)).scalar()
+        return {
+            # Inferred from the trip count, so results can still be matched to a scale
+            "scale": round(trips / BASE_COUNTS["trips"], 3),
+            "seed": args.seed,
+            "rows": {"trips": trips},
+            "route_ids": [str(r) for r in conn.execute(select(Route.id)).scalars()],
+            "vehicle_ids": [str(v) for v in conn.execute(select(Vehicle.id)).scalars()],
+            "sacco_ids": [str(s) for s in conn.execute(select(Sacco.id)).scalars()],
+            "driver_id": str(busiest(Trip.driver_id)),
+            "passenger_id": str(busiest(Trip.user_id)),
+        }
+
+
+def build_scenarios(dataset: dict, rng: random.Random) -> dict:
+    """name -> callable returning (method, url, json body) for the i-th request"""
+    routes, vehicles, saccos = dataset["route_ids"], dataset["vehicle_ids"], dataset["sacco_ids"]
+
+    def location_poll(i):
+        return "GET", f"/api/vehicles/location?route_id={routes[i % len(routes)]}&is_online=true", None
+
+    def gps_ingest(i):
+        body = {
+            "current_latitude": f"{-1.286389 + rng.uniform(-0.1, 0.1):.8f}",
+            "current_longitude": f"{36.817223 + rng.uniform(-0.1, 0.1):.8f}",
+        }
+        return "PATCH", f"/api/vehicles/{vehicles[i % len(vehicles)]}/location", body
+
+    def dashboard(i):
+        return "GET", f"/api/drivers/{dataset['driver_id']}/dashboard", None
+
+    def history(i):
+        return "GET", f"/api/trips/user/{dataset['passenger_id']}/history?limit=20", None
+
+    def analytics(i):
+        return "GET", f"/api/admin/saccos/{saccos[i % len(saccos)]}/analytics?days=30", None
+
+    def route_list(i):
+        return "GET", "/api/routes", None
+
+    return {
+        "location_poll": location_poll,
+        "gps_ingest": gps_ingest,
+        "dashboard": dashboard,
+        "history": history,
+        "analytics": analytics,
+        "routes": route_list,
+    }
+
+
+def percentile(ordered, pct):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))] if ordered else 0.0
+
+
+async def run_scenario(client: httpx.AsyncClient, make_request, iterations: int, warmup: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one(i, measured):
+        nonlocal errors
+        method, url, body = make_request(i)
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.request(method, url, json=body)
+            elapsed = time.perf_counter() - start
+        if response.status_code >= 400:
+            errors += 1
+            if errors == 1:
+                print(f"    {method} {url} -> {response.status_code}: {response.text[:200]}")
+        if measured:
+            latencies.append(elapsed)
+
+    for i in range(warmup):
+        await one(i, False)
+
+    queries_before = sum(metrics.queries.values())
+    start = time.perf_counter()
+    await asyncio.gather(*(one(warmup + i, True) for i in range(iterations)))
+    wall = time.perf_counter() - start
+    queries = sum(metrics.queries.values()) - queries_before
+
+    latencies.sort()
+    ms = lambda s: round(s * 1000, 3)  # noqa: E731
+    return {
+        "requests": iterations,
+        "errors": errors,
+        "p50_ms": ms(percentile(latencies, 0.50)),
+        "p95_ms": ms(percentile(latencies, 0.95)),
+        "p99_ms": ms(percentile(latencies, 0.99)),
+        "mean_ms": ms(sum(latencies) / len(latencies)) if latencies else 0.0,
+        "max_ms": ms(latencies[-1]) if latencies else 0.0,
+        "throughput_rps": round(iterations / wall, 1) if wall else 0.0,
+        "queries_per_request": round(queries / iterations, 2) if iterations else 0.0,
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return "unknown"
+
+
+async def main():
+    url = engine.url.render_as_string(hide_password=True)
+    if args.no_seed:
+        dataset = discover_dataset()
+    else:
+        print(f"Seeding scale {args.scale} (seed {args.seed}) into {url}")
+        start = time.perf_counter()
+        dataset = seed_database(engine, scale=args.scale, seed=args.seed)
+        print(f"  {dataset['rows']} in {time.perf_counter() - start:.1f} s\n")
+
+    scenarios = build_scenarios(dataset, random.Random(args.seed))
+    selected = [s for s in args.scenarios.split(",") if s] or list(scenarios)
+    unknown = [s for s in selected if s not in scenarios]
+    if unknown:
+        sys.exit(f"Unknown scenarios: {', '.join(unknown)} (choose from {', '.join(scenarios)})")
+
+    results = {}
+    # Count server errors instead of re-raising them into the benchmark
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for name in selected:
+            results[name] = await run_scenario(client, scenarios[name], args.iterations, args.warmup, args.concurrency)
+            r = results[name]
+            print(
+                f"[{name}] p50 {r['p50_ms']:.2f} ms  p95 {r['p95_ms']:.2f} ms  p99 {r['p99_ms']:.2f} ms  "
+                f"{r['throughput_rps']:.0f} req/s  {r['queries_per_request']:.1f} queries/req"
+                + (f"  {r['errors']} errors" if r["errors"] else "")
+            )
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "dialect": engine.dialect.name,
+            "python": platform.python_version(),
+            "scale": dataset["scale"],
+            "seed": dataset["seed"],
+            "iterations": args.iterations,
+            "warmup": args.warmup,
+            "concurrency": args.concurrency,
+            "rows": dataset["rows"],
+        },
+        "scenarios": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
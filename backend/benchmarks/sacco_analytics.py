@@ -0,0 +1,166 @@
+# benchmarks/sacco_analytics.py
+"""
+Response time of GET /api/admin/saccos/{id}/analytics over a year of trips of
+a large sacco: the previous handler (every completed trip loaded and summed in
+Python) against the aggregates pushed down to SQL, for the totals and for each
+kind of breakdown.
+
+The previous handler is kept here as a reference route; its totals are checked
+against the new totals and against the totals closing every streamed breakdown.
+
+Usage (from backend/):
+    python -m benchmarks.sacco_analytics --vehicles 500 --days 365 --trips-per-day 3
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///bench_sacco_analytics.db")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import Depends, FastAPI  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from app.api import admin  # noqa: E402
+from app.db.database import Base, engine, get_db  # noqa: E402
+from app.models import Route, Sacco, Trip, User, Vehicle  # noqa: E402
+from app.models.trip import PaymentStatus, TripStatus  # noqa: E402
+from app.models.user import UserType  # noqa: E402
+
+INSERT_CHUNK = 20000
+ROUTES = 20
+OTHER_SACCOS = 4
+
+REPORTS = [
+    ("totals", ""),
+    ("by day", "bucket=day"),
+    ("by hour", "bucket=hour"),
+    ("by week x route", "bucket=week&group_by=route"),
+    ("by vehicle", "group_by=vehicle"),
+    ("by day x driver", "bucket=day&group_by=driver"),
+]
+
+
+def reference_app() -> FastAPI:
+    """The admin router, plus the previous analytics handler under /reference"""
+    app = FastAPI()
+    app.include_router(admin.router)
+
+    @app.get("/reference/{sacco_id}/analytics")
+    def reference_analytics(sacco_id: str, days: int = 30, db: Session = Depends(get_db)):
+        vehicle_ids = [v.id for v in db.query(Vehicle.id).filter(Vehicle.sacco_id == uuid.UUID(sacco_id)).all()]
+        trips = db.query(Trip).filter(
+            Trip.vehicle_id.in_(vehicle_ids),
+            Trip.trip_status == "completed",
+            Trip.end_time >= datetime.utcnow() - timedelta(days=days),
+        ).all()
+        total_earnings = sum(float(trip.fare_amount or 0) for trip in trips)
+        return {"total_trips": len(trips), "total_earnings": total_earnings}
+
+    return app
+
+
+def seed(vehicles: int, days: int, trips_per_day: int, rng: random.Random) -> str:
+    """One sacco with `vehicles` vehicles, plus smaller saccos; returns the large sacco's id"""
+    def uid():
+        return uuid.UUID(int=rng.getrandbits(128), version=4)
+
+    now = datetime.utcnow()
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    saccos = [uid() for _ in range(OTHER_SACCOS + 1)]
+    routes = [uid() for _ in range(ROUTES)]
+    # The benchmarked sacco owns `vehicles`, every other sacco a tenth of that
+    fleet = [(uid(), saccos[0]) for _ in range(vehicles)]
+    fleet += [(uid(), sacco) for sacco in saccos[1:] for _ in range(max(1, vehicles // 10))]
+    drivers = {vehicle_id: uid() for vehicle_id, _ in fleet}
+    with engine.begin() as conn:
+        conn.execute(insert(Sacco), [{
+            "id": sacco, "name": f"Sacco {i}", "registration_number": f"SAC{i:04d}", "created_at": now,
+        } for i, sacco in enumerate(saccos)])
+        conn.execute(insert(Route), [{
+            "id": route, "name": f"Route {i}", "route_number": f"{i:05d}", "origin": "CBD",
+            "destination": f"Stage {i}", "is_active": True, "created_at": now, "updated_at": now,
+        } for i, route in enumerate(routes)])
+        conn.execute(insert(User), [{
+            "id": driver, "name": f"Driver {i}", "phone": f"+2547{i:08d}", "email": f"driver{i}@bench.local",
+            "password_hash": "x", "user_type": UserType.driver, "is_verified": True, "is_active": True,
+            "created_at": now,
+        } for i, driver in enumerate(drivers.values())])
+        conn.execute(insert(Vehicle), [{
+            "id": vehicle_id, "registration_number": f"KB{i:06d}", "sacco_id": sacco,
+            "route_id": routes[i % ROUTES], "capacity": 14, "is_active": True, "created_at": now,
+        } for i, (vehicle_id, sacco) in enumerate(fleet)])
+
+        rows = []
+        for day in range(days):
+            for i, (vehicle_id, _) in enumerate(fleet):
+                for _ in range(trips_per_day):
+                    end = now - timedelta(days=day, minutes=rng.randint(0, 24 * 60 - 1))
+                    rows.append({
+                        "id": uid(), "user_id": uid(), "vehicle_id": vehicle_id, "driver_id": drivers[vehicle_id],
+                        "route_id": routes[i % ROUTES], "start_time": end - timedelta(minutes=40), "end_time": end,
+                        "fare_amount": Decimal(rng.choice(["50.00", "80.00", "100.00", "150.00"])),
+                        "payment_status": PaymentStatus.completed,
+                        "trip_status": rng.choices([TripStatus.completed, TripStatus.cancelled], [19, 1])[0],
+                        "created_at": end,
+                    })
+            if len(rows) >= INSERT_CHUNK:
+                conn.execute(insert(Trip), rows)
+                rows = []
+        if rows:
+            conn.execute(insert(Trip), rows)
+    return str(saccos[0])
+
+
+def timed(client: TestClient, path: str, requests: int) -> tuple:
+    client.get(path)
+    samples = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        response = client.get(path)
+        response.raise_for_status()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000, response
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sacco analytics benchmark")
+    parser.add_argument("--vehicles", type=int, default=500)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--trips-per-day", type=int, default=3, help="Trips per vehicle per day")
+    parser.add_argument("--requests", type=int, default=5, help="Timed requests per report")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    sacco_id = seed(args.vehicles, args.days, args.trips_per_day, random.Random(args.seed))
+    client = TestClient(reference_app())
+    base = f"/api/admin/saccos/{sacco_id}/analytics?days={args.days}"
+
+    previous_ms, response = timed(client, f"/reference/{sacco_id}/analytics?days={args.days}", args.requests)
+    expected = response.json()
+    print(f"{args.vehicles} vehicles, {args.days} days, {expected['total_trips']:,} completed trips "
+          f"(median of {args.requests} requests)\n")
+    print(f"{'report':<18}{'ms':>10}{'rows':>9}{'bytes':>12}")
+    print(f"{'previous totals':<18}{previous_ms:>10.1f}{'':>9}{len(response.content):>12,}")
+    for name, query in REPORTS:
+        elapsed, response = timed(client, f"{base}&{query}" if query else base, args.requests)
+        body = response.json()
+        totals = (body["total_trips"], round(body["total_earnings"], 2))
+        if totals != (expected["total_trips"], round(expected["total_earnings"], 2)):
+            raise SystemExit(f"{name}: totals {totals} differ from the previous handler's")
+        rows = len(body.get("rows", [body]))
+        print(f"{name:<18}{elapsed:>10.1f}{rows:>9,}{len(response.content):>12,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+# benchmarks/seed.py
+"""
+Deterministic dataset generator for benchmarks.
+
+The same (scale, seed) always produces the same rows and ids, so results are
+comparable between commits. Scale 1 approximates today's fleet; 10 and 100
+model growth.
+"""
+from datetime import datetime, timedelta
+from decimal import Decimal
+from math import cos, radians, sin
+import random
+import uuid
+
+from sqlalchemy import insert
+
+from app.db.database import Base
+from app.models import (
+    EmergencyAlert, GpsPoint, Payment, Rating, Route, RouteStop, Sacco, Stop, Trip, User, Vehicle,
+)
+from app.models.payment import PaymentStatus
+from app.models.trip import PaymentStatus as TripPaymentStatus, TripStatus
+from app.models.user import UserType
+from app.services.gps_partitions import gps_partitions
+
+# Row counts at scale 1
+BASE_COUNTS = {
+    "saccos": 10,
+    "routes": 40,
+    "stops_per_route": 12,
+    "vehicles": 200,
+    "drivers": 200,
+    "passengers": 2000,
+    "trips": 20000,
+    "gps_points": 100000,
+    "alerts": 500,
+}
+
+NAIROBI = (-1.286389, 36.817223)
+INSERT_CHUNK = 5000
+HISTORY_DAYS = 90
+
+# Fixed reference time so generated timestamps don't depend on when seeding runs
+EPOCH = datetime(2026, 1, 1)
+
+# Stops are laid out along a straight line per route, radiating from the centre
+STOP_SPACING_M = 800
+METRES_PER_DEGREE = 111_320
+
+
+def counts_for(scale: float) -> dict:
+    counts = {k: max(1, int(v * scale)) for k, v in BASE_COUNTS.items()}
+    counts["stops_per_route"] = BASE_COUNTS["stops_per_route"]
+    return counts
+
+
+class DatasetGenerator:
+    def __init__(self, scale: float = 1.0, seed: int = 42, now: datetime = None):
+        self.scale = scale
+        self.counts = counts_for(scale)
+        self.rng = random.Random(seed)
+        # Timestamps are generated relative to `now` so "today" and "last 30 days"
+        # windows always have data; ids and values depend only on the seed
+        self.now = now or datetime.utcnow().replace(microsecond=0)
+
+    def _uuid(self) -> uuid.UUID:
+        return uuid.UUID(int=self.rng.getrandbits(128), version=4)
+
+    def _coord(self, spread: float = 0.15):
+        lat = NAIROBI[0] + self.rng.uniform(-spread, spread)
+        lng = NAIROBI[1] + self.rng.uniform(-spread, spread)
+        return Decimal(f"{lat:.8f}"), Decimal(f"{lng:.8f}")
+
+    @staticmethod
+    def _stop_coord(route_index: int, sequence: int):
+        # Derived from the indices only, so adding stop coordinates did not shift the random stream
+        bearing = route_index * 2.399963  # golden angle spreads routes evenly
+        distance = (sequence + 1) * STOP_SPACING_M
+        lat = NAIROBI[0] + distance * cos(bearing) / METRES_PER_DEGREE
+        lng = NAIROBI[1] + distance * sin(bearing) / (METRES_PER_DEGREE * cos(radians(NAIROBI[0])))
+        return Decimal(f"{lat:.8f}"), Decimal(f"{lng:.8f}")
+
+    def reference_tables(self) -> dict:
+        """Saccos, routes, stops, users and vehicles: small enough to build in memory"""
+        c = self.counts
+        rng = self.rng
+        data = {}
+
+        data["saccos"] = [
+            {"id": self._uuid(), "name": f"Sacco {i}", "registration_number": f"SAC-{i:05d}",
+             "contact_phone": f"0700{i:06d}", "created_at": EPOCH}
+            for i in range(c["saccos"])
+        ]
+        sacco_ids = [s["id"] for s in data["saccos"]]
+
+        data["routes"] = [
+            {"id": self._uuid(), "name": f"Route {i}", "route_number": str(i), "origin": f"Origin {i}",
+             "destination": f"Destination {i}", "estimated_duration_minutes": rng.randint(20, 90),
+             "distance_km": Decimal(f"{rng.uniform(5, 40):.2f}"), "is_active": True,
+             "created_at": EPOCH, "updated_at": EPOCH}
+            for i in range(c["routes"])
+        ]
+        route_ids = [r["id"] for r in data["routes"]]
+
+        data["stops"], data["route_stops"] = [], []
+        for r_index, route_id in enumerate(route_ids):
+            for seq in range(c["stops_per_route"]):
+                stop_id = self._uuid()
+                lat, lng = self._stop_coord(r_index, seq)
+                data["stops"].append({"id": stop_id, "name": f"Stop {r_index}-{seq}", "latitude": lat,
+                                      "longitude": lng, "created_at": EPOCH})
+                data["route_stops"].append({"id": self._uuid(), "route_id": route_id, "stop_id": stop_id, "sequence": seq})
+
+        users = []
+        for i in range(c["drivers"]):
+            users.append({"id": self._uuid(), "phone": f"0711{i:06d}", "name": f"Driver {i}",
+                          "email": f"driver{i}@bench.local", "password_hash": "x",
+                          "user_type": UserType.driver, "is_verified": True, "is_active": True, "created_at": EPOCH})
+        for i in range(c["passengers"]):
+            users.append({"id": self._uuid(), "phone": f"0722{i:06d}", "name": f"Passenger {i}",
+                          "email": f"passenger{i}@bench.local", "password_hash": "x",
+                          "user_type": UserType.passenger, "is_verified": True, "is_active": True, "created_at": EPOCH})
+        data["users"] = users
+        self.driver_ids = [u["id"] for u in users[:c["drivers"]]]
+        self.passenger_ids = [u["id"] for u in users[c["drivers"]:]]
+
+        vehicles = []
+        for i in range(c["vehicles"]):
+            lat, lng = self._coord()
+            vehicles.append({
+                "id": self._uuid(), "registration_number": f"KB{i:05d}", "sacco_id": sacco_ids[i % len(sacco_ids)],
+                "route_id": route_ids[i % len(route_ids)], "capacity": 14, "vehicle_type": "minibus",
+                "make": "Toyota", "model": "Hiace", "year_of_manufacture": 2015 + i % 10,
+                "current_latitude": lat, "current_longitude": lng, "last_location_update": self.now,
+                "is_active": True, "is_online": rng.random() < 0.7, "created_at": EPOCH, "updated_at": EPOCH,
+            })
+        data["vehicles"] = vehicles
+        self.vehicles = vehicles
+        return data
+
+    def trip_batches(self, size: int = INSERT_CHUNK):
+        """Yield (trips, payments, ratings) batches; 1 in 200 trips is still ongoing"""
+        rng = self.rng
+        vehicles, driver_ids, passenger_ids = self.vehicles, self.driver_ids, self.passenger_ids
+        trips, payments, ratings = [], [], []
+
+        for i in range(self.counts["trips"]):
+            vehicle = vehicles[rng.randrange(len(vehicles))]
+            start = self.now - timedelta(minutes=rng.randint(0, HISTORY_DAYS * 24 * 60))
+            duration = rng.randint(10, 90)
+            ongoing = i % 200 == 0
+            lat, lng = self._coord()
+            end_lat, end_lng = self._coord()
+            fare = Decimal(rng.choice([50, 60, 80, 100, 120, 150]))
+            trip = {
+                "id": self._uuid(), "user_id": passenger_ids[rng.randrange(len(passenger_ids))],
+                "vehicle_id": vehicle["id"], "driver_id": driver_ids[rng.randrange(len(driver_ids))],
+                "route_id": vehicle["route_id"], "start_latitude": lat, "start_longitude": lng,
+                "end_latitude": None if ongoing else end_lat, "end_longitude": None if ongoing else end_lng,
+                "start_time": start, "end_time": None if ongoing else start + timedelta(minutes=duration),
+                "duration_minutes": None if ongoing else duration, "fare_amount": fare,
+                "payment_status": TripPaymentStatus.pending if ongoing else TripPaymentStatus.completed,
+                "trip_status": TripStatus.ongoing if ongoing else TripStatus.completed,
+                "created_at": start, "updated_at": start,
+            }
+            trips.append(trip)
+            if not ongoing:
+                if rng.random() < 0.75:
+                    payments.append({
+                        "id": self._uuid(), "trip_id": trip["id"], "user_id": trip["user_id"],
+                        "driver_id": trip["driver_id"], "amount": fare, "payment_status": PaymentStatus.completed,
+                        "reference_number": f"PAY-B{i:08d}", "mpesa_transaction_id": f"BNCH{i:08d}",
+                        "idempotency_key": f"bench-{i}", "created_at": trip["end_time"], "updated_at": trip["end_time"],
+                    })
+                if rng.random() < 0.5:
+                    ratings.append({
+                        "id": self._uuid(), "trip_id": trip["id"], "passenger_id": trip["user_id"],
+                        "driver_id": trip["driver_id"], "score": rng.choices([1, 2, 3, 4, 5], [1, 1, 3, 8, 12])[0],
+                        "created_at": trip["end_time"],
+                    })
+
+            if len(trips) >= size:
+                yield trips, payments, ratings
+                trips, payments, ratings = [], [], []
+
+        if trips:
+            yield trips, payments, ratings
+
+    def gps_batches(self, size: int = INSERT_CHUNK):
+        """Yield gps_points batches: a 10-second random walk per vehicle ending at `now`"""
+        rng = self.rng
+        batch = []
+        per_vehicle = max(1, self.counts["gps_points"] // len(self.vehicles))
+        for vehicle in self.vehicles:
+            lat, lng = float(vehicle["current_latitude"]), float(vehicle["current_longitude"])
+            ts = self.now - timedelta(seconds=per_vehicle * 10)
+            for _ in range(per_vehicle):
+                lat += rng.uniform(-0.0005, 0.0005)
+                lng += rng.uniform(-0.0005, 0.0005)
+                ts += timedelta(seconds=10)
+                batch.append({
+                    "id": self._uuid(), "vehicle_id": vehicle["id"],
+                    "latitude": Decimal(f"{lat:.8f}"), "longitude": Decimal(f"{lng:.8f}"),
+                    "timestamp": ts, "created_at": ts,
+                })
+                if len(batch) >= size:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+    def alerts(self) -> list:
+        rng = self.rng
+        alerts = []
+        for i in range(self.counts["alerts"]):
+            lat, lng = self._coord()
+            created = self.now - timedelta(minutes=rng.randint(0, HISTORY_DAYS * 24 * 60))
+            alerts.append({
+                "id": self._uuid(), "user_id": self.passenger_ids[rng.randrange(len(self.passenger_ids))],
+                "vehicle_id": self.vehicles[rng.randrange(len(self.vehicles))]["id"],
+                "latitude": lat, "longitude": lng,
+                "status": "active" if i % 10 == 0 else "resolved", "alert_type": "general",
+                "created_at": created, "updated_at": created,
+            })
+        return alerts
+
+
+# Insert order respects foreign keys
+REFERENCE_TABLES = [
+    ("saccos", Sacco), ("routes", Route), ("stops", Stop), ("route_stops", RouteStop),
+    ("users", User), ("vehicles", Vehicle),
+]
+
+
+def seed_database(engine, scale: float = 1.0, seed: int = 42, now: datetime = None) -> dict:
+    """
+    Drop and recreate all tables, then load a generated dataset.
+    Trips and GPS points are streamed in batches, so memory stays flat at 100x.
+    Returns handy ids for scenarios and the row counts loaded.
+    """
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    generator = DatasetGenerator(scale=scale, seed=seed, now=now)
+    reference = generator.reference_tables()
+    rows = {}
+    trips_per_driver, trips_per_passenger = {}, {}
+
+    with engine.begin() as conn:
+        if engine.dialect.name == "postgresql":
+            gps_partitions.ensure_partitions(conn, start=generator.now - timedelta(days=1))
+
+        for key, model in REFERENCE_TABLES:
+            _insert(conn, model, reference[key])
+            rows[key] = len(reference[key])
+
+        for key in ("trips", "payments", "ratings"):
+            rows[key] = 0
+        for trips, payments, ratings in generator.trip_batches():
+            _insert(conn, Trip, trips)
+            _insert(conn, Payment, payments)
+            _insert(conn, Rating, ratings)
+            rows["trips"] += len(trips)
+            rows["payments"] += len(payments)
+            rows["ratings"] += len(ratings)
+            for trip in trips:
+                trips_per_driver[trip["driver_id"]] = trips_per_driver.get(trip["driver_id"], 0) + 1
+                trips_per_passenger[trip["user_id"]] = trips_per_passenger.get(trip["user_id"], 0) + 1
+
+        rows["gps_points"] = 0
+        for batch in generator.gps_batches():
+            _insert(conn, GpsPoint, batch)
+            rows["gps_points"] += len(batch)
+
+        alerts = generator.alerts()
+        _insert(conn, EmergencyAlert, alerts)
+        rows["alerts"] = len(alerts)
+
+    return {
+        "scale": scale,
+        "seed": seed,
+        "rows": rows,
+        "route_ids": [str(r["id"]) for r in reference["routes"]],
+        "vehicle_ids": [str(v["id"]) for v in reference["vehicles"]],
+        "sacco_ids": [str(s["id"]) for s in reference["saccos"]],
+        "driver_id": str(max(trips_per_driver, key=trips_per_driver.get)),
+        "passenger_id": str(max(trips_per_passenger, key=trips_per_passenger.get)),
+    }
+
+
+def _insert(conn, model, rows):
+    for start in range(0, len(rows), INSERT_CHUNK):
+        conn.execute(insert(model.__table__), rows[start:start + INSERT_CHUNK])
@@ -0,0 +1,144 @@
+# benchmarks/sse_streams.py
+"""
+Memory per open Server-Sent Events stream and the cost of fanning events out
+to them, without a database.
+
+Opens the streams as real requests to /api/vehicles/stream through the ASGI
+application (middleware and StreamingResponse included), spread over routes
+with a share watching a box, then publishes location updates through the
+ConnectionManager as a location update would, and closes every stream.
+
+Usage (from backend/):
+    python -m benchmarks.sse_streams --streams 10000 --routes 40 --events 2000
+"""
+import argparse
+import asyncio
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+import uuid
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///bench_sse_streams.db")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.main import app  # noqa: E402
+from app.websockets.manager import connection_manager  # noqa: E402
+from app.websockets.sse import sse_broadcaster  # noqa: E402
+from benchmarks.seed import NAIROBI  # noqa: E402
+
+
+class Client:
+    __slots__ = ("received", "frames")
+
+    def __init__(self):
+        self.received = 0
+        self.frames = 0
+
+
+def pending_frames() -> bool:
+    subscribed = [*sse_broadcaster._by_route.values(), sse_broadcaster._boxes]
+    return any(stream.pending for streams in subscribed for stream in streams)
+
+
+async def open_stream(query: str, client: Client, disconnect: asyncio.Event):
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": "/api/vehicles/stream", "raw_path": b"/api/vehicles/stream",
+        "query_string": query.encode(), "root_path": "", "server": ("bench", 80),
+        "client": ("127.0.0.1", 1), "headers": [(b"host", b"bench"), (b"accept", b"text/event-stream")],
+    }
+    requested = False
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await disconnect.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            client.received += len(message.get("body", b""))
+            client.frames += 1
+
+    await app(scope, receive, send)
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    routes = [str(uuid.UUID(int=rng.getrandbits(128), version=4)) for _ in range(args.routes)]
+    disconnect = asyncio.Event()
+    clients = [Client() for _ in range(args.streams)]
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    tasks = []
+    for i, client in enumerate(clients):
+        if rng.random() < args.box_share:
+            lat, lon = NAIROBI[0] + rng.uniform(-0.1, 0.1), NAIROBI[1] + rng.uniform(-0.1, 0.1)
+            query = f"bbox={lat - 0.02},{lon - 0.02},{lat + 0.02},{lon + 0.02}"
+        else:
+            query = f"route_id={routes[i % args.routes]}"
+        tasks.append(asyncio.create_task(open_stream(query, client, disconnect)))
+    while sse_broadcaster.streams < args.streams:
+        await asyncio.sleep(0.01)
+    await asyncio.sleep(0.1)
+    gc.collect()
+    per_stream = (tracemalloc.get_traced_memory()[0] - before) / args.streams
+    tracemalloc.stop()
+
+    base = sum(client.frames for client in clients)
+    delivered = sse_broadcaster.delivered
+    started = time.perf_counter()
+    for i in range(args.events):
+        await connection_manager.broadcast_vehicle_location(
+            route_id=routes[i % args.routes],
+            vehicle_data={
+                "vehicle_id": f"vehicle-{i % 2000}",
+                "registration_number": f"KB{i % 2000:06d}",
+                "latitude": NAIROBI[0] + rng.uniform(-0.1, 0.1),
+                "longitude": NAIROBI[1] + rng.uniform(-0.1, 0.1),
+                "occupancy": rng.randint(0, 14),
+                "capacity": 14,
+                "timestamp": "2026-01-01T06:00:00",
+            },
+        )
+    publish_seconds = time.perf_counter() - started
+    fanout = sse_broadcaster.delivered - delivered
+    # Let every stream write out what it was given
+    while pending_frames() and time.perf_counter() - started < 60:
+        await asyncio.sleep(0.01)
+    drain_seconds = time.perf_counter() - started
+
+    disconnect.set()
+    await asyncio.gather(*tasks)
+
+    print(f"{args.streams} streams over {args.routes} routes ({args.box_share:.0%} by box), {args.events} events\n")
+    print(f"Memory:   {per_stream / 1024:.2f} KiB per open stream (request, response and subscription), "
+          f"{per_stream * args.streams / 2**20:.1f} MiB in total")
+    print(f"Publish:  {publish_seconds / args.events * 1e6:.1f} us/event, {fanout / args.events:.0f} streams per event, "
+          f"{fanout / publish_seconds:,.0f} frames queued/s")
+    print(f"Written:  {sum(client.received for client in clients) / 2**20:.1f} MiB in "
+          f"{sum(client.frames for client in clients) - base:,} writes, all sent {drain_seconds:.2f}s after publishing began")
+    print(f"Streams left open after disconnect: {sse_broadcaster.streams}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SSE stream benchmark")
+    parser.add_argument("--streams", type=int, default=10000)
+    parser.add_argument("--routes", type=int, default=40)
+    parser.add_argument("--events", type=int, default=2000)
+    parser.add_argument("--box-share", type=float, default=0.1, help="Share of streams watching a box instead of a route")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
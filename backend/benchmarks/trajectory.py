@@ -0,0 +1,161 @@
+# benchmarks/trajectory.py
+"""
+Compression ratio and reconstruction error of GPS track simplification.
+
+Simulated tracks model a matatu run: straight legs along a road with turns,
+dwell time at stages, stop-and-go traffic and ~4 m GPS noise, one fix every
+5-10 s. Real tracks can be read from a database instead.
+
+Usage (from backend/):
+    python -m benchmarks.trajectory --tracks 50 --tolerances 5,10,15,25,50
+    python -m benchmarks.trajectory --database-url postgresql://... --hours 24
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.trajectory import EARTH_RADIUS_M, Fix, OnlineSimplifier, compression_stats, simplify  # noqa: E402
+
+NAIROBI = (-1.286389, 36.817223)
+METRES_PER_DEGREE = math.radians(1.0) * EARTH_RADIUS_M
+
+
+def simulate_track(rng: random.Random, duration_s: float = 3600.0) -> list:
+    lat, lon = NAIROBI[0] + rng.uniform(-0.1, 0.1), NAIROBI[1] + rng.uniform(-0.1, 0.1)
+    heading = rng.uniform(0, 2 * math.pi)
+    t, fixes = 0.0, []
+    leg_left = rng.uniform(300, 3000)   # metres until the next turn
+    dwell_left = 0.0
+    speed = 0.0
+
+    while t < duration_s:
+        dt = rng.uniform(5, 10)
+        if dwell_left > 0:
+            dwell_left -= dt
+            speed = 0.0
+        else:
+            target = rng.choice([0.0, 3.0, 8.0, 14.0, 14.0, 17.0])  # jam .. Thika Road
+            speed += (target - speed) * 0.3
+            moved = speed * dt
+            leg_left -= moved
+            if leg_left <= 0:
+                heading += rng.choice([-1, 1]) * rng.uniform(math.pi / 6, math.pi / 2)
+                leg_left = rng.uniform(300, 3000)
+                if rng.random() < 0.4:
+                    dwell_left = rng.uniform(60, 300)  # stage
+            lat += moved * math.cos(heading) / METRES_PER_DEGREE
+            lon += moved * math.sin(heading) / (METRES_PER_DEGREE * math.cos(math.radians(lat)))
+
+        noise_lat = rng.gauss(0, 4.0) / METRES_PER_DEGREE
+        noise_lon = rng.gauss(0, 4.0) / (METRES_PER_DEGREE * math.cos(math.radians(lat)))
+        t += dt
+        fixes.append(Fix(lat + noise_lat, lon + noise_lon, t, len(fixes)))
+    return fixes
+
+
+def load_tracks(database_url: str, hours: float, limit: int) -> list:
+    os.environ["DATABASE_URL"] = database_url
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+    from datetime import datetime, timedelta
+    from sqlalchemy import select
+    from app.db.database import SessionLocal
+    from app.models.gps_point import GpsPoint
+
+    since = datetime.utcnow() - timedelta(hours=hours)
+    db = SessionLocal()
+    try:
+        vehicle_ids = db.execute(
+            select(GpsPoint.vehicle_id).where(GpsPoint.timestamp >= since).distinct().limit(limit)
+        ).scalars().all()
+        tracks = []
+        for vehicle_id in vehicle_ids:
+            rows = db.execute(
+                select(GpsPoint.latitude, GpsPoint.longitude, GpsPoint.timestamp)
+                .where(GpsPoint.vehicle_id == vehicle_id, GpsPoint.timestamp >= since)
+                .order_by(GpsPoint.timestamp)
+            ).all()
+            tracks.append([Fix(float(r.latitude), float(r.longitude), r.timestamp.timestamp(), i) for i, r in enumerate(rows)])
+        return tracks
+    finally:
+        db.close()
+
+
+def run_online(fixes, tolerance):
+    simplifier = OnlineSimplifier(tolerance)
+    kept = []
+    for fix in fixes:
+        kept += [f.ref for f, keep in simplifier.push(fix) if keep]
+    kept += [f.ref for f, keep in simplifier.flush() if keep]
+    return sorted(kept)
+
+
+def evaluate(tracks, tolerance, method):
+    points = kept = 0
+    max_error = weighted_mean = 0.0
+    start = time.perf_counter()
+    results = []
+    for fixes in tracks:
+        indices = simplify(fixes, tolerance) if method == "douglas_peucker" else run_online(fixes, tolerance)
+        results.append((fixes, indices))
+    elapsed = time.perf_counter() - start
+
+    for fixes, indices in results:
+        stats = compression_stats(fixes, indices)
+        points += stats["points"]
+        kept += stats["kept"]
+        max_error = max(max_error, stats["max_error_m"])
+        weighted_mean += stats["mean_error_m"] * stats["points"]
+
+    return {
+        "method": method,
+        "tolerance_m": tolerance,
+        "points": points,
+        "kept": kept,
+        "ratio": round(points / kept, 2) if kept else 0.0,
+        "max_error_m": round(max_error, 2),
+        "mean_error_m": round(weighted_mean / points, 2) if points else 0.0,
+        "points_per_second": round(points / elapsed) if elapsed else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GPS track compression benchmark")
+    parser.add_argument("--tracks", type=int, default=50, help="Simulated one-hour tracks")
+    parser.add_argument("--tolerances", default="5,10,15,25,50", help="Error tolerances in metres")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--database-url", help="Read real tracks from this database instead of simulating")
+    parser.add_argument("--hours", type=float, default=24, help="History per vehicle when reading real tracks")
+    parser.add_argument("--output", help="Write results as JSON")
+    args = parser.parse_args()
+
+    if args.database_url:
+        tracks = load_tracks(args.database_url, args.hours, args.tracks)
+        source = "database"
+    else:
+        rng = random.Random(args.seed)
+        tracks = [simulate_track(rng) for _ in range(args.tracks)]
+        source = "simulated"
+    print(f"{len(tracks)} {source} tracks, {sum(len(t) for t in tracks)} fixes\n")
+
+    print(f"{'method':<17}{'tol m':>7}{'kept':>9}{'ratio':>8}{'max err m':>11}{'mean err m':>12}{'pts/s':>10}")
+    results = []
+    for tolerance in (float(t) for t in args.tolerances.split(",")):
+        for method in ("douglas_peucker", "online"):
+            r = evaluate(tracks, tolerance, method)
+            results.append(r)
+            print(f"{method:<17}{tolerance:>7.0f}{r['kept']:>9}{r['ratio']:>8.1f}"
+                  f"{r['max_error_m']:>11.2f}{r['mean_error_m']:>12.2f}{r['points_per_second']:>10}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"source": source, "tracks": len(tracks), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,16 @@
 from app.db.database import engine, Base
-from app.models import User, Route, Vehicle, Trip, EmergencyAlert, Sacco, Rating, GpsPoint
+from app.models import User, Route, Vehicle, Trip, EmergencyAlert, Sacco, Rating, GpsPoint, SegmentTravelTime, DriverSafetyScore, DemandCell, DemandWatermark, RouteDemandForecast
 
 # Import all models here as you create them
 
 print("Creating tables...")
 Base.metadata.create_all(bind=engine)
+
+from app.services.gps_partitions import gps_partitions
+
+if gps_partitions.native:
+    with engine.begin() as conn:
+        created = gps_partitions.ensure_partitions(conn)
+    print(f"Created {len(created)} gps_points partitions")
+
 print("Tables created successfully!")
\ No newline at end of file
@@ -0,0 +1,62 @@
+# export_gps.py
+"""
+Export GPS history of a vehicle or route to a columnar file.
+
+Usage:
+    python export_gps.py --vehicle <id> --start 2026-01-01 --end 2026-02-01 -o jan.npz
+    python export_gps.py --route <id> --start 2026-01-01 --format arrow -o jan.arrows
+
+Reading the result:
+    data = numpy.load("jan.npz"); data["latitude"], data["vehicle_ids"][data["vehicle"]]
+    table = pyarrow.ipc.open_stream("jan.arrows").read_all()
+"""
+import argparse
+import json
+import sys
+import time
+from datetime import datetime
+from uuid import UUID
+
+from app.db.database import engine
+from app.services.gps_export import EXPORT_FORMATS, ExportUnavailable, check_format, export_query, iter_chunks, write_export
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export GPS history as npz or Arrow IPC")
+    subject = parser.add_mutually_exclusive_group(required=True)
+    subject.add_argument("--vehicle", type=UUID, help="Vehicle ID")
+    subject.add_argument("--route", type=UUID, help="Route ID (vehicles currently assigned to it)")
+    parser.add_argument("--start", type=datetime.fromisoformat, required=True, help="From (UTC, ISO date/time)")
+    parser.add_argument("--end", type=datetime.fromisoformat, default=None, help="Until (UTC, exclusive), default now")
+    parser.add_argument("--format", choices=list(EXPORT_FORMATS), default="npz")
+    parser.add_argument("--compress", action="store_true", help="Deflate npz members")
+    parser.add_argument("-o", "--output", required=True, help="Output file ('-' for stdout)")
+    args = parser.parse_args()
+
+    try:
+        check_format(args.format)
+    except ExportUnavailable as e:
+        sys.exit(str(e))
+
+    end = args.end or datetime.utcnow()
+    query = export_query(args.start, end, vehicle_id=args.vehicle, route_id=args.route)
+    out = sys.stdout.buffer if args.output == "-" else open(args.output, "wb")
+    start = time.perf_counter()
+    try:
+        with engine.connect() as conn:
+            written = write_export(args.format, iter_chunks(conn, query), out, compress=args.compress)
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+
+    if out is not sys.stdout.buffer:
+        print(json.dumps({
+            "output": args.output,
+            "format": args.format,
+            "bytes": written,
+            "elapsed_seconds": round(time.perf_counter() - start, 2),
+        }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# manage_gps_history.py
+"""
+Manage GPS history partitions (gps_points).
+
+Usage:
+    python manage_gps_history.py status
+    python manage_gps_history.py convert            # one-off: partition an existing table
+    python manage_gps_history.py ensure --from 2025-01-01
+    python manage_gps_history.py maintain           # premake, retention, downsampling
+"""
+import argparse
+import json
+import logging
+import sys
+from datetime import datetime
+
+from app.db.database import engine
+from app.services.gps_partitions import gps_partitions
+
+
+def status():
+    if not gps_partitions.native:
+        return {"dialect": engine.dialect.name, "partitioned": False}
+    with engine.connect() as conn:
+        partitioned = gps_partitions.is_partitioned(conn)
+        partitions = gps_partitions.partitions(conn) if partitioned else []
+    return {
+        "dialect": engine.dialect.name,
+        "partitioned": partitioned,
+        "interval": gps_partitions.interval,
+        "retention_days": gps_partitions.retention_days,
+        "retention_action": gps_partitions.retention_action,
+        "downsample_after_days": gps_partitions.downsample_after_days,
+        "downsample_seconds": gps_partitions.downsample_seconds,
+        "partitions": [
+            {"name": p.name, "from": p.start.isoformat(), "to": p.end.isoformat(), "downsampled_to": p.downsampled_to}
+            for p in partitions
+        ],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage GPS history partitions")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("status", help="Show partitions and policy")
+    convert = sub.add_parser("convert", help="Convert an unpartitioned gps_points table in place")
+    convert.add_argument("--keep-legacy", action="store_true", help="Keep the old table as gps_points_legacy")
+    ensure = sub.add_parser("ensure", help="Create missing partitions")
+    ensure.add_argument("--from", dest="start", type=datetime.fromisoformat, help="Earliest date to cover")
+    sub.add_parser("maintain", help="Run premake, retention and downsampling once")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    if args.command == "status":
+        result = status()
+    elif not gps_partitions.native:
+        sys.exit(f"Partitioning needs PostgreSQL (database is {engine.dialect.name})")
+    elif args.command == "convert":
+        with engine.begin() as conn:
+            result = {"rows_copied": gps_partitions.convert_table(conn, keep_legacy=args.keep_legacy)}
+    elif args.command == "ensure":
+        with engine.begin() as conn:
+            result = {"created": gps_partitions.ensure_partitions(conn, start=args.start)}
+    else:
+        result = gps_partitions.run_maintenance()
+
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# migrate_coordinates.py
+"""
+Convert the coordinate columns of gps_points and vehicles between storages.
+
+Set COORDINATE_STORAGE to the new storage only after converting; the API
+refuses to start while the two disagree.
+
+Usage:
+    python migrate_coordinates.py status
+    python migrate_coordinates.py convert --to microdegrees
+    python migrate_coordinates.py convert --to numeric     # back to the original schema
+
+On a partitioned gps_points the ALTER runs on every attached partition and
+rewrites them under an exclusive lock; detached archive tables are left alone.
+"""
+import argparse
+import json
+import sys
+
+from sqlalchemy import inspect, text
+
+from app.db.database import Base, engine
+from app.db.types import COORDINATE_SCALE, COORDINATE_STORAGES, MICRODEGREES, coordinate_columns, reflected_storage
+import app.models  # noqa: F401  (registers the tables on Base.metadata)
+
+
+def current_storages(conn) -> dict:
+    inspector = inspect(conn)
+    storages = {}
+    for table_name, names in coordinate_columns(Base.metadata).items():
+        if not inspector.has_table(table_name):
+            continue
+        reflected = {c["name"]: c["type"] for c in inspector.get_columns(table_name)}
+        for name in names:
+            storages[f"{table_name}.{name}"] = reflected_storage(reflected[name])
+    return storages
+
+
+def status():
+    from app.core.config import settings
+    with engine.connect() as conn:
+        storages = current_storages(conn)
+    return {
+        "dialect": engine.dialect.name,
+        "configured": settings.COORDINATE_STORAGE,
+        "columns": storages,
+        "consistent": all(s == settings.COORDINATE_STORAGE for s in storages.values()),
+    }
+
+
+def alter_statement(table_name: str, column, source: str, target: str) -> str:
+    name = column.name
+    degrees = f"({name} / {MICRODEGREES}.0)" if source == "microdegrees" else name
+    if target == "microdegrees":
+        new_type, using = "integer", f"round({degrees} * {MICRODEGREES})::integer"
+    elif target == "float":
+        new_type, using = "double precision", f"{degrees}::double precision"
+    else:
+        precision = column.type.impl.precision
+        new_type = f"numeric({precision}, {COORDINATE_SCALE})"
+        using = f"round({degrees}::numeric, {COORDINATE_SCALE})"
+    return f"ALTER TABLE {table_name} ALTER COLUMN {name} TYPE {new_type} USING {using}"
+
+
+def convert(target: str):
+    changed = []
+    with engine.begin() as conn:
+        storages = current_storages(conn)
+        for table_name, names in coordinate_columns(Base.metadata).items():
+            for name in names:
+                source = storages.get(f"{table_name}.{name}")
+                if source is None or source == target:
+                    continue
+                column = Base.metadata.tables[table_name].c[name]
+                conn.execute(text(alter_statement(table_name, column, source, target)))
+                changed.append(f"{table_name}.{name}: {source} -> {target}")
+    return {"target": target, "changed": changed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert coordinate column storage")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("status", help="Show the storage of each coordinate column")
+    convert_parser = sub.add_parser("convert", help="ALTER the coordinate columns to another storage")
+    convert_parser.add_argument("--to", dest="target", choices=COORDINATE_STORAGES, required=True)
+    args = parser.parse_args()
+
+    if args.command == "status":
+        result = status()
+    elif engine.dialect.name != "postgresql":
+        sys.exit(
+            f"Converting needs PostgreSQL (database is {engine.dialect.name}); "
+            "SQLite cannot change column types, recreate the tables with create_tables.py instead"
+        )
+    else:
+        result = convert(args.target)
+
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+# mock_mpesa.py
+"""
+Local mock of the Daraja (M-Pesa) API for tests and load runs.
+
+Implements the two endpoints MpesaClient uses:
+  GET  /oauth/v1/generate?grant_type=client_credentials
+  POST /mpesa/stkpush/v1/processrequest
+
+Optionally posts a payment callback (in our /api/payments/callback/mpesa format)
+back to the CallBackURL of each STK push, simulating the customer entering their PIN.
+
+Usage:
+    python mock_mpesa.py --port 8090 --callback --callback-delay 2
+    MPESA_BASE_URL=http://localhost:8090 MPESA_CONSUMER_KEY=x MPESA_CONSUMER_SECRET=x MPESA_PASSKEY=x uvicorn app.main:app
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib import request
+
+
+class MockMpesaServer:
+    """In-process mock Daraja server; use as a context manager in tests"""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        fail_rate: float = 0.0,
+        send_callback: bool = False,
+        callback_delay: float = 1.0,
+        callback_success_rate: float = 1.0,
+    ):
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.send_callback = send_callback
+        self.callback_delay = callback_delay
+        self.callback_success_rate = callback_success_rate
+
+        self.tokens_issued = 0
+        self.stk_requests = []
+        self.callbacks_sent = 0
+        self._lock = threading.Lock()
+        self._token = uuid.uuid4().hex
+
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _post_callback(self, callback_url: str, reference: str, amount):
+        success = random.random() < self.callback_success_rate
+        body = json.dumps({
+            "transaction_id": f"MOCK{uuid.uuid4().hex[:10].upper()}",
+            "status": "success" if success else "failed",
+            "amount": amount,
+            "reference": reference,
+        }).encode("utf-8")
+        req = request.Request(callback_url, data=body, method="POST")
+        req.add_header("Content-Type", "application/json")
+        try:
+            request.urlopen(req, timeout=10).close()
+            with self._lock:
+                self.callbacks_sent += 1
+        except Exception as e:
+            print(f"Mock callback to {callback_url} failed: {e}")
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, code: int, payload: dict):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if not self.path.startswith("/oauth/v1/generate"):
+                    return self._send(404, {"errorMessage": "Not found"})
+                if not self.headers.get("Authorization", "").startswith("Basic "):
+                    return self._send(400, {"errorMessage": "Invalid credentials"})
+                with server._lock:
+                    server.tokens_issued += 1
+                self._send(200, {"access_token": server._token, "expires_in": "3599"})
+
+            def do_POST(self):
+                if self.path != "/mpesa/stkpush/v1/processrequest":
+                    return self._send(404, {"errorMessage": "Not found"})
+                if self.headers.get("Authorization") != f"Bearer {server._token}":
+                    return self._send(401, {"errorMessage": "Invalid Access Token"})
+
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+
+                if server.latency:
+                    time.sleep(server.latency)
+                if random.random() < server.fail_rate:
+                    return self._send(503, {"errorMessage": "Service unavailable"})
+
+                with server._lock:
+                    server.stk_requests.append(payload)
+
+                checkout_id = f"ws_CO_{uuid.uuid4().hex[:20]}"
+                self._send(200, {
+                    "MerchantRequestID": uuid.uuid4().hex[:12],
+                    "CheckoutRequestID": checkout_id,
+                    "ResponseCode": "0",
+                    "ResponseDescription": "Success. Request accepted for processing",
+                    "CustomerMessage": "Success. Request accepted for processing",
+                })
+
+                if server.send_callback and payload.get("CallBackURL"):
+                    threading.Timer(
+                        server.callback_delay,
+                        server._post_callback,
+                        args=(payload["CallBackURL"], payload.get("AccountReference"), payload.get("Amount")),
+                    ).start()
+
+        return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock M-Pesa Daraja server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to delay each STK push")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Fraction of STK pushes answered with 503")
+    parser.add_argument("--callback", action="store_true", help="Post payment callbacks to CallBackURL")
+    parser.add_argument("--callback-delay", type=float, default=1.0)
+    parser.add_argument("--callback-success-rate", type=float, default=1.0)
+    args = parser.parse_args()
+
+    mock = MockMpesaServer(
+        host=args.host,
+        port=args.port,
+        latency=args.latency,
+        fail_rate=args.fail_rate,
+        send_callback=args.callback,
+        callback_delay=args.callback_delay,
+        callback_success_rate=args.callback_success_rate,
+    )
+    print(f"Mock M-Pesa listening on {mock.base_url}")
+    try:
+        mock.httpd.serve_forever()
+    except KeyboardInterrupt:
+        mock.stop()
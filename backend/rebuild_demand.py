@@ -0,0 +1,37 @@
+# rebuild_demand.py
+"""
+Recount the demand heatmap (demand_cells) from every trip and emergency alert,
+or add what was created since the last run.
+
+Usage:
+    python rebuild_demand.py rebuild                  # both sources from scratch
+    python rebuild_demand.py rebuild --source trips
+    python rebuild_demand.py update                   # since the watermarks, as the API does
+"""
+import argparse
+import json
+import logging
+import time
+
+from app.services.demand import SOURCES, demand_heatmap
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the demand heatmap")
+    parser.add_argument("command", choices=["rebuild", "update"])
+    parser.add_argument("--source", choices=list(SOURCES), action="append", help="Rebuild only this source")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    start = time.perf_counter()
+    if args.command == "rebuild":
+        result = {"counted": demand_heatmap.rebuild(args.source)}
+    else:
+        result = {"counted": demand_heatmap.update()}
+    result["elapsed_seconds"] = round(time.perf_counter() - start, 2)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
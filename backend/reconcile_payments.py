@@ -0,0 +1,50 @@
+# reconcile_payments.py
+"""
+Reconcile the payments table against an M-Pesa statement or B2C report (CSV).
+
+Usage:
+    python reconcile_payments.py statement.csv --report mismatches.csv
+    python reconcile_payments.py statement.csv --dry-run
+"""
+import argparse
+import json
+import logging
+import sys
+import time
+
+from app.db.database import SessionLocal
+from app.services.reconciliation import PaymentReconciler, read_statement
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconcile payments against an M-Pesa statement")
+    parser.add_argument("statement", help="Statement CSV file ('-' for stdin)")
+    parser.add_argument("--report", help="Write mismatches and corrections to this CSV file")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="Statement rows matched per DB round-trip")
+    parser.add_argument("--dry-run", action="store_true", help="Report only, don't apply corrections")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    statement = sys.stdin if args.statement == "-" else open(args.statement, newline="", encoding="utf-8-sig")
+    report = open(args.report, "w", newline="") if args.report else None
+    db = SessionLocal()
+    start = time.perf_counter()
+    try:
+        reconciler = PaymentReconciler(db, chunk_size=args.chunk_size, dry_run=args.dry_run, report=report)
+        summary = reconciler.run(read_statement(statement))
+    finally:
+        db.close()
+        if report:
+            report.close()
+        if statement is not sys.stdin:
+            statement.close()
+
+    result = summary.as_dict()
+    result["elapsed_seconds"] = round(time.perf_counter() - start, 2)
+    result["dry_run"] = args.dry_run
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
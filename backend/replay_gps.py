@@ -0,0 +1,305 @@
+# replay_gps.py
+"""
+Replay recorded GPS history through the live ingest path.
+
+Fixes are read from gps_points for a time window, or from a file written by
+export_gps.py, and sent as PATCH /api/vehicles/{id}/location in timestamp
+order with their recorded spacing divided by --speed. A vehicle's fixes go out
+one at a time and in order; different vehicles overlap up to --concurrency.
+
+Without --url the app runs in-process (with its background services) against
+the configured database; with --url fixes go to a running server. Either way
+--subscribers opens passenger route subscriptions to measure WebSocket fan-out.
+
+The API stamps fixes with its own clock, so above 1x the speeds and travel
+times it derives are scaled too: replay at 1x to reproduce driving safety and
+ETA behaviour, faster as ingest and fan-out load.
+
+Usage:
+    python replay_gps.py --start 2026-03-02T04:00 --end 2026-03-02T07:00 --speed 10
+    python replay_gps.py --route <id> --start 2026-03-02T04:00 --end 2026-03-02T05:00 --subscribers 50
+    python replay_gps.py --file rush.npz --speed 50 --url http://localhost:8000 --subscribers 200
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from array import array
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+from uuid import UUID
+
+import httpx
+from sqlalchemy import select
+
+from app.db.database import SessionLocal, engine
+from app.models.gps_point import GpsPoint
+from app.models.vehicle import Vehicle
+from app.services.gps_export import iter_chunks
+
+_EPOCH = datetime(1970, 1, 1)
+
+# Fixes dispatched but not yet answered, per unit of concurrency; past this the
+# replay stops reading ahead and the lag shows the server falling behind
+PENDING_PER_SLOT = 10
+
+Fix = Tuple[str, float, float, float]  # vehicle_id, latitude, longitude, seconds since epoch
+
+
+def fixes_from_db(start: datetime, end: datetime, vehicle_id=None, route_id=None) -> Iterator[Fix]:
+    query = select(GpsPoint.vehicle_id, GpsPoint.latitude, GpsPoint.longitude, GpsPoint.timestamp).where(
+        GpsPoint.timestamp >= start, GpsPoint.timestamp < end
+    )
+    if vehicle_id is not None:
+        query = query.where(GpsPoint.vehicle_id == vehicle_id)
+    if route_id is not None:
+        query = query.where(GpsPoint.vehicle_id.in_(select(Vehicle.id).where(Vehicle.route_id == route_id)))
+    with engine.connect() as conn:
+        for chunk in iter_chunks(conn, query.order_by(GpsPoint.timestamp)):
+            for vehicle, lat, lon, ts in chunk:
+                yield str(vehicle), float(lat), float(lon), (ts - _EPOCH).total_seconds()
+
+
+def fixes_from_file(path: str) -> Iterator[Fix]:
+    """An .npz or Arrow IPC export; loaded whole, since exports are ordered by vehicle"""
+    import numpy as np
+
+    if path.endswith(".npz"):
+        data = np.load(path)
+        vehicle_ids, vehicle = data["vehicle_ids"], data["vehicle"]
+        lat, lon, ts_ms = data["latitude"], data["longitude"], data["timestamp_ms"]
+    else:
+        import pyarrow as pa
+
+        with pa.OSFile(path, "rb") as source:
+            table = pa.ipc.open_stream(source).read_all()
+        vehicles = table.column("vehicle_id").combine_chunks()
+        vehicle_ids, vehicle = vehicles.dictionary.to_numpy(zero_copy_only=False), vehicles.indices.to_numpy()
+        lat, lon = table.column("latitude").to_numpy(), table.column("longitude").to_numpy()
+        ts_ms = table.column("timestamp").cast(pa.int64()).to_numpy()
+
+    for i in np.argsort(ts_ms, kind="stable"):
+        yield str(vehicle_ids[vehicle[i]]), float(lat[i]), float(lon[i]), ts_ms[i] / 1000.0
+
+
+def percentiles_ms(values) -> dict:
+    ordered = sorted(values)
+    if not ordered:
+        return {}
+    pick = lambda pct: round(ordered[min(len(ordered) - 1, int(len(ordered) * pct))] * 1000, 1)  # noqa: E731
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99), "max": round(ordered[-1] * 1000, 1)}
+
+
+class ReplayStats:
+    def __init__(self):
+        self.statuses: Counter = Counter()
+        self.lags = array("d")  # seconds from a fix's due time to its response
+        self.vehicles = set()
+        self.first_error: Optional[str] = None
+        self.fanout_lags = array("d")  # seconds from ingest to a subscriber receiving the update
+        self.messages = 0
+
+    def delivered(self, message: dict):
+        self.messages += 1
+        if message.get("type") != "vehicle_location_update":
+            return
+        try:
+            stamped = datetime.fromisoformat(message["data"]["timestamp"])
+        except (KeyError, TypeError, ValueError):
+            return
+        self.fanout_lags.append((datetime.utcnow() - stamped).total_seconds())
+
+
+class _Subscriber:
+    """Stands in for a passenger's WebSocket in the in-process connection manager"""
+
+    def __init__(self, stats: ReplayStats):
+        self.stats = stats
+
+    async def send_json(self, message: dict):
+        self.stats.delivered(message)
+
+    async def send_text(self, message: str):
+        self.stats.delivered(json.loads(message))
+
+
+async def subscribe_in_process(route_ids: List[str], count: int, stats: ReplayStats):
+    from app.websockets.manager import connection_manager
+
+    for i in range(count):
+        await connection_manager.subscribe_to_route(_Subscriber(stats), route_ids[i % len(route_ids)])
+
+
+async def subscribe_remote(url: str, route_id: str, index: int, stats: ReplayStats, ready: asyncio.Event):
+    try:
+        import websockets
+    except ImportError:
+        sys.exit("--subscribers with --url needs the websockets package (installed with uvicorn[standard])")
+
+    ws_url = url.replace("http", "ws", 1).rstrip("/") + f"/ws/tracking/replay-{index}"
+    async with websockets.connect(ws_url) as ws:
+        await ws.send(json.dumps({"action": "subscribe", "route_id": route_id}))
+        await ws.recv()
+        ready.set()
+        async for raw in ws:
+            stats.delivered(json.loads(raw))
+
+
+def subscribed_routes(route_id=None) -> List[str]:
+    if route_id is not None:
+        return [str(route_id)]
+    db = SessionLocal()
+    try:
+        rows = db.execute(select(Vehicle.route_id).where(Vehicle.route_id != None).distinct()).scalars().all()
+    finally:
+        db.close()
+    return [str(r) for r in rows]
+
+
+async def replay(fixes: Iterator[Fix], client: httpx.AsyncClient, speed: float, concurrency: int,
+                 stats: ReplayStats, progress: float) -> Tuple[float, float]:
+    """Returns (recorded span, wall time) in seconds"""
+    semaphore = asyncio.Semaphore(concurrency)
+    # asyncio.Lock wakes waiters first come first served, so a vehicle's fixes leave in order
+    lanes: Dict[str, asyncio.Lock] = {}
+    pending = set()
+    max_pending = concurrency * PENDING_PER_SLOT
+
+    async def send(vehicle_id: str, lat: float, lon: float, due: float):
+        async with lanes[vehicle_id]:
+            async with semaphore:
+                try:
+                    response = await client.patch(
+                        f"/api/vehicles/{vehicle_id}/location",
+                        json={"current_latitude": lat, "current_longitude": lon},
+                    )
+                    status = response.status_code
+                    if status >= 400 and stats.first_error is None:
+                        stats.first_error = f"{vehicle_id} -> {status}: {response.text[:200]}"
+                except httpx.HTTPError as e:
+                    status = type(e).__name__
+                    if stats.first_error is None:
+                        stats.first_error = f"{vehicle_id} -> {e!r}"
+        stats.lags.append(time.perf_counter() - due)
+        stats.statuses[status] += 1
+
+    origin = last = None
+    wall_start = next_report = time.perf_counter()
+    for vehicle_id, lat, lon, t in fixes:
+        if origin is None:
+            origin = t
+        last = t
+        due = wall_start + (t - origin) / speed
+        delay = due - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        while len(pending) >= max_pending:
+            await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+
+        if vehicle_id not in lanes:
+            lanes[vehicle_id] = asyncio.Lock()
+            stats.vehicles.add(vehicle_id)
+        task = asyncio.create_task(send(vehicle_id, lat, lon, due))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+
+        if progress and time.perf_counter() >= next_report:
+            next_report = time.perf_counter() + progress
+            behind = time.perf_counter() - due
+            print(f"  {sum(stats.statuses.values())} sent, {len(pending)} in flight, "
+                  f"replay time {_EPOCH + timedelta(seconds=t):%H:%M:%S}, {max(behind, 0):.1f}s behind",
+                  file=sys.stderr)
+
+    if pending:
+        await asyncio.wait(pending)
+    return (last - origin) if origin is not None else 0.0, time.perf_counter() - wall_start
+
+
+async def run(args) -> dict:
+    if args.file:
+        fixes = fixes_from_file(args.file)
+    else:
+        fixes = fixes_from_db(args.start, args.end or datetime.utcnow(), vehicle_id=args.vehicle, route_id=args.route)
+
+    stats = ReplayStats()
+    listeners = []
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    try:
+        if args.url:
+            if args.subscribers:
+                routes = subscribed_routes(args.route)
+                for i in range(args.subscribers):
+                    ready = asyncio.Event()
+                    listeners.append(asyncio.create_task(subscribe_remote(args.url, routes[i % len(routes)], i, stats, ready)))
+                    await ready.wait()
+            async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+                span, wall = await replay(fixes, client, args.speed, args.concurrency, stats, args.progress)
+        else:
+            from app.main import app
+
+            async with app.router.lifespan_context(app):
+                if args.subscribers:
+                    await subscribe_in_process(subscribed_routes(args.route), args.subscribers, stats)
+                transport = httpx.ASGITransport(app=app)
+                async with httpx.AsyncClient(transport=transport, base_url="http://replay", timeout=args.timeout) as client:
+                    span, wall = await replay(fixes, client, args.speed, args.concurrency, stats, args.progress)
+                # Let broadcasts still queued on the loop reach the subscribers
+                await asyncio.sleep(0.1)
+    finally:
+        for listener in listeners:
+            listener.cancel()
+
+    sent = sum(stats.statuses.values())
+    result = {
+        "source": args.file or f"gps_points {args.start.isoformat()} .. {(args.end or datetime.utcnow()).isoformat()}",
+        "target": args.url or "in-process",
+        "speed": args.speed,
+        "fixes": sent,
+        "vehicles": len(stats.vehicles),
+        "recorded_seconds": round(span, 1),
+        "elapsed_seconds": round(wall, 2),
+        "target_rate_per_second": round(sent / (span / args.speed), 1) if span else None,
+        "achieved_rate_per_second": round(sent / wall, 1) if wall else None,
+        "statuses": {str(k): v for k, v in sorted(stats.statuses.items(), key=lambda kv: str(kv[0]))},
+        "lag_ms": percentiles_ms(stats.lags),
+    }
+    if stats.first_error:
+        result["first_error"] = stats.first_error
+    if args.subscribers:
+        result["fanout"] = {
+            "subscribers": args.subscribers,
+            "messages": stats.messages,
+            "lag_ms": percentiles_ms(stats.fanout_lags),
+        }
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay GPS history through the ingest API")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--start", type=datetime.fromisoformat, help="Replay gps_points from (UTC, ISO date/time)")
+    source.add_argument("--file", help="Replay an export_gps.py file (.npz or Arrow IPC stream)")
+    parser.add_argument("--end", type=datetime.fromisoformat, default=None, help="Until (UTC, exclusive), default now")
+    subject = parser.add_mutually_exclusive_group()
+    subject.add_argument("--vehicle", type=UUID, help="Only this vehicle")
+    subject.add_argument("--route", type=UUID, help="Only vehicles currently assigned to this route")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed, 1 = real time (up to 100)")
+    parser.add_argument("--url", help="Base URL of a running API; default runs the app in-process")
+    parser.add_argument("--concurrency", type=int, default=64, help="Requests in flight")
+    parser.add_argument("--subscribers", type=int, default=0, help="Passenger route subscriptions to fan out to")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout in seconds")
+    parser.add_argument("--progress", type=float, default=10.0, help="Seconds between progress lines, 0 for none")
+    args = parser.parse_args()
+
+    if not 0 < args.speed <= 100:
+        parser.error("--speed must be between 0 and 100")
+    if args.file and (args.vehicle or args.route or args.end):
+        parser.error("--vehicle, --route and --end select from gps_points; filter files when exporting them")
+
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
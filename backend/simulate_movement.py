@@ -1,12 +1,15 @@
 # simulate_movement.py
 import asyncio
 import random
+from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
 from app.db import SessionLocal
 from app.models import Vehicle
 
 async def simulate_vehicle_movement():
     """Simulate random vehicle movement around Nairobi"""
+    # Vehicles that stopped reporting, and until when
+    parked = {}
     
     while True:
         db = SessionLocal()
@@ -14,7 +17,15 @@ async def simulate_vehicle_movement():
             # Get all active vehicles
             vehicles = db.query(Vehicle).filter(Vehicle.is_active == True).all()
             
+            now = datetime.utcnow()
             for vehicle in vehicles:
+                # Now and then a vehicle goes quiet for 5-15 minutes; the API's
+                # presence sweeper marks it offline once it has been silent long enough
+                if parked.get(vehicle.id, now) > now:
+                    continue
+                if random.random() < 0.01:
+                    parked[vehicle.id] = now + timedelta(minutes=random.uniform(5, 15))
+                    continue
                 if vehicle.current_latitude and vehicle.current_longitude:
                     # Move vehicle slightly (about 100-200 meters)
                     # 0.001 degrees ≈ 111 meters
@@ -23,10 +34,8 @@ async def simulate_vehicle_movement():
                     
                     vehicle.current_latitude = float(vehicle.current_latitude) + lat_change
                     vehicle.current_longitude = float(vehicle.current_longitude) + lon_change
-                    
-                    # Randomly toggle online status (10% chance)
-                    if random.random() < 0.1:
-                        vehicle.is_online = not vehicle.is_online
+                    vehicle.last_location_update = now
+                    vehicle.is_online = True
             
             db.commit()
             print(f"✓ Updated {len(vehicles)} vehicles")